@@ -65,6 +65,9 @@ async def graceful_shutdown():  # sourcery skip: use-named-expression
 
         from src.plugin_system.core.events_manager import events_manager
         from src.plugin_system.base.component_types import EventType
+        from src.common.database.db_executor import db_executor
+        from src.common.database.group_commit import group_commit_writer
+        from src.chat.emoji_system.emoji_manager import get_emoji_manager
 
         # 触发 ON_STOP 事件
         await events_manager.handle_mai_events(event_type=EventType.ON_STOP)
@@ -92,6 +95,11 @@ async def graceful_shutdown():  # sourcery skip: use-named-expression
             except Exception as e:
                 logger.error(f"等待任务取消时发生异常: {e}")
 
+        # 写入组提交缓冲中剩余的数据，再等待数据库线程中已提交的读写完成
+        get_emoji_manager().flush_usage()
+        group_commit_writer.close()
+        db_executor.shutdown()
+
         logger.info("麦麦优雅关闭完成")
 
         # 关闭日志系统，释放文件句柄
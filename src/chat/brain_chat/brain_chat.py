@@ -7,25 +7,24 @@ from rich.traceback import install
 
 from src.config.config import global_config
 from src.common.logger import get_logger
+from src.common.database.db_executor import db_read
+from src.common.database.group_commit import group_commit_writer
 from src.common.data_models.info_data_model import ActionPlannerInfo
 from src.common.data_models.message_data_model import ReplyContentType
 from src.chat.message_receive.chat_stream import ChatStream, get_chat_manager
 from src.chat.utils.prompt_builder import global_prompt_manager
 from src.chat.utils.timer_calculator import Timer
+from src.chat.utils.cycle_context import CycleContext
 from src.chat.brain_chat.brain_planner import BrainPlanner
 from src.chat.planner_actions.action_modifier import ActionModifier
 from src.chat.planner_actions.action_manager import ActionManager
 from src.chat.heart_flow.hfc_utils import CycleDetail
-from src.chat.heart_flow.hfc_utils import send_typing, stop_typing
+from src.chat.heart_flow.hfc_utils import send_typing, stop_typing, wait_for_new_message
 from src.chat.express.expression_learner import expression_learner_manager
 from src.person_info.person_info import Person
 from src.plugin_system.base.component_types import EventType, ActionInfo
 from src.plugin_system.core import events_manager
 from src.plugin_system.apis import generator_api, send_api, message_api, database_api
-from src.chat.utils.chat_message_builder import (
-    build_readable_messages_with_id,
-    get_raw_msg_before_timestamp_with_chat,
-)
 
 if TYPE_CHECKING:
     from src.common.data_models.database_data_model import DatabaseMessages
@@ -62,12 +61,13 @@ class BrainChatting:
     用于在特定聊天流中生成回复。
     """
 
-    def __init__(self, chat_id: str):
+    def __init__(self, chat_id: str, new_message_event: Optional[asyncio.Event] = None):
         """
         BrainChatting 初始化函数
 
         参数:
             chat_id: 聊天流唯一标识符(如stream_id)
+            new_message_event: 新消息通知事件，由 Heartflow 在消息入库后置位
             on_stop_focus_chat: 当收到stop_focus_chat命令时调用的回调函数
             performance_version: 性能记录版本号，用于区分不同启动版本
         """
@@ -94,6 +94,7 @@ class BrainChatting:
         self._current_cycle_detail: CycleDetail = None  # type: ignore
 
         self.last_read_time = time.time() - 2
+        self.new_message_event: asyncio.Event = new_message_event or asyncio.Event()
 
         self.more_plan = False
         
@@ -159,7 +160,10 @@ class BrainChatting:
         )
 
     async def _loopbody(self):  # sourcery skip: hoist-if-from-if
-        recent_messages_list = message_api.get_messages_by_time_in_chat(
+        # 先清除通知再查询，查询之后到达的消息会重新置位事件，不会丢失
+        self.new_message_event.clear()
+        recent_messages_list = await db_read(
+            message_api.get_messages_by_time_in_chat,
             chat_id=self.stream_id,
             start_time=self.last_read_time,
             end_time=time.time(),
@@ -177,7 +181,7 @@ class BrainChatting:
             
         else:
             # Normal模式：消息数量不足，等待
-            await asyncio.sleep(0.2)
+            await wait_for_new_message(self.new_message_event)
             return True
         return True
 
@@ -202,7 +206,7 @@ class BrainChatting:
         if platform is None:
             platform = getattr(self.chat_stream, "platform", "unknown")
 
-        person = Person(platform=platform, user_id=action_message.user_info.user_id)
+        person = await db_read(Person, platform=platform, user_id=action_message.user_info.user_id)
         person_name = person.person_name
         action_prompt_display = f"你对{person_name}进行了回复：{reply_text}"
 
@@ -245,10 +249,15 @@ class BrainChatting:
             cycle_timers, thinking_id = self.start_cycle()
             logger.info(f"{self.log_prefix} 开始第{self._cycle_counter}次思考")
 
+            # 本次循环共享的上下文快照，modifier/planner/replyer 不再各自查询和渲染聊天记录
+            # 先等待该聊天尚未提交的消息和动作记录写入，后面在事件循环中渲染动作记录时才不会读到旧数据
+            await group_commit_writer.aflush(chat_id=self.stream_id)
+            cycle_context = await db_read(CycleContext, self.stream_id)
+
             # 第一步：动作检查
             available_actions: Dict[str, ActionInfo] = {}
             try:
-                await self.action_modifier.modify_actions()
+                await self.action_modifier.modify_actions(cycle_context=cycle_context)
                 available_actions = self.action_manager.get_using_actions()
             except Exception as e:
                 logger.error(f"{self.log_prefix} 动作修改失败: {e}")
@@ -256,13 +265,8 @@ class BrainChatting:
             # 执行planner
             is_group_chat, chat_target_info, _ = self.action_planner.get_necessary_info()
 
-            message_list_before_now = get_raw_msg_before_timestamp_with_chat(
-                chat_id=self.stream_id,
-                timestamp=time.time(),
+            chat_content_block, message_id_list = cycle_context.build_readable_with_id(
                 limit=int(global_config.chat.max_context_size * 0.6),
-            )
-            chat_content_block, message_id_list = build_readable_messages_with_id(
-                messages=message_list_before_now,
                 timestamp_mode="normal_no_YMD",
                 read_mark=self.action_planner.last_obs_time_mark,
                 truncate=True,
@@ -276,6 +280,7 @@ class BrainChatting:
                 chat_content_block=chat_content_block,
                 message_id_list=message_id_list,
                 interest=global_config.personality.interest,
+                cycle_context=cycle_context,
             )
             continue_flag, modified_message = await events_manager.handle_mai_events(
                 EventType.ON_PLAN, None, prompt_info[0], None, self.chat_stream.stream_id
@@ -289,12 +294,15 @@ class BrainChatting:
                 action_to_use_info, _ = await self.action_planner.plan(
                     loop_start_time=self.last_read_time,
                     available_actions=available_actions,
+                    cycle_context=cycle_context,
                 )
 
             # 3. 并行执行所有动作
             action_tasks = [
                 asyncio.create_task(
-                    self._execute_action(action, action_to_use_info, thinking_id, available_actions, cycle_timers)
+                    self._execute_action(
+                        action, action_to_use_info, thinking_id, available_actions, cycle_timers, cycle_context
+                    )
                 )
                 for action in action_to_use_info
             ]
@@ -351,6 +359,7 @@ class BrainChatting:
 
             self.end_cycle(loop_info, cycle_timers)
             self.print_cycle_info(cycle_timers)
+            logger.debug(f"{self.log_prefix} 第{self._cycle_counter}次思考{cycle_context.stats_summary()}")
 
             return True
 
@@ -435,8 +444,11 @@ class BrainChatting:
         message_data: "DatabaseMessages",
         selected_expressions: Optional[List[int]] = None,
     ) -> str:
-        new_message_count = message_api.count_new_messages(
-            chat_id=self.chat_stream.stream_id, start_time=self.last_read_time, end_time=time.time()
+        new_message_count = await db_read(
+            message_api.count_new_messages,
+            chat_id=self.chat_stream.stream_id,
+            start_time=self.last_read_time,
+            end_time=time.time(),
         )
 
         need_reply = new_message_count >= random.randint(2, 4)
@@ -480,6 +492,7 @@ class BrainChatting:
         thinking_id: str,
         available_actions: Dict[str, ActionInfo],
         cycle_timers: Dict[str, float],
+        cycle_context: Optional[CycleContext] = None,
     ):
         """执行单个动作的通用函数"""
         try:
@@ -513,6 +526,7 @@ class BrainChatting:
                             enable_tool=global_config.tool.enable_tool,
                             request_type="replyer",
                             from_plugin=False,
+                            cycle_context=cycle_context,
                         )
 
                         if not success or not llm_response or not llm_response.reply_set:
@@ -8,16 +8,19 @@ import traceback
 import io
 import re
 import binascii
+import threading
 
-from typing import Optional, Tuple, List, Any
+from typing import Optional, Tuple, List, Any, Dict
 from PIL import Image
 from rich.traceback import install
 
 from src.common.database.database_model import Emoji
 from src.common.database.database import db as peewee_db
+from src.common.database.db_executor import db_executor
 from src.common.logger import get_logger
 from src.config.config import global_config, model_config
 from src.chat.utils.utils_image import image_path_to_base64, get_image_manager
+from src.chat.emoji_system.emotion_index import EmotionIndex, levenshtein_distance
 from src.llm_models.utils_model import LLMRequest
 
 install(extra_lines=3)
@@ -28,6 +31,7 @@ BASE_DIR = os.path.join("data")
 EMOJI_DIR = os.path.join(BASE_DIR, "emoji")  # 表情包存储目录
 EMOJI_REGISTERED_DIR = os.path.join(BASE_DIR, "emoji_registed")  # 已注册的表情包注册目录
 MAX_EMOJI_FOR_PROMPT = 20  # 最大允许的表情包描述数量于图片替换的 prompt 中
+EMOJI_USAGE_FLUSH_INTERVAL = 30  # 表情包使用次数在内存中累积多少秒后写入数据库
 
 """
 还没经过测试，有些地方数据库和内存数据同步可能不完全
@@ -388,6 +392,14 @@ class EmojiManager:
         self.emoji_num_max = global_config.emoji.max_reg_num
         self.emoji_num_max_reach_deletion = global_config.emoji.do_replace
         self.emoji_objects: list[MaiEmoji] = []  # 存储MaiEmoji对象的列表，使用类型注解明确列表元素类型
+        # 与 emoji_objects 同步维护的哈希索引和情感标签索引，修改 emoji_objects 时需通过下面的 _set/_add/_remove 方法
+        self._emoji_by_hash: Dict[str, MaiEmoji] = {}
+        self._emotion_index = EmotionIndex()
+
+        # 待写入数据库的使用记录: 哈希 -> (新增使用次数, 最后使用时间)
+        self._usage_lock = threading.Lock()
+        self._pending_usage: Dict[str, Tuple[int, float]] = {}
+        self._usage_timer: Optional[threading.Timer] = None
 
         logger.info("启动表情包管理器")
 
@@ -407,15 +419,75 @@ class EmojiManager:
         if not self._initialized:
             raise RuntimeError("EmojiManager not initialized")
 
+    def _set_emoji_objects(self, emoji_objects: List["MaiEmoji"]) -> None:
+        """替换内存中的表情包列表并重建索引"""
+        self.emoji_objects = emoji_objects
+        self._emoji_by_hash = {emoji.hash: emoji for emoji in emoji_objects}
+        self._emotion_index.rebuild(emoji_objects)
+
+    def _add_emoji_object(self, emoji: "MaiEmoji") -> None:
+        """向内存列表和索引中加入一个表情包"""
+        self.emoji_objects.append(emoji)
+        self._emoji_by_hash[emoji.hash] = emoji
+        self._emotion_index.add(emoji)
+
+    def _remove_emoji_objects(self, emojis: List["MaiEmoji"]) -> None:
+        """从内存列表和索引中移除表情包"""
+        removed_ids = {id(emoji) for emoji in emojis}
+        self.emoji_objects = [e for e in self.emoji_objects if id(e) not in removed_ids]
+        for emoji in emojis:
+            if self._emoji_by_hash.get(emoji.hash) is emoji:
+                del self._emoji_by_hash[emoji.hash]
+            self._emotion_index.remove(emoji)
+
     def record_usage(self, emoji_hash: str) -> None:
-        """记录表情使用次数"""
+        """记录表情使用次数
+
+        内存中的计数立即更新，数据库在 EMOJI_USAGE_FLUSH_INTERVAL 秒内合并为一次批量写入
+        """
+        now = time.time()
+        if emoji := self._emoji_by_hash.get(emoji_hash):
+            emoji.usage_count += 1
+            emoji.last_used_time = now
+        with self._usage_lock:
+            count, _ = self._pending_usage.get(emoji_hash, (0, now))
+            self._pending_usage[emoji_hash] = (count + 1, now)
+            if self._usage_timer is None:
+                self._usage_timer = threading.Timer(EMOJI_USAGE_FLUSH_INTERVAL, self._on_usage_timer)
+                self._usage_timer.daemon = True
+                self._usage_timer.start()
+
+    def flush_usage(self) -> None:
+        """立即把累积的使用次数写入数据库（关闭时调用）"""
+        with self._usage_lock:
+            if self._usage_timer is not None:
+                self._usage_timer.cancel()
+                self._usage_timer = None
+        self._write_usage()
+
+    def _on_usage_timer(self) -> None:
+        with self._usage_lock:
+            self._usage_timer = None
+        if db_executor.submit_write(self._write_usage) is None:
+            # 写线程已关闭，直接在当前线程写入
+            self._write_usage()
+
+    def _write_usage(self) -> None:
+        with self._usage_lock:
+            pending, self._pending_usage = self._pending_usage, {}
+        if not pending:
+            return
         try:
-            emoji_update = Emoji.get(Emoji.emoji_hash == emoji_hash)
-            emoji_update.usage_count += 1
-            emoji_update.last_used_time = time.time()  # Update last used time
-            emoji_update.save()  # Persist changes to DB
-        except Emoji.DoesNotExist:  # type: ignore
-            logger.error(f"记录表情使用失败: 未找到 hash 为 {emoji_hash} 的表情包")
+            with peewee_db.atomic():
+                for emoji_hash, (count, last_used_time) in pending.items():
+                    updated = (
+                        Emoji.update(usage_count=Emoji.usage_count + count, last_used_time=last_used_time)
+                        .where(Emoji.emoji_hash == emoji_hash)
+                        .execute()
+                    )
+                    if not updated:
+                        logger.error(f"记录表情使用失败: 未找到 hash 为 {emoji_hash} 的表情包")
+            logger.debug(f"已写入 {len(pending)} 个表情包的使用记录")
         except Exception as e:
             logger.error(f"记录表情使用失败: {str(e)}")
 
@@ -430,45 +502,12 @@ class EmojiManager:
             self._ensure_db()
             _time_start = time.time()
 
-            # 获取所有表情包 (从内存缓存中获取)
-            all_emojis = self.emoji_objects
-
-            if not all_emojis:
+            if not self.emoji_objects:
                 logger.warning("内存中没有任何表情包对象")
                 return None
 
-            # 计算每个表情包与输入文本的最大情感相似度
-            emoji_similarities = []
-            for emoji in all_emojis:
-                # 跳过已标记为删除的对象
-                if emoji.is_deleted:
-                    continue
-
-                emotions = emoji.emotion
-                if not emotions:
-                    continue
-
-                # 计算与每个emotion标签的相似度，取最大值
-                max_similarity = 0
-                best_matching_emotion = ""
-                for emotion in emotions:
-                    # 使用编辑距离计算相似度
-                    distance = self._levenshtein_distance(text_emotion, emotion)
-                    max_len = max(len(text_emotion), len(emotion))
-                    similarity = 1 - (distance / max_len if max_len > 0 else 0)
-                    if similarity > max_similarity:
-                        max_similarity = similarity
-                        best_matching_emotion = emotion
-
-                if best_matching_emotion:
-                    emoji_similarities.append((emoji, max_similarity, best_matching_emotion))
-
-            # 按相似度降序排序
-            emoji_similarities.sort(key=lambda x: x[1], reverse=True)
-
-            # 获取前10个最相似的表情包
-            top_emojis = emoji_similarities[:10] if len(emoji_similarities) > 10 else emoji_similarities
-
+            # 通过情感标签索引获取前10个最相似的表情包
+            top_emojis = self._emotion_index.search(text_emotion)
             if not top_emojis:
                 logger.warning("未找到匹配的表情包")
                 return None
@@ -492,7 +531,6 @@ class EmojiManager:
             return None
 
     def _levenshtein_distance(self, s1: str, s2: str) -> int:
-        # sourcery skip: simplify-empty-collection-comparison, simplify-len-comparison, simplify-str-len-comparison
         """计算两个字符串的编辑距离
 
         Args:
@@ -502,23 +540,7 @@ class EmojiManager:
         Returns:
             int: 编辑距离
         """
-        if len(s1) < len(s2):
-            return self._levenshtein_distance(s2, s1)
-
-        if len(s2) == 0:
-            return len(s1)
-
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-
-        return previous_row[-1]
+        return levenshtein_distance(s1, s2)
 
     async def check_emoji_file_integrity(self) -> None:
         """检查表情包文件完整性
@@ -569,7 +591,7 @@ class EmojiManager:
 
             # 从 self.emoji_objects 中移除标记的对象
             if objects_to_remove:
-                self.emoji_objects = [e for e in self.emoji_objects if e not in objects_to_remove]
+                self._remove_emoji_objects(objects_to_remove)
 
             # 清理 EMOJI_REGISTERED_DIR 目录中未被追踪的文件
             removed_count = await clean_unused_emojis(EMOJI_REGISTERED_DIR, self.emoji_objects, removed_count)
@@ -649,8 +671,8 @@ class EmojiManager:
             emoji_peewee_instances = Emoji.select()
             emoji_objects, load_errors = _to_emoji_objects(emoji_peewee_instances)
 
-            # 更新内存中的列表和数量
-            self.emoji_objects = emoji_objects
+            # 更新内存中的列表、索引和数量
+            self._set_emoji_objects(emoji_objects)
             self.emoji_num = len(emoji_objects)
 
             logger.info(f"[数据库] 加载完成: 共加载 {self.emoji_num} 个表情包记录。")
@@ -659,7 +681,7 @@ class EmojiManager:
 
         except Exception as e:
             logger.error(f"[错误] 从数据库加载所有表情包对象失败: {str(e)}")
-            self.emoji_objects = []  # 加载失败则清空列表
+            self._set_emoji_objects([])  # 加载失败则清空列表
             self.emoji_num = 0
 
     async def get_emoji_from_db(self, emoji_hash: Optional[str] = None) -> List["MaiEmoji"]:
@@ -695,19 +717,16 @@ class EmojiManager:
             return []
 
     async def get_emoji_from_manager(self, emoji_hash: str) -> Optional["MaiEmoji"]:
-        # sourcery skip: use-next
-        """从内存中的 emoji_objects 列表获取表情包
+        """从内存中获取表情包
 
         参数:
             emoji_hash: 要查找的表情包哈希值
         返回:
             MaiEmoji 或 None: 如果找到则返回 MaiEmoji 对象，否则返回 None
         """
-        for emoji in self.emoji_objects:
-            # 确保对象未被标记为删除且哈希值匹配
-            if not emoji.is_deleted and emoji.hash == emoji_hash:
-                return emoji
-        return None  # 如果循环结束还没找到，则返回 None
+        emoji = self._emoji_by_hash.get(emoji_hash)
+        # 确保对象未被标记为删除
+        return emoji if emoji is not None and not emoji.is_deleted else None
 
     async def get_emoji_tag_by_hash(self, emoji_hash: str) -> Optional[List[str]]:
         """根据哈希值获取已注册表情包的情感标签列表
@@ -796,8 +815,8 @@ class EmojiManager:
             success = await emoji.delete()
 
             if success:
-                # 从emoji_objects列表中移除该对象
-                self.emoji_objects = [e for e in self.emoji_objects if e.hash != emoji_hash]
+                # 从emoji_objects列表和索引中移除该对象
+                self._remove_emoji_objects([e for e in self.emoji_objects if e.hash == emoji_hash])
                 # 更新计数
                 self.emoji_num -= 1
                 logger.info(f"[统计] 当前表情包数量: {self.emoji_num}")
@@ -878,7 +897,7 @@ class EmojiManager:
                         # 修复：等待异步注册完成
                         register_success = await new_emoji.register_to_db()
                         if register_success:
-                            self.emoji_objects.append(new_emoji)
+                            self._add_emoji_object(new_emoji)
                             self.emoji_num += 1
                             logger.info(f"[成功] 注册: {new_emoji.filename}")
                             return True
@@ -937,7 +956,7 @@ class EmojiManager:
             else:
                 logger.info("[VLM分析] 生成新的详细描述")
                 if image_format in ["gif", "GIF"]:
-                    image_base64 = get_image_manager().transform_gif(image_base64)  # type: ignore
+                    image_base64 = await get_image_manager().transform_gif_async(image_base64)  # type: ignore
                     if not image_base64:
                         raise RuntimeError("GIF表情包转换失败")
                     prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，描述一下表情包表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
@@ -1077,8 +1096,8 @@ class EmojiManager:
                 # 直接注册
                 register_success = await new_emoji.register_to_db()  # 此方法会移动文件并更新 DB
                 if register_success:
-                    # 注册成功后，添加到内存列表
-                    self.emoji_objects.append(new_emoji)
+                    # 注册成功后，添加到内存列表和索引
+                    self._add_emoji_object(new_emoji)
                     self.emoji_num += 1
                     logger.info(f"[成功] 注册新表情包: {filename} (当前: {self.emoji_num}/{self.emoji_num_max})")
                     return True
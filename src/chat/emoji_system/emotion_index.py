@@ -0,0 +1,168 @@
+import heapq
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+if TYPE_CHECKING:
+    from src.chat.emoji_system.emoji_manager import MaiEmoji
+
+# 缓存最近多少个查询的匹配结果，情感词重复率很高
+EMOTION_QUERY_CACHE_SIZE = 256
+# 默认返回的候选表情包数量
+EMOTION_TOP_K = 10
+
+
+def levenshtein_distance(s1: str, s2: str) -> int:
+    """计算两个字符串的编辑距离"""
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if not s2:
+        return len(s1)
+
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def emotion_similarity(query: str, tag: str) -> float:
+    """基于编辑距离的相似度，1 表示完全相同"""
+    max_len = max(len(query), len(tag))
+    return 1 - levenshtein_distance(query, tag) / max_len if max_len > 0 else 1.0
+
+
+# (表情包, 相似度, 匹配到的情感标签)
+EmotionMatch = Tuple["MaiEmoji", float, str]
+
+
+class EmotionIndex:
+    """
+    表情包情感标签索引
+
+    - 标签去重：相同的标签只计算一次编辑距离，无论有多少表情包使用它
+    - 字符倒排预筛：与查询没有任何公共字符的标签编辑距离等于较长者的长度，相似度恒为 0，
+      原实现也会丢弃它们，因此只需计算至少有一个公共字符的标签
+    - 候选标签按长度分组：编辑距离不小于长度差，因此每个桶的相似度有上界 1 - |len(q) - L| / max(len(q), L)，
+      按上界从高到低计算，当上界已经低于当前第 k 名的相似度时，剩下的桶不可能再进入前 k 名，直接跳过
+    - 用堆取前 k 名，不再对全部表情包排序
+    - 缓存最近查询的结果，注册/删除表情包时失效
+    """
+
+    def __init__(self, cache_size: int = EMOTION_QUERY_CACHE_SIZE):
+        # 标签 -> {表情包哈希: 表情包}
+        self._tag_emojis: Dict[str, Dict[str, "MaiEmoji"]] = {}
+        # 字符 -> 包含该字符的标签
+        self._char_tags: Dict[str, Set[str]] = {}
+        self._cache_size = cache_size
+        self._query_cache: "OrderedDict[Tuple[str, int], List[EmotionMatch]]" = OrderedDict()
+
+        self.queries = 0
+        self.cache_hits = 0
+        self.distance_calls = 0
+
+    def __len__(self) -> int:
+        return len(self._tag_emojis)
+
+    def rebuild(self, emojis: List["MaiEmoji"]) -> None:
+        """根据表情包列表重建索引"""
+        self._tag_emojis.clear()
+        self._char_tags.clear()
+        for emoji in emojis:
+            self._add(emoji)
+        self._query_cache.clear()
+
+    def add(self, emoji: "MaiEmoji") -> None:
+        """加入一个表情包的全部情感标签"""
+        self._add(emoji)
+        self._query_cache.clear()
+
+    def remove(self, emoji: "MaiEmoji") -> None:
+        """移除一个表情包的全部情感标签"""
+        for tag in set(emoji.emotion):
+            emojis = self._tag_emojis.get(tag)
+            if emojis is None:
+                continue
+            emojis.pop(emoji.hash, None)
+            if not emojis:
+                del self._tag_emojis[tag]
+                for char in set(tag):
+                    tags = self._char_tags[char]
+                    tags.discard(tag)
+                    if not tags:
+                        del self._char_tags[char]
+        self._query_cache.clear()
+
+    def search(self, query: str, k: int = EMOTION_TOP_K) -> List[EmotionMatch]:
+        """
+        查找与 query 最相似的 k 个表情包
+
+        表情包的相似度取其所有情感标签中的最大值，与逐个表情包计算的结果一致。
+
+        Returns:
+            List[EmotionMatch]: 按相似度降序排列，只包含相似度大于 0 的表情包
+        """
+        self.queries += 1
+        cache_key = (query, k)
+        if cache_key in self._query_cache:
+            self.cache_hits += 1
+            self._query_cache.move_to_end(cache_key)
+            # 缓存期间被标记删除的表情包直接跳过
+            return [match for match in self._query_cache[cache_key] if not match[0].is_deleted]
+
+        # 候选标签按长度分组
+        buckets: Dict[int, List[str]] = {}
+        for tag in set().union(*(self._char_tags.get(char, ()) for char in set(query))):
+            buckets.setdefault(len(tag), []).append(tag)
+
+        query_len = len(query)
+
+        def upper_bound(length: int) -> float:
+            max_len = max(query_len, length)
+            return 1 - abs(query_len - length) / max_len if max_len > 0 else 1.0
+
+        # 表情包哈希 -> (相似度, 标签)，只记录当前最好的标签
+        best: Dict[str, Tuple[float, str]] = {}
+        for length in sorted(buckets, key=upper_bound, reverse=True):
+            if len(best) >= k and upper_bound(length) <= heapq.nlargest(k, (s for s, _ in best.values()))[-1]:
+                break
+            for tag in buckets[length]:
+                self.distance_calls += 1
+                similarity = emotion_similarity(query, tag)
+                if similarity <= 0:
+                    continue
+                for emoji_hash, emoji in self._tag_emojis[tag].items():
+                    if emoji.is_deleted:
+                        continue
+                    current = best.get(emoji_hash)
+                    if current is None or similarity > current[0]:
+                        best[emoji_hash] = (similarity, tag)
+
+        top = heapq.nlargest(k, best.items(), key=lambda item: item[1][0])
+        result = [(self._tag_emojis[tag][emoji_hash], similarity, tag) for emoji_hash, (similarity, tag) in top]
+
+        self._query_cache[cache_key] = result
+        if len(self._query_cache) > self._cache_size:
+            self._query_cache.popitem(last=False)
+        return result
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "tags": len(self._tag_emojis),
+            "queries": self.queries,
+            "cache_hit_rate": self.cache_hits / self.queries if self.queries else 0.0,
+            "distance_calls": self.distance_calls,
+        }
+
+    def _add(self, emoji: "MaiEmoji") -> None:
+        for tag in emoji.emotion:
+            emojis = self._tag_emojis.get(tag)
+            if emojis is None:
+                emojis = self._tag_emojis[tag] = {}
+                for char in set(tag):
+                    self._char_tags.setdefault(char, set()).add(tag)
+            emojis[emoji.hash] = emoji
@@ -0,0 +1,216 @@
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.common.database.database_model import Expression
+from src.common.logger import get_logger
+
+logger = get_logger("expression_index")
+
+
+class FenwickSampler:
+    """
+    按权重抽样的树状数组
+
+    追加、修改权重与按权重抽取一个位置都是 O(log n)；
+    不放回抽样时把已抽中的位置权重临时置 0，抽完再恢复。
+    """
+
+    def __init__(self):
+        self._tree: List[float] = [0.0]  # 下标从1开始
+        self._weights: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def append(self, weight: float) -> int:
+        """追加一个位置，返回位置下标"""
+        self._weights.append(weight)
+        i = len(self._weights)
+        # 新节点覆盖 (i - lowbit(i), i]，等于前面已有的部分和加上自身权重
+        self._tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        return i - 1
+
+    def get(self, pos: int) -> float:
+        return self._weights[pos]
+
+    def set(self, pos: int, weight: float) -> None:
+        delta = weight - self._weights[pos]
+        if delta == 0:
+            return
+        self._weights[pos] = weight
+        i = pos + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def total(self) -> float:
+        return self._prefix(len(self._weights))
+
+    def find(self, target: float) -> int:
+        """返回前缀和首次不小于 target 的位置，target 取 (0, total]"""
+        pos = 0
+        step = 1 << (len(self._weights).bit_length())
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] < target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+    def draw(self) -> Optional[int]:
+        """按权重抽取一个位置，所有权重都为 0 时返回 None"""
+        for _ in range(2):
+            total = self.total()
+            if total <= 0:
+                return None
+            pos = self.find(total * (1.0 - random.random()))
+            if pos < len(self._weights) and self._weights[pos] > 0:
+                return pos
+            # 反复增量更新产生的浮点误差可能让查找落空，重建后再试一次
+            self._rebuild()
+        return None
+
+    def _prefix(self, i: int) -> float:
+        result = 0.0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def _rebuild(self) -> None:
+        tree = [0.0] + self._weights
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+
+class _ChatExpressions:
+    """单个聊天流的表达方式，位置与抽样器一一对应，删除后的位置留给新表达方式复用"""
+
+    def __init__(self):
+        self.sampler = FenwickSampler()
+        self.records: List[Optional[Dict[str, Any]]] = []
+        self.positions: Dict[int, int] = {}  # 表达方式id -> 位置
+        self.free: List[int] = []
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        weight = max(float(record["count"]), 0.0)
+        pos = self.positions.get(record["id"])
+        if pos is None:
+            if self.free:
+                pos = self.free.pop()
+                self.sampler.set(pos, weight)
+            else:
+                pos = self.sampler.append(weight)
+                self.records.append(None)
+            self.positions[record["id"]] = pos
+        else:
+            self.sampler.set(pos, weight)
+        self.records[pos] = record
+
+    def remove(self, expr_id: int) -> None:
+        pos = self.positions.pop(expr_id, None)
+        if pos is None:
+            return
+        self.sampler.set(pos, 0.0)
+        self.records[pos] = None
+        self.free.append(pos)
+
+
+def _to_record(expr: Expression) -> Dict[str, Any]:
+    return {
+        "id": expr.id,
+        "situation": expr.situation,
+        "style": expr.style,
+        "count": expr.count,
+        "last_active_time": expr.last_active_time,
+        "source_id": expr.chat_id,
+        "type": "style",
+        "create_date": expr.create_date if expr.create_date is not None else expr.last_active_time,
+    }
+
+
+class ExpressionIndex:
+    """
+    常驻内存的 style 表达方式索引
+
+    每个聊天流第一次被抽样时从数据库加载一次，之后由写入方（学习、激活计数、衰减）增量维护；
+    按 count 加权的不放回抽样先按各聊天流的总权重选聊天流，再在该聊天流的树状数组中选表达方式，
+    单次抽取为 O(相关聊天流数 + log n)，不再每次查询全部表达方式并逐个累加权重。
+    抽样运行在数据库读线程中，修改运行在写线程或事件循环中，所有操作都持有同一把锁。
+    """
+
+    def __init__(self):
+        self._chats: Dict[str, _ChatExpressions] = {}
+        self._lock = threading.Lock()
+
+    def sample(self, chat_ids: Iterable[str], k: int) -> List[Dict[str, Any]]:
+        """从多个聊天流的表达方式中按 count 加权、不放回地抽取 k 个"""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        self._ensure_loaded(chat_ids)
+        with self._lock:
+            chats = [self._chats[chat_id] for chat_id in chat_ids if chat_id in self._chats]
+            total_num = sum(len(chat.positions) for chat in chats)
+            if k <= 0 or total_num == 0:
+                return []
+            if total_num <= k:
+                return [record.copy() for chat in chats for record in chat.records if record is not None]
+
+            selected: List[Tuple[_ChatExpressions, int, float]] = []
+            try:
+                for _ in range(k):
+                    totals = [chat.sampler.total() for chat in chats]
+                    if sum(totals) <= 0:
+                        break
+                    chat = random.choices(chats, weights=totals)[0]
+                    pos = chat.sampler.draw()
+                    if pos is None:
+                        break
+                    selected.append((chat, pos, chat.sampler.get(pos)))
+                    chat.sampler.set(pos, 0.0)
+            finally:
+                for chat, pos, weight in selected:
+                    chat.sampler.set(pos, weight)
+            return [chat.records[pos].copy() for chat, pos, _ in selected]  # type: ignore
+
+    def upsert(self, expr: Expression) -> None:
+        """新增或更新一个表达方式，只在对应聊天流已加载时生效"""
+        if expr.type != "style":
+            return
+        with self._lock:
+            if chat := self._chats.get(expr.chat_id):
+                chat.upsert(_to_record(expr))
+
+    def remove(self, expr: Expression) -> None:
+        with self._lock:
+            if chat := self._chats.get(expr.chat_id):
+                chat.remove(expr.id)
+
+    def invalidate(self, chat_id: Optional[str] = None) -> None:
+        """丢弃已加载的数据，下次抽样时重新从数据库加载"""
+        with self._lock:
+            if chat_id is None:
+                self._chats.clear()
+            else:
+                self._chats.pop(chat_id, None)
+
+    def _ensure_loaded(self, chat_ids: List[str]) -> None:
+        # 加载时持有锁，避免加载期间的写入被随后放入的旧数据覆盖；每个聊天流只加载一次
+        with self._lock:
+            missing = [chat_id for chat_id in chat_ids if chat_id not in self._chats]
+            if not missing:
+                return
+
+            loaded: Dict[str, _ChatExpressions] = {chat_id: _ChatExpressions() for chat_id in missing}
+            query = Expression.select().where((Expression.chat_id.in_(missing)) & (Expression.type == "style"))
+            for expr in query:
+                loaded[expr.chat_id].upsert(_to_record(expr))
+            self._chats.update(loaded)
+        logger.debug(f"加载了 {len(missing)} 个聊天流的表达方式索引")
+
+
+expression_index = ExpressionIndex()
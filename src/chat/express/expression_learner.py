@@ -6,8 +6,12 @@ from datetime import datetime
 
 from typing import List, Dict, Optional, Any, Tuple
 
+from peewee import Case
+
 from src.common.logger import get_logger
+from src.common.database.database import db
 from src.common.database.database_model import Expression
+from src.chat.express.expression_index import expression_index
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import model_config, global_config
 from src.chat.utils.chat_message_builder import get_raw_msg_by_timestamp_with_chat_inclusive, build_anonymous_messages
@@ -169,32 +173,23 @@ class ExpressionLearner:
     def _apply_global_decay_to_database(self, current_time: float) -> None:
         """
         对数据库中的所有表达方式应用全局衰减
+
+        衰减值与 calculate_decay_factor 相同，用一条 DELETE 和一条 UPDATE 在数据库中完成，
+        不再逐条读取和保存
         """
         try:
-            # 获取所有表达方式
-            all_expressions = Expression.select()
-
-            updated_count = 0
-            deleted_count = 0
-
-            for expr in all_expressions:
-                # 计算时间差
-                last_active = expr.last_active_time
-                time_diff_days = (current_time - last_active) / (24 * 3600)  # 转换为天
-
-                # 计算衰减值
-                decay_value = self.calculate_decay_factor(time_diff_days)
-                new_count = max(0.01, expr.count - decay_value)
+            time_diff_days = (current_time - Expression.last_active_time) / (24 * 3600)
+            decay_value = Case(
+                None,
+                [(time_diff_days <= 0, 0.0), (time_diff_days >= DECAY_DAYS, 0.01)],
+                0.01 / (DECAY_DAYS**2) * time_diff_days * time_diff_days,
+            )
 
-                if new_count <= 0.01:
-                    # 如果count太小，删除这个表达方式
-                    expr.delete_instance()
-                    deleted_count += 1
-                else:
-                    # 更新count
-                    expr.count = new_count
-                    expr.save()
-                    updated_count += 1
+            with db.atomic():
+                # 衰减后count太小的表达方式直接删除，剩下的衰减后都大于最小值
+                deleted_count = Expression.delete().where(Expression.count - decay_value <= DECAY_MIN).execute()
+                updated_count = Expression.update(count=Expression.count - decay_value).execute()
+            expression_index.invalidate()
 
             if updated_count > 0 or deleted_count > 0:
                 logger.info(f"全局衰减完成：更新了 {updated_count} 个表达方式，删除了 {deleted_count} 个表达方式")
@@ -284,7 +279,7 @@ class ExpressionLearner:
                     expr_obj.last_active_time = current_time
                     expr_obj.save()
                 else:
-                    Expression.create(
+                    expr_obj = Expression.create(
                         situation=new_expr["situation"],
                         style=new_expr["style"],
                         count=1,
@@ -293,6 +288,7 @@ class ExpressionLearner:
                         type="style",
                         create_date=current_time,  # 手动设置创建日期
                     )
+                expression_index.upsert(expr_obj)
             # 限制最大数量
             exprs = list(
                 Expression.select()
@@ -303,6 +299,7 @@ class ExpressionLearner:
                 # 删除count最小的多余表达方式
                 for expr in exprs[: len(exprs) - MAX_EXPRESSION_COUNT]:
                     expr.delete_instance()
+                    expression_index.remove(expr)
         return learnt_expressions
 
     async def learn_expression(self, num: int = 10) -> Optional[Tuple[List[Tuple[str, str, str]], str]]:
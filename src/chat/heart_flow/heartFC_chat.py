@@ -7,16 +7,19 @@ from rich.traceback import install
 
 from src.config.config import global_config
 from src.common.logger import get_logger
+from src.common.database.db_executor import db_read
+from src.common.database.group_commit import group_commit_writer
 from src.common.data_models.info_data_model import ActionPlannerInfo
-from src.common.data_models.message_data_model import ReplyContentType
+from src.common.data_models.message_data_model import ReplyContentType, ReplySetModel
 from src.chat.message_receive.chat_stream import ChatStream, get_chat_manager
 from src.chat.utils.prompt_builder import global_prompt_manager
 from src.chat.utils.timer_calculator import Timer
+from src.chat.utils.cycle_context import CycleContext
 from src.chat.planner_actions.planner import ActionPlanner
 from src.chat.planner_actions.action_modifier import ActionModifier
 from src.chat.planner_actions.action_manager import ActionManager
 from src.chat.heart_flow.hfc_utils import CycleDetail
-from src.chat.heart_flow.hfc_utils import send_typing, stop_typing
+from src.chat.heart_flow.hfc_utils import send_typing, stop_typing, wait_for_new_message
 from src.chat.express.expression_learner import expression_learner_manager
 from src.chat.frequency_control.frequency_control import frequency_control_manager
 from src.person_info.person_info import Person
@@ -25,14 +28,10 @@ from src.plugin_system.core import events_manager
 from src.plugin_system.apis import generator_api, send_api, message_api, database_api
 from src.mais4u.mai_think import mai_thinking_manager
 from src.mais4u.s4u_config import s4u_config
-from src.chat.utils.chat_message_builder import (
-    build_readable_messages_with_id,
-    get_raw_msg_before_timestamp_with_chat,
-)
 
 if TYPE_CHECKING:
     from src.common.data_models.database_data_model import DatabaseMessages
-    from src.common.data_models.message_data_model import ReplySetModel
+    from src.common.data_models.llm_data_model import LLMGenerationDataModel, ReplyStreamHandler
 
 
 ERROR_LOOP_INFO = {
@@ -66,12 +65,13 @@ class HeartFChatting:
     其生命周期现在由其关联的 SubHeartflow 的 FOCUSED 状态控制。
     """
 
-    def __init__(self, chat_id: str):
+    def __init__(self, chat_id: str, new_message_event: Optional[asyncio.Event] = None):
         """
         HeartFChatting 初始化函数
 
         参数:
             chat_id: 聊天流唯一标识符(如stream_id)
+            new_message_event: 新消息通知事件，由 Heartflow 在消息入库后置位
             on_stop_focus_chat: 当收到stop_focus_chat命令时调用的回调函数
             performance_version: 性能记录版本号，用于区分不同启动版本
         """
@@ -98,6 +98,7 @@ class HeartFChatting:
         self._current_cycle_detail: CycleDetail = None  # type: ignore
 
         self.last_read_time = time.time() - 2
+        self.new_message_event: asyncio.Event = new_message_event or asyncio.Event()
 
         self.talk_threshold = global_config.chat.talk_value
 
@@ -164,7 +165,10 @@ class HeartFChatting:
         )
 
     async def _loopbody(self):  # sourcery skip: hoist-if-from-if
-        recent_messages_list = message_api.get_messages_by_time_in_chat(
+        # 先清除通知再查询，查询之后到达的消息会重新置位事件，不会丢失
+        self.new_message_event.clear()
+        recent_messages_list = await db_read(
+            message_api.get_messages_by_time_in_chat,
             chat_id=self.stream_id,
             start_time=self.last_read_time,
             end_time=time.time(),
@@ -210,7 +214,7 @@ class HeartFChatting:
                 await asyncio.sleep(5)
                 return True
         else:
-            await asyncio.sleep(0.2)
+            await wait_for_new_message(self.new_message_event)
             return True
         return True
 
@@ -222,20 +226,29 @@ class HeartFChatting:
         thinking_id,
         actions,
         selected_expressions: Optional[List[int]] = None,
+        reply_sent: bool = False,
     ) -> Tuple[Dict[str, Any], str, Dict[str, float]]:
         with Timer("回复发送", cycle_timers):
-            reply_text = await self._send_response(
-                reply_set=response_set,
-                message_data=action_message,
-                selected_expressions=selected_expressions,
-            )
+            if reply_sent:
+                # 回复已在生成过程中逐句发送
+                reply_text = "".join(
+                    reply_content.content  # type: ignore
+                    for reply_content in response_set.reply_data
+                    if reply_content.content_type == ReplyContentType.TEXT
+                )
+            else:
+                reply_text = await self._send_response(
+                    reply_set=response_set,
+                    message_data=action_message,
+                    selected_expressions=selected_expressions,
+                )
 
         # 获取 platform，如果不存在则从 chat_stream 获取，如果还是 None 则使用默认值
         platform = action_message.chat_info.platform
         if platform is None:
             platform = getattr(self.chat_stream, "platform", "unknown")
 
-        person = Person(platform=platform, user_id=action_message.user_info.user_id)
+        person = await db_read(Person, platform=platform, user_id=action_message.user_info.user_id)
         person_name = person.person_name
         action_prompt_display = f"你对{person_name}进行了回复：{reply_text}"
 
@@ -282,10 +295,15 @@ class HeartFChatting:
             cycle_timers, thinking_id = self.start_cycle()
             logger.info(f"{self.log_prefix} 开始第{self._cycle_counter}次思考")
 
+            # 本次循环共享的上下文快照，modifier/planner/replyer 不再各自查询和渲染聊天记录
+            # 先等待该聊天尚未提交的消息和动作记录写入，后面在事件循环中渲染动作记录时才不会读到旧数据
+            await group_commit_writer.aflush(chat_id=self.stream_id)
+            cycle_context = await db_read(CycleContext, self.stream_id)
+
             # 第一步：动作检查
             available_actions: Dict[str, ActionInfo] = {}
             try:
-                await self.action_modifier.modify_actions()
+                await self.action_modifier.modify_actions(cycle_context=cycle_context)
                 available_actions = self.action_manager.get_using_actions()
             except Exception as e:
                 logger.error(f"{self.log_prefix} 动作修改失败: {e}")
@@ -293,13 +311,8 @@ class HeartFChatting:
             # 执行planner
             is_group_chat, chat_target_info, _ = self.action_planner.get_necessary_info()
 
-            message_list_before_now = get_raw_msg_before_timestamp_with_chat(
-                chat_id=self.stream_id,
-                timestamp=time.time(),
+            chat_content_block, message_id_list = cycle_context.build_readable_with_id(
                 limit=int(global_config.chat.max_context_size * 0.6),
-            )
-            chat_content_block, message_id_list = build_readable_messages_with_id(
-                messages=message_list_before_now,
                 timestamp_mode="normal_no_YMD",
                 read_mark=self.action_planner.last_obs_time_mark,
                 truncate=True,
@@ -313,6 +326,7 @@ class HeartFChatting:
                 chat_content_block=chat_content_block,
                 message_id_list=message_id_list,
                 interest=global_config.personality.interest,
+                cycle_context=cycle_context,
             )
             continue_flag, modified_message = await events_manager.handle_mai_events(
                 EventType.ON_PLAN, None, prompt_info[0], None, self.chat_stream.stream_id
@@ -326,6 +340,7 @@ class HeartFChatting:
                 action_to_use_info, _ = await self.action_planner.plan(
                     loop_start_time=self.last_read_time,
                     available_actions=available_actions,
+                    cycle_context=cycle_context,
                 )
 
             has_reply = False
@@ -348,7 +363,9 @@ class HeartFChatting:
             # 3. 并行执行所有动作
             action_tasks = [
                 asyncio.create_task(
-                    self._execute_action(action, action_to_use_info, thinking_id, available_actions, cycle_timers)
+                    self._execute_action(
+                        action, action_to_use_info, thinking_id, available_actions, cycle_timers, cycle_context
+                    )
                 )
                 for action in action_to_use_info
             ]
@@ -405,6 +422,7 @@ class HeartFChatting:
 
             self.end_cycle(loop_info, cycle_timers)
             self.print_cycle_info(cycle_timers)
+            logger.debug(f"{self.log_prefix} 第{self._cycle_counter}次思考{cycle_context.stats_summary()}")
 
             """S4U内容，暂时保留"""
             if s4u_config.enable_s4u:
@@ -489,20 +507,59 @@ class HeartFChatting:
             traceback.print_exc()
             return False, "", ""
 
-    async def _send_response(
-        self,
-        reply_set: "ReplySetModel",
-        message_data: "DatabaseMessages",
-        selected_expressions: Optional[List[int]] = None,
-    ) -> str:
-        new_message_count = message_api.count_new_messages(
-            chat_id=self.chat_stream.stream_id, start_time=self.last_read_time, end_time=time.time()
+    async def _need_quote_reply(self) -> bool:
+        """从思考到回复期间新消息较多时使用引用回复"""
+        new_message_count = await db_read(
+            message_api.count_new_messages,
+            chat_id=self.chat_stream.stream_id,
+            start_time=self.last_read_time,
+            end_time=time.time(),
         )
 
         need_reply = new_message_count >= random.randint(2, 4)
 
         if need_reply:
             logger.info(f"{self.log_prefix} 从思考到回复，共有{new_message_count}条新消息，使用引用回复")
+        return need_reply
+
+    def _build_reply_stream_sender(
+        self, message_data: Optional["DatabaseMessages"], sent_reply_set: "ReplySetModel"
+    ) -> "ReplyStreamHandler":
+        """构建边生成边发送回复的函数，发送方式与 _send_response 一致，已发送的内容记录到 sent_reply_set"""
+        first_replied = False
+
+        async def send_segment(text: str, llm_response: "LLMGenerationDataModel") -> None:
+            nonlocal first_replied
+            if not first_replied:
+                first_replied = True
+                await send_api.text_to_stream(
+                    text=text,
+                    stream_id=self.chat_stream.stream_id,
+                    reply_message=message_data,
+                    set_reply=await self._need_quote_reply(),
+                    typing=False,
+                    selected_expressions=llm_response.selected_expressions,
+                )
+            else:
+                await send_api.text_to_stream(
+                    text=text,
+                    stream_id=self.chat_stream.stream_id,
+                    reply_message=message_data,
+                    set_reply=False,
+                    typing=True,
+                    selected_expressions=llm_response.selected_expressions,
+                )
+            sent_reply_set.add_text_content(text)
+
+        return send_segment
+
+    async def _send_response(
+        self,
+        reply_set: "ReplySetModel",
+        message_data: "DatabaseMessages",
+        selected_expressions: Optional[List[int]] = None,
+    ) -> str:
+        need_reply = await self._need_quote_reply()
 
         reply_text = ""
         first_replied = False
@@ -540,6 +597,7 @@ class HeartFChatting:
         thinking_id: str,
         available_actions: Dict[str, ActionInfo],
         cycle_timers: Dict[str, float],
+        cycle_context: Optional[CycleContext] = None,
     ):
         """执行单个动作的通用函数"""
         try:
@@ -573,6 +631,9 @@ class HeartFChatting:
                     return {"action_type": "no_reply_until_call", "success": True, "reply_text": "", "command": ""}
 
                 elif action_planner_info.action_type == "reply":
+                    # 流式发送时已经发给用户的回复，生成失败或被取消时仍需记录
+                    sent_reply_set = ReplySetModel()
+                    llm_response = None
                     try:
                         success, llm_response = await generator_api.generate_reply(
                             chat_stream=self.chat_stream,
@@ -583,9 +644,13 @@ class HeartFChatting:
                             enable_tool=global_config.tool.enable_tool,
                             request_type="replyer",
                             from_plugin=False,
+                            cycle_context=cycle_context,
+                            reply_stream_handler=self._build_reply_stream_sender(
+                                action_planner_info.action_message, sent_reply_set
+                            ),
                         )
 
-                        if not success or not llm_response or not llm_response.reply_set:
+                        if not sent_reply_set and (not success or not llm_response or not llm_response.reply_set):
                             if action_planner_info.action_message:
                                 logger.info(
                                     f"对 {action_planner_info.action_message.processed_plain_text} 的回复生成失败"
@@ -595,17 +660,23 @@ class HeartFChatting:
                             return {"action_type": "reply", "success": False, "reply_text": "", "loop_info": None}
 
                     except asyncio.CancelledError:
-                        logger.debug(f"{self.log_prefix} 并行执行：回复生成任务已被取消")
-                        return {"action_type": "reply", "success": False, "reply_text": "", "loop_info": None}
-                    response_set = llm_response.reply_set
-                    selected_expressions = llm_response.selected_expressions
+                        if not sent_reply_set:
+                            logger.debug(f"{self.log_prefix} 并行执行：回复生成任务已被取消")
+                            return {"action_type": "reply", "success": False, "reply_text": "", "loop_info": None}
+                        logger.info(f"{self.log_prefix} 回复生成任务已被取消，记录已发送的部分回复")
+                    if sent_reply_set:
+                        response_set = sent_reply_set
+                    else:
+                        response_set = llm_response.reply_set  # type: ignore
+                    selected_expressions = llm_response.selected_expressions if llm_response else None
                     loop_info, reply_text, _ = await self._send_and_store_reply(
-                        response_set=response_set,
+                        response_set=response_set,  # type: ignore
                         action_message=action_planner_info.action_message,  # type: ignore
                         cycle_timers=cycle_timers,
                         thinking_id=thinking_id,
                         actions=chosen_action_plan_infos,
                         selected_expressions=selected_expressions,
+                        reply_sent=bool(sent_reply_set),
                     )
                     return {
                         "action_type": "reply",
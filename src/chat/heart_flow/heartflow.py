@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 from typing import Any, Optional, Dict
 
@@ -15,6 +16,18 @@ class Heartflow:
 
     def __init__(self):
         self.heartflow_chat_list: Dict[Any, HeartFChatting | BrainChatting] = {}
+        # 每个聊天流的新消息通知，消息入库后置位，聊天循环据此唤醒而不必轮询数据库
+        self.new_message_events: Dict[Any, asyncio.Event] = {}
+
+    def get_new_message_event(self, chat_id: Any) -> asyncio.Event:
+        """获取聊天流的新消息通知事件，不存在则创建"""
+        if chat_id not in self.new_message_events:
+            self.new_message_events[chat_id] = asyncio.Event()
+        return self.new_message_events[chat_id]
+
+    def notify_new_message(self, chat_id: Any) -> None:
+        """通知聊天流有新消息入库"""
+        self.get_new_message_event(chat_id).set()
 
     async def get_or_create_heartflow_chat(self, chat_id: Any) -> Optional[HeartFChatting | BrainChatting]:
         """获取或创建一个新的HeartFChatting实例"""
@@ -27,9 +40,11 @@ class Heartflow:
                 if not chat_stream:
                     raise ValueError(f"未找到 chat_id={chat_id} 的聊天流")
                 if chat_stream.group_info:
-                    new_chat = HeartFChatting(chat_id=chat_id)
+                    new_chat = HeartFChatting(
+                        chat_id=chat_id, new_message_event=self.get_new_message_event(chat_id)
+                    )
                 else:
-                    new_chat = BrainChatting(chat_id=chat_id)
+                    new_chat = BrainChatting(chat_id=chat_id, new_message_event=self.get_new_message_event(chat_id))
                 await new_chat.start()
                 self.heartflow_chat_list[chat_id] = new_chat
                 return new_chat
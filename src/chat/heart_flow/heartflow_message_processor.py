@@ -74,6 +74,7 @@ class HeartFCMessageReceiver:
             _, keywords = await _calculate_interest(message)
 
             await self.storage.store_message(message, chat)
+            heartflow.notify_new_message(chat.stream_id)
 
             heartflow_chat: HeartFChatting = await heartflow.get_or_create_heartflow_chat(chat.stream_id)  # type: ignore
 
@@ -96,6 +97,9 @@ class HeartFCMessageReceiver:
                     if image and image.description:
                         # 将[picid:xxxx]替换成图片描述
                         processed_text = processed_text.replace(f"[picid:{picid}]", f"[图片：{image.description}]")
+                    elif image and not image.vlm_processed:
+                        # 描述还在后台生成中
+                        processed_text = processed_text.replace(f"[picid:{picid}]", "[图片：内容正在阅读，请稍等]")
                     else:
                         # 如果没有找到图片描述，则移除[picid:xxxx]标记
                         processed_text = processed_text.replace(f"[picid:{picid}]", "[图片：网络不好，图片无法加载]")
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from typing import Optional, Dict, Any
 
@@ -11,6 +12,9 @@ from src.common.message_repository import count_messages
 
 logger = get_logger(__name__)
 
+# 没有收到新消息通知时，兜底检查数据库的间隔（秒）
+NEW_MESSAGE_FALLBACK_INTERVAL = 5.0
+
 
 class CycleDetail:
     """循环信息记录类"""
@@ -84,6 +88,23 @@ class CycleDetail:
         self.loop_action_info = loop_info["loop_action_info"]
 
 
+async def wait_for_new_message(event: asyncio.Event, timeout: float = NEW_MESSAGE_FALLBACK_INTERVAL) -> bool:
+    """等待新消息通知，超时后返回以便调用方兜底查询数据库
+
+    Args:
+        event: 聊天流的新消息通知事件
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        bool: 是否收到了新消息通知
+    """
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
 def get_recent_message_stats(minutes: float = 30, chat_id: Optional[str] = None) -> dict:
     """
     Args:
@@ -2,12 +2,11 @@ from dataclasses import dataclass
 import json
 import os
 import math
-import asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # import tqdm
 import faiss
@@ -26,17 +25,18 @@ from rich.progress import (
     TextColumn,
 )
 from src.config.config import global_config
+from src.chat.utils.embedding_service import embedding_service
 
 
 install(extra_lines=3)
 
-# 多线程embedding配置常量
-DEFAULT_MAX_WORKERS = 10  # 默认最大线程数
-DEFAULT_CHUNK_SIZE = 10  # 默认每个线程处理的数据块大小
+# 批量embedding配置常量
+DEFAULT_MAX_WORKERS = 10  # 默认同时进行的请求数
+DEFAULT_CHUNK_SIZE = 10  # 默认每次请求提交的字符串数
 MIN_CHUNK_SIZE = 1  # 最小分块大小
 MAX_CHUNK_SIZE = 50  # 最大分块大小
-MIN_WORKERS = 1  # 最小线程数
-MAX_WORKERS = 20  # 最大线程数
+MIN_WORKERS = 1  # 最小并发数
+MAX_WORKERS = 20  # 最大并发数
 
 ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
 EMBEDDING_DATA_DIR = os.path.join(ROOT_PATH, "data", "embedding")
@@ -63,6 +63,17 @@ EMBEDDING_TEST_STRINGS = [
 EMBEDDING_TEST_FILE = os.path.join(ROOT_PATH, "data", "embedding_model_test.json")
 EMBEDDING_SIM_THRESHOLD = 0.99
 
+# Faiss索引类型配置（embedding_index_type = "auto" 时按库大小选择）
+INDEX_TYPE_FLAT = "flat"
+INDEX_TYPE_IVF = "ivf"
+INDEX_TYPE_HNSW = "hnsw"
+AUTO_IVF_MIN_SIZE = 100000  # 库大小达到该值时自动使用IVF-Flat，否则精确检索
+IVF_NPROBE = 32  # IVF检索时访问的聚类数
+IVF_MIN_TRAIN_SIZE = 39  # IVF每个聚类至少需要的训练样本数，库小于该值时即使配置为ivf也只能构建精确索引
+HNSW_M = 32  # HNSW每个节点的邻居数
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 128
+
 
 def cosine_similarity(a, b):
     # 计算余弦相似度
@@ -92,6 +103,73 @@ class EmbeddingStoreItem:
         }
 
 
+class EmbeddingTable:
+    """
+    列式存储的嵌入库数据
+
+    所有 embedding 存放在同一个 float32 矩阵中（从文件加载时为只读内存映射），hash 和 str 各为一列。
+    按 hash 取项是一次下标查找，返回的 EmbeddingStoreItem.embedding 是矩阵行的视图，不复制向量。
+    新写入的向量先暂存，访问 matrix 时再一次性合并
+    """
+
+    def __init__(self, hashes: Optional[List[str]] = None, strs: Optional[List[str]] = None, matrix=None):
+        self.hashes: List[str] = list(hashes or [])
+        self.strs: List[str] = list(strs or [])
+        self.hash2idx: Dict[str, int] = {item_hash: i for i, item_hash in enumerate(self.hashes)}
+        self._matrix: Optional[np.ndarray] = matrix
+        self._pending: List[np.ndarray] = []
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        """全部 embedding 组成的 (条目数, 维度) 矩阵，库为空时为 None"""
+        if self._pending:
+            new_rows = np.asarray(self._pending, dtype=np.float32)
+            if self._matrix is None or len(self._matrix) == 0:
+                self._matrix = new_rows
+            else:
+                self._matrix = np.concatenate((self._matrix, new_rows))
+            self._pending = []
+        return self._matrix
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, item_hash) -> bool:
+        return item_hash in self.hash2idx
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.hashes)
+
+    def keys(self) -> List[str]:
+        return self.hashes
+
+    def values(self) -> Iterator[EmbeddingStoreItem]:
+        return (self[item_hash] for item_hash in self.hashes)
+
+    def __getitem__(self, item_hash: str) -> EmbeddingStoreItem:
+        idx = self.hash2idx[item_hash]
+        return EmbeddingStoreItem(item_hash, self.matrix[idx], self.strs[idx])  # type: ignore
+
+    def get(self, item_hash: str, default=None) -> Optional[EmbeddingStoreItem]:
+        return self[item_hash] if item_hash in self.hash2idx else default
+
+    def __setitem__(self, item_hash: str, item: EmbeddingStoreItem):
+        embedding = np.asarray(item.embedding, dtype=np.float32)
+        if item_hash in self.hash2idx:
+            idx = self.hash2idx[item_hash]
+            matrix = self.matrix
+            if not matrix.flags.writeable:  # type: ignore
+                # 内存映射为只读，修改前复制到内存
+                self._matrix = matrix = np.array(matrix)
+            matrix[idx] = embedding  # type: ignore
+            self.strs[idx] = item.str
+            return
+        self.hash2idx[item_hash] = len(self.hashes)
+        self.hashes.append(item_hash)
+        self.strs.append(item.str)
+        self._pending.append(embedding)
+
+
 class EmbeddingStore:
     def __init__(
         self,
@@ -105,8 +183,9 @@ class EmbeddingStore:
         self.embedding_file_path = f"{dir_path}/{namespace}.parquet"
         self.index_file_path = f"{dir_path}/{namespace}.index"
         self.idx2hash_file_path = dir_path + "/" + namespace + "_i2h.json"
+        self.matrix_file_path = f"{dir_path}/{namespace}_emb.npy"
 
-        # 多线程配置参数验证和设置
+        # 并发配置参数验证和设置
         self.max_workers = max(MIN_WORKERS, min(MAX_WORKERS, max_workers))
         self.chunk_size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size))
 
@@ -120,163 +199,67 @@ class EmbeddingStore:
                 f"chunk_size 已从 {chunk_size} 调整为 {self.chunk_size} (范围: {MIN_CHUNK_SIZE}-{MAX_CHUNK_SIZE})"
             )
 
-        self.store = {}
+        self.store = EmbeddingTable()
 
         self.faiss_index = None
-        self.idx2hash = None
+        self.idx2hash: List[str] | None = None
 
     def _get_embedding(self, s: str) -> List[float]:
-        """获取字符串的嵌入向量，使用完全同步的方式避免事件循环问题"""
-        # 创建新的事件循环并在完成后立即关闭
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            # 创建新的LLMRequest实例
-            from src.llm_models.utils_model import LLMRequest
-            from src.config.config import model_config
-
-            llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type="embedding")
-
-            # 使用新的事件循环运行异步方法
-            embedding, _ = loop.run_until_complete(llm.get_embedding(s))
-
-            if embedding and len(embedding) > 0:
-                return embedding
-            else:
-                logger.error(f"获取嵌入失败: {s}")
-                return []
-
-        except Exception as e:
-            logger.error(f"获取嵌入时发生异常: {s}, 错误: {e}")
+        """获取字符串的嵌入向量（不使用缓存，用于模型一致性校验的后备）"""
+        embedding = embedding_service.embed_many_sync([s], use_cache=False)[0]
+        if not embedding:
+            logger.error(f"获取嵌入失败: {s}")
             return []
-        finally:
-            # 确保事件循环被正确关闭
-            try:
-                loop.close()
-            except Exception:
-                pass
+        return embedding
 
-    def _get_embeddings_batch_threaded(
-        self, strs: List[str], chunk_size: int = 10, max_workers: int = 10, progress_callback=None
+    def _get_embeddings_batch(
+        self,
+        strs: List[str],
+        chunk_size: int = 10,
+        max_workers: int = 10,
+        progress_callback=None,
+        use_cache: bool = True,
     ) -> List[Tuple[str, List[float]]]:
-        """使用多线程批量获取嵌入向量
+        """批量获取嵌入向量
+
+        请求由 embedding_service 在常驻事件循环中发出：每 chunk_size 条文本合并为一次 /embeddings 请求，
+        最多 max_workers 个请求同时进行，客户端与连接池在整个导入过程中复用
 
         Args:
             strs: 要获取嵌入的字符串列表
-            chunk_size: 每个线程处理的数据块大小
-            max_workers: 最大线程数
+            chunk_size: 每次请求提交的字符串数
+            max_workers: 同时进行的请求数
             progress_callback: 进度回调函数，接收一个参数表示完成的数量
+            use_cache: 是否读写嵌入缓存，校验模型一致性时应关闭
 
         Returns:
-            包含(原始字符串, 嵌入向量)的元组列表，保持与输入顺序一致
+            包含(原始字符串, 嵌入向量)的元组列表，保持与输入顺序一致，失败的嵌入为空列表
         """
         if not strs:
             return []
 
-        # 分块
-        chunks = []
-        for i in range(0, len(strs), chunk_size):
-            chunk = strs[i : i + chunk_size]
-            chunks.append((i, chunk))  # 保存起始索引以维持顺序
-
-        # 结果存储，使用字典按索引存储以保证顺序
-        results = {}
-
-        def process_chunk(chunk_data):
-            """处理单个数据块的函数"""
-            start_idx, chunk_strs = chunk_data
-            chunk_results = []
-
-            # 为每个线程创建独立的LLMRequest实例
-            from src.llm_models.utils_model import LLMRequest
-            from src.config.config import model_config
-
-            try:
-                # 创建线程专用的LLM实例
-                llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type="embedding")
-
-                for i, s in enumerate(chunk_strs):
-                    try:
-                        # 在线程中创建独立的事件循环
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            embedding = loop.run_until_complete(llm.get_embedding(s))
-                        finally:
-                            loop.close()
-
-                        if embedding and len(embedding) > 0:
-                            chunk_results.append((start_idx + i, s, embedding[0]))  # embedding[0] 是实际的向量
-                        else:
-                            logger.error(f"获取嵌入失败: {s}")
-                            chunk_results.append((start_idx + i, s, []))
-
-                        # 每完成一个嵌入立即更新进度
-                        if progress_callback:
-                            progress_callback(1)
-
-                    except Exception as e:
-                        logger.error(f"获取嵌入时发生异常: {s}, 错误: {e}")
-                        chunk_results.append((start_idx + i, s, []))
-
-                        # 即使失败也要更新进度
-                        if progress_callback:
-                            progress_callback(1)
-
-            except Exception as e:
-                logger.error(f"创建LLM实例失败: {e}")
-                # 如果创建LLM实例失败，返回空结果
-                for i, s in enumerate(chunk_strs):
-                    chunk_results.append((start_idx + i, s, []))
-                    # 即使失败也要更新进度
-                    if progress_callback:
-                        progress_callback(1)
-
-            return chunk_results
-
-        # 使用线程池处理
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            future_to_chunk = {executor.submit(process_chunk, chunk): chunk for chunk in chunks}
-
-            # 收集结果（进度已在process_chunk中实时更新）
-            for future in as_completed(future_to_chunk):
-                try:
-                    chunk_results = future.result()
-                    for idx, s, embedding in chunk_results:
-                        results[idx] = (s, embedding)
-                except Exception as e:
-                    chunk = future_to_chunk[future]
-                    logger.error(f"处理数据块时发生异常: {chunk}, 错误: {e}")
-                    # 为失败的块添加空结果
-                    start_idx, chunk_strs = chunk
-                    for i, s in enumerate(chunk_strs):
-                        results[start_idx + i] = (s, [])
-
-        # 按原始顺序返回结果
-        ordered_results = []
-        for i in range(len(strs)):
-            if i in results:
-                ordered_results.append(results[i])
-            else:
-                # 防止遗漏
-                ordered_results.append((strs[i], []))
-
-        return ordered_results
+        embeddings = embedding_service.embed_many_sync(
+            strs,
+            batch_size=chunk_size,
+            max_concurrency=max_workers,
+            use_cache=use_cache,
+            progress_callback=progress_callback,
+        )
+        return [(s, embedding or []) for s, embedding in zip(strs, embeddings, strict=True)]
 
     def get_test_file_path(self):
         return EMBEDDING_TEST_FILE
 
     def save_embedding_test_vectors(self):
-        """保存测试字符串的嵌入到本地（使用多线程优化）"""
+        """保存测试字符串的嵌入到本地"""
         logger.info("开始保存测试字符串的嵌入向量...")
 
-        # 使用多线程批量获取测试字符串的嵌入
-        embedding_results = self._get_embeddings_batch_threaded(
+        # 批量获取测试字符串的嵌入，校验模型时不使用缓存
+        embedding_results = self._get_embeddings_batch(
             EMBEDDING_TEST_STRINGS,
             chunk_size=min(self.chunk_size, len(EMBEDDING_TEST_STRINGS)),
             max_workers=min(self.max_workers, len(EMBEDDING_TEST_STRINGS)),
+            use_cache=False,
         )
 
         # 构建测试向量字典
@@ -303,7 +286,7 @@ class EmbeddingStore:
             return json.load(f)
 
     def check_embedding_model_consistency(self):
-        """校验当前模型与本地嵌入模型是否一致（使用多线程优化）"""
+        """校验当前模型与本地嵌入模型是否一致"""
         local_vectors = self.load_embedding_test_vectors()
         if local_vectors is None:
             logger.warning("未检测到本地嵌入模型测试文件，将保存当前模型的测试嵌入。")
@@ -319,11 +302,12 @@ class EmbeddingStore:
 
         logger.info("开始检验嵌入模型一致性...")
 
-        # 使用多线程批量获取当前模型的嵌入
-        embedding_results = self._get_embeddings_batch_threaded(
+        # 批量获取当前模型的嵌入，校验模型时不使用缓存
+        embedding_results = self._get_embeddings_batch(
             EMBEDDING_TEST_STRINGS,
             chunk_size=min(self.chunk_size, len(EMBEDDING_TEST_STRINGS)),
             max_workers=min(self.max_workers, len(EMBEDDING_TEST_STRINGS)),
+            use_cache=False,
         )
 
         # 检查一致性
@@ -342,7 +326,7 @@ class EmbeddingStore:
         return True
 
     def batch_insert_strs(self, strs: List[str], times: int) -> None:
-        """向库中存入字符串（使用多线程优化）"""
+        """向库中存入字符串（批量请求嵌入）"""
         if not strs:
             return
 
@@ -393,14 +377,14 @@ class EmbeddingStore:
                     max(MIN_WORKERS, len(new_strs) // optimal_chunk_size if optimal_chunk_size > 0 else 1),
                 )
 
-                logger.debug(f"使用多线程处理: chunk_size={optimal_chunk_size}, max_workers={optimal_max_workers}")
+                logger.debug(f"批量获取嵌入: chunk_size={optimal_chunk_size}, max_workers={optimal_max_workers}")
 
                 # 定义进度更新回调函数
                 def update_progress(count):
                     progress.update(task, advance=count)
 
                 # 批量获取嵌入，并实时更新进度
-                embedding_results = self._get_embeddings_batch_threaded(
+                embedding_results = self._get_embeddings_batch(
                     new_strs,
                     chunk_size=optimal_chunk_size,
                     max_workers=optimal_max_workers,
@@ -416,72 +400,121 @@ class EmbeddingStore:
                         logger.warning(f"跳过存储失败的嵌入: {s[:50]}...")
 
     def save_to_file(self) -> None:
-        """保存到文件"""
-        data = []
+        """保存到文件
+
+        parquet 保存完整数据，另存一份 embedding 矩阵(.npy)供启动时内存映射加载
+        """
         logger.info(f"正在保存{self.namespace}嵌入库到文件{self.embedding_file_path}")
-        for item in self.store.values():
-            data.append(item.to_dict())
-        data_frame = pd.DataFrame(data)
+        matrix = self.store.matrix
+        if matrix is None:
+            matrix = np.empty((0, global_config.lpmm_knowledge.embedding_dimension), dtype=np.float32)
+        embedding_column = pa.FixedSizeListArray.from_arrays(
+            pa.array(np.ascontiguousarray(matrix, dtype=np.float32).ravel()), matrix.shape[1]
+        )
+        table = pa.table(
+            {
+                "hash": pa.array(self.store.hashes, type=pa.string()),
+                "embedding": embedding_column,
+                "str": pa.array(self.store.strs, type=pa.string()),
+            }
+        )
 
         if not os.path.exists(self.dir):
             os.makedirs(self.dir, exist_ok=True)
-        if not os.path.exists(self.embedding_file_path):
-            open(self.embedding_file_path, "w").close()
 
-        data_frame.to_parquet(self.embedding_file_path, engine="pyarrow", index=False)
+        pq.write_table(table, self.embedding_file_path)
         logger.info(f"{self.namespace}嵌入库保存成功")
 
+        # 矩阵文件必须晚于 parquet 写入，加载时以修改时间判断是否过期
+        self._save_matrix_file(matrix)
+
         if self.faiss_index is not None and self.idx2hash is not None:
             logger.info(f"正在保存{self.namespace}嵌入库的FaissIndex到文件{self.index_file_path}")
             faiss.write_index(self.faiss_index, self.index_file_path)
             logger.info(f"{self.namespace}嵌入库的FaissIndex保存成功")
             logger.info(f"正在保存{self.namespace}嵌入库的idx2hash映射到文件{self.idx2hash_file_path}")
             with open(self.idx2hash_file_path, "w", encoding="utf-8") as f:
-                f.write(json.dumps(self.idx2hash, ensure_ascii=False, indent=4))
+                f.write(json.dumps(self.idx2hash, ensure_ascii=False))
             logger.info(f"{self.namespace}嵌入库的idx2hash映射保存成功")
 
+    def _load_matrix(self, row_count: int) -> np.ndarray:
+        """加载 embedding 矩阵，优先内存映射 .npy，过期或缺失时从 parquet 列转换并重新生成"""
+        if os.path.exists(self.matrix_file_path) and os.path.getmtime(self.matrix_file_path) >= os.path.getmtime(
+            self.embedding_file_path
+        ):
+            try:
+                matrix = np.load(self.matrix_file_path, mmap_mode="r")
+                if matrix.ndim == 2 and matrix.shape[0] == row_count and matrix.dtype == np.float32:
+                    return matrix
+                logger.warning(f"{self.namespace}嵌入库的矩阵文件与parquet不一致，将重新生成")
+            except Exception as e:
+                logger.warning(f"读取{self.namespace}嵌入库的矩阵文件失败，将重新生成：{e}")
+
+        # 整列读取 embedding，展平后一次性转换为矩阵
+        embedding_column = pq.read_table(self.embedding_file_path, columns=["embedding"]).column("embedding")
+        embedding_column = embedding_column.combine_chunks()
+        values = embedding_column.flatten().to_numpy(zero_copy_only=False)
+        matrix = np.ascontiguousarray(values, dtype=np.float32).reshape(row_count, -1)
+        self._save_matrix_file(matrix)
+        return matrix
+
+    def _save_matrix_file(self, matrix: np.ndarray) -> None:
+        """写入 embedding 矩阵文件，失败时下次启动会从 parquet 重新生成"""
+        try:
+            if (
+                isinstance(matrix, np.memmap)
+                and matrix.filename
+                and os.path.exists(self.matrix_file_path)
+                and os.path.samefile(matrix.filename, self.matrix_file_path)
+            ):
+                # 矩阵未修改且正映射着该文件，只需刷新修改时间
+                os.utime(self.matrix_file_path)
+                return
+            tmp_path = f"{self.matrix_file_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, self.matrix_file_path)
+        except Exception as e:
+            logger.warning(f"保存{self.namespace}嵌入库的矩阵文件失败，下次启动将从parquet加载：{e}")
+
     def load_from_file(self) -> None:
         """从文件中加载"""
         if not os.path.exists(self.embedding_file_path):
             raise Exception(f"文件{self.embedding_file_path}不存在")
         logger.info("正在加载嵌入库...")
         logger.debug(f"正在从文件{self.embedding_file_path}中加载{self.namespace}嵌入库")
-        data_frame = pd.read_parquet(self.embedding_file_path, engine="pyarrow")
-        total = len(data_frame)
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            MofNCompleteColumn(),
-            "•",
-            TimeElapsedColumn(),
-            "<",
-            TimeRemainingColumn(),
-            transient=False,
-        ) as progress:
-            task = progress.add_task("加载嵌入库", total=total)
-            for _, row in data_frame.iterrows():
-                self.store[row["hash"]] = EmbeddingStoreItem(row["hash"], row["embedding"], row["str"])
-                progress.update(task, advance=1)
-        logger.info(f"{self.namespace}嵌入库加载成功")
+        columns = pq.read_table(self.embedding_file_path, columns=["hash", "str"])
+        hashes = columns.column("hash").to_pylist()
+        strs = columns.column("str").to_pylist()
+        self.store = EmbeddingTable(hashes, strs, self._load_matrix(len(hashes)) if hashes else None)
+        logger.info(f"{self.namespace}嵌入库加载成功，共{len(self.store)}条")
 
         try:
             if os.path.exists(self.index_file_path):
                 logger.info(f"正在加载{self.namespace}嵌入库的FaissIndex...")
                 logger.debug(f"正在从文件{self.index_file_path}中加载{self.namespace}嵌入库的FaissIndex")
                 self.faiss_index = faiss.read_index(self.index_file_path)
+                self._configure_index_search(self.faiss_index)
                 logger.info(f"{self.namespace}嵌入库的FaissIndex加载成功")
             else:
                 raise Exception(f"文件{self.index_file_path}不存在")
             if os.path.exists(self.idx2hash_file_path):
                 logger.info(f"正在加载{self.namespace}嵌入库的idx2hash映射...")
                 logger.debug(f"正在从文件{self.idx2hash_file_path}中加载{self.namespace}嵌入库的idx2hash映射")
-                with open(self.idx2hash_file_path, "r") as f:
-                    self.idx2hash = json.load(f)
+                with open(self.idx2hash_file_path, "r", encoding="utf-8") as f:
+                    idx2hash = json.load(f)
+                # 兼容旧版以字符串序号为键的映射
+                if isinstance(idx2hash, dict):
+                    idx2hash = [idx2hash[str(i)] for i in range(len(idx2hash))]
+                self.idx2hash = idx2hash
                 logger.info(f"{self.namespace}嵌入库的idx2hash映射加载成功")
             else:
                 raise Exception(f"文件{self.idx2hash_file_path}不存在")
+            if self.faiss_index.ntotal != len(self.idx2hash):
+                raise Exception("FaissIndex与idx2hash映射的条目数不一致")
+            # 与按当前库大小实际会构建的类型比较，避免小库配置为ivf时每次启动都重建
+            if self._get_index_type(self.faiss_index) != self._buildable_index_type(len(self.idx2hash)):
+                raise Exception("FaissIndex类型与配置不一致")
         except Exception as e:
             logger.error(f"加载{self.namespace}嵌入库的FaissIndex时发生错误：{e}")
             logger.warning("正在重建Faiss索引")
@@ -489,20 +522,69 @@ class EmbeddingStore:
             logger.info(f"{self.namespace}嵌入库的FaissIndex重建成功")
             self.save_to_file()
 
+    @staticmethod
+    def _select_index_type(size: int) -> str:
+        """根据配置和库大小确定索引类型"""
+        index_type = global_config.lpmm_knowledge.embedding_index_type.lower()
+        if index_type in (INDEX_TYPE_FLAT, INDEX_TYPE_IVF, INDEX_TYPE_HNSW):
+            return index_type
+        if index_type != "auto":
+            logger.warning(f"未知的嵌入索引类型 {index_type}，将按库大小自动选择")
+        return INDEX_TYPE_IVF if size >= AUTO_IVF_MIN_SIZE else INDEX_TYPE_FLAT
+
+    @classmethod
+    def _buildable_index_type(cls, size: int) -> str:
+        """按配置和库大小实际会构建的索引类型，IVF训练样本不足时退化为精确索引"""
+        index_type = cls._select_index_type(size)
+        if index_type == INDEX_TYPE_IVF and size < IVF_MIN_TRAIN_SIZE:
+            return INDEX_TYPE_FLAT
+        return index_type
+
+    @staticmethod
+    def _get_index_type(index) -> str:
+        """获取已加载索引的类型"""
+        if isinstance(index, faiss.IndexIVF):
+            return INDEX_TYPE_IVF
+        if isinstance(index, faiss.IndexHNSW):
+            return INDEX_TYPE_HNSW
+        return INDEX_TYPE_FLAT
+
+    @staticmethod
+    def _configure_index_search(index) -> None:
+        """设置近似索引的检索参数（这些参数不会随索引文件保存）"""
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = min(IVF_NPROBE, index.nlist)
+        elif isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+
     def build_faiss_index(self) -> None:
         """重新构建Faiss索引，以余弦相似度为度量"""
-        # 获取所有的embedding
-        array = []
-        self.idx2hash = dict()
-        for key in self.store:
-            array.append(self.store[key].embedding)
-            self.idx2hash[str(len(array) - 1)] = key
-        embeddings = np.array(array, dtype=np.float32)
+        dim = global_config.lpmm_knowledge.embedding_dimension
+        self.idx2hash = list(self.store.keys())
+        # 直接从库的矩阵复制一份用于归一化（加载的矩阵是只读内存映射）
+        matrix = self.store.matrix
+        if matrix is None:
+            embeddings = np.empty((0, dim), dtype=np.float32)
+        else:
+            embeddings = np.array(matrix, dtype=np.float32, order="C")
         # L2归一化
         faiss.normalize_L2(embeddings)
+
         # 构建索引
-        self.faiss_index = faiss.IndexFlatIP(global_config.lpmm_knowledge.embedding_dimension)
+        index_type = self._buildable_index_type(len(embeddings))
+        if index_type == INDEX_TYPE_IVF:
+            nlist = max(1, min(int(4 * math.sqrt(len(embeddings))), len(embeddings) // IVF_MIN_TRAIN_SIZE))
+            quantizer = faiss.IndexFlatIP(dim)
+            self.faiss_index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.faiss_index.train(embeddings)
+        elif index_type == INDEX_TYPE_HNSW:
+            self.faiss_index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.faiss_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            self.faiss_index = faiss.IndexFlatIP(dim)
         self.faiss_index.add(embeddings)
+        self._configure_index_search(self.faiss_index)
+        logger.info(f"{self.namespace}嵌入库的FaissIndex构建完成，类型: {index_type}，条目数: {len(embeddings)}")
 
     def search_top_k(self, query: List[float], k: int) -> List[Tuple[str, float]]:
         """搜索最相似的k个项，以余弦相似度为度量
@@ -512,28 +594,42 @@ class EmbeddingStore:
         Returns:
             result: 最相似的k个项的(hash, 余弦相似度)列表
         """
+        results = self.search_top_k_many([query], k)
+        return results[0] if results else []
+
+    def search_top_k_many(self, queries: List[List[float]], k: int) -> List[List[Tuple[str, float]]]:
+        """批量搜索，每个查询返回最相似的k个项，以余弦相似度为度量
+        Args:
+            queries: 查询的embedding列表
+            k: 每个查询返回的最相似的k个项
+        Returns:
+            result: 与queries一一对应的(hash, 余弦相似度)列表
+        """
         if self.faiss_index is None:
             logger.debug("FaissIndex尚未构建,返回None")
             return []
         if self.idx2hash is None:
             logger.warning("idx2hash尚未构建,返回None")
             return []
+        if not queries:
+            return []
 
-        # L2归一化
-        faiss.normalize_L2(np.array([query], dtype=np.float32))
+        # 复制为连续的float32矩阵后原地L2归一化
+        query_matrix = np.array(queries, dtype=np.float32, order="C")
+        faiss.normalize_L2(query_matrix)
         # 搜索
-        distances, indices = self.faiss_index.search(np.array([query]), k)
-        # 整理结果
-        indices = list(indices.flatten())
-        distances = list(distances.flatten())
-        result = [
-            (self.idx2hash[str(int(idx))], float(sim))
-            for (idx, sim) in zip(indices, distances, strict=False)
-            if idx in range(len(self.idx2hash))
+        distances, indices = self.faiss_index.search(query_matrix, k)
+        # 整理结果，faiss以-1表示结果不足k个
+        idx2hash = self.idx2hash
+        return [
+            [
+                (idx2hash[idx], sim)
+                for idx, sim in zip(row_indices.tolist(), row_distances.tolist(), strict=True)
+                if 0 <= idx < len(idx2hash)
+            ]
+            for row_indices, row_distances in zip(indices, distances, strict=True)
         ]
 
-        return result
-
 
 class EmbeddingManager:
     def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, chunk_size: int = DEFAULT_CHUNK_SIZE):
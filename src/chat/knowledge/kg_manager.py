@@ -5,6 +5,7 @@ from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from rich.progress import (
     Progress,
     BarColumn,
@@ -24,6 +25,9 @@ from src.config.config import global_config
 
 from .global_logger import logger
 
+SYNONYM_SEARCH_BATCH_SIZE = 256  # 同义词连接时每批查询的实体数
+SPARSE_PPR_MIN_NODES = 20000  # 图节点数达到该值时使用稀疏矩阵计算PPR
+
 
 def _get_kg_dir():
     """
@@ -42,6 +46,56 @@ def get_kg_dir_str():
     return _get_kg_dir()
 
 
+class SparsePageRank:
+    """
+    基于 SciPy CSR 矩阵的个性化 PageRank
+
+    计算方式与 quick_algo.pagerank.run_pagerank 一致（按边的 weight 加权，悬挂节点按个性化向量分配，
+    个性化向量按全部给定权重之和归一化），转移矩阵只在构建时计算一次，可在多次查询间复用
+    """
+
+    def __init__(self, graph: di_graph.DiGraph):
+        self.nodes: List[str] = graph.get_node_list()
+        self.node_index: Dict[str, int] = {node: i for i, node in enumerate(self.nodes)}
+        edges = graph.get_edge_list()
+        self.edge_count = len(edges)
+
+        node_count = len(self.nodes)
+        rows = np.fromiter((self.node_index[src] for src, _ in edges), dtype=np.int64, count=len(edges))
+        cols = np.fromiter((self.node_index[dst] for _, dst in edges), dtype=np.int64, count=len(edges))
+        weights = np.fromiter((graph[edge]["weight"] for edge in edges), dtype=np.float64, count=len(edges))
+        matrix = sp.csr_array((weights, (rows, cols)), shape=(node_count, node_count))
+
+        # 按出边权重之和做行归一化
+        out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+        inv_out_weight = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight != 0)
+        self.transition = sp.csr_array(sp.diags_array(inv_out_weight) @ matrix)
+        self.dangling = out_weight == 0
+
+    def run(
+        self, personalization: Dict[str, float], alpha: float = 0.85, max_iter: int = 100, tol: float = 1e-6
+    ) -> Dict[str, float]:
+        node_count = len(self.nodes)
+        if node_count == 0:
+            return {}
+
+        total_weight = sum(personalization.values())
+        p = np.zeros(node_count, dtype=np.float64)
+        if total_weight != 0:
+            for node, weight in personalization.items():
+                if (idx := self.node_index.get(node)) is not None:
+                    p[idx] = weight / total_weight
+
+        x = np.full(node_count, 1.0 / node_count)
+        for _ in range(max_iter):
+            x_last = x
+            x = alpha * (x_last @ self.transition + x_last[self.dangling].sum() * p) + (1 - alpha) * p
+            if np.abs(x - x_last).sum() < node_count * tol:
+                break
+
+        return dict(zip(self.nodes, x.tolist(), strict=True))
+
+
 class KGManager:
     def __init__(self):
         # 会被保存的字段
@@ -58,6 +112,9 @@ class KGManager:
         self.ent_cnt_data_path = self.dir_path + "/" + "rag-ent-cnt" + ".parquet"
         self.pg_hash_file_path = self.dir_path + "/" + "rag-pg-hash" + ".json"
 
+        # 稀疏PPR的转移矩阵缓存，图结构变化后重建
+        self._sparse_ppr: SparsePageRank | None = None
+
     def save_to_file(self):
         """将KG数据保存到文件"""
         # 确保目录存在
@@ -93,10 +150,11 @@ class KGManager:
 
         # 加载实体计数
         ent_cnt_df = pd.read_parquet(self.ent_cnt_data_path, engine="pyarrow")
-        self.ent_appear_cnt = dict({row["hash_key"]: row["appear_cnt"] for _, row in ent_cnt_df.iterrows()})
+        self.ent_appear_cnt = dict(zip(ent_cnt_df["hash_key"].tolist(), ent_cnt_df["appear_cnt"].tolist(), strict=True))
 
         # 加载KG
         self.graph = di_graph.load_from_file(self.graph_data_path)
+        self._sparse_ppr = None
 
     def _build_edges_between_ent(
         self,
@@ -168,7 +226,9 @@ class KGManager:
             transient=False,
         ) as progress:
             task = progress.add_task("同义词连接", total=total)
-            for ent_hash in ent_hash_list:
+            # 按批查询相似实体，减少Faiss调用次数
+            batch_results = {}
+            for i, ent_hash in enumerate(ent_hash_list):
                 if ent_hash in synonym_hash_set:
                     progress.update(task, advance=1)
                     continue
@@ -178,9 +238,23 @@ class KGManager:
                     continue
                 assert isinstance(ent, EmbeddingStoreItem)
                 # 查询相似实体
-                similar_ents = embedding_manager.entities_embedding_store.search_top_k(
-                    ent.embedding, global_config.lpmm_knowledge.rag_synonym_search_top_k
-                )
+                if ent_hash not in batch_results:
+                    batch_hashes = [
+                        h
+                        for h in ent_hash_list[i : i + SYNONYM_SEARCH_BATCH_SIZE]
+                        if h not in synonym_hash_set and h in embedding_manager.entities_embedding_store.store
+                    ]
+                    batch_results = dict(
+                        zip(
+                            batch_hashes,
+                            embedding_manager.entities_embedding_store.search_top_k_many(
+                                [embedding_manager.entities_embedding_store.store[h].embedding for h in batch_hashes],
+                                global_config.lpmm_knowledge.rag_synonym_search_top_k,
+                            ),
+                            strict=False,
+                        )
+                    )
+                similar_ents = batch_results.get(ent_hash, [])
                 res_ent = []  # Debug
                 for res_ent_hash, similarity in similar_ents:
                     if res_ent_hash == ent_hash:
@@ -219,16 +293,16 @@ class KGManager:
             - 若是已存在的边，则更新边的权重
         2. 更新新节点的属性
         """
-        existed_nodes = self.graph.get_node_list()
-        existed_edges = [str((edge[0], edge[1])) for edge in self.graph.get_edge_list()]
+        existed_nodes = set(self.graph.get_node_list())
+        existed_edges = set(self.graph.get_edge_list())
+        self._sparse_ppr = None
 
         now_time = time.time()
 
         # 更新图结构
         for src_tgt, weight in node_to_node.items():
-            key = str(src_tgt)
             # 检查边是否已存在
-            if key not in existed_edges:
+            if src_tgt not in existed_edges:
                 # 新边
                 self.graph.add_edge(
                     di_graph.DiEdge(
@@ -329,7 +403,7 @@ class KGManager:
             embed_manager: EmbeddingManager对象
         """
         # 图中存在的节点总集
-        existed_nodes = self.graph.get_node_list()
+        existed_nodes = set(self.graph.get_node_list())
 
         # 准备PPR使用的数据
         # 节点权重：实体
@@ -416,12 +490,22 @@ class KGManager:
         del ent_weights, pg_weights
 
         # PersonalizedPageRank
-        ppr_res = pagerank.run_pagerank(
-            self.graph,
-            personalization=ppr_node_weights,
-            max_iter=100,
-            alpha=global_config.lpmm_knowledge.qa_ppr_damping,
-        )
+        if len(existed_nodes) >= SPARSE_PPR_MIN_NODES:
+            # 大图使用缓存转移矩阵的稀疏实现
+            if self._sparse_ppr is None or len(self._sparse_ppr.nodes) != len(existed_nodes):
+                self._sparse_ppr = SparsePageRank(self.graph)
+            ppr_res = self._sparse_ppr.run(
+                ppr_node_weights,
+                max_iter=100,
+                alpha=global_config.lpmm_knowledge.qa_ppr_damping,
+            )
+        else:
+            ppr_res = pagerank.run_pagerank(
+                self.graph,
+                personalization=ppr_node_weights,
+                max_iter=100,
+                alpha=global_config.lpmm_knowledge.qa_ppr_damping,
+            )
 
         # 获取最终结果
         # 从搜索结果中提取文段节点的结果
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from typing import Tuple, List, Dict, Optional
 
@@ -38,12 +39,24 @@ class QAManager:
         part_end_time = time.perf_counter()
         logger.debug(f"Embedding用时：{part_end_time - part_start_time:.5f}s")
 
-        # 根据问题Embedding查询Relation Embedding库
+        # 根据问题Embedding同时查询Relation和Paragraph Embedding库
+        # 两个库的索引不同，无法合并为一次检索，改为在线程中并行执行，避免阻塞事件循环
         part_start_time = time.perf_counter()
-        relation_search_res = self.embed_manager.relation_embedding_store.search_top_k(
-            question_embedding,
-            global_config.lpmm_knowledge.qa_relation_search_top_k,
+        relation_search_res, paragraph_search_res = await asyncio.gather(
+            asyncio.to_thread(
+                self.embed_manager.relation_embedding_store.search_top_k,
+                question_embedding,
+                global_config.lpmm_knowledge.qa_relation_search_top_k,
+            ),
+            asyncio.to_thread(
+                self.embed_manager.paragraphs_embedding_store.search_top_k,
+                question_embedding,
+                global_config.lpmm_knowledge.qa_paragraph_search_top_k,
+            ),
         )
+        part_end_time = time.perf_counter()
+        logger.debug(f"关系与文段检索用时：{part_end_time - part_start_time:.5f}s")
+
         if relation_search_res is None:
             return None
         # 过滤阈值
@@ -54,9 +67,6 @@ class QAManager:
             logger.debug("未找到相关关系，跳过关系检索")
             relation_search_res = []
 
-        part_end_time = time.perf_counter()
-        logger.debug(f"关系检索用时：{part_end_time - part_start_time:.5f}s")
-
         for res in relation_search_res:
             if store_item := self.embed_manager.relation_embedding_store.store.get(res[0]):
                 rel_str = store_item.str
@@ -66,15 +76,6 @@ class QAManager:
         # logger.info(f"LLM过滤三元组用时：{time.time() - part_start_time:.2f}s")
         # part_start_time = time.time()
 
-        # 根据问题Embedding查询Paragraph Embedding库
-        part_start_time = time.perf_counter()
-        paragraph_search_res = self.embed_manager.paragraphs_embedding_store.search_top_k(
-            question_embedding,
-            global_config.lpmm_knowledge.qa_paragraph_search_top_k,
-        )
-        part_end_time = time.perf_counter()
-        logger.debug(f"文段检索用时：{part_end_time - part_start_time:.5f}s")
-
         if len(relation_search_res) != 0:
             logger.info("找到相关关系，将使用RAG进行检索")
             # 使用KG检索
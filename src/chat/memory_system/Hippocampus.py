@@ -7,16 +7,20 @@ import re
 import jieba
 import networkx as nx
 import numpy as np
-from typing import List, Tuple, Set, Coroutine, Any
-from collections import Counter
+from typing import List, Tuple, Set, Coroutine, Any, Dict
+from collections import Counter, defaultdict
 import traceback
+import operator
+from functools import lru_cache, reduce
 
 from rich.traceback import install
 
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import global_config, model_config
 from src.common.data_models.database_data_model import DatabaseMessages
+from src.common.database.database import db
 from src.common.database.database_model import GraphNodes, GraphEdges  # Peewee Models导入
+from src.common.database.db_executor import db_write
 from src.common.logger import get_logger
 from src.chat.utils.utils import cut_key_words
 from src.chat.utils.chat_message_builder import (
@@ -53,9 +57,309 @@ def calculate_information_content(text):
 logger = get_logger("memory")
 
 
+@lru_cache(maxsize=4096)
+def cut_word_set(text: str) -> frozenset:
+    """jieba 分词后的词集合，结果按文本缓存"""
+    return frozenset(jieba.cut(text))
+
+
+class TopicIndex:
+    """
+    记忆主题的分词索引，随 MemoryGraph 增量维护
+
+    缓存每个主题的词集合，并维护 词 -> 主题 的倒排表。
+    关键词与主题都是 0/1 词向量，余弦相似度等于 |A∩B| / sqrt(|A|·|B|)，
+    因此只需在倒排表中统计交集大小，无需对每个主题重新分词
+    """
+
+    def __init__(self):
+        self.topic_words: Dict[str, frozenset] = {}
+        self.inverted: Dict[str, Set[str]] = defaultdict(set)
+        # 主题加入顺序，保证同分主题的排序与遍历图节点时一致
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+
+    def add(self, topic):
+        if topic in self.topic_words or not isinstance(topic, str):
+            return
+        words = cut_word_set(topic)
+        self.topic_words[topic] = words
+        self._order[topic] = self._next_order
+        self._next_order += 1
+        for word in words:
+            self.inverted[word].add(topic)
+
+    def remove(self, topic):
+        words = self.topic_words.pop(topic, None)
+        if words is None:
+            return
+        del self._order[topic]
+        for word in words:
+            topics = self.inverted.get(word)
+            if topics is not None:
+                topics.discard(topic)
+                if not topics:
+                    del self.inverted[word]
+
+    def rebuild(self, topics):
+        self.topic_words.clear()
+        self.inverted.clear()
+        self._order.clear()
+        self._next_order = 0
+        for topic in topics:
+            self.add(topic)
+
+    def similar(self, text: str, threshold: float) -> List[Tuple[str, float]]:
+        """返回与 text 词集合余弦相似度不低于 threshold 的主题，按相似度降序"""
+        words = cut_word_set(text)
+        overlaps: Counter = Counter()
+        for word in words:
+            if topics := self.inverted.get(word):
+                overlaps.update(topics)
+
+        results = []
+        for topic, overlap in overlaps.items():
+            # 与 cosine_similarity 对 0/1 向量的计算方式保持一致
+            similarity = overlap / (math.sqrt(len(words)) * math.sqrt(len(self.topic_words[topic])))
+            if similarity >= threshold:
+                results.append((topic, similarity))
+
+        # 没有公共词的主题相似度为0，只有阈值不大于0时才需要
+        if threshold <= 0:
+            results.extend((topic, 0) for topic in self.topic_words if topic not in overlaps)
+
+        results.sort(key=lambda x: (-x[1], self._order[x[0]]))
+        return results
+
+
+class MemoryGraphCSR:
+    """
+    记忆图的 CSR(压缩稀疏行) 快照，供扩散激活检索使用
+
+    indptr/indices 按 G 的节点与邻居遍历顺序存储邻接关系，costs 为每条边的激活衰减 1/strength。
+    快照只读，图结构变化后由 MemoryGraph 丢弃并在下次检索时重建
+    """
+
+    def __init__(self, G: nx.Graph):
+        self.nodes: List[str] = list(G.nodes())
+        self.node_index: Dict[str, int] = {node: i for i, node in enumerate(self.nodes)}
+
+        indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        indices = []
+        costs = []
+        for i, node in enumerate(self.nodes):
+            for neighbor, edge_data in G.adj[node].items():
+                strength = edge_data.get("strength", 1)
+                indices.append(self.node_index[neighbor])
+                costs.append(1 / strength if strength else math.inf)
+            indptr[i + 1] = len(indices)
+
+        self.indptr = indptr
+        self.indices = np.array(indices, dtype=np.int64)
+        self.costs = np.array(costs, dtype=np.float64)
+
+    def update_edge(self, concept1, concept2, strength) -> bool:
+        """原地更新已有边的衰减值，边不在快照中时返回 False"""
+        i = self.node_index.get(concept1)
+        j = self.node_index.get(concept2)
+        if i is None or j is None:
+            return False
+        cost = 1 / strength if strength else math.inf
+        for u, v in ((i, j), (j, i)):
+            start, end = self.indptr[u], self.indptr[u + 1]
+            hits = np.flatnonzero(self.indices[start:end] == v)
+            if hits.size == 0:
+                return False
+            self.costs[start + hits[0]] = cost
+        return True
+
+    def spread(self, sources: List[str], max_depth: int, root_activation: float = 1.0) -> Dict[str, float]:
+        """
+        从多个关键词同时进行扩散激活，返回每个节点的累计激活值
+
+        每个关键词独立扩散：从激活值1.0出发，每经过一条边减去 1/strength，
+        激活值不大于0或达到 max_depth 时停止，每个节点只取最先到达的激活值。
+        所有关键词按层一起展开，以 (关键词序号, 节点) 区分各自的访问记录，
+        结果与逐个关键词做广度优先遍历后按关键词顺序累加完全一致
+
+        Args:
+            sources: 关键词列表，必须都是图中的节点，允许重复
+            max_depth: 最大扩散深度
+            root_activation: 关键词节点自身计入的激活值
+        """
+        if not sources:
+            return {}
+
+        node_count = len(self.nodes)
+        frontier_k = np.arange(len(sources), dtype=np.int64)
+        frontier_node = np.array([self.node_index[source] for source in sources], dtype=np.int64)
+        frontier_act = np.ones(len(sources), dtype=np.float64)
+        visited = frontier_k * node_count + frontier_node
+
+        out_k = [frontier_k]
+        out_node = [frontier_node]
+        out_act = [np.full(len(sources), root_activation, dtype=np.float64)]
+
+        for _ in range(max_depth):
+            if frontier_node.size == 0:
+                break
+
+            # 按队列顺序展开当前层所有节点的邻居
+            starts = self.indptr[frontier_node]
+            counts = self.indptr[frontier_node + 1] - starts
+            total = int(counts.sum())
+            if total == 0:
+                break
+            owner = np.repeat(np.arange(frontier_node.size), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            positions = starts[owner] + offsets
+
+            neighbors = self.indices[positions]
+            activations = frontier_act[owner] - self.costs[positions]
+            ks = frontier_k[owner]
+            keys = ks * node_count + neighbors
+
+            mask = (activations > 0) & ~np.isin(keys, visited)
+            keys, neighbors, activations, ks = keys[mask], neighbors[mask], activations[mask], ks[mask]
+
+            # 同一关键词下先到达的路径优先
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+
+            frontier_k, frontier_node, frontier_act = ks[first], neighbors[first], activations[first]
+            visited = np.concatenate((visited, keys[first]))
+            out_k.append(frontier_k)
+            out_node.append(frontier_node)
+            out_act.append(frontier_act)
+
+        all_k = np.concatenate(out_k)
+        order = np.argsort(all_k, kind="stable")
+        all_node = np.concatenate(out_node)[order]
+        all_act = np.concatenate(out_act)[order]
+
+        activate_map: Dict[str, float] = {}
+        for node_idx, activation in zip(all_node.tolist(), all_act.tolist(), strict=True):
+            node = self.nodes[node_idx]
+            if node in activate_map:
+                activate_map[node] += activation
+            else:
+                activate_map[node] = activation
+        return activate_map
+
+
 class MemoryGraph:
     def __init__(self):
         self.G = nx.Graph()  # 使用 networkx 的图结构
+        self.topic_index = TopicIndex()
+        self._csr: MemoryGraphCSR | None = None
+
+        # 自上次同步以来的变更，sync_memory_to_db 只写入这部分
+        # 边统一使用 edge_key 排序后的 (source, target) 作为键
+        self.dirty_nodes: Set[str] = set()
+        self.deleted_nodes: Set[str] = set()
+        self.dirty_edges: Set[Tuple[str, str]] = set()
+        self.deleted_edges: Set[Tuple[str, str]] = set()
+
+    @staticmethod
+    def edge_key(concept1, concept2) -> Tuple[str, str]:
+        """无向边的规范键，与端点顺序无关"""
+        return (concept1, concept2) if concept1 <= concept2 else (concept2, concept1)
+
+    def mark_node_dirty(self, concept):
+        self.dirty_nodes.add(concept)
+        self.deleted_nodes.discard(concept)
+
+    def mark_edge_dirty(self, concept1, concept2):
+        # 只改变强度时直接修补快照，新增边需要重建
+        if self._csr is not None and not (
+            self.G.has_edge(concept1, concept2)
+            and self._csr.update_edge(concept1, concept2, self.G[concept1][concept2].get("strength", 1))
+        ):
+            self._csr = None
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.add(key)
+        self.deleted_edges.discard(key)
+
+    def add_node(self, concept, **attrs):
+        """添加或更新节点并记录变更"""
+        if concept not in self.G:
+            self._csr = None
+        self.G.add_node(concept, **attrs)
+        self.topic_index.add(concept)
+        self.mark_node_dirty(concept)
+
+    def add_edge(self, concept1, concept2, **attrs):
+        """添加或更新边并记录变更，networkx 自动创建的端点也会被记录"""
+        for concept in (concept1, concept2):
+            if concept not in self.G:
+                self.topic_index.add(concept)
+                self.mark_node_dirty(concept)
+        self.G.add_edge(concept1, concept2, **attrs)
+        self.mark_edge_dirty(concept1, concept2)
+
+    def remove_edge(self, concept1, concept2):
+        self.G.remove_edge(concept1, concept2)
+        self._csr = None
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.discard(key)
+        self.deleted_edges.add(key)
+
+    def remove_node(self, concept):
+        """删除节点及其所有边并记录变更"""
+        for neighbor in list(self.G.neighbors(concept)):
+            key = self.edge_key(concept, neighbor)
+            self.dirty_edges.discard(key)
+            self.deleted_edges.add(key)
+        self.G.remove_node(concept)
+        self._csr = None
+        self.topic_index.remove(concept)
+        self.dirty_nodes.discard(concept)
+        self.deleted_nodes.add(concept)
+
+    def invalidate_csr(self):
+        """直接修改 G 的结构后调用，使扩散检索重建快照"""
+        self._csr = None
+
+    def get_csr(self) -> MemoryGraphCSR:
+        """获取当前图结构的 CSR 快照，结构变化后首次调用时重建"""
+        if self._csr is None:
+            self._csr = MemoryGraphCSR(self.G)
+        return self._csr
+
+    def has_pending_changes(self) -> bool:
+        return bool(self.dirty_nodes or self.deleted_nodes or self.dirty_edges or self.deleted_edges)
+
+    def pop_changes(self) -> Dict[str, set]:
+        """取出并清空待同步的变更"""
+        changes = {
+            "dirty_nodes": self.dirty_nodes,
+            "deleted_nodes": self.deleted_nodes,
+            "dirty_edges": self.dirty_edges,
+            "deleted_edges": self.deleted_edges,
+        }
+        self.clear_changes()
+        return changes
+
+    def restore_changes(self, changes: Dict[str, set]):
+        """同步失败时把取出的变更放回，已被后续操作覆盖的状态以当前记录为准"""
+        for concept in changes["dirty_nodes"]:
+            if concept not in self.deleted_nodes:
+                self.dirty_nodes.add(concept)
+        for concept in changes["deleted_nodes"]:
+            if concept not in self.dirty_nodes:
+                self.deleted_nodes.add(concept)
+        for key in changes["dirty_edges"]:
+            if key not in self.deleted_edges:
+                self.dirty_edges.add(key)
+        for key in changes["deleted_edges"]:
+            if key not in self.dirty_edges:
+                self.deleted_edges.add(key)
+
+    def clear_changes(self):
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.dirty_edges = set()
+        self.deleted_edges = set()
 
     def connect_dot(self, concept1, concept2):
         # 避免自连接
@@ -69,9 +373,10 @@ class MemoryGraph:
             self.G[concept1][concept2]["strength"] = self.G[concept1][concept2].get("strength", 1) + 1
             # 更新最后修改时间
             self.G[concept1][concept2]["last_modified"] = current_time
+            self.mark_edge_dirty(concept1, concept2)
         else:
             # 如果是新边,初始化 strength 为 1
-            self.G.add_edge(
+            self.add_edge(
                 concept1,
                 concept2,
                 strength=1,
@@ -117,9 +422,10 @@ class MemoryGraph:
                 logger.info(f"节点 {concept} 创建新记忆：{str(memory)}")
             # 更新最后修改时间
             self.G.nodes[concept]["last_modified"] = current_time
+            self.mark_node_dirty(concept)
         else:
             # 如果是新节点,创建新的记忆字符串
-            self.G.add_node(
+            self.add_node(
                 concept,
                 memory_items=str(memory),
                 weight=1.0,  # 新节点初始权重为1.0
@@ -226,7 +532,7 @@ class MemoryGraph:
         node_data = self.G.nodes[topic]
 
         # 删除整个节点
-        self.G.remove_node(topic)
+        self.remove_node(topic)
         # 如果节点存在memory_items
         if "memory_items" in node_data:
             if memory_items := node_data["memory_items"]:
@@ -365,30 +671,15 @@ class Hippocampus:
         if not keyword:
             return []
 
-        # 获取所有节点
-        all_nodes = list(self.memory_graph.G.nodes())
         memories = []
 
-        # 计算关键词的词集合
-        keyword_words = set(jieba.cut(keyword))
-
-        # 遍历所有节点，计算相似度
-        for node in all_nodes:
-            node_words = set(jieba.cut(node))
-            all_words = keyword_words | node_words
-            v1 = [1 if word in keyword_words else 0 for word in all_words]
-            v2 = [1 if word in node_words else 0 for word in all_words]
-            similarity = cosine_similarity(v1, v2)
-
-            # 如果相似度超过阈值，获取该节点的记忆
-            if similarity >= 0.3:  # 可以调整这个阈值
-                node_data = self.memory_graph.G.nodes[node]
-                # 直接使用完整的记忆内容
-                if memory_items := node_data.get("memory_items", ""):
-                    memories.append((node, memory_items, similarity))
+        # 通过主题索引查找相似度超过阈值的节点，结果已按相似度降序排列
+        for node, similarity in self.memory_graph.topic_index.similar(keyword, 0.3):  # 可以调整这个阈值
+            node_data = self.memory_graph.G.nodes[node]
+            # 直接使用完整的记忆内容
+            if memory_items := node_data.get("memory_items", ""):
+                memories.append((node, memory_items, similarity))
 
-        # 按相似度降序排序
-        memories.sort(key=lambda x: x[2], reverse=True)
         return memories
 
     async def get_keywords_from_text(self, text: str) -> Tuple[List[str], List]:
@@ -473,55 +764,9 @@ class Hippocampus:
 
         logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
 
-        # 从每个关键词获取记忆
-        activate_map = {}  # 存储每个词的累计激活值
-
-        # 对每个关键词进行扩散式检索
-        for keyword in valid_keywords:
-            logger.debug(f"开始以关键词 '{keyword}' 为中心进行扩散检索 (最大深度: {max_depth}):")
-            # 初始化激活值
-            activation_values = {keyword: 1.0}
-            # 记录已访问的节点
-            visited_nodes = {keyword}
-            # 待处理的节点队列，每个元素是(节点, 激活值, 当前深度)
-            nodes_to_process = [(keyword, 1.0, 0)]
-
-            while nodes_to_process:
-                current_node, current_activation, current_depth = nodes_to_process.pop(0)
-
-                # 如果激活值小于0或超过最大深度，停止扩散
-                if current_activation <= 0 or current_depth >= max_depth:
-                    continue
-
-                # 获取当前节点的所有邻居
-                neighbors = list(self.memory_graph.G.neighbors(current_node))
-
-                for neighbor in neighbors:
-                    if neighbor in visited_nodes:
-                        continue
-
-                    # 获取连接强度
-                    edge_data = self.memory_graph.G[current_node][neighbor]
-                    strength = edge_data.get("strength", 1)
-
-                    # 计算新的激活值
-                    new_activation = current_activation - (1 / strength)
-
-                    if new_activation > 0:
-                        activation_values[neighbor] = new_activation
-                        visited_nodes.add(neighbor)
-                        nodes_to_process.append((neighbor, new_activation, current_depth + 1))
-                        # logger.debug(
-                        # f"节点 '{neighbor}' 被激活，激活值: {new_activation:.2f} (通过 '{current_node}' 连接，强度: {strength}, 深度: {current_depth + 1})"
-                        # )  # noqa: E501
-
-            # 更新激活映射
-            for node, activation_value in activation_values.items():
-                if activation_value > 0:
-                    if node in activate_map:
-                        activate_map[node] += activation_value
-                    else:
-                        activate_map[node] = activation_value
+        # 以所有关键词为中心进行扩散式检索，得到每个节点的累计激活值
+        logger.debug(f"开始以关键词为中心进行扩散检索 (最大深度: {max_depth})")
+        activate_map = self.memory_graph.get_csr().spread(valid_keywords, max_depth, root_activation=1.0)
 
         # 基于激活值平方的独立概率选择
         remember_map = {}
@@ -555,17 +800,8 @@ class Hippocampus:
             node_data = self.memory_graph.G.nodes[node]
             if memory_items := node_data.get("memory_items", ""):
                 logger.debug("节点包含完整记忆")
-                # 计算记忆与关键词的相似度
-                memory_words = set(jieba.cut(memory_items))
-                text_words = set(keywords)
-                if all_words := memory_words | text_words:
-                    # 计算相似度（虽然这里没有使用，但保持逻辑一致性）
-                    v1 = [1 if word in memory_words else 0 for word in all_words]
-                    v2 = [1 if word in text_words else 0 for word in all_words]
-                    _ = cosine_similarity(v1, v2)  # 计算但不使用，用_表示
-
-                    # 添加完整记忆到结果中
-                    all_memories.append((node, memory_items, activation))
+                # 添加完整记忆到结果中
+                all_memories.append((node, memory_items, activation))
             else:
                 logger.info("节点没有记忆")
 
@@ -619,54 +855,9 @@ class Hippocampus:
 
         logger.debug(f"有效的关键词: {', '.join(valid_keywords)}")
 
-        # 从每个关键词获取记忆
-        activate_map = {}  # 存储每个词的累计激活值
-
-        # 对每个关键词进行扩散式检索
-        for keyword in valid_keywords:
-            logger.debug(f"开始以关键词 '{keyword}' 为中心进行扩散检索 (最大深度: {max_depth}):")
-            # 初始化激活值
-            activation_values = {keyword: 1.5}
-            # 记录已访问的节点
-            visited_nodes = {keyword}
-            # 待处理的节点队列，每个元素是(节点, 激活值, 当前深度)
-            nodes_to_process = [(keyword, 1.0, 0)]
-
-            while nodes_to_process:
-                current_node, current_activation, current_depth = nodes_to_process.pop(0)
-
-                # 如果激活值小于0或超过最大深度，停止扩散
-                if current_activation <= 0 or current_depth >= max_depth:
-                    continue
-
-                # 获取当前节点的所有邻居
-                neighbors = list(self.memory_graph.G.neighbors(current_node))
-
-                for neighbor in neighbors:
-                    if neighbor in visited_nodes:
-                        continue
-
-                    # 获取连接强度
-                    edge_data = self.memory_graph.G[current_node][neighbor]
-                    strength = edge_data.get("strength", 1)
-
-                    # 计算新的激活值
-                    new_activation = current_activation - (1 / strength)
-
-                    if new_activation > 0:
-                        activation_values[neighbor] = new_activation
-                        visited_nodes.add(neighbor)
-                        nodes_to_process.append((neighbor, new_activation, current_depth + 1))
-                        # logger.debug(
-                        # f"节点 '{neighbor}' 被激活，激活值: {new_activation:.2f} (通过 '{current_node}' 连接，强度: {strength}, 深度: {current_depth + 1})")  # noqa: E501
-
-            # 更新激活映射
-            for node, activation_value in activation_values.items():
-                if activation_value > 0:
-                    if node in activate_map:
-                        activate_map[node] += activation_value
-                    else:
-                        activate_map[node] = activation_value
+        # 以所有关键词为中心进行扩散式检索，关键词节点自身计入1.5的激活值
+        logger.debug(f"开始以关键词为中心进行扩散检索 (最大深度: {max_depth})")
+        activate_map = self.memory_graph.get_csr().spread(valid_keywords, max_depth, root_activation=1.5)
 
         # 输出激活映射
         # logger.info("激活映射统计:")
@@ -676,7 +867,7 @@ class Hippocampus:
         # 计算激活节点数与总节点数的比值
         total_activation = sum(activate_map.values())
         # logger.debug(f"总激活值: {total_activation:.2f}")
-        total_nodes = len(self.memory_graph.G.nodes())
+        total_nodes = self.memory_graph.G.number_of_nodes()
         # activated_nodes = len(activate_map)
         activation_ratio = total_activation / total_nodes if total_nodes > 0 else 0
         activation_ratio = activation_ratio * 50
@@ -691,178 +882,136 @@ class EntorhinalCortex:
         self.hippocampus = hippocampus
         self.memory_graph = hippocampus.memory_graph
 
+    # 单条 SQL 中的参数个数需低于 SQLite 的变量上限(999)
+    DB_BATCH_SIZE = 100
+
     async def sync_memory_to_db(self):
-        """将记忆图同步到数据库"""
+        """将记忆图自上次同步以来的变更写入数据库
+
+        只处理 MemoryGraph 记录的新增/修改/删除的节点和边，所有写入在同一个事务中批量完成
+        """
         start_time = time.time()
         current_time = datetime.datetime.now().timestamp()
 
-        # 获取数据库中所有节点和内存中所有节点
-        db_nodes = {node.concept: node for node in GraphNodes.select()}
-        memory_nodes = list(self.memory_graph.G.nodes(data=True))
+        # 先清理变更中的非法节点和空节点，删除会同时记录其所有边
+        for concept in list(self.memory_graph.dirty_nodes):
+            if concept not in self.memory_graph.G:
+                self.memory_graph.dirty_nodes.discard(concept)
+                continue
+            memory_items = self.memory_graph.G.nodes[concept].get("memory_items", "")
+            if not concept or not isinstance(concept, str) or not memory_items or memory_items.strip() == "":
+                self.memory_graph.remove_node(concept)
 
-        # 批量准备节点数据
-        nodes_to_create = []
-        nodes_to_update = []
-        nodes_to_delete = set()
+        if not self.memory_graph.has_pending_changes():
+            logger.debug("[数据库] 记忆图没有变更，跳过同步")
+            return
 
-        # 处理节点
-        for concept, data in memory_nodes:
-            if not concept or not isinstance(concept, str):
-                self.memory_graph.G.remove_node(concept)
-                continue
+        changes = self.memory_graph.pop_changes()
 
+        nodes_data = []
+        for concept in changes["dirty_nodes"]:
+            data = self.memory_graph.G.nodes[concept]
             memory_items = data.get("memory_items", "")
+            nodes_data.append(
+                {
+                    "concept": concept,
+                    "memory_items": memory_items,
+                    "weight": data.get("weight", 1.0),
+                    "hash": self.hippocampus.calculate_node_hash(concept, memory_items),
+                    "created_time": data.get("created_time", current_time),
+                    "last_modified": data.get("last_modified", current_time),
+                }
+            )
 
-            # 直接检查字符串是否为空，不需要分割成列表
-            if not memory_items or memory_items.strip() == "":
-                self.memory_graph.G.remove_node(concept)
+        edges_data = []
+        for source, target in changes["dirty_edges"]:
+            if not self.memory_graph.G.has_edge(source, target):
                 continue
+            data = self.memory_graph.G[source][target]
+            edges_data.append(
+                {
+                    "source": source,
+                    "target": target,
+                    "strength": data.get("strength", 1),
+                    "hash": self.hippocampus.calculate_edge_hash(source, target),
+                    "created_time": data.get("created_time", current_time),
+                    "last_modified": data.get("last_modified", current_time),
+                }
+            )
 
-            # 计算内存中节点的特征值
-            memory_hash = self.hippocampus.calculate_node_hash(concept, memory_items)
-            created_time = data.get("created_time", current_time)
-            last_modified = data.get("last_modified", current_time)
+        # 边表没有唯一约束且历史数据的端点顺序不固定，更新边时先删除两个方向的旧记录再插入
+        edge_keys_to_delete = list(changes["deleted_edges"] | changes["dirty_edges"])
+        deleted_nodes = list(changes["deleted_nodes"])
 
-            # memory_items直接作为字符串存储，不需要JSON序列化
-            if not memory_items:
-                continue
+        try:
+            # 与其他写入一样交给写线程执行，不在事件循环线程中持有写事务
+            await db_write(self._write_changes_to_db, deleted_nodes, edge_keys_to_delete, nodes_data, edges_data)
+        except Exception:
+            self.memory_graph.restore_changes(changes)
+            raise
 
-            # 获取权重属性
-            weight = data.get("weight", 1.0)
+        end_time = time.time()
+        logger.info(f"[数据库] 同步完成，总耗时: {end_time - start_time:.2f}秒")
+        logger.info(
+            f"[数据库] 同步了 {len(nodes_data)} 个节点和 {len(edges_data)} 条边，"
+            f"删除了 {len(deleted_nodes)} 个节点和 {len(changes['deleted_edges'])} 条边"
+        )
 
-            if concept not in db_nodes:
-                nodes_to_create.append(
-                    {
-                        "concept": concept,
-                        "memory_items": memory_items,
-                        "weight": weight,
-                        "hash": memory_hash,
-                        "created_time": created_time,
-                        "last_modified": last_modified,
-                    }
-                )
-            else:
-                db_node = db_nodes[concept]
-                if db_node.hash != memory_hash:
-                    nodes_to_update.append(
-                        {
-                            "concept": concept,
-                            "memory_items": memory_items,
-                            "weight": weight,
-                            "hash": memory_hash,
-                            "last_modified": last_modified,
-                        }
-                    )
-
-        # 计算需要删除的节点
-        memory_concepts = {concept for concept, _ in memory_nodes}
-        nodes_to_delete = set(db_nodes.keys()) - memory_concepts
-
-        # 批量处理节点
-        if nodes_to_create:
-            batch_size = 100
-            for i in range(0, len(nodes_to_create), batch_size):
-                batch = nodes_to_create[i : i + batch_size]
-                GraphNodes.insert_many(batch).execute()
-
-        if nodes_to_update:
-            batch_size = 100
-            for i in range(0, len(nodes_to_update), batch_size):
-                batch = nodes_to_update[i : i + batch_size]
-                for node_data in batch:
-                    GraphNodes.update(**{k: v for k, v in node_data.items() if k != "concept"}).where(
-                        GraphNodes.concept == node_data["concept"]
-                    ).execute()
-
-        if nodes_to_delete:
-            GraphNodes.delete().where(GraphNodes.concept.in_(nodes_to_delete)).execute()  # type: ignore
-
-        # 处理边的信息
-        db_edges = list(GraphEdges.select())
-        memory_edges = list(self.memory_graph.G.edges(data=True))
+    def _write_changes_to_db(
+        self,
+        deleted_nodes: List[str],
+        edge_keys_to_delete: List[Tuple[str, str]],
+        nodes_data: List[Dict[str, Any]],
+        edges_data: List[Dict[str, Any]],
+    ):
+        """在一个事务中写入记忆图的变更，运行在数据库写线程中"""
+        batch_size = self.DB_BATCH_SIZE
+        with db.atomic():
+            for i in range(0, len(deleted_nodes), batch_size):
+                batch = deleted_nodes[i : i + batch_size]
+                GraphNodes.delete().where(GraphNodes.concept.in_(batch)).execute()  # type: ignore
+                GraphEdges.delete().where(
+                    GraphEdges.source.in_(batch) | GraphEdges.target.in_(batch)  # type: ignore
+                ).execute()
 
-        # 创建边的哈希值字典
-        db_edge_dict = {}
-        for edge in db_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(edge.source, edge.target)
-            db_edge_dict[(edge.source, edge.target)] = {"hash": edge_hash, "strength": edge.strength}
+            for i in range(0, len(edge_keys_to_delete), batch_size):
+                batch = edge_keys_to_delete[i : i + batch_size]
+                condition = reduce(
+                    operator.or_,
+                    (
+                        ((GraphEdges.source == source) & (GraphEdges.target == target))
+                        | ((GraphEdges.source == target) & (GraphEdges.target == source))
+                        for source, target in batch
+                    ),
+                )
+                GraphEdges.delete().where(condition).execute()
 
-        # 批量准备边数据
-        edges_to_create = []
-        edges_to_update = []
+            for i in range(0, len(nodes_data), batch_size):
+                GraphNodes.insert_many(nodes_data[i : i + batch_size]).on_conflict_replace().execute()
 
-        # 处理边
-        for source, target, data in memory_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(source, target)
-            edge_key = (source, target)
-            strength = data.get("strength", 1)
-            created_time = data.get("created_time", current_time)
-            last_modified = data.get("last_modified", current_time)
+            for i in range(0, len(edges_data), batch_size):
+                GraphEdges.insert_many(edges_data[i : i + batch_size]).execute()
 
-            if edge_key not in db_edge_dict:
-                edges_to_create.append(
-                    {
-                        "source": source,
-                        "target": target,
-                        "strength": strength,
-                        "hash": edge_hash,
-                        "created_time": created_time,
-                        "last_modified": last_modified,
-                    }
-                )
-            elif db_edge_dict[edge_key]["hash"] != edge_hash:
-                edges_to_update.append(
-                    {
-                        "source": source,
-                        "target": target,
-                        "strength": strength,
-                        "hash": edge_hash,
-                        "last_modified": last_modified,
-                    }
-                )
+    def _rewrite_all_to_db(self, nodes_data: List[Dict[str, Any]], edges_data: List[Dict[str, Any]]):
+        """清空记忆图表后重新写入全部节点和边，运行在数据库写线程中"""
+        batch_size = self.DB_BATCH_SIZE
+        with db.atomic():
+            clear_start = time.time()
+            GraphNodes.delete().execute()
+            GraphEdges.delete().execute()
+            logger.info(f"[数据库] 清空数据库耗时: {time.time() - clear_start:.2f}秒")
 
-        # 计算需要删除的边
-        memory_edge_keys = {(source, target) for source, target, _ in memory_edges}
-        edges_to_delete = set(db_edge_dict.keys()) - memory_edge_keys
-
-        # 批量处理边
-        if edges_to_create:
-            batch_size = 100
-            for i in range(0, len(edges_to_create), batch_size):
-                batch = edges_to_create[i : i + batch_size]
-                GraphEdges.insert_many(batch).execute()
-
-        if edges_to_update:
-            batch_size = 100
-            for i in range(0, len(edges_to_update), batch_size):
-                batch = edges_to_update[i : i + batch_size]
-                for edge_data in batch:
-                    GraphEdges.update(**{k: v for k, v in edge_data.items() if k not in ["source", "target"]}).where(
-                        (GraphEdges.source == edge_data["source"]) & (GraphEdges.target == edge_data["target"])
-                    ).execute()
-
-        if edges_to_delete:
-            for source, target in edges_to_delete:
-                GraphEdges.delete().where((GraphEdges.source == source) & (GraphEdges.target == target)).execute()
+            for i in range(0, len(nodes_data), batch_size):
+                GraphNodes.insert_many(nodes_data[i : i + batch_size]).execute()
 
-        end_time = time.time()
-        logger.info(f"[数据库] 同步完成，总耗时: {end_time - start_time:.2f}秒")
-        logger.info(
-            f"[数据库] 同步了 {len(nodes_to_create) + len(nodes_to_update)} 个节点和 {len(edges_to_create) + len(edges_to_update)} 条边"
-        )
+            for i in range(0, len(edges_data), batch_size):
+                GraphEdges.insert_many(edges_data[i : i + batch_size]).execute()
 
     async def resync_memory_to_db(self):
         """清空数据库并重新同步所有记忆数据"""
         start_time = time.time()
         logger.info("[数据库] 开始重新同步所有记忆数据...")
 
-        # 清空数据库
-        clear_start = time.time()
-        GraphNodes.delete().execute()
-        GraphEdges.delete().execute()
-        clear_end = time.time()
-        logger.info(f"[数据库] 清空数据库耗时: {clear_end - clear_start:.2f}秒")
-
         # 获取所有节点和边
         memory_nodes = list(self.memory_graph.G.nodes(data=True))
         memory_edges = list(self.memory_graph.G.edges(data=True))
@@ -875,7 +1024,7 @@ class EntorhinalCortex:
 
             # 直接检查字符串是否为空，不需要分割成列表
             if not memory_items or memory_items.strip() == "":
-                self.memory_graph.G.remove_node(concept)
+                self.memory_graph.remove_node(concept)
                 continue
 
             # 计算内存中节点的特征值
@@ -901,13 +1050,6 @@ class EntorhinalCortex:
                 }
             )
 
-        # 批量插入节点
-        if nodes_data:
-            batch_size = 100
-            for i in range(0, len(nodes_data), batch_size):
-                batch = nodes_data[i : i + batch_size]
-                GraphNodes.insert_many(batch).execute()
-
         # 批量准备边数据
         edges_data = []
         for source, target, data in memory_edges:
@@ -926,12 +1068,11 @@ class EntorhinalCortex:
                 logger.error(f"准备边 {source}-{target} 数据时发生错误: {e}")
                 continue
 
-        # 批量插入边
-        if edges_data:
-            batch_size = 100
-            for i in range(0, len(edges_data), batch_size):
-                batch = edges_data[i : i + batch_size]
-                GraphEdges.insert_many(batch).execute()
+        # 清空数据库并批量插入，在写线程的同一个事务中完成
+        await db_write(self._rewrite_all_to_db, nodes_data, edges_data)
+
+        # 全量写入后内存与数据库一致，之前记录的变更不再需要
+        self.memory_graph.clear_changes()
 
         end_time = time.time()
         logger.info(f"[数据库] 重新同步完成，总耗时: {end_time - start_time:.2f}秒")
@@ -944,6 +1085,7 @@ class EntorhinalCortex:
 
         # 清空当前图
         self.memory_graph.G.clear()
+        self.memory_graph.clear_changes()
 
         # 统计加载情况
         total_nodes = 0
@@ -960,6 +1102,8 @@ class EntorhinalCortex:
                 # 处理空字符串或None的情况
                 if not node.memory_items or node.memory_items.strip() == "":
                     logger.warning(f"节点 {concept} 的memory_items为空，跳过")
+                    # 记为已删除，下次同步时从数据库中清理
+                    self.memory_graph.deleted_nodes.add(concept)
                     skipped_nodes += 1
                     continue
 
@@ -1029,10 +1173,15 @@ class EntorhinalCortex:
                 self.memory_graph.G.add_edge(
                     source, target, strength=strength, created_time=created_time, last_modified=last_modified
                 )
+            else:
+                self.memory_graph.deleted_edges.add(self.memory_graph.edge_key(source, target))
 
         if need_update:
             logger.info("[数据库] 已为缺失的时间字段进行补充")
 
+        self.memory_graph.topic_index.rebuild(self.memory_graph.G.nodes())
+        self.memory_graph.invalidate_csr()
+
         # 输出加载统计信息
         logger.info(
             f"[数据库] 记忆加载完成: 总计 {total_nodes} 个节点, 成功加载 {loaded_nodes} 个, 跳过 {skipped_nodes} 个"
@@ -1136,24 +1285,7 @@ class ParahippocampalGyrus:
             if response:
                 compressed_memory.add((topic, response[0]))
 
-                existing_topics = list(self.memory_graph.G.nodes())
-                similar_topics = []
-
-                for existing_topic in existing_topics:
-                    topic_words = set(jieba.cut(topic))
-                    existing_words = set(jieba.cut(existing_topic))
-
-                    all_words = topic_words | existing_words
-                    v1 = [1 if word in topic_words else 0 for word in all_words]
-                    v2 = [1 if word in existing_words else 0 for word in all_words]
-
-                    similarity = cosine_similarity(v1, v2)
-
-                    if similarity >= 0.7:
-                        similar_topics.append((existing_topic, similarity))
-
-                similar_topics.sort(key=lambda x: x[1], reverse=True)
-                similar_topics = similar_topics[:3]
+                similar_topics = self.memory_graph.topic_index.similar(topic, 0.7)[:3]
                 similar_topics_dict[topic] = similar_topics
 
         if global_config.debug.show_prompt:
@@ -1190,26 +1322,10 @@ class ParahippocampalGyrus:
         if not keyword_list:
             return {}
 
-        existing_topics = list(self.memory_graph.G.nodes())
         result: dict[str, list[tuple[str, float]]] = {}
 
         for kw in keyword_list:
-            kw_words = set(jieba.cut(kw))
-            similar_topics: list[tuple[str, float]] = []
-
-            for topic in existing_topics:
-                topic_words = set(jieba.cut(topic))
-                all_words = kw_words | topic_words
-                if not all_words:
-                    continue
-                v1 = [1 if w in kw_words else 0 for w in all_words]
-                v2 = [1 if w in topic_words else 0 for w in all_words]
-                sim = cosine_similarity(v1, v2)
-                if sim >= threshold:
-                    similar_topics.append((topic, sim))
-
-            similar_topics.sort(key=lambda x: x[1], reverse=True)
-            result[kw] = similar_topics[:top_k]
+            result[kw] = self.memory_graph.topic_index.similar(kw, threshold)[:top_k]
 
         return result
 
@@ -1264,14 +1380,14 @@ class ParahippocampalGyrus:
                         # 确保相似主题节点存在（如果没有，也可以只建立边，networkx会创建节点，但需初始化属性）
                         if similar_topic not in self.memory_graph.G:
                             # 创建一个空的相似主题节点，避免悬空边，memory_items 为空字符串
-                            self.memory_graph.G.add_node(
+                            self.memory_graph.add_node(
                                 similar_topic,
                                 memory_items="",
                                 weight=1.0,
                                 created_time=current_time,
                                 last_modified=current_time,
                             )
-                        self.memory_graph.G.add_edge(
+                        self.memory_graph.add_edge(
                             topic,
                             similar_topic,
                             strength=strength,
@@ -1341,11 +1457,12 @@ class ParahippocampalGyrus:
                 new_strength = current_strength - 1
 
                 if new_strength <= 0:
-                    self.memory_graph.G.remove_edge(source, target)
+                    self.memory_graph.remove_edge(source, target)
                     edge_changes["removed"].append(f"{source} -> {target}")
                 else:
                     edge_data["strength"] = new_strength
                     edge_data["last_modified"] = current_time
+                    self.memory_graph.mark_edge_dirty(source, target)
                     edge_changes["weakened"].append(f"{source}-{target} (强度: {current_strength} -> {new_strength})")
         edge_check_end = time.time()
         logger.info(f"[遗忘] 连接检查耗时: {edge_check_end - edge_check_start:.2f}秒")
@@ -1364,7 +1481,7 @@ class ParahippocampalGyrus:
             # 直接检查记忆内容是否为空
             if not memory_items or memory_items.strip() == "":
                 try:
-                    self.memory_graph.G.remove_node(node)
+                    self.memory_graph.remove_node(node)
                     node_changes["removed"].append(f"{node}(空节点)")  # 标记为空节点移除
                     logger.debug(f"[遗忘] 移除了空的节点: {node}")
                 except nx.NetworkXError as e:
@@ -1385,7 +1502,7 @@ class ParahippocampalGyrus:
             if current_time - last_modified > adjusted_threshold and memory_items:
                 # 既然每个节点现在是完整记忆，直接删除整个节点
                 try:
-                    self.memory_graph.G.remove_node(node)
+                    self.memory_graph.remove_node(node)
                     node_changes["removed"].append(f"{node}(长时间未修改,权重{node_weight:.1f})")
                     logger.debug(f"[遗忘] 移除了长时间未修改的节点: {node} (权重: {node_weight:.1f})")
                 except nx.NetworkXError as e:
@@ -1397,7 +1514,7 @@ class ParahippocampalGyrus:
         if any(edge_changes.values()) or any(node_changes.values()):
             sync_start = time.time()
 
-            await self.hippocampus.entorhinal_cortex.resync_memory_to_db()
+            await self.hippocampus.entorhinal_cortex.sync_memory_to_db()
 
             sync_end = time.time()
             logger.info(f"[遗忘] 数据库同步耗时: {sync_end - sync_start:.2f}秒")
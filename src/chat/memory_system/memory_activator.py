@@ -6,6 +6,7 @@ from typing import List, Tuple
 
 from src.config.config import global_config, model_config
 from src.common.logger import get_logger
+from src.common.database.group_commit import group_commit_writer
 from src.common.data_models.database_data_model import DatabaseMessages
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
 from src.chat.utils.utils import parse_keywords_string
@@ -156,6 +157,9 @@ class MemoryActivator:
             List[Tuple[str, str]]: 选择的记忆列表，格式为 (keyword, content)
         """
         try:
+            # 渲染动作记录前等待该聊天尚未提交的记录写入
+            if chat_history:
+                await group_commit_writer.aflush(chat_id=chat_history[0].chat_id)
             # 构建聊天历史字符串
             obs_info_text = build_readable_messages(
                 chat_history,
@@ -4,6 +4,8 @@ import traceback
 from typing import Union
 
 from src.common.database.database_model import Messages, Images
+from src.common.database.db_executor import db_read
+from src.common.database.group_commit import group_commit_writer
 from src.common.logger import get_logger
 from .chat_stream import ChatStream
 from .message import MessageSending, MessageRecv
@@ -42,7 +44,11 @@ class MessageStorage:
             # print(processed_plain_text)
 
             if processed_plain_text:
-                processed_plain_text = MessageStorage.replace_image_descriptions(processed_plain_text)
+                # 只有包含图片描述时才需要查询数据库，避免每条消息都切换一次线程
+                if "[图片：" in processed_plain_text:
+                    processed_plain_text = await db_read(
+                        MessageStorage.replace_image_descriptions, processed_plain_text
+                    )
                 filtered_processed_plain_text = re.sub(pattern, "", processed_plain_text, flags=re.DOTALL)
             else:
                 filtered_processed_plain_text = ""
@@ -96,44 +102,48 @@ class MessageStorage:
             # 安全地获取 user_info, 如果为 None 则视为空字典 (以防万一)
             user_info_from_chat = chat_info_dict.get("user_info") or {}
 
-            Messages.create(
-                message_id=msg_id,
-                time=float(message.message_info.time),  # type: ignore
-                chat_id=chat_stream.stream_id,
-                # Flattened chat_info
-                reply_to=reply_to,
-                is_mentioned=is_mentioned,
-                is_at=is_at,
-                reply_probability_boost=reply_probability_boost,
-                chat_info_stream_id=chat_info_dict.get("stream_id"),
-                chat_info_platform=chat_info_dict.get("platform"),
-                chat_info_user_platform=user_info_from_chat.get("platform"),
-                chat_info_user_id=user_info_from_chat.get("user_id"),
-                chat_info_user_nickname=user_info_from_chat.get("user_nickname"),
-                chat_info_user_cardname=user_info_from_chat.get("user_cardname"),
-                chat_info_group_platform=group_info_from_chat.get("platform"),
-                chat_info_group_id=group_info_from_chat.get("group_id"),
-                chat_info_group_name=group_info_from_chat.get("group_name"),
-                chat_info_create_time=float(chat_info_dict.get("create_time", 0.0)),
-                chat_info_last_active_time=float(chat_info_dict.get("last_active_time", 0.0)),
-                # Flattened user_info (message sender)
-                user_platform=user_info_dict.get("platform"),
-                user_id=user_info_dict.get("user_id"),
-                user_nickname=user_info_dict.get("user_nickname"),
-                user_cardname=user_info_dict.get("user_cardname"),
-                # Text content
-                processed_plain_text=filtered_processed_plain_text,
-                display_message=filtered_display_message,
-                interest_value=interest_value,
-                priority_mode=priority_mode,
-                priority_info=priority_info,
-                is_emoji=is_emoji,
-                is_picid=is_picid,
-                is_notify=is_notify,
-                is_command=is_command,
-                key_words=key_words,
-                key_words_lite=key_words_lite,
-                selected_expressions=selected_expressions,
+            # 交给组提交写入器批量落库，读取该聊天的消息前会先等待其提交
+            group_commit_writer.add(
+                Messages,
+                dict(
+                    message_id=msg_id,
+                    time=float(message.message_info.time),  # type: ignore
+                    chat_id=chat_stream.stream_id,
+                    # Flattened chat_info
+                    reply_to=reply_to,
+                    is_mentioned=is_mentioned,
+                    is_at=is_at,
+                    reply_probability_boost=reply_probability_boost,
+                    chat_info_stream_id=chat_info_dict.get("stream_id"),
+                    chat_info_platform=chat_info_dict.get("platform"),
+                    chat_info_user_platform=user_info_from_chat.get("platform"),
+                    chat_info_user_id=user_info_from_chat.get("user_id"),
+                    chat_info_user_nickname=user_info_from_chat.get("user_nickname"),
+                    chat_info_user_cardname=user_info_from_chat.get("user_cardname"),
+                    chat_info_group_platform=group_info_from_chat.get("platform"),
+                    chat_info_group_id=group_info_from_chat.get("group_id"),
+                    chat_info_group_name=group_info_from_chat.get("group_name"),
+                    chat_info_create_time=float(chat_info_dict.get("create_time", 0.0)),
+                    chat_info_last_active_time=float(chat_info_dict.get("last_active_time", 0.0)),
+                    # Flattened user_info (message sender)
+                    user_platform=user_info_dict.get("platform"),
+                    user_id=user_info_dict.get("user_id"),
+                    user_nickname=user_info_dict.get("user_nickname"),
+                    user_cardname=user_info_dict.get("user_cardname"),
+                    # Text content
+                    processed_plain_text=filtered_processed_plain_text,
+                    display_message=filtered_display_message,
+                    interest_value=interest_value,
+                    priority_mode=priority_mode,
+                    priority_info=priority_info,
+                    is_emoji=is_emoji,
+                    is_picid=is_picid,
+                    is_notify=is_notify,
+                    is_command=is_command,
+                    key_words=key_words,
+                    key_words_lite=key_words_lite,
+                    selected_expressions=selected_expressions,
+                ),
             )
         except Exception:
             logger.exception("存储消息失败")
@@ -148,6 +158,7 @@ class MessageStorage:
             if not qq_message_id:
                 logger.info("消息不存在message_id，无法更新")
                 return False
+            group_commit_writer.flush(Messages)
             if matched_message := (
                 Messages.select().where((Messages.message_id == mmc_message_id)).order_by(Messages.time.desc()).first()
             ):
@@ -2,9 +2,10 @@ import random
 import asyncio
 import hashlib
 import time
-from typing import List, Dict, TYPE_CHECKING, Tuple
+from typing import List, Dict, TYPE_CHECKING, Optional, Tuple
 
 from src.common.logger import get_logger
+from src.common.database.group_commit import group_commit_writer
 from src.config.config import global_config, model_config
 from src.llm_models.utils_model import LLMRequest
 from src.chat.message_receive.chat_stream import get_chat_manager, ChatMessageContext
@@ -15,6 +16,7 @@ from src.plugin_system.core.global_announcement_manager import global_announceme
 
 if TYPE_CHECKING:
     from src.chat.message_receive.chat_stream import ChatStream
+    from src.chat.utils.cycle_context import CycleContext
 
 logger = get_logger("action_manager")
 
@@ -46,6 +48,7 @@ class ActionModifier:
     async def modify_actions(
         self,
         message_content: str = "",
+        cycle_context: Optional["CycleContext"] = None,
     ):  # sourcery skip: use-named-expression
         """
         动作修改流程，整合传统观察处理和新的激活类型判定
@@ -55,6 +58,10 @@ class ActionModifier:
         2. 基于激活类型的智能动作判定，最终确定可用动作集
 
         处理后，ActionManager 将包含最终的可用动作集，供规划器直接使用
+
+        Args:
+            message_content: 最新的消息内容
+            cycle_context: 本次循环的上下文快照，提供时不再单独查询数据库
         """
         logger.debug(f"{self.log_prefix}开始完整动作修改流程")
 
@@ -65,19 +72,31 @@ class ActionModifier:
         self.action_manager.restore_actions()
         all_actions = self.action_manager.get_using_actions()
 
-        message_list_before_now_half = get_raw_msg_before_timestamp_with_chat(
-            chat_id=self.chat_stream.stream_id,
-            timestamp=time.time(),
-            limit=min(int(global_config.chat.max_context_size * 0.33), 10),
-        )
+        context_limit = min(int(global_config.chat.max_context_size * 0.33), 10)
+        # 渲染动作记录前等待本聊天尚未提交的记录写入
+        await group_commit_writer.aflush(chat_id=self.chat_stream.stream_id)
+        if cycle_context:
+            chat_content = cycle_context.build_readable(
+                limit=context_limit,
+                replace_bot_name=True,
+                timestamp_mode="relative",
+                read_mark=0.0,
+                show_actions=True,
+            )
+        else:
+            message_list_before_now_half = get_raw_msg_before_timestamp_with_chat(
+                chat_id=self.chat_stream.stream_id,
+                timestamp=time.time(),
+                limit=context_limit,
+            )
 
-        chat_content = build_readable_messages(
-            message_list_before_now_half,
-            replace_bot_name=True,
-            timestamp_mode="relative",
-            read_mark=0.0,
-            show_actions=True,
-        )
+            chat_content = build_readable_messages(
+                message_list_before_now_half,
+                replace_bot_name=True,
+                timestamp_mode="relative",
+                read_mark=0.0,
+                show_actions=True,
+            )
 
         if message_content:
             chat_content = chat_content + "\n" + f"现在，最新的消息是：{message_content}"
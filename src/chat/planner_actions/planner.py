@@ -11,6 +11,7 @@ from json_repair import repair_json
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import global_config, model_config
 from src.common.logger import get_logger
+from src.common.database.group_commit import group_commit_writer
 from src.common.data_models.info_data_model import ActionPlannerInfo
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
 from src.chat.utils.chat_message_builder import (
@@ -28,6 +29,7 @@ from src.plugin_system.core.component_registry import component_registry
 if TYPE_CHECKING:
     from src.common.data_models.info_data_model import TargetPersonInfo
     from src.common.data_models.database_data_model import DatabaseMessages
+    from src.chat.utils.cycle_context import CycleContext
 
 logger = get_logger("planner")
 
@@ -225,35 +227,57 @@ class ActionPlanner:
         self,
         available_actions: Dict[str, ActionInfo],
         loop_start_time: float = 0.0,
+        cycle_context: Optional["CycleContext"] = None,
     ) -> Tuple[List[ActionPlannerInfo], Optional["DatabaseMessages"]]:
         # sourcery skip: use-named-expression
         """
         规划器 (Planner): 使用LLM根据上下文决定做出什么动作。
+
+        提供 cycle_context 时复用本次循环已读取和渲染好的聊天记录。
         """
         target_message: Optional["DatabaseMessages"] = None
+        # 等待本聊天尚未提交的消息和动作记录写入，下面在事件循环中同步读取时才能读到
+        await group_commit_writer.aflush(chat_id=self.chat_id)
 
         # 获取聊天上下文
-        message_list_before_now = get_raw_msg_before_timestamp_with_chat(
-            chat_id=self.chat_id,
-            timestamp=time.time(),
-            limit=int(global_config.chat.max_context_size * 0.6),
-        )
+        context_limit = int(global_config.chat.max_context_size * 0.6)
+        short_context_limit = int(global_config.chat.max_context_size * 0.3)
         message_id_list: list[Tuple[str, "DatabaseMessages"]] = []
-        chat_content_block, message_id_list = build_readable_messages_with_id(
-            messages=message_list_before_now,
-            timestamp_mode="normal_no_YMD",
-            read_mark=self.last_obs_time_mark,
-            truncate=True,
-            show_actions=True,
-        )
+        if cycle_context:
+            chat_content_block, message_id_list = cycle_context.build_readable_with_id(
+                limit=context_limit,
+                timestamp_mode="normal_no_YMD",
+                read_mark=self.last_obs_time_mark,
+                truncate=True,
+                show_actions=True,
+            )
+            chat_content_block_short = cycle_context.build_readable(
+                limit=short_context_limit or context_limit,
+                timestamp_mode="normal_no_YMD",
+                truncate=False,
+                show_actions=False,
+            )
+        else:
+            message_list_before_now = get_raw_msg_before_timestamp_with_chat(
+                chat_id=self.chat_id,
+                timestamp=time.time(),
+                limit=context_limit,
+            )
+            chat_content_block, message_id_list = build_readable_messages_with_id(
+                messages=message_list_before_now,
+                timestamp_mode="normal_no_YMD",
+                read_mark=self.last_obs_time_mark,
+                truncate=True,
+                show_actions=True,
+            )
 
-        message_list_before_now_short = message_list_before_now[-int(global_config.chat.max_context_size * 0.3) :]
-        chat_content_block_short, message_id_list_short = build_readable_messages_with_id(
-            messages=message_list_before_now_short,
-            timestamp_mode="normal_no_YMD",
-            truncate=False,
-            show_actions=False,
-        )
+            message_list_before_now_short = message_list_before_now[-short_context_limit:]
+            chat_content_block_short, _ = build_readable_messages_with_id(
+                messages=message_list_before_now_short,
+                timestamp_mode="normal_no_YMD",
+                truncate=False,
+                show_actions=False,
+            )
 
         self.last_obs_time_mark = time.time()
 
@@ -273,6 +297,7 @@ class ActionPlanner:
             chat_content_block=chat_content_block,
             message_id_list=message_id_list,
             interest=global_config.personality.interest,
+            cycle_context=cycle_context,
         )
 
         # 调用LLM获取决策
@@ -299,16 +324,20 @@ class ActionPlanner:
         message_id_list: List[Tuple[str, "DatabaseMessages"]],
         chat_content_block: str = "",
         interest: str = "",
+        cycle_context: Optional["CycleContext"] = None,
     ) -> tuple[str, List[Tuple[str, "DatabaseMessages"]]]:
         """构建 Planner LLM 的提示词 (获取模板并填充数据)"""
         try:
             # 获取最近执行过的动作
-            actions_before_now = get_actions_by_timestamp_with_chat(
-                chat_id=self.chat_id,
-                timestamp_start=time.time() - 600,
-                timestamp_end=time.time(),
-                limit=6,
-            )
+            if cycle_context:
+                actions_before_now = cycle_context.get_recent_actions(seconds=600, limit=6)
+            else:
+                actions_before_now = get_actions_by_timestamp_with_chat(
+                    chat_id=self.chat_id,
+                    timestamp_start=time.time() - 600,
+                    timestamp_end=time.time(),
+                    limit=6,
+                )
             actions_before_now_block = build_readable_actions(actions=actions_before_now)
             if actions_before_now_block:
                 actions_before_now_block = f"你刚刚选择并执行过的action是：\n{actions_before_now_block}"
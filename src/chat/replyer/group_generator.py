@@ -8,16 +8,19 @@ from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from src.mais4u.mai_think import mai_thinking_manager
 from src.common.logger import get_logger
+from src.common.database.db_executor import db_read
+from src.common.database.group_commit import group_commit_writer
 from src.common.data_models.database_data_model import DatabaseMessages
 from src.common.data_models.info_data_model import ActionPlannerInfo
-from src.common.data_models.llm_data_model import LLMGenerationDataModel
+from src.common.data_models.llm_data_model import LLMGenerationDataModel, ReplyStreamHandler
 from src.config.config import global_config, model_config
 from src.llm_models.utils_model import LLMRequest
 from src.chat.message_receive.message import UserInfo, Seg, MessageRecv, MessageSending
 from src.chat.message_receive.chat_stream import ChatStream
 from src.chat.message_receive.uni_message_sender import UniversalMessageSender
 from src.chat.utils.timer_calculator import Timer  # <--- Import Timer
-from src.chat.utils.utils import get_chat_type_and_target_info
+from src.chat.utils.cycle_context import CycleContext
+from src.chat.utils.utils import get_chat_type_and_target_info, generate_reply_stream
 from src.chat.utils.prompt_builder import global_prompt_manager
 from src.chat.utils.chat_message_builder import (
     build_readable_messages,
@@ -69,6 +72,8 @@ class DefaultReplyer:
         from_plugin: bool = True,
         stream_id: Optional[str] = None,
         reply_message: Optional[DatabaseMessages] = None,
+        cycle_context: Optional[CycleContext] = None,
+        reply_stream_handler: Optional[ReplyStreamHandler] = None,
     ) -> Tuple[bool, LLMGenerationDataModel]:
         # sourcery skip: merge-nested-ifs
         """
@@ -82,6 +87,8 @@ class DefaultReplyer:
             chosen_actions: 已选动作
             enable_tool: 是否启用工具调用
             from_plugin: 是否来自插件
+            cycle_context: 本次思考循环的上下文快照（可选）
+            reply_stream_handler: 流式回复处理函数（可选），提供且没有会修改生成结果的插件时，每生成一段完整的句子就交给它处理
 
         Returns:
             Tuple[bool, Optional[Dict[str, Any]], Optional[str]]: (是否成功, 生成的回复, 使用的prompt)
@@ -102,6 +109,7 @@ class DefaultReplyer:
                     enable_tool=enable_tool,
                     reply_message=reply_message,
                     reply_reason=reply_reason,
+                    cycle_context=cycle_context,
                 )
             llm_response.prompt = prompt
             llm_response.selected_expressions = selected_expressions
@@ -127,7 +135,13 @@ class DefaultReplyer:
             model_name = "unknown_model"
 
             try:
-                content, reasoning_content, model_name, tool_call = await self.llm_generate_content(prompt)
+                if reply_stream_handler and not events_manager.has_intercepting_handlers(EventType.AFTER_LLM, stream_id):
+                    # 生成结果不会再被插件修改，可以边生成边发送
+                    content, reasoning_content, model_name, tool_call = await generate_reply_stream(
+                        self.express_model, prompt, llm_response, reply_stream_handler
+                    )
+                else:
+                    content, reasoning_content, model_name, tool_call = await self.llm_generate_content(prompt)
                 logger.debug(f"replyer生成内容: {content}")
                 llm_response.content = content
                 llm_response.reasoning = reasoning_content
@@ -149,6 +163,10 @@ class DefaultReplyer:
             except UserWarning as e:
                 raise e
             except Exception as llm_e:
+                if llm_response.streamed:
+                    # 部分回复已经发给用户，保留已生成的内容，让调用方照常记录这次回复
+                    logger.warning(f"LLM 流式生成中途失败，保留已发送的部分回复: {llm_e}")
+                    return True, llm_response
                 # 精简报错信息
                 logger.error(f"LLM 生成失败: {llm_e}")
                 return False, llm_response  # LLM 调用失败则无法生成回复
@@ -227,7 +245,7 @@ class DefaultReplyer:
             return ""
 
         # 获取用户ID
-        person = Person(person_name=sender)
+        person = await db_read(Person, person_name=sender)
         if not is_person_known(person_name=sender):
             logger.warning(f"未找到用户 {sender} 的ID，跳过信息提取")
             return f"你完全不认识{sender}，不理解ta的相关信息。"
@@ -439,7 +457,11 @@ class DefaultReplyer:
         return name, result, duration
 
     def build_s4u_chat_history_prompts(
-        self, message_list_before_now: List[DatabaseMessages], target_user_id: str, sender: str
+        self,
+        message_list_before_now: List[DatabaseMessages],
+        target_user_id: str,
+        sender: str,
+        cycle_context: Optional[CycleContext] = None,
     ) -> Tuple[str, str]:
         """
         构建 s4u 风格的分离对话 prompt
@@ -447,6 +469,7 @@ class DefaultReplyer:
         Args:
             message_list_before_now: 历史消息列表
             target_user_id: 目标用户ID（当前对话对象）
+            cycle_context: 上下文快照，提供时背景对话直接使用其缓存的渲染结果
 
         Returns:
             Tuple[str, str]: (核心对话prompt, 背景对话prompt)
@@ -502,13 +525,21 @@ class DefaultReplyer:
         # 构建背景对话 prompt
         all_dialogue_prompt = ""
         if message_list_before_now:
-            latest_25_msgs = message_list_before_now[-int(global_config.chat.max_context_size) :]
-            all_dialogue_prompt_str = build_readable_messages(
-                latest_25_msgs,
-                replace_bot_name=True,
-                timestamp_mode="normal_no_YMD",
-                truncate=True,
-            )
+            if cycle_context:
+                all_dialogue_prompt_str = cycle_context.build_readable(
+                    limit=int(global_config.chat.max_context_size),
+                    replace_bot_name=True,
+                    timestamp_mode="normal_no_YMD",
+                    truncate=True,
+                )
+            else:
+                latest_25_msgs = message_list_before_now[-int(global_config.chat.max_context_size) :]
+                all_dialogue_prompt_str = build_readable_messages(
+                    latest_25_msgs,
+                    replace_bot_name=True,
+                    timestamp_mode="normal_no_YMD",
+                    truncate=True,
+                )
             if core_dialogue_prompt:
                 all_dialogue_prompt = f"所有用户的发言：\n{all_dialogue_prompt_str}"
             else:
@@ -615,6 +646,7 @@ class DefaultReplyer:
         available_actions: Optional[Dict[str, ActionInfo]] = None,
         chosen_actions: Optional[List[ActionPlannerInfo]] = None,
         enable_tool: bool = True,
+        cycle_context: Optional[CycleContext] = None,
     ) -> Tuple[str, List[int]]:
         """
         构建回复器上下文
@@ -627,11 +659,19 @@ class DefaultReplyer:
             enable_timeout: 是否启用超时处理
             enable_tool: 是否启用工具调用
             reply_message: 回复的原始消息
+            cycle_context: 本次思考循环的上下文快照，提供时复用其中的聊天记录，只增量读取之后到达的消息
         Returns:
             str: 构建好的上下文
         """
         if available_actions is None:
             available_actions = {}
+        # 等待该聊天尚未提交的消息和动作记录写入，之后在事件循环中渲染聊天记录时不会读到旧数据
+        await group_commit_writer.aflush(chat_id=self.chat_stream.stream_id)
+        if cycle_context is None or cycle_context.chat_id != self.chat_stream.stream_id:
+            cycle_context = await db_read(CycleContext, self.chat_stream.stream_id)
+        else:
+            # planner 思考期间可能有新消息到达，回复前补充到快照中
+            cycle_context = await db_read(cycle_context.refreshed)
         chat_stream = self.chat_stream
         chat_id = chat_stream.stream_id
         is_group_chat = bool(chat_stream.group_info)
@@ -644,7 +684,7 @@ class DefaultReplyer:
 
         if reply_message:
             user_id = reply_message.user_info.user_id
-            person = Person(platform=platform, user_id=user_id)
+            person = cycle_context.get_person(platform, user_id)
             person_name = person.person_name or user_id
             sender = person_name
             target = reply_message.processed_plain_text
@@ -657,17 +697,10 @@ class DefaultReplyer:
         target = replace_user_references(target, chat_stream.platform, replace_bot_name=True)
         target = re.sub(r"\\[picid:[^\\]]+\\]", "[图片]", target)
 
-        message_list_before_now_long = get_raw_msg_before_timestamp_with_chat(
-            chat_id=chat_id,
-            timestamp=time.time(),
-            limit=global_config.chat.max_context_size * 1,
-        )
+        message_list_before_now_long = cycle_context.get_messages(global_config.chat.max_context_size)
 
-        message_list_before_short = get_raw_msg_before_timestamp_with_chat(
-            chat_id=chat_id,
-            timestamp=time.time(),
-            limit=int(global_config.chat.max_context_size * 0.33),
-        )
+        short_context_limit = int(global_config.chat.max_context_size * 0.33)
+        message_list_before_short = cycle_context.get_messages(short_context_limit)
 
         person_list_short: List[Person] = []
         for msg in message_list_before_short:
@@ -682,15 +715,15 @@ class DefaultReplyer:
                 and reply_message.user_info.platform == msg.user_info.platform
             ):
                 continue
-            person = Person(platform=msg.user_info.platform, user_id=msg.user_info.user_id)
+            person = cycle_context.get_person(msg.user_info.platform, msg.user_info.user_id)  # type: ignore
             if person.is_known:
                 person_list_short.append(person)
 
         for person in person_list_short:
             print(person.person_name)
 
-        chat_talking_prompt_short = build_readable_messages(
-            message_list_before_short,
+        chat_talking_prompt_short = cycle_context.build_readable(
+            limit=short_context_limit,
             replace_bot_name=True,
             timestamp_mode="relative",
             read_mark=0.0,
@@ -776,7 +809,7 @@ class DefaultReplyer:
 
         # 构建分离的对话 prompt
         core_dialogue_prompt, background_dialogue_prompt = self.build_s4u_chat_history_prompts(
-            message_list_before_now_long, user_id, sender
+            message_list_before_now_long, user_id, sender, cycle_context=cycle_context
         )
 
         if global_config.bot.qq_account == user_id and platform == global_config.bot.platform:
@@ -830,6 +863,7 @@ class DefaultReplyer:
         chat_stream = self.chat_stream
         chat_id = chat_stream.stream_id
         is_group_chat = bool(chat_stream.group_info)
+        await group_commit_writer.aflush(chat_id=chat_id)
 
         sender, target = self._parse_reply_target(reply_to)
         target = replace_user_references(target, chat_stream.platform, replace_bot_name=True)
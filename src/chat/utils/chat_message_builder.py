@@ -12,6 +12,7 @@ from src.common.data_models.database_data_model import DatabaseMessages, Databas
 from src.common.data_models.message_data_model import MessageAndActionModel
 from src.common.database.database_model import ActionRecords
 from src.common.database.database_model import Images
+from src.common.database.group_commit import group_commit_writer
 from src.person_info.person_info import Person, get_person_id
 from src.chat.utils.utils import translate_timestamp_to_human_readable, assign_message_ids
 
@@ -185,6 +186,7 @@ def get_actions_by_timestamp_with_chat(
     limit_mode: str = "latest",
 ) -> List[DatabaseActionRecords]:
     """获取在特定聊天从指定时间戳到指定时间戳的动作记录，按时间升序排序，返回动作记录列表"""
+    group_commit_writer.flush(ActionRecords, chat_id)
     query = ActionRecords.select().where(
         (ActionRecords.chat_id == chat_id)
         & (ActionRecords.time > timestamp_start)  # type: ignore
@@ -224,6 +226,7 @@ def get_actions_by_timestamp_with_chat_inclusive(
     chat_id: str, timestamp_start: float, timestamp_end: float, limit: int = 0, limit_mode: str = "latest"
 ) -> List[Dict[str, Any]]:
     """获取在特定聊天从指定时间戳到指定时间戳的动作记录（包含边界），按时间升序排序，返回动作记录列表"""
+    group_commit_writer.flush(ActionRecords, chat_id)
     query = ActionRecords.select().where(
         (ActionRecords.chat_id == chat_id)
         & (ActionRecords.time >= timestamp_start)  # type: ignore
@@ -689,6 +692,7 @@ def build_readable_messages(
         chat_id = messages[0].chat_id if messages else None
 
         # 获取这个时间范围内的动作记录，并匹配chat_id
+        group_commit_writer.flush(ActionRecords, chat_id)
         actions_in_range = (
             ActionRecords.select()
             .where(
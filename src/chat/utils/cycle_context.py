@@ -0,0 +1,186 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.config.config import global_config
+from src.common.logger import get_logger
+from src.common.message_repository import find_messages
+from src.common.data_models.database_data_model import DatabaseMessages, DatabaseActionRecords
+from src.chat.utils.chat_message_builder import (
+    build_readable_messages,
+    build_readable_messages_with_id,
+    get_actions_by_timestamp_with_chat,
+    get_raw_msg_before_timestamp_with_chat,
+)
+from src.person_info.person_info import Person
+
+logger = get_logger("cycle_context")
+
+
+class CycleContext:
+    """
+    单次思考循环的聊天上下文快照
+
+    在循环开始时只读取一次数据库，之后由 action_modifier、planner 和 replyer 共享：
+    - 各组件需要的消息窗口都是同一份最新消息的后缀，直接切片获得
+    - 渲染结果按 (窗口大小, timestamp_mode, truncate, show_actions, read_mark, ...) 缓存
+    - 发送者的 Person 对象按 (platform, user_id) 缓存
+
+    快照创建后消息不再变化：planner 调用 LLM 期间可能有新消息到达，replyer 构建提示词前调用 refreshed()
+    得到补上新消息的新快照，已经拿到旧快照的组件不受影响；
+    db_queries / render_calls / render_hits 用于核对每个循环的开销
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        timestamp: Optional[float] = None,
+        limit: Optional[int] = None,
+        messages: Optional[Tuple[DatabaseMessages, ...]] = None,
+        persons: Optional[Dict[Tuple[str, str], Person]] = None,
+        db_queries: int = 0,
+    ):
+        """
+        Args:
+            messages: 已读取好的消息，提供时不再查询数据库（用于 refreshed() 构造新快照）
+            persons: 与其他快照共享的 Person 缓存
+            db_queries: 之前的快照已经执行的查询次数，便于按循环统计
+        """
+        self.chat_id = chat_id
+        self.timestamp = timestamp or time.time()
+        self.limit = limit or global_config.chat.max_context_size
+
+        self.db_queries = db_queries
+        self.render_calls = 0
+        self.render_hits = 0
+
+        if messages is None:
+            messages = tuple(
+                get_raw_msg_before_timestamp_with_chat(chat_id=chat_id, timestamp=self.timestamp, limit=self.limit)
+            )
+            self.db_queries += 1
+        self._messages: Tuple[DatabaseMessages, ...] = messages
+
+        self._recent_actions: Dict[Tuple[float, int], List[DatabaseActionRecords]] = {}
+        self._persons: Dict[Tuple[str, str], Person] = persons if persons is not None else {}
+        self._rendered: Dict[tuple, Tuple[str, List[Tuple[str, DatabaseMessages]]]] = {}
+
+    def refreshed(self) -> "CycleContext":
+        """
+        增量读取快照时间之后到达的消息，返回补上这些消息的新快照，当前快照不变
+
+        只查询 [上次快照时间, 当前时间) 内的消息；没有新消息时直接返回当前快照，已渲染的结果继续复用。
+        新快照重新渲染和读取动作记录，已构造的 Person 仍然共享
+        """
+        now = time.time()
+        new_messages = find_messages(
+            message_filter={"chat_id": self.chat_id, "time": {"$gte": self.timestamp, "$lt": now}},
+            limit=self.limit,
+            limit_mode="latest",
+        )
+        if new_messages:
+            known_ids = {msg.message_id for msg in self._messages[-len(new_messages) :]}
+            new_messages = [msg for msg in new_messages if msg.message_id not in known_ids]
+        if not new_messages:
+            return self
+        logger.debug(f"[{self.chat_id}] 上下文快照补充了 {len(new_messages)} 条新消息")
+        return CycleContext(
+            self.chat_id,
+            timestamp=now,
+            limit=self.limit,
+            messages=(self._messages + tuple(new_messages))[-self.limit :],
+            persons=self._persons,
+            db_queries=self.db_queries + 1,
+        )
+
+    @property
+    def messages(self) -> Tuple[DatabaseMessages, ...]:
+        """快照中的全部消息，按时间升序"""
+        return self._messages
+
+    def get_messages(self, limit: int = 0) -> List[DatabaseMessages]:
+        """获取最新的 limit 条消息，按时间升序；limit 不大于 0 时返回全部"""
+        if limit <= 0 or limit >= len(self._messages):
+            return list(self._messages)
+        return list(self._messages[-limit:])
+
+    def build_readable(
+        self,
+        limit: int = 0,
+        replace_bot_name: bool = True,
+        timestamp_mode: str = "relative",
+        read_mark: float = 0.0,
+        truncate: bool = False,
+        show_actions: bool = False,
+    ) -> str:
+        """等同于对 get_messages(limit) 调用 build_readable_messages，结果在本循环内缓存"""
+        key = ("plain", limit, replace_bot_name, timestamp_mode, read_mark, truncate, show_actions)
+        if key in self._rendered:
+            self.render_hits += 1
+            return self._rendered[key][0]
+
+        self.render_calls += 1
+        readable = build_readable_messages(
+            self.get_messages(limit),
+            replace_bot_name=replace_bot_name,
+            timestamp_mode=timestamp_mode,
+            read_mark=read_mark,
+            truncate=truncate,
+            show_actions=show_actions,
+        )
+        self._rendered[key] = (readable, [])
+        return readable
+
+    def build_readable_with_id(
+        self,
+        limit: int = 0,
+        replace_bot_name: bool = True,
+        timestamp_mode: str = "relative",
+        read_mark: float = 0.0,
+        truncate: bool = False,
+        show_actions: bool = False,
+    ) -> Tuple[str, List[Tuple[str, DatabaseMessages]]]:
+        """等同于对 get_messages(limit) 调用 build_readable_messages_with_id，结果在本循环内缓存
+
+        同一循环内重复调用返回同一组消息ID，保证 planner 提示词与解析时使用的ID一致
+        """
+        key = ("with_id", limit, replace_bot_name, timestamp_mode, read_mark, truncate, show_actions)
+        if key in self._rendered:
+            self.render_hits += 1
+            readable, message_id_list = self._rendered[key]
+            return readable, list(message_id_list)
+
+        self.render_calls += 1
+        readable, message_id_list = build_readable_messages_with_id(
+            messages=self.get_messages(limit),
+            replace_bot_name=replace_bot_name,
+            timestamp_mode=timestamp_mode,
+            read_mark=read_mark,
+            truncate=truncate,
+            show_actions=show_actions,
+        )
+        self._rendered[key] = (readable, message_id_list)
+        return readable, list(message_id_list)
+
+    def get_recent_actions(self, seconds: float = 600, limit: int = 6) -> List[DatabaseActionRecords]:
+        """获取快照时间之前 seconds 秒内的动作记录，结果在本循环内缓存"""
+        key = (seconds, limit)
+        if key not in self._recent_actions:
+            self.db_queries += 1
+            self._recent_actions[key] = get_actions_by_timestamp_with_chat(
+                chat_id=self.chat_id,
+                timestamp_start=self.timestamp - seconds,
+                timestamp_end=self.timestamp,
+                limit=limit,
+            )
+        return list(self._recent_actions[key])
+
+    def get_person(self, platform: str, user_id: str) -> Person:
+        """获取发送者对应的 Person，同一循环内只构造一次"""
+        key = (platform, str(user_id))
+        if key not in self._persons:
+            self._persons[key] = Person(platform=platform, user_id=user_id)
+        return self._persons[key]
+
+    def stats_summary(self) -> str:
+        """返回本循环的数据库查询与渲染次数，用于日志"""
+        return f"上下文查询{self.db_queries}次, 渲染{self.render_calls}次(缓存命中{self.render_hits}次)"
@@ -0,0 +1,381 @@
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from peewee import chunked
+
+from src.common.database.database_model import EmbeddingCache
+from src.common.database.db_executor import db_executor, db_read
+from src.common.database.group_commit import SQLITE_MAX_VARIABLES, group_commit_writer
+from src.common.logger import get_logger
+from src.config.config import model_config
+from src.llm_models.utils_model import LLMRequest
+
+logger = get_logger("embedding")
+
+# 内存LRU缓存的最大条数（向量以float32保存，1024维约4KB一条）
+EMBEDDING_MEMORY_CACHE_SIZE = 4096
+# 单次 /embeddings 请求最多合并的文本数
+EMBEDDING_BATCH_SIZE = 32
+# 单条请求进入批次后最多等待多久（秒）再发出，用于收集同一时刻的其他请求
+EMBEDDING_BATCH_DELAY = 0.005
+# 批量获取时同时进行的请求数
+EMBEDDING_BULK_CONCURRENCY = 4
+# 数据库缓存表的最大条数，超出后按写入时间删除最旧的记录（1024维约4KB一条）
+EMBEDDING_DISK_CACHE_MAX_ROWS = 200_000
+# 每写入多少条新向量检查一次数据库缓存是否超出上限
+EMBEDDING_DISK_PRUNE_INTERVAL = 1000
+
+# (文本, 文本哈希)
+PendingText = Tuple[str, str]
+
+
+def get_text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _LoopState:
+    """单个事件循环上的合并与批处理状态（Future 与定时器只能在创建它们的事件循环中使用）"""
+
+    def __init__(self):
+        # 文本哈希 -> 正在进行的请求
+        self.inflight: Dict[str, asyncio.Future] = {}
+        # 请求类型 -> 等待凑批的文本
+        self.pending: Dict[str, List[PendingText]] = {}
+        self.flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+
+class EmbeddingService:
+    """
+    文本嵌入服务
+
+    - 按 (模型标识符, 文本哈希) 缓存结果：内存LRU + 数据库中的 embedding_cache 表（超出条数上限时淘汰最旧的记录）
+    - 相同文本的并发请求合并为一次
+    - 同一时刻的多条单文本请求由微批处理器合并为一次批量 /embeddings 请求
+    - 客户端由 client_registry 按事件循环复用，不再每次请求新建连接池
+    """
+
+    def __init__(self, memory_cache_size: int = EMBEDDING_MEMORY_CACHE_SIZE):
+        self.memory_cache_size = memory_cache_size
+        self._memory_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._loop_states: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState] = (
+            weakref.WeakKeyDictionary()
+        )
+        # 供同步代码使用的专用事件循环
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_loop_lock = threading.Lock()
+        # 距离上次检查数据库缓存上限后新写入的条数；初始即达到间隔，启动后的第一次写入就会检查一次
+        self._writes_since_prune = EMBEDDING_DISK_PRUNE_INTERVAL
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.api_texts = 0
+        self.api_batches = 0
+
+    @staticmethod
+    def _model_identifiers() -> List[str]:
+        """嵌入任务可能使用的模型标识符；以标识符而非模型名作为缓存键，更换模型后不会命中旧向量"""
+        return [
+            model_config.get_model_info(model_name).model_identifier
+            for model_name in model_config.model_task_config.embedding.model_list
+        ]
+
+    def _memory_get(self, text_hash: str, identifiers: List[str]) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            for identifier in identifiers:
+                key = f"{identifier}:{text_hash}"
+                if (vector := self._memory_cache.get(key)) is not None:
+                    self._memory_cache.move_to_end(key)
+                    return vector
+        return None
+
+    def _memory_put(self, key: str, vector: np.ndarray):
+        with self._cache_lock:
+            self._memory_cache[key] = vector
+            self._memory_cache.move_to_end(key)
+            while len(self._memory_cache) > self.memory_cache_size:
+                self._memory_cache.popitem(last=False)
+
+    @staticmethod
+    def _load_from_disk(text_hashes: List[str], identifiers: List[str]) -> Dict[str, Tuple[str, np.ndarray]]:
+        """从数据库缓存中查找，返回 文本哈希 -> (缓存键, 向量)"""
+        keys = {f"{identifier}:{text_hash}": text_hash for text_hash in text_hashes for identifier in identifiers}
+        found: Dict[str, Tuple[str, np.ndarray]] = {}
+        for key_chunk in chunked(list(keys), SQLITE_MAX_VARIABLES):
+            query = (
+                EmbeddingCache.select(EmbeddingCache.cache_key, EmbeddingCache.embedding)
+                .where(EmbeddingCache.cache_key.in_(key_chunk))
+                .tuples()
+            )
+            for cache_key, blob in query:
+                found.setdefault(keys[cache_key], (cache_key, np.frombuffer(blob, dtype=np.float32)))
+        return found
+
+    @staticmethod
+    def _prune_disk_cache(max_rows: int = EMBEDDING_DISK_CACHE_MAX_ROWS) -> int:
+        """删除数据库缓存中超出条数上限的最旧记录，返回删除的条数（在写线程中执行）"""
+        excess = EmbeddingCache.select().count() - max_rows
+        if excess <= 0:
+            return 0
+        oldest = EmbeddingCache.select(EmbeddingCache.id).order_by(EmbeddingCache.timestamp).limit(excess)
+        deleted = EmbeddingCache.delete().where(EmbeddingCache.id.in_(oldest)).execute()
+        logger.info(f"嵌入缓存超出 {max_rows} 条上限，已删除 {deleted} 条最旧的记录")
+        return deleted
+
+    def _note_disk_writes(self, count: int):
+        self._writes_since_prune += count
+        if self._writes_since_prune < EMBEDDING_DISK_PRUNE_INTERVAL:
+            return
+        self._writes_since_prune = 0
+        db_executor.submit_write(self._prune_disk_cache)
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None:
+            state = self._loop_states[loop] = _LoopState()
+        return state
+
+    async def embed(self, text: str, request_type: str = "embedding") -> Optional[List[float]]:
+        """
+        获取单条文本的嵌入向量
+
+        相同文本的并发请求只会请求一次；同一时刻的不同文本会被合并为一次批量请求。
+
+        Returns:
+            嵌入向量，失败时返回None
+        """
+        self.requests += 1
+        text_hash = get_text_hash(text)
+        if (vector := self._memory_get(text_hash, self._model_identifiers())) is not None:
+            self.cache_hits += 1
+            return vector.tolist()
+
+        state = self._loop_state()
+        future = state.inflight.get(text_hash)
+        if future is None:
+            future = self._enqueue(state, text, text_hash, request_type)
+        # 多个调用方共享同一个Future，某个调用方被取消时不影响其他调用方
+        vector = await asyncio.shield(future)
+        return None if vector is None else vector.tolist()
+
+    def _enqueue(self, state: _LoopState, text: str, text_hash: str, request_type: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state.inflight[text_hash] = future
+        pending = state.pending.setdefault(request_type, [])
+        pending.append((text, text_hash))
+        if len(pending) >= EMBEDDING_BATCH_SIZE:
+            self._flush(state, request_type)
+        elif len(pending) == 1:
+            state.flush_handles[request_type] = loop.call_later(EMBEDDING_BATCH_DELAY, self._flush, state, request_type)
+        return future
+
+    def _flush(self, state: _LoopState, request_type: str):
+        if handle := state.flush_handles.pop(request_type, None):
+            handle.cancel()
+        batch = state.pending.pop(request_type, None)
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run_batch(state, batch, request_type))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+
+    async def _run_batch(
+        self,
+        state: _LoopState,
+        batch: List[PendingText],
+        request_type: str,
+    ):
+        """获取一批文本的嵌入，并把结果交给等待这些文本的Future"""
+        vectors: Dict[str, Optional[np.ndarray]] = {}
+        try:
+            vectors = await self._resolve(batch, request_type, use_cache=True)
+        except Exception as e:
+            logger.error(f"获取 {len(batch)} 条文本的嵌入失败: {e}")
+        finally:
+            for _, text_hash in batch:
+                future = state.inflight.pop(text_hash, None)
+                if future is not None and not future.done():
+                    future.set_result(vectors.get(text_hash))
+
+    async def _resolve(
+        self, batch: List[PendingText], request_type: str, use_cache: bool
+    ) -> Dict[str, Optional[np.ndarray]]:
+        vectors: Dict[str, Optional[np.ndarray]] = {}
+        missing = batch
+        if use_cache:
+            found = await db_read(
+                self._load_from_disk, [text_hash for _, text_hash in batch], self._model_identifiers()
+            )
+            for text_hash, (cache_key, vector) in found.items():
+                vectors[text_hash] = vector
+                self._memory_put(cache_key, vector)
+            self.cache_hits += len(found)
+            missing = [item for item in batch if item[1] not in found]
+        if not missing:
+            return vectors
+
+        texts = [text for text, _ in missing]
+        llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type=request_type)
+        try:
+            embeddings, model_name = await llm.get_embeddings(texts)
+            results: List[Tuple[Optional[List[float]], Optional[str]]] = [
+                (embedding, model_name) for embedding in embeddings
+            ]
+            self.api_batches += 1
+        except Exception as e:
+            # 部分提供商不支持批量输入，退回逐条请求
+            logger.warning(f"批量获取 {len(texts)} 条嵌入失败，改为逐条请求: {e}")
+            results = await asyncio.gather(*(self._embed_single(llm, text) for text in texts))
+            self.api_batches += len(texts)
+        self.api_texts += len(texts)
+
+        now = time.time()
+        written = 0
+        for (_, text_hash), (embedding, model_name) in zip(missing, results, strict=True):
+            if not embedding or model_name is None:
+                vectors[text_hash] = None
+                continue
+            vector = np.asarray(embedding, dtype=np.float32)
+            vectors[text_hash] = vector
+            if use_cache:
+                cache_key = f"{model_config.get_model_info(model_name).model_identifier}:{text_hash}"
+                self._memory_put(cache_key, vector)
+                group_commit_writer.add(
+                    EmbeddingCache,
+                    {"cache_key": cache_key, "model_name": model_name, "embedding": vector.tobytes(), "timestamp": now},
+                    key_field="cache_key",
+                )
+                written += 1
+        if written:
+            self._note_disk_writes(written)
+        return vectors
+
+    @staticmethod
+    async def _embed_single(llm: LLMRequest, text: str) -> Tuple[Optional[List[float]], Optional[str]]:
+        try:
+            return await llm.get_embedding(text)
+        except Exception as e:
+            logger.error(f"获取embedding失败: {text[:50]}, 错误: {e}")
+            return None, None
+
+    async def embed_many(
+        self,
+        texts: List[str],
+        request_type: str = "embedding",
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_BULK_CONCURRENCY,
+        use_cache: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ) -> List[Optional[List[float]]]:
+        """
+        批量获取嵌入向量
+
+        Args:
+            texts: 文本列表
+            request_type: 请求类型
+            batch_size: 单次请求提交的文本数
+            max_concurrency: 同时进行的请求数
+            use_cache: 是否读写缓存；校验模型一致性时应关闭
+            progress_callback: 进度回调，参数为新完成的文本条数
+        Returns:
+            与输入顺序一致的嵌入向量列表，失败的位置为None
+        """
+        state = self._loop_state()
+        identifiers = self._model_identifiers() if use_cache else []
+        text_hashes = [get_text_hash(text) for text in texts]
+        occurrences = Counter(text_hashes)
+        vectors: Dict[str, Optional[np.ndarray]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        todo: List[PendingText] = []
+        self.requests += len(texts)
+
+        for text, text_hash in zip(texts, text_hashes, strict=True):
+            if text_hash in vectors or text_hash in waiting:
+                continue
+            if use_cache and (vector := self._memory_get(text_hash, identifiers)) is not None:
+                vectors[text_hash] = vector
+                self.cache_hits += 1
+            elif use_cache and text_hash in state.inflight:
+                waiting[text_hash] = state.inflight[text_hash]
+            else:
+                waiting[text_hash] = asyncio.get_running_loop().create_future()
+                if use_cache:
+                    # 登记为进行中，使同时到来的单条请求可以复用结果
+                    state.inflight[text_hash] = waiting[text_hash]
+                todo.append((text, text_hash))
+
+        if progress_callback and vectors:
+            progress_callback(sum(occurrences[text_hash] for text_hash in vectors))
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_chunk(chunk: List[PendingText]):
+            async with semaphore:
+                if use_cache:
+                    await self._run_batch(state, chunk, request_type)
+                    return
+                # 不使用缓存时不登记为进行中，直接把结果交给本次调用的Future
+                chunk_vectors: Dict[str, Optional[np.ndarray]] = {}
+                try:
+                    chunk_vectors = await self._resolve(chunk, request_type, use_cache=False)
+                except Exception as e:
+                    logger.error(f"获取 {len(chunk)} 条文本的嵌入失败: {e}")
+                finally:
+                    for _, text_hash in chunk:
+                        if not waiting[text_hash].done():
+                            waiting[text_hash].set_result(chunk_vectors.get(text_hash))
+
+        async def wait_one(text_hash: str):
+            vectors[text_hash] = await asyncio.shield(waiting[text_hash])
+            if progress_callback:
+                progress_callback(occurrences[text_hash])
+
+        await asyncio.gather(
+            *(run_chunk(todo[i : i + batch_size]) for i in range(0, len(todo), max(1, batch_size))),
+            *(wait_one(text_hash) for text_hash in waiting),
+        )
+
+        return [None if (vector := vectors.get(text_hash)) is None else vector.tolist() for text_hash in text_hashes]
+
+    def _get_sync_loop(self) -> asyncio.AbstractEventLoop:
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="embedding-loop", daemon=True).start()
+                self._sync_loop = loop
+            return self._sync_loop
+
+    def embed_many_sync(self, texts: List[str], **kwargs) -> List[Optional[List[float]]]:
+        """
+        在同步代码中批量获取嵌入向量（供知识库导入等使用），参数同 embed_many
+
+        请求在嵌入服务专用的常驻事件循环线程中执行，客户端与连接池可以跨调用复用，
+        不必为每条文本创建新的事件循环。不能在该线程内部调用。
+        """
+        future = asyncio.run_coroutine_threadsafe(self.embed_many(texts, **kwargs), self._get_sync_loop())
+        return future.result()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存命中与批处理统计"""
+        with self._cache_lock:
+            memory_size = len(self._memory_cache)
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "api_texts": self.api_texts,
+            "api_batches": self.api_batches,
+            "memory_cache_size": memory_size,
+        }
+
+
+embedding_service = EmbeddingService()
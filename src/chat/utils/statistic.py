@@ -7,7 +7,8 @@ from typing import Any, Dict, Tuple, List
 
 from src.common.logger import get_logger
 from src.common.database.database import db
-from src.common.database.database_model import OnlineTime, LLMUsage, Messages
+from src.common.database.database_model import OnlineTime
+from src.chat.utils.statistic_rollup import statistic_rollup
 from src.manager.async_task_manager import AsyncTask
 from src.manager.local_store_manager import local_storage
 
@@ -52,6 +53,46 @@ ONLINE_TIME = "online_time"
 TOTAL_MSG_CNT = "total_messages"
 MSG_CNT_BY_CHAT = "messages_by_chat"
 
+# 各分类对应的统计键：(请求数, 输入token, 输出token, 总token, 花费, 平均耗时, 耗时标准差)
+_LLM_CATEGORY_KEYS = {
+    "type": (
+        REQ_CNT_BY_TYPE,
+        IN_TOK_BY_TYPE,
+        OUT_TOK_BY_TYPE,
+        TOTAL_TOK_BY_TYPE,
+        COST_BY_TYPE,
+        AVG_TIME_COST_BY_TYPE,
+        STD_TIME_COST_BY_TYPE,
+    ),
+    "user": (
+        REQ_CNT_BY_USER,
+        IN_TOK_BY_USER,
+        OUT_TOK_BY_USER,
+        TOTAL_TOK_BY_USER,
+        COST_BY_USER,
+        AVG_TIME_COST_BY_USER,
+        STD_TIME_COST_BY_USER,
+    ),
+    "model": (
+        REQ_CNT_BY_MODEL,
+        IN_TOK_BY_MODEL,
+        OUT_TOK_BY_MODEL,
+        TOTAL_TOK_BY_MODEL,
+        COST_BY_MODEL,
+        AVG_TIME_COST_BY_MODEL,
+        STD_TIME_COST_BY_MODEL,
+    ),
+    "module": (
+        REQ_CNT_BY_MODULE,
+        IN_TOK_BY_MODULE,
+        OUT_TOK_BY_MODULE,
+        TOTAL_TOK_BY_MODULE,
+        COST_BY_MODULE,
+        AVG_TIME_COST_BY_MODULE,
+        STD_TIME_COST_BY_MODULE,
+    ),
+}
+
 
 class OnlineTimeRecordTask(AsyncTask):
     """在线时间记录任务"""
@@ -192,6 +233,7 @@ class StatisticOutputTask(AsyncTask):
             self._format_model_classified_stat(stats["last_hour"]),
             "",
             self._format_chat_stat(stats["last_hour"]),
+            self._format_cache_stat(),
             self.SEP_LINE,
             "",
         ]
@@ -306,10 +348,6 @@ class StatisticOutputTask(AsyncTask):
                 COST_BY_USER: defaultdict(float),
                 COST_BY_MODEL: defaultdict(float),
                 COST_BY_MODULE: defaultdict(float),
-                TIME_COST_BY_TYPE: defaultdict(list),
-                TIME_COST_BY_USER: defaultdict(list),
-                TIME_COST_BY_MODEL: defaultdict(list),
-                TIME_COST_BY_MODULE: defaultdict(list),
                 AVG_TIME_COST_BY_TYPE: defaultdict(float),
                 AVG_TIME_COST_BY_USER: defaultdict(float),
                 AVG_TIME_COST_BY_MODEL: defaultdict(float),
@@ -322,87 +360,62 @@ class StatisticOutputTask(AsyncTask):
             for period_key, _ in collect_period
         }
 
-        # 以最早的时间戳为起始时间获取记录
-        # Assuming LLMUsage.timestamp is a DateTimeField
-        query_start_time = collect_period[-1][1]
-        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time):  # type: ignore
-            record_timestamp = record.timestamp  # This is already a datetime object
-            for idx, (_, period_start) in enumerate(collect_period):
-                if record_timestamp >= period_start:
-                    for period_key, _ in collect_period[idx:]:
-                        stats[period_key][TOTAL_REQ_CNT] += 1
-
-                        request_type = record.request_type or "unknown"
-                        user_id = record.user_id or "unknown"  # user_id is TextField, already string
-                        model_name = record.model_name or "unknown"
-
-                        # 提取模块名：如果请求类型包含"."，取第一个"."之前的部分
-                        module_name = request_type.split(".")[0] if "." in request_type else request_type
-
-                        stats[period_key][REQ_CNT_BY_TYPE][request_type] += 1
-                        stats[period_key][REQ_CNT_BY_USER][user_id] += 1
-                        stats[period_key][REQ_CNT_BY_MODEL][model_name] += 1
-                        stats[period_key][REQ_CNT_BY_MODULE][module_name] += 1
-
-                        prompt_tokens = record.prompt_tokens or 0
-                        completion_tokens = record.completion_tokens or 0
-                        total_tokens = prompt_tokens + completion_tokens
-
-                        stats[period_key][IN_TOK_BY_TYPE][request_type] += prompt_tokens
-                        stats[period_key][IN_TOK_BY_USER][user_id] += prompt_tokens
-                        stats[period_key][IN_TOK_BY_MODEL][model_name] += prompt_tokens
-                        stats[period_key][IN_TOK_BY_MODULE][module_name] += prompt_tokens
-
-                        stats[period_key][OUT_TOK_BY_TYPE][request_type] += completion_tokens
-                        stats[period_key][OUT_TOK_BY_USER][user_id] += completion_tokens
-                        stats[period_key][OUT_TOK_BY_MODEL][model_name] += completion_tokens
-                        stats[period_key][OUT_TOK_BY_MODULE][module_name] += completion_tokens
-
-                        stats[period_key][TOTAL_TOK_BY_TYPE][request_type] += total_tokens
-                        stats[period_key][TOTAL_TOK_BY_USER][user_id] += total_tokens
-                        stats[period_key][TOTAL_TOK_BY_MODEL][model_name] += total_tokens
-                        stats[period_key][TOTAL_TOK_BY_MODULE][module_name] += total_tokens
-
-                        cost = record.cost or 0.0
-                        stats[period_key][TOTAL_COST] += cost
-                        stats[period_key][COST_BY_TYPE][request_type] += cost
-                        stats[period_key][COST_BY_USER][user_id] += cost
-                        stats[period_key][COST_BY_MODEL][model_name] += cost
-                        stats[period_key][COST_BY_MODULE][module_name] += cost
-
-                        # 收集time_cost数据
-                        time_cost = record.time_cost or 0.0
-                        if time_cost > 0:  # 只记录有效的time_cost
-                            stats[period_key][TIME_COST_BY_TYPE][request_type].append(time_cost)
-                            stats[period_key][TIME_COST_BY_USER][user_id].append(time_cost)
-                            stats[period_key][TIME_COST_BY_MODEL][model_name].append(time_cost)
-                            stats[period_key][TIME_COST_BY_MODULE][module_name].append(time_cost)
-                    break
-
-        # 计算平均耗时和标准差
-        for period_key in stats:
-            for category in [REQ_CNT_BY_TYPE, REQ_CNT_BY_USER, REQ_CNT_BY_MODEL, REQ_CNT_BY_MODULE]:
-                time_cost_key = f"time_costs_by_{category.split('_')[-1]}"
-                avg_key = f"avg_time_costs_by_{category.split('_')[-1]}"
-                std_key = f"std_time_costs_by_{category.split('_')[-1]}"
-
-                for item_name in stats[period_key][category]:
-                    time_costs = stats[period_key][time_cost_key].get(item_name, [])
-                    if time_costs:
-                        # 计算平均耗时
-                        avg_time_cost = sum(time_costs) / len(time_costs)
-                        stats[period_key][avg_key][item_name] = round(avg_time_cost, 3)
-
-                        # 计算标准差
-                        if len(time_costs) > 1:
-                            variance = sum((x - avg_time_cost) ** 2 for x in time_costs) / len(time_costs)
-                            std_time_cost = variance**0.5
-                            stats[period_key][std_key][item_name] = round(std_time_cost, 3)
-                        else:
-                            stats[period_key][std_key][item_name] = 0.0
+        # 每个时间段分别读取汇总表；耗时只需有效个数、和与平方和即可得到平均值与标准差
+        for period_key, period_start in collect_period:
+            period_stats = stats[period_key]
+            time_cost_moments = {category: defaultdict(lambda: [0, 0.0, 0.0]) for category in _LLM_CATEGORY_KEYS}
+
+            for (
+                request_type,
+                user_id,
+                model_name,
+                count,
+                prompt_tokens,
+                completion_tokens,
+                cost,
+                time_cost_count,
+                time_cost_sum,
+                time_cost_sq_sum,
+            ) in statistic_rollup.query_llm_usage(period_start):
+                request_type = request_type or "unknown"
+                user_id = user_id or "unknown"
+                model_name = model_name or "unknown"
+                # 提取模块名：如果请求类型包含"."，取第一个"."之前的部分
+                module_name = request_type.split(".")[0] if "." in request_type else request_type
+                total_tokens = prompt_tokens + completion_tokens
+
+                period_stats[TOTAL_REQ_CNT] += count
+                period_stats[TOTAL_COST] += cost
+                for category, item_name in (
+                    ("type", request_type),
+                    ("user", user_id),
+                    ("model", model_name),
+                    ("module", module_name),
+                ):
+                    req_key, in_key, out_key, tok_key, cost_key, _, _ = _LLM_CATEGORY_KEYS[category]
+                    period_stats[req_key][item_name] += count
+                    period_stats[in_key][item_name] += prompt_tokens
+                    period_stats[out_key][item_name] += completion_tokens
+                    period_stats[tok_key][item_name] += total_tokens
+                    period_stats[cost_key][item_name] += cost
+
+                    moments = time_cost_moments[category][item_name]
+                    moments[0] += time_cost_count
+                    moments[1] += time_cost_sum
+                    moments[2] += time_cost_sq_sum
+
+            # 计算平均耗时和标准差
+            for category, (req_key, _, _, _, _, avg_key, std_key) in _LLM_CATEGORY_KEYS.items():
+                for item_name in period_stats[req_key]:
+                    n, total, sq_total = time_cost_moments[category][item_name]
+                    if n:
+                        avg_time_cost = total / n
+                        period_stats[avg_key][item_name] = round(avg_time_cost, 3)
+                        variance = max(sq_total / n - avg_time_cost**2, 0.0) if n > 1 else 0.0
+                        period_stats[std_key][item_name] = round(variance**0.5, 3)
                     else:
-                        stats[period_key][avg_key][item_name] = 0.0
-                        stats[period_key][std_key][item_name] = 0.0
+                        period_stats[avg_key][item_name] = 0.0
+                        period_stats[std_key][item_name] = 0.0
 
         return stats
 
@@ -466,44 +479,17 @@ class StatisticOutputTask(AsyncTask):
             for period_key, _ in collect_period
         }
 
-        query_start_timestamp = collect_period[-1][1].timestamp()  # Messages.time is a DoubleField (timestamp)
-        for message in Messages.select().where(Messages.time >= query_start_timestamp):  # type: ignore
-            message_time_ts = message.time  # This is a float timestamp
-
-            chat_id = None
-            chat_name = None
-
-            # Logic based on Peewee model structure, aiming to replicate original intent
-            if message.chat_info_group_id:
-                chat_id = f"g{message.chat_info_group_id}"
-                chat_name = message.chat_info_group_name or f"群{message.chat_info_group_id}"
-            elif message.user_id:  # Fallback to sender's info for chat_id if not a group_info based chat
-                # This uses the message SENDER's ID as per original logic's fallback
-                chat_id = f"u{message.user_id}"  # SENDER's user_id
-                chat_name = message.user_nickname  # SENDER's nickname
-            else:
-                # If neither group_id nor sender_id is available for chat identification
-                logger.warning(
-                    f"Message (PK: {message.id if hasattr(message, 'id') else 'N/A'}) lacks group_id and user_id for chat stats."
-                )
-                continue
-
-            if not chat_id:  # Should not happen if above logic is correct
-                continue
-
-            # Update name_mapping
-            if chat_id in self.name_mapping:
-                if chat_name != self.name_mapping[chat_id][0] and message_time_ts > self.name_mapping[chat_id][1]:
-                    self.name_mapping[chat_id] = (chat_name, message_time_ts)
-            else:
-                self.name_mapping[chat_id] = (chat_name, message_time_ts)
+        for period_key, period_start in collect_period:
+            for chat_id, chat_name, count, last_message_time in statistic_rollup.query_messages(period_start):
+                # 更新名称映射，保留最新消息对应的名称
+                if chat_id in self.name_mapping:
+                    if chat_name != self.name_mapping[chat_id][0] and last_message_time > self.name_mapping[chat_id][1]:
+                        self.name_mapping[chat_id] = (chat_name, last_message_time)
+                else:
+                    self.name_mapping[chat_id] = (chat_name, last_message_time)
 
-            for idx, (_, period_start_dt) in enumerate(collect_period):
-                if message_time_ts >= period_start_dt.timestamp():
-                    for period_key, _ in collect_period[idx:]:
-                        stats[period_key][TOTAL_MSG_CNT] += 1
-                        stats[period_key][MSG_CNT_BY_CHAT][chat_id] += 1
-                    break
+                stats[period_key][TOTAL_MSG_CNT] += count
+                stats[period_key][MSG_CNT_BY_CHAT][chat_id] += count
         return stats
 
     def _collect_all_statistics(self, now: datetime) -> Dict[str, Dict[str, Any]]:
@@ -512,6 +498,9 @@ class StatisticOutputTask(AsyncTask):
         :param now: 基准当前时间
         """
 
+        # 先把新增的记录汇总进汇总表，之后的统计与图表只读取汇总表
+        statistic_rollup.catch_up()
+
         last_all_time_stat = None
 
         if "last_full_statistics" in local_storage:
@@ -658,6 +647,19 @@ class StatisticOutputTask(AsyncTask):
         output.append("")
         return "\n".join(output)
 
+    @staticmethod
+    def _format_cache_stat() -> str:
+        """
+        格式化自启动以来的缓存命中统计
+        """
+        from src.person_info.person_info import person_info_manager
+
+        person_cache = person_info_manager.get_person_cache_stats()
+        return (
+            f"用户信息缓存: 命中率 {person_cache['hit_rate']:.1%}（命中 {person_cache['hits']} 次，"
+            f"未命中 {person_cache['misses']} 次，当前缓存 {person_cache['size']} 人）\n"
+        )
+
     def _get_chat_display_name_from_id(self, chat_id: str) -> str:
         """从chat_id获取显示名称"""
         try:
@@ -1200,8 +1202,8 @@ class StatisticOutputTask(AsyncTask):
 
     def _collect_interval_data(self, now: datetime, hours: int, interval_minutes: int) -> dict:
         """收集指定时间范围内每个间隔的数据"""
-        # 生成时间点
-        start_time = now - timedelta(hours=hours)
+        # 生成时间点，起点按分钟取整以便直接使用分钟级汇总
+        start_time = (now - timedelta(hours=hours)).replace(second=0, microsecond=0)
         time_points = []
         current_time = start_time
 
@@ -1218,59 +1220,47 @@ class StatisticOutputTask(AsyncTask):
 
         interval_seconds = interval_minutes * 60
 
-        # 查询LLM使用记录
-        query_start_time = start_time
-        for record in LLMUsage.select().where(LLMUsage.timestamp >= query_start_time):  # type: ignore
-            record_time = record.timestamp
-
+        # 查询LLM使用记录（分钟级汇总）
+        for bucket, model_name, request_type, cost in statistic_rollup.query_llm_cost_by_minute(start_time):
             # 找到对应的时间间隔索引
-            time_diff = (record_time - start_time).total_seconds()
+            time_diff = (bucket - start_time).total_seconds()
             interval_index = int(time_diff // interval_seconds)
 
             if 0 <= interval_index < len(time_points):
                 # 累加总花费数据
-                cost = record.cost or 0.0
+                cost = cost or 0.0
                 total_cost_data[interval_index] += cost  # type: ignore
 
                 # 累加按模型分类的花费
-                model_name = record.model_name or "unknown"
+                model_name = model_name or "unknown"
                 if model_name not in cost_by_model:
                     cost_by_model[model_name] = [0] * len(time_points)
                 cost_by_model[model_name][interval_index] += cost
 
                 # 累加按模块分类的花费
-                request_type = record.request_type or "unknown"
+                request_type = request_type or "unknown"
                 module_name = request_type.split(".")[0] if "." in request_type else request_type
                 if module_name not in cost_by_module:
                     cost_by_module[module_name] = [0] * len(time_points)
                 cost_by_module[module_name][interval_index] += cost
 
-        # 查询消息记录
-        query_start_timestamp = start_time.timestamp()
-        for message in Messages.select().where(Messages.time >= query_start_timestamp):  # type: ignore
-            message_time_ts = message.time
-
+        # 查询消息记录（分钟级汇总）
+        for bucket, chat_key, chat_name, count in statistic_rollup.query_messages_by_minute(start_time):
             # 找到对应的时间间隔索引
-            time_diff = message_time_ts - query_start_timestamp
+            time_diff = (bucket - start_time).total_seconds()
             interval_index = int(time_diff // interval_seconds)
 
             if 0 <= interval_index < len(time_points):
-                # 确定聊天流名称
-                chat_name = None
-                if message.chat_info_group_id:
-                    chat_name = message.chat_info_group_name or f"群{message.chat_info_group_id}"
-                elif message.user_id:
-                    chat_name = message.user_nickname or f"用户{message.user_id}"
-                else:
-                    continue
-
+                # 确定聊天流名称，私聊没有昵称时使用用户ID
+                if not chat_key.startswith("g"):
+                    chat_name = chat_name or f"用户{chat_key[1:]}"
                 if not chat_name:
                     continue
 
                 # 累加消息数
                 if chat_name not in message_by_chat:
                     message_by_chat[chat_name] = [0] * len(time_points)
-                message_by_chat[chat_name][interval_index] += 1
+                message_by_chat[chat_name][interval_index] += count
 
         return {
             "time_labels": time_labels,
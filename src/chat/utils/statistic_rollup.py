@@ -0,0 +1,330 @@
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple, Type
+
+from peewee import Case, Model, Value, fn
+
+from src.common.logger import get_logger
+from src.common.database.database import db
+from src.common.database.database_model import (
+    LLMUsage,
+    Messages,
+    LLMUsageRollupBase,
+    LLMUsageMinuteRollup,
+    LLMUsageHourRollup,
+    MessageRollupBase,
+    MessageMinuteRollup,
+    MessageHourRollup,
+    StatisticRollupCursor,
+)
+from src.common.database.db_executor import db_executor
+from src.common.database.group_commit import group_commit_writer
+
+logger = get_logger("statistic_rollup")
+
+# 每个事务最多汇总多少个 id，避免长时间占用写锁
+ROLLUP_CATCH_UP_CHUNK = 50000
+# 分钟级汇总只保留这么久，更早的时间段使用小时级汇总
+MINUTE_ROLLUP_RETENTION = timedelta(days=8)
+
+MINUTE_BUCKET_FORMAT = "%Y-%m-%d %H:%M:00"
+HOUR_BUCKET_FORMAT = "%Y-%m-%d %H:00:00"
+
+# (request_type, user_id, model_name, 请求数, 输入token, 输出token, 花费, 有效耗时个数, 耗时和, 耗时平方和)
+LLMUsageRow = Tuple[Optional[str], Optional[str], Optional[str], int, int, int, float, int, float, float]
+# (chat_key, chat_name, 消息数, 最后一条消息时间)
+MessageRow = Tuple[str, Optional[str], int, float]
+
+
+def _floor_minute(t: datetime) -> datetime:
+    return t.replace(second=0, microsecond=0)
+
+
+def _ceil_minute(t: datetime) -> datetime:
+    floor = _floor_minute(t)
+    return floor if floor == t else floor + timedelta(minutes=1)
+
+
+def _ceil_hour(t: datetime) -> datetime:
+    floor = t.replace(minute=0, second=0, microsecond=0)
+    return floor if floor == t else floor + timedelta(hours=1)
+
+
+class StatisticRollup:
+    """
+    统计汇总表的维护与查询
+
+    llm_usage 与 messages 按自增 id 游标增量汇总到分钟级、小时级两张汇总表，
+    游标与汇总在同一个事务中更新，首次运行（游标为 0）即为对历史数据的回填。
+
+    查询 [start, 现在] 的统计时把区间拆成三段，结果与直接扫描原始记录一致：
+    - [start, 下一整分钟) 直接聚合原始记录
+    - [下一整分钟, 下一整点) 读取分钟级汇总
+    - [下一整点, 现在] 读取小时级汇总
+    """
+
+    def catch_up(self):
+        """把源表中尚未汇总的记录汇总进汇总表，并清理过期的分钟级汇总"""
+        group_commit_writer.flush(LLMUsage)
+        group_commit_writer.flush(Messages)
+        self._catch_up_source(LLMUsage, self._rollup_llm_usage)
+        self._catch_up_source(Messages, self._rollup_messages)
+        self._run_on_writer(self._prune_minute_rollups)
+
+    # -- 增量汇总 --
+
+    @staticmethod
+    def _run_on_writer(func: Callable, *args):
+        """在数据库写线程上执行，避免与聊天写入争抢写锁；执行器已关闭时直接执行"""
+        if db_executor.in_writer_thread():
+            return func(*args)
+        future = db_executor.submit_write(func, *args)
+        return func(*args) if future is None else future.result()
+
+    def _catch_up_source(self, source: Type[Model], rollup: Callable[[int, int, datetime], None]):
+        table_name = source._meta.table_name
+        max_id = source.select(fn.MAX(source.id)).scalar() or 0
+        cursor = StatisticRollupCursor.get_or_none(StatisticRollupCursor.source == table_name)
+        last_id = cursor.last_id if cursor else 0
+        if last_id >= max_id:
+            return
+        if last_id == 0:
+            logger.info(f"正在从 {table_name} 回填统计汇总表，共约 {max_id} 条记录...")
+        while last_id < max_id:
+            last_id = self._run_on_writer(self._apply_chunk, table_name, rollup, max_id)
+        logger.debug(f"{table_name} 已汇总至 id {last_id}")
+
+    @staticmethod
+    def _apply_chunk(table_name: str, rollup: Callable[[int, int, datetime], None], max_id: int) -> int:
+        """在一个事务内汇总下一段 id 并推进游标，返回新的游标位置"""
+        minute_cutoff = _floor_minute(datetime.now() - MINUTE_ROLLUP_RETENTION)
+        with db.atomic():
+            # 游标在事务内重新读取，保证同一段记录不会被重复汇总
+            cursor = StatisticRollupCursor.get_or_none(StatisticRollupCursor.source == table_name)
+            low = cursor.last_id if cursor else 0
+            high = min(low + ROLLUP_CATCH_UP_CHUNK, max_id)
+            if high <= low:
+                return low
+            rollup(low, high, minute_cutoff)
+            StatisticRollupCursor.insert(source=table_name, last_id=high).on_conflict(
+                conflict_target=[StatisticRollupCursor.source],
+                update={StatisticRollupCursor.last_id: high},
+            ).execute()
+        return high
+
+    @staticmethod
+    def _rollup_llm_usage(low: int, high: int, minute_cutoff: datetime):
+        source = LLMUsage._meta.table_name
+        for model, bucket_format in (
+            (LLMUsageMinuteRollup, MINUTE_BUCKET_FORMAT),
+            (LLMUsageHourRollup, HOUR_BUCKET_FORMAT),
+        ):
+            minute_filter = "AND timestamp >= ?" if model is LLMUsageMinuteRollup else ""
+            params = [bucket_format, low, high] + ([str(minute_cutoff)] if minute_filter else [])
+            db.execute_sql(
+                f"""
+                INSERT INTO {model._meta.table_name} (
+                    bucket, model_name, model_api_provider, request_type, user_id, request_count,
+                    prompt_tokens, completion_tokens, cost, time_cost_count, time_cost_sum, time_cost_sq_sum
+                )
+                SELECT
+                    strftime(?, timestamp),
+                    COALESCE(model_name, ''),
+                    COALESCE(model_api_provider, ''),
+                    COALESCE(request_type, ''),
+                    COALESCE(user_id, ''),
+                    COUNT(*),
+                    TOTAL(prompt_tokens),
+                    TOTAL(completion_tokens),
+                    TOTAL(cost),
+                    TOTAL(CASE WHEN time_cost > 0 THEN 1 ELSE 0 END),
+                    TOTAL(CASE WHEN time_cost > 0 THEN time_cost ELSE 0 END),
+                    TOTAL(CASE WHEN time_cost > 0 THEN time_cost * time_cost ELSE 0 END)
+                FROM {source}
+                WHERE id > ? AND id <= ? {minute_filter}
+                GROUP BY 1, 2, 3, 4, 5
+                ON CONFLICT (bucket, model_name, model_api_provider, request_type, user_id) DO UPDATE SET
+                    request_count = request_count + excluded.request_count,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    cost = cost + excluded.cost,
+                    time_cost_count = time_cost_count + excluded.time_cost_count,
+                    time_cost_sum = time_cost_sum + excluded.time_cost_sum,
+                    time_cost_sq_sum = time_cost_sq_sum + excluded.time_cost_sq_sum
+                """,
+                params,
+            )
+
+    @staticmethod
+    def _rollup_messages(low: int, high: int, minute_cutoff: datetime):
+        source = Messages._meta.table_name
+        # 与原先的逐条统计一致：有群号按群聊统计，否则按发送者统计，两者都没有的消息跳过
+        is_group = "(chat_info_group_id IS NOT NULL AND chat_info_group_id != '')"
+        for model, bucket_format in (
+            (MessageMinuteRollup, MINUTE_BUCKET_FORMAT),
+            (MessageHourRollup, HOUR_BUCKET_FORMAT),
+        ):
+            minute_filter = "AND time >= ?" if model is MessageMinuteRollup else ""
+            params = [bucket_format, low, high] + ([minute_cutoff.timestamp()] if minute_filter else [])
+            db.execute_sql(
+                f"""
+                INSERT INTO {model._meta.table_name} (bucket, chat_key, chat_name, message_count, last_time)
+                SELECT
+                    strftime(?, time, 'unixepoch', 'localtime'),
+                    CASE WHEN {is_group} THEN 'g' || chat_info_group_id ELSE 'u' || user_id END,
+                    CASE WHEN {is_group} THEN COALESCE(NULLIF(chat_info_group_name, ''), '群' || chat_info_group_id)
+                         ELSE COALESCE(user_nickname, '') END,
+                    COUNT(*),
+                    MAX(time)
+                FROM {source}
+                WHERE id > ? AND id <= ? {minute_filter}
+                    AND ({is_group} OR (user_id IS NOT NULL AND user_id != ''))
+                GROUP BY 1, 2, 3
+                ON CONFLICT (bucket, chat_key, chat_name) DO UPDATE SET
+                    message_count = message_count + excluded.message_count,
+                    last_time = MAX(last_time, excluded.last_time)
+                """,
+                params,
+            )
+
+    @staticmethod
+    def _prune_minute_rollups():
+        cutoff = _floor_minute(datetime.now() - MINUTE_ROLLUP_RETENTION)
+        LLMUsageMinuteRollup.delete().where(LLMUsageMinuteRollup.bucket < cutoff).execute()
+        MessageMinuteRollup.delete().where(MessageMinuteRollup.bucket < cutoff).execute()
+
+    # -- 查询 --
+
+    @staticmethod
+    def _split(start: datetime) -> Tuple[datetime, datetime]:
+        """返回 (原始记录段的结束, 分钟级汇总段的结束)"""
+        minute_end = _ceil_hour(start)
+        raw_end = _ceil_minute(start)
+        # 分钟级汇总已被清理的时间段，直接读取不足一小时的原始记录
+        if raw_end < datetime.now() - MINUTE_ROLLUP_RETENTION + timedelta(hours=1):
+            raw_end = minute_end
+        return raw_end, minute_end
+
+    def query_llm_usage(self, start: datetime) -> List[LLMUsageRow]:
+        """获取 start 之后的 LLM 使用统计，按 (request_type, user_id, model_name) 分组，同一分组可能出现多行"""
+        raw_end, minute_end = self._split(start)
+        rows: List[LLMUsageRow] = []
+
+        valid = LLMUsage.time_cost > 0
+        rows.extend(
+            LLMUsage.select(
+                LLMUsage.request_type,
+                LLMUsage.user_id,
+                LLMUsage.model_name,
+                fn.COUNT(LLMUsage.id),
+                fn.TOTAL(LLMUsage.prompt_tokens),
+                fn.TOTAL(LLMUsage.completion_tokens),
+                fn.TOTAL(LLMUsage.cost),
+                fn.TOTAL(Case(None, [(valid, 1)], 0)),
+                fn.TOTAL(Case(None, [(valid, LLMUsage.time_cost)], 0)),
+                fn.TOTAL(Case(None, [(valid, LLMUsage.time_cost * LLMUsage.time_cost)], 0)),
+            )
+            .where((LLMUsage.timestamp >= start) & (LLMUsage.timestamp < raw_end))
+            .group_by(LLMUsage.request_type, LLMUsage.user_id, LLMUsage.model_name)
+            .tuples()
+        )
+        rows.extend(self._query_llm_rollup(LLMUsageMinuteRollup, raw_end, minute_end))
+        rows.extend(self._query_llm_rollup(LLMUsageHourRollup, minute_end, None))
+        return [
+            (row[0], row[1], row[2], int(row[3]), int(row[4]), int(row[5]), row[6], int(row[7]), row[8], row[9])
+            for row in rows
+        ]
+
+    @staticmethod
+    def _query_llm_rollup(
+        model: Type[LLMUsageRollupBase], start: datetime, end: Optional[datetime]
+    ) -> List[LLMUsageRow]:
+        condition = model.bucket >= start
+        if end is not None:
+            if end <= start:
+                return []
+            condition &= model.bucket < end
+        return list(
+            model.select(
+                model.request_type,
+                model.user_id,
+                model.model_name,
+                fn.SUM(model.request_count),
+                fn.SUM(model.prompt_tokens),
+                fn.SUM(model.completion_tokens),
+                fn.SUM(model.cost),
+                fn.SUM(model.time_cost_count),
+                fn.SUM(model.time_cost_sum),
+                fn.SUM(model.time_cost_sq_sum),
+            )
+            .where(condition)
+            .group_by(model.request_type, model.user_id, model.model_name)
+            .tuples()
+        )
+
+    def query_messages(self, start: datetime) -> List[MessageRow]:
+        """获取 start 之后各聊天的消息数，按 (chat_key, chat_name) 分组，同一分组可能出现多行"""
+        raw_end, minute_end = self._split(start)
+        rows: List[MessageRow] = []
+
+        is_group = Messages.chat_info_group_id.is_null(False) & (Messages.chat_info_group_id != "")
+        group_name = fn.COALESCE(
+            fn.NULLIF(Messages.chat_info_group_name, ""), Value("群").concat(Messages.chat_info_group_id)
+        )
+        chat_key = Case(
+            None, [(is_group, Value("g").concat(Messages.chat_info_group_id))], Value("u").concat(Messages.user_id)
+        )
+        chat_name = Case(None, [(is_group, group_name)], fn.COALESCE(Messages.user_nickname, ""))
+        rows.extend(
+            Messages.select(chat_key, chat_name, fn.COUNT(Messages.id), fn.MAX(Messages.time))
+            .where(
+                (Messages.time >= start.timestamp())
+                & (Messages.time < raw_end.timestamp())
+                & (is_group | (Messages.user_id.is_null(False) & (Messages.user_id != "")))
+            )
+            .group_by(chat_key, chat_name)
+            .tuples()
+        )
+        rows.extend(self._query_message_rollup(MessageMinuteRollup, raw_end, minute_end))
+        rows.extend(self._query_message_rollup(MessageHourRollup, minute_end, None))
+        return rows
+
+    @staticmethod
+    def _query_message_rollup(
+        model: Type[MessageRollupBase], start: datetime, end: Optional[datetime]
+    ) -> List[MessageRow]:
+        condition = model.bucket >= start
+        if end is not None:
+            if end <= start:
+                return []
+            condition &= model.bucket < end
+        return list(
+            model.select(model.chat_key, model.chat_name, fn.SUM(model.message_count), fn.MAX(model.last_time))
+            .where(condition)
+            .group_by(model.chat_key, model.chat_name)
+            .tuples()
+        )
+
+    @staticmethod
+    def query_llm_cost_by_minute(start: datetime) -> List[Tuple[datetime, str, str, float]]:
+        """获取 start（需按分钟取整）之后每分钟按 (模型, 请求类型) 的花费，用于图表"""
+        model = LLMUsageMinuteRollup
+        return list(
+            model.select(model.bucket, model.model_name, model.request_type, fn.SUM(model.cost))
+            .where(model.bucket >= start)
+            .group_by(model.bucket, model.model_name, model.request_type)
+            .tuples()
+        )
+
+    @staticmethod
+    def query_messages_by_minute(start: datetime) -> List[Tuple[datetime, str, str, int]]:
+        """获取 start（需按分钟取整）之后每分钟按聊天的消息数，用于图表"""
+        model = MessageMinuteRollup
+        return list(
+            model.select(model.bucket, model.chat_key, model.chat_name, fn.SUM(model.message_count))
+            .where(model.bucket >= start)
+            .group_by(model.bucket, model.chat_key, model.chat_name)
+            .tuples()
+        )
+
+
+statistic_rollup = StatisticRollup()
@@ -6,11 +6,13 @@ import json
 import math
 import os
 import random
+import threading
 import time
 import jieba
 
 from collections import defaultdict
 from pathlib import Path
+from typing import Dict, List, Optional
 from pypinyin import Style, pinyin
 
 from src.common.logger import get_logger
@@ -18,54 +20,104 @@ from src.common.logger import get_logger
 logger = get_logger("typo_gen")
 
 
-class ChineseTypoGenerator:
-    def __init__(self, error_rate=0.3, min_freq=5, tone_error_rate=0.2, word_replace_rate=0.3, max_freq_diff=200):
-        """
-        初始化错别字生成器
-
-        参数:
-            error_rate: 单字替换概率
-            min_freq: 最小字频阈值
-            tone_error_rate: 声调错误概率
-            word_replace_rate: 整词替换概率
-            max_freq_diff: 最大允许的频率差异
-        """
-        self.error_rate = error_rate
-        self.min_freq = min_freq
-        self.tone_error_rate = tone_error_rate
-        self.word_replace_rate = word_replace_rate
-        self.max_freq_diff = max_freq_diff
-
-        # 加载数据
-        # print("正在加载汉字数据库，请稍候...")
-        # logger.info("正在加载汉字数据库，请稍候...")
-
-        self.pinyin_dict = self._create_pinyin_dict()
-        self.char_frequency = self._load_or_create_char_frequency()
+class TypoIndex:
+    """
+    错别字生成所需的预计算索引，每个进程只加载一次
+
+    包含:
+        pinyin_dict: 拼音 -> 同音字列表
+        char_pinyin: 汉字 -> 拼音
+        char_frequency: 汉字 -> 归一化字频
+        word_frequency: 词语 -> jieba 词频
+        word_homophones: 逐字拼音拼接成的词拼音 -> 同音词列表
+
+    拼音表和词频首次构建后保存在 depends-data 下，之后直接读取，
+    不再逐字调用 pypinyin，也不再为每个词重新解析 jieba 词典
+    """
+
+    INDEX_VERSION = 1
+    INDEX_FILE = Path("depends-data/typo_index.json")
+    CHAR_FREQUENCY_FILE = Path("depends-data/char_frequency.json")
+
+    _instance: Optional["TypoIndex"] = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        pinyin_dict: Dict[str, List[str]],
+        word_frequency: Dict[str, float],
+        char_frequency: Dict[str, float],
+    ):
+        self.pinyin_dict: Dict[str, List[str]] = defaultdict(list, pinyin_dict)
+        self.char_pinyin: Dict[str, str] = {char: py for py, chars in pinyin_dict.items() for char in chars}
+        self.word_frequency = word_frequency
+        self.char_frequency = char_frequency
+        self.word_homophones = self._build_word_homophones()
+
+    @classmethod
+    def get_instance(cls) -> "TypoIndex":
+        """获取进程内共享的索引，首次调用时加载或构建"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    start_time = time.time()
+                    cls._instance = cls._load_or_create()
+                    logger.debug(f"错别字索引加载完成，耗时 {time.time() - start_time:.2f}秒")
+        return cls._instance
+
+    @classmethod
+    def _load_or_create(cls) -> "TypoIndex":
+        char_frequency = cls._load_or_create_char_frequency()
+
+        if cls.INDEX_FILE.exists():
+            try:
+                with open(cls.INDEX_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == cls.INDEX_VERSION:
+                    pinyin_dict = {py: list(chars) for py, chars in data["pinyin_dict"].items()}
+                    return cls(pinyin_dict, data["word_frequency"], char_frequency)
+                logger.info("错别字索引版本不匹配，重新构建")
+            except Exception as e:
+                logger.warning(f"读取错别字索引失败，重新构建: {e}")
+
+        logger.info("正在构建错别字索引，仅首次运行需要...")
+        pinyin_dict = cls._create_pinyin_dict()
+        word_frequency = cls._load_word_frequency()
+        try:
+            cls.INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(cls.INDEX_FILE, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "version": cls.INDEX_VERSION,
+                        "pinyin_dict": {py: "".join(chars) for py, chars in pinyin_dict.items()},
+                        "word_frequency": word_frequency,
+                    },
+                    f,
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+        except Exception as e:
+            logger.warning(f"保存错别字索引失败: {e}")
+        return cls(pinyin_dict, word_frequency, char_frequency)
 
-    def _load_or_create_char_frequency(self):
+    @classmethod
+    def _load_or_create_char_frequency(cls) -> Dict[str, float]:
         """
         加载或创建汉字频率字典
         """
-        cache_file = Path("depends-data/char_frequency.json")
+        cache_file = cls.CHAR_FREQUENCY_FILE
 
         # 如果缓存文件存在，直接加载
         if cache_file.exists():
             with open(cache_file, "r", encoding="utf-8") as f:
                 return json.load(f)
 
-        # 使用内置的词频文件
+        # 使用jieba词典的词频，对词中的每个字进行频率累加
         char_freq = defaultdict(int)
-        dict_path = os.path.join(os.path.dirname(jieba.__file__), "dict.txt")
-
-        # 读取jieba的词典文件
-        with open(dict_path, "r", encoding="utf-8") as f:
-            for line in f:
-                word, freq = line.strip().split()[:2]
-                # 对词中的每个字进行频率累加
-                for char in word:
-                    if self._is_chinese_char(char):
-                        char_freq[char] += int(freq)
+        for word, freq in cls._load_word_frequency().items():
+            for char in word:
+                if ChineseTypoGenerator._is_chinese_char(char):
+                    char_freq[char] += int(freq)
 
         # 归一化频率值
         max_freq = max(char_freq.values())
@@ -78,7 +130,21 @@ class ChineseTypoGenerator:
         return normalized_freq
 
     @staticmethod
-    def _create_pinyin_dict():
+    def _load_word_frequency() -> Dict[str, float]:
+        """
+        读取jieba词典中的词频
+        """
+        dict_path = os.path.join(os.path.dirname(jieba.__file__), "dict.txt")
+        word_frequency = {}
+        with open(dict_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) >= 2:
+                    word_frequency[parts[0]] = float(parts[1])
+        return word_frequency
+
+    @staticmethod
+    def _create_pinyin_dict() -> Dict[str, List[str]]:
         """
         创建拼音到汉字的映射字典
         """
@@ -96,6 +162,47 @@ class ChineseTypoGenerator:
 
         return pinyin_dict
 
+    def _build_word_homophones(self) -> Dict[str, List[str]]:
+        """
+        按每个字的拼音给多字词分组，同组的词互为同音词
+        """
+        word_homophones = defaultdict(list)
+        for word in self.word_frequency:
+            if len(word) < 2:
+                continue
+            word_pinyin = [self.char_pinyin.get(char) for char in word]
+            if None in word_pinyin:
+                continue
+            word_homophones[" ".join(word_pinyin)].append(word)  # type: ignore
+        return dict(word_homophones)
+
+
+class ChineseTypoGenerator:
+    def __init__(self, error_rate=0.3, min_freq=5, tone_error_rate=0.2, word_replace_rate=0.3, max_freq_diff=200):
+        """
+        初始化错别字生成器
+
+        参数:
+            error_rate: 单字替换概率
+            min_freq: 最小字频阈值
+            tone_error_rate: 声调错误概率
+            word_replace_rate: 整词替换概率
+            max_freq_diff: 最大允许的频率差异
+        """
+        self.error_rate = error_rate
+        self.min_freq = min_freq
+        self.tone_error_rate = tone_error_rate
+        self.word_replace_rate = word_replace_rate
+        self.max_freq_diff = max_freq_diff
+
+        # 拼音/字频/同音词索引在进程内共享，只在第一次使用时加载
+        index = TypoIndex.get_instance()
+        self.pinyin_dict = index.pinyin_dict
+        self.char_pinyin = index.char_pinyin
+        self.char_frequency = index.char_frequency
+        self.word_frequency = index.word_frequency
+        self.word_homophones = index.word_homophones
+
     @staticmethod
     def _is_chinese_char(char):
         """
@@ -121,7 +228,7 @@ class ChineseTypoGenerator:
             if char.isspace() or not self._is_chinese_char(char):
                 continue
             # 获取拼音（数字声调）
-            py = pinyin(char, style=Style.TONE3)[0][0]
+            py = self.char_pinyin.get(char) or pinyin(char, style=Style.TONE3)[0][0]
             result.append((char, py))
 
         return result
@@ -238,40 +345,20 @@ class ChineseTypoGenerator:
         # 获取词的拼音
         word_pinyin = self._get_word_pinyin(word)
 
-        # 遍历所有可能的同音字组合
-        candidates = []
-        for py in word_pinyin:
-            chars = self.pinyin_dict.get(py, [])
-            if not chars:
-                return []
-            candidates.append(chars)
-
-        # 生成所有可能的组合
-        import itertools
-
-        all_combinations = itertools.product(*candidates)
-
-        # 获取jieba词典和词频信息
-        dict_path = os.path.join(os.path.dirname(jieba.__file__), "dict.txt")
-        valid_words = {}  # 改用字典存储词语及其频率
-        with open(dict_path, "r", encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 2:
-                    word_text = parts[0]
-                    word_freq = float(parts[1])  # 获取词频
-                    valid_words[word_text] = word_freq
+        # 同音词索引按每个字的拼音分组，与逐字组合后查词典的结果一致
+        candidates = self.word_homophones.get(" ".join(word_pinyin))
+        if not candidates:
+            return []
 
         # 获取原词的词频作为参考
-        original_word_freq = valid_words.get(word, 0)
+        original_word_freq = self.word_frequency.get(word, 0)
         min_word_freq = original_word_freq * 0.1  # 设置最小词频为原词频的10%
 
         # 过滤和计算频率
         homophones = []
-        for combo in all_combinations:
-            new_word = "".join(combo)
-            if new_word != word and new_word in valid_words:
-                new_word_freq = valid_words[new_word]
+        for new_word in candidates:
+            if new_word != word:
+                new_word_freq = self.word_frequency[new_word]
                 # 只保留词频达到阈值的词
                 if new_word_freq >= min_word_freq:
                     # 计算词的平均字频（考虑字频和词频）
@@ -353,7 +440,7 @@ class ChineseTypoGenerator:
                         replace_prob = self._calculate_replacement_probability(orig_freq, typo_freq)
                         if random.random() < replace_prob:
                             result.append(typo_char)
-                            typo_py = pinyin(typo_char, style=Style.TONE3)[0][0]
+                            typo_py = self.char_pinyin[typo_char]
                             typo_info.append((char, typo_char, py, typo_py, orig_freq, typo_freq))
                             char_typos.append((typo_char, char))  # 记录(错字,正确字)对
                             current_pos += 1
@@ -376,7 +463,7 @@ class ChineseTypoGenerator:
                             replace_prob = self._calculate_replacement_probability(orig_freq, typo_freq)
                             if random.random() < replace_prob:
                                 word_result.append(typo_char)
-                                typo_py = pinyin(typo_char, style=Style.TONE3)[0][0]
+                                typo_py = self.char_pinyin[typo_char]
                                 typo_info.append((char, typo_char, py, typo_py, orig_freq, typo_freq))
                                 char_typos.append((typo_char, char))  # 记录(错字,正确字)对
                                 continue
@@ -447,6 +534,24 @@ class ChineseTypoGenerator:
                 print(f"警告: 参数 {key} 不存在")
 
 
+_typo_generator: Optional[ChineseTypoGenerator] = None
+
+
+def get_typo_generator(**kwargs) -> ChineseTypoGenerator:
+    """
+    获取进程内共享的错别字生成器，传入的参数会更新到该实例上
+
+    可设置参数同 ChineseTypoGenerator.__init__
+    """
+    global _typo_generator
+    if _typo_generator is None:
+        _typo_generator = ChineseTypoGenerator(**kwargs)
+    else:
+        for key, value in kwargs.items():
+            setattr(_typo_generator, key, value)
+    return _typo_generator
+
+
 def main():
     # 创建错别字生成器实例
     typo_generator = ChineseTypoGenerator(error_rate=0.03, min_freq=7, tone_error_rate=0.02, word_replace_rate=0.3)
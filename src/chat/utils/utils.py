@@ -12,18 +12,27 @@ from typing import Optional, Tuple, List, TYPE_CHECKING
 from src.common.logger import get_logger
 from src.common.data_models.database_data_model import DatabaseMessages
 from src.common.message_repository import find_messages, count_messages
-from src.config.config import global_config, model_config
+from src.config.config import global_config
 from src.chat.message_receive.message import MessageRecv
 from src.chat.message_receive.chat_stream import get_chat_manager
-from src.llm_models.utils_model import LLMRequest
+from src.chat.utils.embedding_service import embedding_service
 from src.person_info.person_info import Person
-from .typo_generator import ChineseTypoGenerator
+from src.chat.utils.timer_calculator import Timer
+from .typo_generator import get_typo_generator
 
 if TYPE_CHECKING:
     from src.common.data_models.info_data_model import TargetPersonInfo
+    from src.common.data_models.llm_data_model import LLMGenerationDataModel, ReplyStreamHandler
+    from src.llm_models.utils_model import LLMRequest
 
 logger = get_logger("chat_utils")
 
+# 流式回复中视为句子结束的标点（不含英文句点，避免切开小数和缩写）
+STREAM_SENTENCE_ENDINGS = "。！？!?；;…\n"
+# 紧跟在句末标点后、应与前一句一起输出的字符
+STREAM_SENTENCE_TRAILERS = "”’」』）)】]\"'~～"
+STREAM_BRACKET_PAIRS = {"(": ")", "（": "）", "[": "]", "【": "】"}
+
 
 def is_english_letter(char: str) -> bool:
     """检查字符是否为英文字母（忽略大小写）"""
@@ -104,15 +113,8 @@ def is_mentioned_bot_in_message(message: MessageRecv) -> tuple[bool, bool, float
 
 
 async def get_embedding(text, request_type="embedding") -> Optional[List[float]]:
-    """获取文本的embedding向量"""
-    # 每次都创建新的LLMRequest实例以避免事件循环冲突
-    llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type=request_type)
-    try:
-        embedding, _ = await llm.get_embedding(text)
-    except Exception as e:
-        logger.error(f"获取embedding失败: {str(e)}")
-        embedding = None
-    return embedding
+    """获取文本的embedding向量（经过缓存，并发请求会被合并为批量请求）"""
+    return await embedding_service.embed(text, request_type)
 
 
 def get_recent_group_speaker(chat_stream_id: str, sender, limit: int = 12) -> list:
@@ -297,7 +299,97 @@ def random_remove_punctuation(text: str) -> str:
     return result
 
 
-def process_llm_response(text: str, enable_splitter: bool = True, enable_chinese_typo: bool = True) -> list[str]:
+class StreamingSentenceBuffer:
+    """
+    将流式生成的增量文本切分为完整的句子
+
+    只在括号外的句末标点处切分，并且等到标点后的下一个字符到达后才确认，
+    避免拆开连续的标点、紧随其后的引号，或被括号包裹的颜文字与动作描写。
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, delta: str) -> str:
+        """追加增量文本，返回已经完整的句子（可能包含多句，没有则为空字符串）"""
+        self._buffer += delta
+        closing: List[str] = []
+        cut = 0
+        for i, char in enumerate(self._buffer[:-1]):
+            if char in STREAM_BRACKET_PAIRS:
+                closing.append(STREAM_BRACKET_PAIRS[char])
+            elif closing and char == closing[-1]:
+                closing.pop()
+            elif (
+                not closing
+                and char in STREAM_SENTENCE_ENDINGS
+                and self._buffer[i + 1] not in STREAM_SENTENCE_ENDINGS
+                and self._buffer[i + 1] not in STREAM_SENTENCE_TRAILERS
+            ):
+                cut = i + 1
+        sentences, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return sentences
+
+    def flush(self) -> str:
+        """流结束时取出剩余的内容"""
+        rest, self._buffer = self._buffer, ""
+        return rest
+
+
+async def generate_reply_stream(
+    llm_request: "LLMRequest",
+    prompt: str,
+    llm_response: "LLMGenerationDataModel",
+    reply_stream_handler: "ReplyStreamHandler",
+) -> Tuple[str, str, str, Optional[list]]:
+    """
+    流式生成回复，每生成一段完整的句子就交给 reply_stream_handler 处理
+
+    reply_stream_handler 返回 False 时停止生成并中断请求。生成失败或被取消时，
+    llm_response 中保留已生成的部分。
+
+    Returns:
+        Tuple[str, str, str, Optional[list]]: (回复内容, 推理内容, 模型名称, 工具调用)
+    """
+    with Timer("LLM生成", {}):
+        if global_config.debug.show_prompt:
+            logger.info(f"\n{prompt}\n")
+        else:
+            logger.debug(f"\n{prompt}\n")
+
+        stream = llm_request.generate_response_stream(prompt)
+        sentence_buffer = StreamingSentenceBuffer()
+        try:
+            stopped = False
+            async for delta in stream:
+                if sentences := sentence_buffer.feed(delta):
+                    llm_response.streamed = True
+                    if await reply_stream_handler(sentences, llm_response) is False:
+                        stopped = True
+                        break
+            if not stopped and (rest := sentence_buffer.flush().strip()):
+                llm_response.streamed = True
+                await reply_stream_handler(rest, llm_response)
+        finally:
+            llm_response.content = stream.content
+            llm_response.model = stream.model_name
+            # 停止生成或回复任务被取消时立即中断请求
+            await stream.aclose()
+
+        logger.debug(f"replyer生成内容: {stream.content}")
+    return stream.content, stream.reasoning_content, stream.model_name, stream.tool_calls
+
+
+def process_llm_response(
+    text: str, enable_splitter: bool = True, enable_chinese_typo: bool = True, is_stream_segment: bool = False
+) -> list[str]:
+    """
+    处理LLM的回复：去除括号内容、分割句子、生成错字
+
+    Args:
+        is_stream_segment: 是否为流式回复中的一段，此时内容为空返回空列表，
+            整条回复的长度与句数限制由调用方按已发送的总量控制
+    """
     if not global_config.response_post_process.enable_response_post_process:
         return [text]
 
@@ -314,6 +406,8 @@ def process_llm_response(text: str, enable_splitter: bool = True, enable_chinese
     # 去除 () 和 [] 及其包裹的内容
     cleaned_text = pattern.sub("", protected_text)
 
+    if cleaned_text.strip() == "" and is_stream_segment:
+        return []
     if cleaned_text == "":
         return ["呃呃"]
 
@@ -323,11 +417,11 @@ def process_llm_response(text: str, enable_splitter: bool = True, enable_chinese
     max_length = global_config.response_splitter.max_length * 2
     max_sentence_num = global_config.response_splitter.max_sentence_num
     # 如果基本上是中文，则进行长度过滤
-    if get_western_ratio(cleaned_text) < 0.1 and len(cleaned_text) > max_length:
+    if not is_stream_segment and get_western_ratio(cleaned_text) < 0.1 and len(cleaned_text) > max_length:
         logger.warning(f"回复过长 ({len(cleaned_text)} 字符)，返回默认回复")
         return ["懒得说"]
 
-    typo_generator = ChineseTypoGenerator(
+    typo_generator = get_typo_generator(
         error_rate=global_config.chinese_typo.error_rate,
         min_freq=global_config.chinese_typo.min_freq,
         tone_error_rate=global_config.chinese_typo.tone_error_rate,
@@ -349,7 +443,7 @@ def process_llm_response(text: str, enable_splitter: bool = True, enable_chinese
         else:
             sentences.append(sentence)
 
-    if len(sentences) > max_sentence_num:
+    if not is_stream_segment and len(sentences) > max_sentence_num:
         logger.warning(f"分割后消息数量过多 ({len(sentences)} 条)，返回默认回复")
         return [f"{global_config.bot.nickname}不知道哦"]
 
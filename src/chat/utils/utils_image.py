@@ -1,18 +1,23 @@
+import asyncio
 import base64
+import functools
 import os
+import threading
 import time
 import hashlib
 import uuid
 import io
 import numpy as np
 
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
 from PIL import Image
 from rich.traceback import install
 
 from src.common.logger import get_logger
 from src.common.database.database import db
 from src.common.database.database_model import Images, ImageDescriptions
+from src.common.database.db_executor import db_read, db_write
 from src.config.config import global_config, model_config
 from src.llm_models.utils_model import LLMRequest
 
@@ -20,6 +25,77 @@ install(extra_lines=3)
 
 logger = get_logger("chat_image")
 
+T = TypeVar("T")
+
+# 图片解码、哈希、GIF拼帧等CPU密集操作使用的线程数；线程过多会与事件循环争抢 GIL
+IMAGE_WORKER_THREADS = 2
+# base64 分块解码的块大小（字符数，须为4的倍数）；b64decode 执行期间不释放 GIL，分块后工作线程可以定期让出
+BASE64_DECODE_CHUNK = 256 * 1024
+_BASE64_IGNORED = bytes(set(range(128)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="))
+
+_image_executor: Optional[ThreadPoolExecutor] = None
+_image_executor_lock = threading.Lock()
+
+
+def _get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            _image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKER_THREADS, thread_name_prefix="image-worker")
+        return _image_executor
+
+
+async def run_in_image_pool(func: Callable[..., T], *args, **kwargs) -> T:
+    """在图片线程池中执行CPU密集的图片处理，避免阻塞事件循环
+
+    hashlib、Pillow 和 NumPy 在处理大块数据时会释放 GIL，线程池即可并行，
+    也省去了进程池来回拷贝整张图片的开销。
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_image_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _b64decode_chunked(data: str) -> bytes:
+    """分块解码base64，结果与 base64.b64decode 相同"""
+    if len(data) <= BASE64_DECODE_CHUNK:
+        return base64.b64decode(data)
+    parts = []
+    carry = b""
+    for start in range(0, len(data), BASE64_DECODE_CHUNK):
+        # b64decode 会丢弃换行等非base64字符，这里先去掉，保证每块按4字符对齐
+        raw = carry + data[start : start + BASE64_DECODE_CHUNK].encode("ascii", errors="ignore").translate(
+            None, _BASE64_IGNORED
+        )
+        cut = len(raw) - len(raw) % 4
+        parts.append(base64.b64decode(raw[:cut]))
+        carry = raw[cut:]
+    if carry:
+        parts.append(base64.b64decode(carry))
+    return b"".join(parts)
+
+
+def _decode_image(image_base64: str) -> Tuple[str, bytes, str]:
+    """解码base64图片并计算MD5
+
+    Returns:
+        Tuple[str, bytes, str]: (只含ASCII字符的base64, 图片字节, 图片哈希)
+    """
+    # 确保base64字符串只包含ASCII字符（isascii 只检查字符串标志位，通常无需复制整个字符串）
+    if isinstance(image_base64, str) and not image_base64.isascii():
+        image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
+    image_bytes = _b64decode_chunked(image_base64)
+    return image_base64, image_bytes, hashlib.md5(image_bytes).hexdigest()
+
+
+def _get_image_format(image_bytes: bytes) -> str:
+    """识别图片格式（小写），只读取文件头"""
+    return Image.open(io.BytesIO(image_bytes)).format.lower()  # type: ignore
+
+
+def _write_image_file(file_path: str, image_bytes: bytes) -> None:
+    with open(file_path, "wb") as f:
+        f.write(image_bytes)
+
 
 class ImageManager:
     _instance = None
@@ -37,6 +113,11 @@ class ImageManager:
 
             self._initialized = True
             self.vlm = LLMRequest(model_set=model_config.model_task_config.vlm, request_type="image")
+            # 正在进行的识别任务，同一张图片同时只识别一次
+            self._inflight: Dict[str, asyncio.Task] = {}
+            # 后台VLM任务，持有引用防止被回收
+            self._background_tasks: Set[asyncio.Task] = set()
+            self._pending_image_ids: Set[str] = set()
 
             try:
                 db.connect(reuse_if_open=True)
@@ -50,6 +131,29 @@ class ImageManager:
         """确保图像存储目录存在"""
         os.makedirs(self.IMAGE_DIR, exist_ok=True)
 
+    async def _single_flight(self, key: str, func: Callable[..., Awaitable[T]], *args) -> T:
+        """同一key同时只执行一次func，其余调用等待并共享同一结果
+
+        同一张表情包/图片同时出现在多个群里时，只会发出一次VLM请求。
+        等待方被取消不会取消共享的任务。
+        """
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget_inflight, key))
+        else:
+            logger.debug(f"[合并请求] 等待进行中的识别任务: {key}")
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 等待方全部被取消时，避免出现未获取异常的警告
+            task.exception()
+
     @staticmethod
     def _get_description_from_db(image_hash: str, description_type: str) -> Optional[str]:
         """从数据库获取图片描述
@@ -96,10 +200,7 @@ class ImageManager:
         from src.chat.emoji_system.emoji_manager import get_emoji_manager
 
         emoji_manager = get_emoji_manager()
-        if isinstance(image_base64, str):
-            image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
-        image_bytes = base64.b64decode(image_base64)
-        image_hash = hashlib.md5(image_bytes).hexdigest()
+        _, _, image_hash = await run_in_image_pool(_decode_image, image_base64)
         emoji = await emoji_manager.get_emoji_from_manager(image_hash)
         if not emoji:
             return "[表情包：未知]"
@@ -110,170 +211,166 @@ class ImageManager:
     async def get_emoji_description(self, image_base64: str) -> str:
         """获取表情包描述，优先使用Emoji表中的缓存数据"""
         try:
-            # 计算图片哈希
-            # 确保base64字符串只包含ASCII字符
-            if isinstance(image_base64, str):
-                image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()  # type: ignore
+            # 解码并计算图片哈希
+            image_base64, image_bytes, image_hash = await run_in_image_pool(_decode_image, image_base64)
+            return await self._single_flight(
+                f"emoji:{image_hash}", self._describe_emoji, image_base64, image_bytes, image_hash
+            )
+        except Exception as e:
+            logger.error(f"获取表情包描述失败: {str(e)}")
+            return "[表情包(处理失败)]"
 
-            # 优先使用EmojiManager查询已注册表情包的描述
-            try:
-                from src.chat.emoji_system.emoji_manager import get_emoji_manager
-
-                emoji_manager = get_emoji_manager()
-                tags = await emoji_manager.get_emoji_tag_by_hash(image_hash)
-                if tags:
-                    tag_str = ",".join(tags)
-                    logger.info(f"[缓存命中] 使用已注册表情包描述: {tag_str}...")
-                    return f"[表情包：{tag_str}]"
-            except Exception as e:
-                logger.debug(f"查询EmojiManager时出错: {e}")
-
-            # 查询ImageDescriptions表的缓存描述
-            if cached_description := self._get_description_from_db(image_hash, "emoji"):
-                logger.info(f"[缓存命中] 使用ImageDescriptions表中的描述: {cached_description[:50]}...")
-                return f"[表情包：{cached_description}]"
-
-            # === 二步走识别流程 ===
-
-            # 第一步：VLM视觉分析 - 生成详细描述
-            if image_format in ["gif", "GIF"]:
-                image_base64_processed = self.transform_gif(image_base64)
-                if image_base64_processed is None:
-                    logger.warning("GIF转换失败，无法获取描述")
-                    return "[表情包(GIF处理失败)]"
-                vlm_prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，描述一下表情包表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
-                detailed_description, _ = await self.vlm.generate_response_for_image(
-                    vlm_prompt, image_base64_processed, "jpg", temperature=0.4
-                )
-            else:
-                vlm_prompt = (
-                    "这是一个表情包，请详细描述一下表情包所表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
-                )
-                detailed_description, _ = await self.vlm.generate_response_for_image(
-                    vlm_prompt, image_base64, image_format, temperature=0.4
-                )
+    async def _describe_emoji(self, image_base64: str, image_bytes: bytes, image_hash: str) -> str:
+        """查询缓存或调用VLM识别表情包，同一表情包的并发调用由 _single_flight 合并"""
+        image_format = await run_in_image_pool(_get_image_format, image_bytes)
 
-            if detailed_description is None:
-                logger.warning("VLM未能生成表情包详细描述")
-                return "[表情包(VLM描述生成失败)]"
-
-            # 第二步：LLM情感分析 - 基于详细描述生成简短的情感标签
-            emotion_prompt = f"""
-            请你基于这个表情包的详细描述，提取出最核心的情感含义，用1-2个词概括。
-            详细描述：'{detailed_description}'
-            
-            要求：
-            1. 只输出1-2个最核心的情感词汇
-            2. 从互联网梗、meme的角度理解
-            3. 输出简短精准，不要解释
-            4. 如果有多个词用逗号分隔
-            """
-
-            # 使用较低温度确保输出稳定
-            emotion_llm = LLMRequest(model_set=model_config.model_task_config.utils, request_type="emoji")
-            emotion_result, _ = await emotion_llm.generate_response_async(emotion_prompt, temperature=0.3)
-
-            if not emotion_result:
-                logger.warning("LLM未能生成情感标签，使用详细描述的前几个词")
-                # 降级处理：从详细描述中提取关键词
-                import jieba
-
-                words = list(jieba.cut(detailed_description))
-                emotion_result = "，".join(words[:2]) if len(words) >= 2 else (words[0] if words else "表情")
-
-            # 处理情感结果，取前1-2个最重要的标签
-            emotions = [e.strip() for e in emotion_result.replace("，", ",").split(",") if e.strip()]
-            final_emotion = emotions[0] if emotions else "表情"
-
-            # 如果有第二个情感且不重复，也包含进来
-            if len(emotions) > 1 and emotions[1] != emotions[0]:
-                final_emotion = f"{emotions[0]}，{emotions[1]}"
-
-            logger.debug(f"[emoji识别] 详细描述: {detailed_description[:50]}... -> 情感标签: {final_emotion}")
-
-            if cached_description := self._get_description_from_db(image_hash, "emoji"):
-                logger.warning(f"虽然生成了描述，但是找到缓存表情包描述: {cached_description}")
-                return f"[表情包：{cached_description}]"
-
-            # 保存表情包文件和元数据（用于可能的后续分析）
-            logger.debug(f"保存表情包: {image_hash}")
-            current_timestamp = time.time()
-            filename = f"{int(current_timestamp)}_{image_hash[:8]}.{image_format}"
-            emoji_dir = os.path.join(self.IMAGE_DIR, "emoji")
-            os.makedirs(emoji_dir, exist_ok=True)
-            file_path = os.path.join(emoji_dir, filename)
+        # 优先使用EmojiManager查询已注册表情包的描述
+        try:
+            from src.chat.emoji_system.emoji_manager import get_emoji_manager
+
+            emoji_manager = get_emoji_manager()
+            tags = await emoji_manager.get_emoji_tag_by_hash(image_hash)
+            if tags:
+                tag_str = ",".join(tags)
+                logger.info(f"[缓存命中] 使用已注册表情包描述: {tag_str}...")
+                return f"[表情包：{tag_str}]"
+        except Exception as e:
+            logger.debug(f"查询EmojiManager时出错: {e}")
+
+        # 查询ImageDescriptions表的缓存描述
+        if cached_description := await db_read(self._get_description_from_db, image_hash, "emoji"):
+            logger.info(f"[缓存命中] 使用ImageDescriptions表中的描述: {cached_description[:50]}...")
+            return f"[表情包：{cached_description}]"
+
+        # === 二步走识别流程 ===
+
+        # 第一步：VLM视觉分析 - 生成详细描述
+        if image_format in ["gif", "GIF"]:
+            image_base64_processed = await self.transform_gif_async(image_base64)
+            if image_base64_processed is None:
+                logger.warning("GIF转换失败，无法获取描述")
+                return "[表情包(GIF处理失败)]"
+            vlm_prompt = "这是一个动态图表情包，每一张图代表了动态图的某一帧，黑色背景代表透明，描述一下表情包表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
+            detailed_description, _ = await self.vlm.generate_response_for_image(
+                vlm_prompt, image_base64_processed, "jpg", temperature=0.4
+            )
+        else:
+            vlm_prompt = "这是一个表情包，请详细描述一下表情包所表达的情感和内容，描述细节，从互联网梗,meme的角度去分析"
+            detailed_description, _ = await self.vlm.generate_response_for_image(
+                vlm_prompt, image_base64, image_format, temperature=0.4
+            )
 
-            try:
-                # 保存文件
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-
-                # 保存到数据库 (Images表) - 包含详细描述用于可能的注册流程
-                try:
-                    img_obj = Images.get((Images.emoji_hash == image_hash) & (Images.type == "emoji"))
-                    img_obj.path = file_path
-                    img_obj.description = detailed_description  # 保存详细描述
-                    img_obj.timestamp = current_timestamp
-                    img_obj.save()
-                except Images.DoesNotExist:  # type: ignore
-                    Images.create(
-                        image_id=str(uuid.uuid4()),
-                        emoji_hash=image_hash,
-                        path=file_path,
-                        type="emoji",
-                        description=detailed_description,  # 保存详细描述
-                        timestamp=current_timestamp,
-                        vlm_processed=True,
-                    )
-            except Exception as e:
-                logger.error(f"保存表情包文件或元数据失败: {str(e)}")
+        if detailed_description is None:
+            logger.warning("VLM未能生成表情包详细描述")
+            return "[表情包(VLM描述生成失败)]"
+
+        # 第二步：LLM情感分析 - 基于详细描述生成简短的情感标签
+        emotion_prompt = f"""
+        请你基于这个表情包的详细描述，提取出最核心的情感含义，用1-2个词概括。
+        详细描述：'{detailed_description}'
+        
+        要求：
+        1. 只输出1-2个最核心的情感词汇
+        2. 从互联网梗、meme的角度理解
+        3. 输出简短精准，不要解释
+        4. 如果有多个词用逗号分隔
+        """
+
+        # 使用较低温度确保输出稳定
+        emotion_llm = LLMRequest(model_set=model_config.model_task_config.utils, request_type="emoji")
+        emotion_result, _ = await emotion_llm.generate_response_async(emotion_prompt, temperature=0.3)
+
+        if not emotion_result:
+            logger.warning("LLM未能生成情感标签，使用详细描述的前几个词")
+            # 降级处理：从详细描述中提取关键词
+            import jieba
+
+            words = list(jieba.cut(detailed_description))
+            emotion_result = "，".join(words[:2]) if len(words) >= 2 else (words[0] if words else "表情")
 
-            # 保存最终的情感标签到缓存 (ImageDescriptions表)
-            self._save_description_to_db(image_hash, final_emotion, "emoji")
+        # 处理情感结果，取前1-2个最重要的标签
+        emotions = [e.strip() for e in emotion_result.replace("，", ",").split(",") if e.strip()]
+        final_emotion = emotions[0] if emotions else "表情"
 
-            return f"[表情包：{final_emotion}]"
+        # 如果有第二个情感且不重复，也包含进来
+        if len(emotions) > 1 and emotions[1] != emotions[0]:
+            final_emotion = f"{emotions[0]}，{emotions[1]}"
+
+        logger.debug(f"[emoji识别] 详细描述: {detailed_description[:50]}... -> 情感标签: {final_emotion}")
+
+        if cached_description := await db_read(self._get_description_from_db, image_hash, "emoji"):
+            logger.warning(f"虽然生成了描述，但是找到缓存表情包描述: {cached_description}")
+            return f"[表情包：{cached_description}]"
+
+        # 保存表情包文件和元数据（用于可能的后续分析）
+        logger.debug(f"保存表情包: {image_hash}")
+        current_timestamp = time.time()
+        filename = f"{int(current_timestamp)}_{image_hash[:8]}.{image_format}"
+        emoji_dir = os.path.join(self.IMAGE_DIR, "emoji")
+        os.makedirs(emoji_dir, exist_ok=True)
+        file_path = os.path.join(emoji_dir, filename)
+
+        def save_emoji_record():
+            try:
+                img_obj = Images.get((Images.emoji_hash == image_hash) & (Images.type == "emoji"))
+                img_obj.path = file_path
+                img_obj.description = detailed_description  # 保存详细描述
+                img_obj.timestamp = current_timestamp
+                img_obj.save()
+            except Images.DoesNotExist:  # type: ignore
+                Images.create(
+                    image_id=str(uuid.uuid4()),
+                    emoji_hash=image_hash,
+                    path=file_path,
+                    type="emoji",
+                    description=detailed_description,  # 保存详细描述
+                    timestamp=current_timestamp,
+                    vlm_processed=True,
+                )
 
+        try:
+            # 保存文件
+            await run_in_image_pool(_write_image_file, file_path, image_bytes)
+
+            # 保存到数据库 (Images表) - 包含详细描述用于可能的注册流程
+            await db_write(save_emoji_record)
         except Exception as e:
-            logger.error(f"获取表情包描述失败: {str(e)}")
-            return "[表情包(处理失败)]"
+            logger.error(f"保存表情包文件或元数据失败: {str(e)}")
+
+        # 保存最终的情感标签到缓存 (ImageDescriptions表)
+        await db_write(self._save_description_to_db, image_hash, final_emotion, "emoji")
+
+        return f"[表情包：{final_emotion}]"
 
     async def get_image_description(self, image_base64: str) -> str:
         """获取普通图片描述，优先使用Images表中的缓存数据"""
         try:
-            # 计算图片哈希
-            if isinstance(image_base64, str):
-                image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
+            # 解码并计算图片哈希
+            image_base64, image_bytes, image_hash = await run_in_image_pool(_decode_image, image_base64)
 
             # 优先检查Images表中是否已有完整的描述
-            existing_image = Images.get_or_none(Images.emoji_hash == image_hash)
+            existing_image = await db_read(Images.get_or_none, Images.emoji_hash == image_hash)
             if existing_image:
                 # 更新计数
                 if hasattr(existing_image, "count") and existing_image.count is not None:
                     existing_image.count += 1
                 else:
                     existing_image.count = 1
-                existing_image.save()
+                await db_write(existing_image.save)
 
                 # 如果已有描述，直接返回
                 if existing_image.description:
                     logger.debug(f"[缓存命中] 使用Images表中的图片描述: {existing_image.description[:50]}...")
                     return f"[图片：{existing_image.description}]"
 
-            if cached_description := self._get_description_from_db(image_hash, "image"):
+            if cached_description := await db_read(self._get_description_from_db, image_hash, "image"):
                 logger.debug(f"[缓存命中] 使用ImageDescriptions表中的描述: {cached_description[:50]}...")
                 return f"[图片：{cached_description}]"
 
             # 调用AI获取描述
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()  # type: ignore
-            prompt = global_config.personality.visual_style
-            logger.info(f"[VLM调用] 为图片生成新描述 (Hash: {image_hash[:8]}...)")
-            description, _ = await self.vlm.generate_response_for_image(
-                prompt, image_base64, image_format, temperature=0.4, max_tokens=300
+            image_format = await run_in_image_pool(_get_image_format, image_bytes)
+            description = await self._single_flight(
+                f"image:{image_hash}", self._generate_image_description, image_base64, image_hash, image_format
             )
 
             if description is None:
@@ -287,12 +384,7 @@ class ImageManager:
             os.makedirs(image_dir, exist_ok=True)
             file_path = os.path.join(image_dir, filename)
 
-            try:
-                # 保存文件
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-
-                # 保存到数据库，补充缺失字段
+            def save_image_record():
                 if existing_image:
                     existing_image.path = file_path
                     existing_image.description = description
@@ -315,11 +407,18 @@ class ImageManager:
                         count=1,
                     )
                     logger.debug(f"[数据库] 创建新图片记录: {image_hash[:8]}...")
+
+            try:
+                # 保存文件
+                await run_in_image_pool(_write_image_file, file_path, image_bytes)
+
+                # 保存到数据库，补充缺失字段
+                await db_write(save_image_record)
             except Exception as e:
                 logger.error(f"保存图片文件或元数据失败: {str(e)}")
 
             # 保存描述到ImageDescriptions表作为备用缓存
-            self._save_description_to_db(image_hash, description, "image")
+            await db_write(self._save_description_to_db, image_hash, description, "image")
 
             logger.info(f"[VLM完成] 图片描述生成: {description[:50]}...")
             return f"[图片：{description}]"
@@ -327,6 +426,21 @@ class ImageManager:
             logger.error(f"获取图片描述失败: {str(e)}")
             return "[图片(处理失败)]"
 
+    async def _generate_image_description(self, image_base64: str, image_hash: str, image_format: str) -> Optional[str]:
+        """调用VLM生成图片描述，同一图片的并发调用由 _single_flight 合并"""
+        prompt = global_config.personality.visual_style
+        logger.info(f"[VLM调用] 为图片生成新描述 (Hash: {image_hash[:8]}...)")
+        description, _ = await self.vlm.generate_response_for_image(
+            prompt, image_base64, image_format, temperature=0.4, max_tokens=300
+        )
+        return description
+
+    async def transform_gif_async(
+        self, gif_base64: str, similarity_threshold: float = 1000.0, max_frames: int = 15
+    ) -> Optional[str]:
+        """在图片线程池中执行 transform_gif，逐帧比较和缩放不会阻塞事件循环"""
+        return await run_in_image_pool(self.transform_gif, gif_base64, similarity_threshold, max_frames)
+
     @staticmethod
     def transform_gif(gif_base64: str, similarity_threshold: float = 1000.0, max_frames: int = 15) -> Optional[str]:
         # sourcery skip: use-contextlib-suppress
@@ -345,7 +459,7 @@ class ImageManager:
             if isinstance(gif_base64, str):
                 gif_base64 = gif_base64.encode("ascii", errors="ignore").decode("ascii")
             # 解码base64
-            gif_data = base64.b64decode(gif_base64)
+            gif_data = _b64decode_chunked(gif_base64)
             gif = Image.open(io.BytesIO(gif_data))
 
             # 收集所有帧
@@ -452,6 +566,9 @@ class ImageManager:
         # sourcery skip: hoist-if-from-if
         """处理图片并返回图片ID和描述
 
+        图片描述由后台任务生成，这里立即返回 [picid:...] 占位符，
+        构建提示词时再根据图片ID从Images表读取描述。
+
         Args:
             image_base64: 图片的base64编码
 
@@ -459,15 +576,10 @@ class ImageManager:
             Tuple[str, str]: (图片ID, 描述)
         """
         try:
-            # 生成图片ID
-            # 计算图片哈希
-            # 确保base64字符串只包含ASCII字符
-            if isinstance(image_base64, str):
-                image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
+            # 解码并计算图片哈希
+            image_base64, image_bytes, image_hash = await run_in_image_pool(_decode_image, image_base64)
 
-            if existing_image := Images.get_or_none(Images.emoji_hash == image_hash):
+            if existing_image := await db_read(Images.get_or_none, Images.emoji_hash == image_hash):
                 # 检查是否缺少必要字段，如果缺少则创建新记录
                 if (
                     not hasattr(existing_image, "image_id")
@@ -486,108 +598,129 @@ class ImageManager:
                         existing_image.vlm_processed = False
 
                 existing_image.count += 1
-                existing_image.save()
+                await db_write(existing_image.save)
+                if not existing_image.vlm_processed:
+                    # 上次的识别任务可能因重启而中断，重新排队（已在处理的不会重复提交）
+                    self._schedule_vlm(existing_image.image_id, image_base64, image_bytes, image_hash)
                 return existing_image.image_id, f"[picid:{existing_image.image_id}]"
-            else:
-                # print(f"图片不存在: {image_hash}")
-                image_id = str(uuid.uuid4())
-
-            # 保存新图片
-            current_timestamp = time.time()
-            image_dir = os.path.join(self.IMAGE_DIR, "images")
-            os.makedirs(image_dir, exist_ok=True)
-            filename = f"{image_id}.png"
-            file_path = os.path.join(image_dir, filename)
 
-            # 保存文件
-            with open(file_path, "wb") as f:
-                f.write(image_bytes)
-
-            # 保存到数据库
-            Images.create(
-                image_id=image_id,
-                emoji_hash=image_hash,
-                path=file_path,
-                type="image",
-                timestamp=current_timestamp,
-                vlm_processed=False,
-                count=1,
+            # 同一张新图片同时出现在多个聊天中时只保存一条记录
+            image_id = await self._single_flight(
+                f"new_image:{image_hash}", self._save_new_image, image_base64, image_bytes, image_hash
             )
-
-            # 启动异步VLM处理
-            await self._process_image_with_vlm(image_id, image_base64)
-
             return image_id, f"[picid:{image_id}]"
 
         except Exception as e:
             logger.error(f"处理图片失败: {str(e)}")
             return "", "[图片]"
 
-    async def _process_image_with_vlm(self, image_id: str, image_base64: str) -> None:
+    async def _save_new_image(self, image_base64: str, image_bytes: bytes, image_hash: str) -> str:
+        """保存新图片文件和记录，并提交后台VLM任务
+
+        Returns:
+            str: 新图片的ID
+        """
+        image_id = str(uuid.uuid4())
+
+        # 保存新图片
+        current_timestamp = time.time()
+        image_dir = os.path.join(self.IMAGE_DIR, "images")
+        os.makedirs(image_dir, exist_ok=True)
+        filename = f"{image_id}.png"
+        file_path = os.path.join(image_dir, filename)
+
+        # 保存文件
+        await run_in_image_pool(_write_image_file, file_path, image_bytes)
+
+        # 保存到数据库
+        await db_write(
+            Images.create,
+            image_id=image_id,
+            emoji_hash=image_hash,
+            path=file_path,
+            type="image",
+            timestamp=current_timestamp,
+            vlm_processed=False,
+            count=1,
+        )
+
+        # 在后台进行VLM处理，不阻塞消息处理流程
+        self._schedule_vlm(image_id, image_base64, image_bytes, image_hash)
+        return image_id
+
+    def _schedule_vlm(self, image_id: str, image_base64: str, image_bytes: bytes, image_hash: str) -> None:
+        """提交后台VLM任务，同一图片ID只会有一个任务"""
+        if image_id in self._pending_image_ids:
+            return
+        self._pending_image_ids.add(image_id)
+        task = asyncio.create_task(self._process_image_with_vlm(image_id, image_base64, image_bytes, image_hash))
+        self._background_tasks.add(task)
+        task.add_done_callback(functools.partial(self._on_vlm_task_done, image_id))
+
+    def _on_vlm_task_done(self, image_id: str, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        self._pending_image_ids.discard(image_id)
+
+    async def _process_image_with_vlm(
+        self, image_id: str, image_base64: str, image_bytes: bytes, image_hash: str
+    ) -> None:
         """使用VLM处理图片并更新数据库
 
         Args:
             image_id: 图片ID
             image_base64: 图片的base64编码
+            image_bytes: 解码后的图片数据
+            image_hash: 图片哈希值
         """
         try:
-            # 计算图片哈希
-            # 确保base64字符串只包含ASCII字符
-            if isinstance(image_base64, str):
-                image_base64 = image_base64.encode("ascii", errors="ignore").decode("ascii")
-            image_bytes = base64.b64decode(image_base64)
-            image_hash = hashlib.md5(image_bytes).hexdigest()
-
             # 获取当前图片记录
-            image = Images.get(Images.image_id == image_id)
+            image = await db_read(Images.get, Images.image_id == image_id)
 
             # 优先检查是否已有其他相同哈希的图片记录包含描述
-            existing_with_description = Images.get_or_none(
-                (Images.emoji_hash == image_hash) & (Images.description.is_null(False)) & (Images.description != "")
+            existing_with_description = await db_read(
+                Images.get_or_none,
+                (Images.emoji_hash == image_hash) & (Images.description.is_null(False)) & (Images.description != ""),
             )
             if existing_with_description and existing_with_description.id != image.id:
                 logger.debug(f"[缓存复用] 从其他相同图片记录复用描述: {existing_with_description.description[:50]}...")
                 image.description = existing_with_description.description
                 image.vlm_processed = True
-                image.save()
+                await db_write(image.save)
                 # 同时保存到ImageDescriptions表作为备用缓存
-                self._save_description_to_db(image_hash, existing_with_description.description, "image")
+                await db_write(self._save_description_to_db, image_hash, existing_with_description.description, "image")
                 return
 
             # 检查ImageDescriptions表的缓存描述
-            if cached_description := self._get_description_from_db(image_hash, "image"):
+            if cached_description := await db_read(self._get_description_from_db, image_hash, "image"):
                 logger.debug(f"[缓存复用] 从ImageDescriptions表复用描述: {cached_description[:50]}...")
                 image.description = cached_description
                 image.vlm_processed = True
-                image.save()
+                await db_write(image.save)
                 return
 
             # 获取图片格式
-            image_format = Image.open(io.BytesIO(image_bytes)).format.lower()  # type: ignore
-
-            # 构建prompt
-            prompt = global_config.personality.visual_style
+            image_format = await run_in_image_pool(_get_image_format, image_bytes)
 
-            # 获取VLM描述
-            description, _ = await self.vlm.generate_response_for_image(
-                prompt, image_base64, image_format, temperature=0.4, max_tokens=300
+            # 获取VLM描述，同一图片同时只请求一次
+            description = await self._single_flight(
+                f"image:{image_hash}", self._generate_image_description, image_base64, image_hash, image_format
             )
 
             if description is None:
                 logger.warning("VLM未能生成图片描述")
                 description = ""
 
-            if cached_description := self._get_description_from_db(image_hash, "image"):
+            if cached_description := await db_read(self._get_description_from_db, image_hash, "image"):
                 logger.info(f"虽然生成了描述，但是找到缓存图片描述: {cached_description}")
                 description = cached_description
 
             # 更新数据库
             image.description = description
             image.vlm_processed = True
-            image.save()
+            await db_write(image.save)
 
             # 保存描述到ImageDescriptions表作为备用缓存
-            self._save_description_to_db(image_hash, description, "image")
+            await db_write(self._save_description_to_db, image_hash, description, "image")
 
         except Exception as e:
             logger.error(f"VLM处理图片失败: {str(e)}")
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional, List, TYPE_CHECKING
+from typing import Awaitable, Callable, Optional, List, TYPE_CHECKING
 
 from . import BaseDataModel
 
@@ -16,4 +16,10 @@ class LLMGenerationDataModel(BaseDataModel):
     tool_calls: Optional[List["ToolCall"]] = None
     prompt: Optional[str] = None
     selected_expressions: Optional[List[int]] = None
-    reply_set: Optional["ReplySetModel"] = None
\ No newline at end of file
+    reply_set: Optional["ReplySetModel"] = None
+    streamed: bool = False
+    """回复是否已在生成过程中逐句交给调用方发送（此时 reply_set 为已发送的内容）"""
+
+
+ReplyStreamHandler = Callable[[str, LLMGenerationDataModel], Awaitable[Optional[bool]]]
+"""流式回复的处理函数，参数为一段已经完整的回复文本与本次生成的数据，返回 False 时停止生成"""
@@ -77,6 +77,8 @@ db = SqliteDatabase(
         "foreign_keys": 1,
         "ignore_check_constraints": 0,
         "synchronous": 0,  # 异步写入提高性能
-        "busy_timeout": 1000,  # 1秒超时而不是3秒
+        # 运行时的写入都经由 db_executor 的写线程串行执行；仍在其他线程直接写入的只有启动阶段的
+        # 建表/迁移、记忆图加载时的字段补全等，这些写入可能与写线程短暂竞争，超时放宽到5秒
+        "busy_timeout": 5000,
     },
 )
@@ -1,6 +1,9 @@
-from peewee import Model, DoubleField, IntegerField, BooleanField, TextField, FloatField, DateTimeField
+from peewee import Model, DoubleField, IntegerField, BooleanField, TextField, FloatField, DateTimeField, BlobField
 from .database import db
+from typing import List, Tuple
 import datetime
+import hashlib
+import time
 from src.common.logger import get_logger
 
 logger = get_logger("database_model")
@@ -126,7 +129,7 @@ class Messages(BaseModel):
     """
 
     message_id = TextField(index=True)  # 消息 ID (更改自 IntegerField)
-    time = DoubleField()  # 消息时间戳
+    time = DoubleField(index=True)  # 消息时间戳
 
     chat_id = TextField(index=True)  # 对应的 ChatStreams stream_id
 
@@ -175,6 +178,8 @@ class Messages(BaseModel):
     class Meta:
         # database = db # 继承自 BaseModel
         table_name = "messages"
+        # 按聊天和时间范围查询并按时间排序的复合索引
+        indexes = ((("chat_id", "time"), False),)
 
 
 class ActionRecords(BaseModel):
@@ -183,7 +188,7 @@ class ActionRecords(BaseModel):
     """
 
     action_id = TextField(index=True)  # 消息 ID (更改自 IntegerField)
-    time = DoubleField()  # 消息时间戳
+    time = DoubleField(index=True)  # 消息时间戳
 
     action_name = TextField()
     action_data = TextField()
@@ -199,6 +204,7 @@ class ActionRecords(BaseModel):
     class Meta:
         # database = db # 继承自 BaseModel
         table_name = "action_records"
+        indexes = ((("chat_id", "time"), False),)
 
 
 class Images(BaseModel):
@@ -251,6 +257,100 @@ class OnlineTime(BaseModel):
         table_name = "online_time"
 
 
+class LLMUsageRollupBase(BaseModel):
+    """
+    LLM 使用记录的时间桶聚合，按 (时间桶, 模型, 提供商, 请求类型, 用户) 累加。
+    由 statistic_rollup 根据 llm_usage 的自增 id 游标增量维护，统计任务只读取汇总表。
+    """
+
+    bucket = DateTimeField(index=True)  # 时间桶起点（本地时间，按分钟或小时取整）
+    model_name = TextField()
+    model_api_provider = TextField()
+    request_type = TextField()
+    user_id = TextField()
+    request_count = IntegerField(default=0)
+    prompt_tokens = IntegerField(default=0)
+    completion_tokens = IntegerField(default=0)
+    cost = DoubleField(default=0.0)
+    # 有效耗时（time_cost > 0）的个数、和与平方和，用于计算平均耗时与标准差
+    time_cost_count = IntegerField(default=0)
+    time_cost_sum = DoubleField(default=0.0)
+    time_cost_sq_sum = DoubleField(default=0.0)
+
+    class Meta:
+        indexes = ((("bucket", "model_name", "model_api_provider", "request_type", "user_id"), True),)
+
+
+class LLMUsageMinuteRollup(LLMUsageRollupBase):
+    """按分钟聚合的 LLM 使用记录，只保留最近几天"""
+
+    class Meta:
+        table_name = "llm_usage_rollup_minute"
+
+
+class LLMUsageHourRollup(LLMUsageRollupBase):
+    """按小时聚合的 LLM 使用记录"""
+
+    class Meta:
+        table_name = "llm_usage_rollup_hour"
+
+
+class MessageRollupBase(BaseModel):
+    """
+    消息数量的时间桶聚合，按 (时间桶, 聊天, 聊天名称) 累加。
+    chat_key 为群聊 "g{群号}" 或私聊 "u{用户ID}"，与统计页面的聊天划分一致。
+    """
+
+    bucket = DateTimeField(index=True)  # 时间桶起点（本地时间，按分钟或小时取整）
+    chat_key = TextField()
+    chat_name = TextField()
+    message_count = IntegerField(default=0)
+    last_time = DoubleField()  # 桶内该名称最后一条消息的时间戳，用于选取最新的聊天名称
+
+    class Meta:
+        indexes = ((("bucket", "chat_key", "chat_name"), True),)
+
+
+class MessageMinuteRollup(MessageRollupBase):
+    """按分钟聚合的消息数量，只保留最近几天"""
+
+    class Meta:
+        table_name = "messages_rollup_minute"
+
+
+class MessageHourRollup(MessageRollupBase):
+    """按小时聚合的消息数量"""
+
+    class Meta:
+        table_name = "messages_rollup_hour"
+
+
+class StatisticRollupCursor(BaseModel):
+    """
+    统计汇总表的增量游标，记录每个源表已汇总到的最大 id
+    """
+
+    source = TextField(unique=True)  # 源表名
+    last_id = IntegerField(default=0)
+
+    class Meta:
+        table_name = "statistic_rollup_cursor"
+
+
+class EmbeddingCache(BaseModel):
+    """
+    文本嵌入向量的磁盘缓存，按 (模型标识符, 文本哈希) 存储，超出条数上限时按写入时间淘汰最旧的记录
+    """
+
+    cache_key = TextField(unique=True)  # "模型标识符:文本sha256"
+    model_name = TextField()  # 生成该向量的模型名（配置中的 name）
+    embedding = BlobField()  # float32 向量的原始字节
+    timestamp = FloatField(index=True)  # 写入时间
+
+    class Meta:
+        table_name = "embedding_cache"
+
+
 class PersonInfo(BaseModel):
     """
     用于存储个人信息数据的模型。
@@ -389,6 +489,12 @@ def initialize_database(sync_constraints=False):
         GraphNodes,
         GraphEdges,
         ActionRecords,  # 添加 ActionRecords 到初始化列表
+        LLMUsageMinuteRollup,
+        LLMUsageHourRollup,
+        MessageMinuteRollup,
+        MessageHourRollup,
+        StatisticRollupCursor,
+        EmbeddingCache,
     ]
 
     try:
@@ -420,6 +526,7 @@ def initialize_database(sync_constraints=False):
                             "DoubleField": "DOUBLE",
                             "BooleanField": "INTEGER",
                             "DateTimeField": "DATETIME",
+                            "BlobField": "BLOB",
                         }.get(field_type, "TEXT")
                         alter_sql = f"ALTER TABLE {table_name} ADD COLUMN {field_name} {sql_type}"
                         alter_sql += " NULL" if field_obj.null else " NOT NULL"
@@ -441,6 +548,9 @@ def initialize_database(sync_constraints=False):
                         except Exception as e:
                             logger.error(f"添加字段 '{field_name}' 失败: {e}")
 
+                # 检查并创建缺失的索引
+                _sync_indexes(model)
+
                 # 检查并删除多余字段（新增逻辑）
                 extra_fields = existing_columns - model_fields
                 if extra_fields:
@@ -467,6 +577,52 @@ def initialize_database(sync_constraints=False):
     logger.info("数据库初始化完成")
 
 
+def _index_name(model, columns: List[str]) -> str:
+    """与 peewee 建表时自动生成的索引名一致：模型名_列名，超过 64 个字符时截断并附加哈希"""
+    prefix = model._meta.name if model._meta.legacy_table_names else model._meta.table_name
+    index_name = "_".join([prefix, *columns])
+    if len(index_name) > 64:
+        index_name = f"{index_name[:56]}_{hashlib.md5(index_name.encode('utf-8')).hexdigest()[:7]}"
+    return index_name
+
+
+def _declared_indexes(model) -> List[Tuple[List[str], bool]]:
+    """模型中声明的索引，返回 (列名列表, 是否唯一) 列表"""
+    declared = [
+        ([field.column_name], bool(field.unique))
+        for field in model._meta.sorted_fields
+        if (field.index or field.unique) and not field.primary_key
+    ]
+    for field_names, unique in model._meta.indexes:
+        declared.append(([model._meta.fields[name].column_name for name in field_names], bool(unique)))
+    return declared
+
+
+def _sync_indexes(model):
+    """为已存在的表补建模型中定义但数据库中缺失的索引（按索引覆盖的列判断是否已存在）"""
+    table_name = model._meta.table_name
+    existing_columns = set()
+    for row in db.execute_sql(f'PRAGMA index_list("{table_name}")').fetchall():
+        index_info = db.execute_sql(f'PRAGMA index_info("{row[1]}")').fetchall()
+        existing_columns.add(tuple(info[2] for info in sorted(index_info)))
+
+    for columns, unique in _declared_indexes(model):
+        if tuple(columns) in existing_columns:
+            continue
+        index_name = _index_name(model, columns)
+        column_sql = ", ".join(f'"{column}"' for column in columns)
+        try:
+            logger.info(f"表 '{table_name}' 缺失索引 '{index_name}'，正在创建...")
+            start_time = time.time()
+            db.execute_sql(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index_name}" '
+                f'ON "{table_name}" ({column_sql})'
+            )
+            logger.info(f"索引 '{index_name}' 创建成功，耗时 {time.time() - start_time:.2f}秒")
+        except Exception as e:
+            logger.error(f"创建索引 '{index_name}' 失败: {e}")
+
+
 def sync_field_constraints():
     """
     同步数据库字段约束，确保现有数据库字段的 NULL 约束与模型定义一致。
@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+from src.common.logger import get_logger
+
+logger = get_logger("db_executor")
+
+T = TypeVar("T")
+
+# 读连接数量：SQLite 在 WAL 模式下读不阻塞写，多个读线程可以并行
+DB_READER_WORKERS = 4
+# 单次查询超过该耗时（秒）时输出警告
+DB_SLOW_QUERY_THRESHOLD = 0.5
+# 用于计算分位数的最近耗时样本数
+DB_LATENCY_WINDOW = 1000
+
+
+class _PoolStats:
+    """单个线程池的排队与耗时统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.recent: Deque[float] = deque(maxlen=DB_LATENCY_WINDOW)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            recent = sorted(self.recent)
+            done = self.completed + self.failed
+            return {
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": self.total_wait / done * 1000 if done else 0.0,
+                "avg_ms": self.total_time / done * 1000 if done else 0.0,
+                "max_ms": self.max_time * 1000,
+                "p50_ms": recent[len(recent) // 2] * 1000 if recent else 0.0,
+                "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+            }
+
+
+class DatabaseExecutor:
+    """
+    异步数据库执行器
+
+    Peewee 的查询是同步阻塞的，直接在协程中调用会在等待 WAL 锁或 fsync 时卡住整个事件循环。
+    这里把查询交给专用线程执行：
+    - 写操作进入单线程的写池，按提交顺序串行执行，避免多个写者争抢数据库锁
+    - 读操作进入多线程的读池，每个线程持有自己的连接（peewee 的连接是线程本地的）
+
+    写操作 await 返回时已经提交，之后提交的读操作一定能读到该写入。
+    """
+
+    def __init__(self, reader_workers: int = DB_READER_WORKERS):
+        self.reader_workers = reader_workers
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self.write_stats = _PoolStats()
+        self.read_stats = _PoolStats()
+
+    def _get_writer(self) -> Optional[ThreadPoolExecutor]:
+        with self._pool_lock:
+            if self._writer is None and not self._closed:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            return self._writer
+
+    def _get_readers(self) -> Optional[ThreadPoolExecutor]:
+        with self._pool_lock:
+            if self._readers is None and not self._closed:
+                self._readers = ThreadPoolExecutor(max_workers=self.reader_workers, thread_name_prefix="db-reader")
+            return self._readers
+
+    @staticmethod
+    def _run(stats: _PoolStats, label: str, submit_time: float, func: Callable[..., T]) -> T:
+        start = time.perf_counter()
+        with stats.lock:
+            stats.queued -= 1
+            stats.running += 1
+            stats.total_wait += start - submit_time
+        ok = False
+        try:
+            result = func()
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with stats.lock:
+                stats.running -= 1
+                if ok:
+                    stats.completed += 1
+                else:
+                    stats.failed += 1
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+                stats.recent.append(elapsed)
+            if elapsed > DB_SLOW_QUERY_THRESHOLD:
+                logger.warning(f"数据库操作 {label} 耗时 {elapsed * 1000:.1f}毫秒")
+
+    def _submit_nowait(
+        self,
+        get_executor: Callable[[], Optional[ThreadPoolExecutor]],
+        stats: _PoolStats,
+        func: Callable[..., T],
+        *args,
+        **kwargs,
+    ) -> Optional["Future[T]"]:
+        executor = get_executor()
+        if executor is None:
+            return None
+        label = getattr(func, "__qualname__", repr(func))
+        call = functools.partial(func, *args, **kwargs)
+        with stats.lock:
+            stats.queued += 1
+        try:
+            return executor.submit(self._run, stats, label, time.perf_counter(), call)
+        except RuntimeError:
+            # 线程池恰好在提交前被关闭
+            with stats.lock:
+                stats.queued -= 1
+            return None
+
+    async def _submit(
+        self,
+        get_executor: Callable[[], Optional[ThreadPoolExecutor]],
+        stats: _PoolStats,
+        func: Callable[..., T],
+        *args,
+        **kwargs,
+    ) -> T:
+        future = self._submit_nowait(get_executor, stats, func, *args, **kwargs)
+        if future is None:
+            # 关闭后不再接受新任务，直接在当前线程执行，保证关闭阶段的收尾写入不丢失
+            return func(*args, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    async def run_read(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在读线程池中执行只读的数据库操作"""
+        return await self._submit(self._get_readers, self.read_stats, func, *args, **kwargs)
+
+    async def run_write(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在写线程中串行执行会修改数据库的操作"""
+        return await self._submit(self._get_writer, self.write_stats, func, *args, **kwargs)
+
+    def submit_write(self, func: Callable[..., T], *args, **kwargs) -> Optional["Future[T]"]:
+        """不等待结果地把写操作提交给写线程，供非协程代码使用；执行器已关闭时返回 None"""
+        return self._submit_nowait(self._get_writer, self.write_stats, func, *args, **kwargs)
+
+    @staticmethod
+    def in_writer_thread() -> bool:
+        """当前是否运行在写线程中，写线程内不能再等待写线程上的任务"""
+        return threading.current_thread().name.startswith("db-writer")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取读写线程池的队列深度与耗时统计"""
+        return {"write": self.write_stats.snapshot(), "read": self.read_stats.snapshot()}
+
+    def shutdown(self, wait: bool = True):
+        """等待已提交的操作完成后关闭线程池"""
+        with self._pool_lock:
+            self._closed = True
+            writer, readers = self._writer, self._readers
+            self._writer = self._readers = None
+        for executor in (writer, readers):
+            if executor is not None:
+                executor.shutdown(wait=wait)
+        stats = self.get_stats()
+        logger.info(
+            f"数据库执行器已关闭，写入 {stats['write']['completed']} 次（平均 {stats['write']['avg_ms']:.1f}毫秒），"
+            f"读取 {stats['read']['completed']} 次（平均 {stats['read']['avg_ms']:.1f}毫秒）"
+        )
+
+
+db_executor = DatabaseExecutor()
+
+
+async def db_read(func: Callable[..., T], *args, **kwargs) -> T:
+    """在读线程池中执行 func(*args, **kwargs)"""
+    return await db_executor.run_read(func, *args, **kwargs)
+
+
+async def db_write(func: Callable[..., T], *args, **kwargs) -> T:
+    """在写线程中执行 func(*args, **kwargs)"""
+    return await db_executor.run_write(func, *args, **kwargs)
@@ -0,0 +1,284 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from peewee import Model, chunked
+
+from src.common.database.database import db
+from src.common.database.db_executor import db_executor
+from src.common.logger import get_logger
+
+logger = get_logger("group_commit")
+
+# 攒够多少行立即提交
+GROUP_COMMIT_MAX_ROWS = 200
+# 第一行进入缓冲后最多等待多久（秒）提交
+GROUP_COMMIT_MAX_DELAY = 0.05
+# 单条 INSERT 语句的绑定参数上限，旧版本 SQLite 默认为 999
+SQLITE_MAX_VARIABLES = 999
+
+# 行写入完成后的回调，参数为是否写入成功，在写入线程中调用
+WrittenCallback = Callable[[bool], None]
+# (模型, 行数据, 主键字段, 写入完成回调)
+PendingRow = Tuple[Type[Model], Dict[str, Any], Optional[str], Optional[WrittenCallback]]
+
+
+class GroupCommitWriter:
+    """
+    组提交写入器
+
+    消息、LLM 使用记录、动作记录这类只追加的数据由生产者放入缓冲区，
+    攒够 GROUP_COMMIT_MAX_ROWS 行或等待 GROUP_COMMIT_MAX_DELAY 秒后，
+    在写线程上用一个事务 insert_many 一次性提交，避免每行一次提交。
+
+    读取这些表之前调用 flush(model, chat_id)：若该聊天还有未提交的行，会等待其提交后再返回，
+    保证刚写入的数据马上可以读到。协程中使用 await aflush(model, chat_id)，等待期间不阻塞事件循环；
+    在事件循环线程中调用 flush 只安排提交、不等待，最多读到 GROUP_COMMIT_MAX_DELAY 之前的数据，
+    因此在协程中同步读取这些表之前，应先 await aflush(chat_id=...)，或通过 db_read 在读线程中读取。
+    """
+
+    def __init__(self, max_rows: int = GROUP_COMMIT_MAX_ROWS, max_delay: float = GROUP_COMMIT_MAX_DELAY):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个批次在写入，关闭后在其他线程直接写入时也不会交错
+        self._flush_lock = threading.Lock()
+        self._pending: List[PendingRow] = []
+        # 尚未提交（包括正在提交）的行数，按模型以及 (模型, chat_id) 统计
+        self._pending_models: Counter = Counter()
+        self._pending_chats: Counter = Counter()
+        # 第一行进入缓冲后的提交期限，由常驻的定时线程检查，避免每批数据都新建一个定时器线程
+        self._deadline: Optional[float] = None
+        self._wakeup = threading.Condition(self._lock)
+        self._timer_thread: Optional[threading.Thread] = None
+        self._scheduled: Optional[Future] = None
+        self._closed = False
+
+        self.rows_written = 0
+        self.batches = 0
+        self.total_flush_time = 0.0
+        self.max_batch_rows = 0
+
+    def add(
+        self,
+        model: Type[Model],
+        row: Dict[str, Any],
+        key_field: Optional[str] = None,
+        on_written: Optional[WrittenCallback] = None,
+    ):
+        """
+        放入一行待写入的数据，立即返回
+
+        Args:
+            model: Peewee 模型类
+            row: 字段名到值的字典
+            key_field: 提供时按该字段去重：已存在同值记录则更新，否则插入（与 db_save 的语义一致）
+            on_written: 该行实际提交（或写入失败）后调用，参数为是否成功，在执行写入的线程中调用
+        """
+        with self._lock:
+            self._pending.append((model, row, key_field, on_written))
+            self._pending_models[model] += 1
+            self._pending_chats[(model, row.get("chat_id"))] += 1
+            if self._closed:
+                write_now = True
+            elif len(self._pending) >= self.max_rows:
+                write_now = self._schedule_locked() is None
+            else:
+                write_now = False
+                if self._deadline is None and self._scheduled is None:
+                    self._deadline = time.monotonic() + self.max_delay
+                    self._start_timer_locked()
+        if write_now:
+            # 已关闭或写线程不可用，直接在当前线程写入
+            self._flush()
+
+    def has_pending(self, model: Optional[Type[Model]] = None, chat_id: Optional[str] = None) -> bool:
+        """是否有尚未提交的行；model 为空表示任意模型，chat_id 为空表示任意聊天"""
+        with self._lock:
+            return self._has_pending_locked(model, chat_id)
+
+    def flush(
+        self, model: Optional[Type[Model]] = None, chat_id: Optional[str] = None, timeout: Optional[float] = None
+    ):
+        """
+        若有符合条件的未提交行，立即提交并等待完成
+
+        Args:
+            model: 只关心该模型的数据，为空表示全部模型
+            chat_id: 只关心该聊天的数据，为空表示全部聊天
+            timeout: 最长等待时间（秒）
+        """
+        with self._lock:
+            if not self._has_pending_locked(model, chat_id):
+                return
+            future = None if db_executor.in_writer_thread() else self._schedule_locked()
+        if future is None:
+            self._flush()
+        elif not _in_event_loop():
+            future.result(timeout)
+
+    async def aflush(self, model: Optional[Type[Model]] = None, chat_id: Optional[str] = None):
+        """flush 的协程版本，等待写线程提交时不阻塞事件循环"""
+        with self._lock:
+            if not self._has_pending_locked(model, chat_id):
+                return
+            future = self._schedule_locked()
+        if future is None:
+            # 写线程已关闭，在默认线程池中直接写入
+            await asyncio.to_thread(self._flush)
+        else:
+            # 提交由多个等待者共享，取消当前等待不应取消提交本身
+            await asyncio.shield(asyncio.wrap_future(future))
+
+    def close(self):
+        """停止缓冲并写入剩余的数据，之后 add 会直接写入"""
+        with self._lock:
+            self._closed = True
+            self._deadline = None
+            self._wakeup.notify_all()
+        self._flush()
+        logger.info(
+            f"组提交写入器已关闭，共写入 {self.rows_written} 行，{self.batches} 批，"
+            f"平均每批 {self.rows_written / self.batches if self.batches else 0:.1f} 行"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓冲与批量写入统计"""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "max_batch_rows": self.max_batch_rows,
+            "avg_flush_ms": self.total_flush_time / self.batches * 1000 if self.batches else 0.0,
+        }
+
+    def _has_pending_locked(self, model: Optional[Type[Model]], chat_id: Optional[str]) -> bool:
+        if model is None:
+            if chat_id is None:
+                return bool(self._pending_models)
+            return any(pending_chat == chat_id for _, pending_chat in self._pending_chats)
+        if chat_id is None:
+            return self._pending_models[model] > 0
+        return self._pending_chats[(model, chat_id)] > 0
+
+    def _schedule_locked(self) -> Optional[Future]:
+        """在写线程上安排一次提交；已安排且尚未开始的提交会被复用"""
+        self._deadline = None
+        if self._scheduled is None:
+            self._scheduled = db_executor.submit_write(self._flush)
+        return self._scheduled
+
+    def _start_timer_locked(self):
+        if self._timer_thread is None:
+            self._timer_thread = threading.Thread(target=self._timer_loop, name="group-commit-timer", daemon=True)
+            self._timer_thread.start()
+        self._wakeup.notify()
+
+    def _timer_loop(self):
+        """到达提交期限后安排提交，关闭后退出"""
+        while True:
+            with self._lock:
+                while not self._closed and (self._deadline is None or self._deadline > time.monotonic()):
+                    self._wakeup.wait(None if self._deadline is None else self._deadline - time.monotonic())
+                if self._closed:
+                    return
+                self._deadline = None
+                if not self._pending:
+                    continue
+                future = self._schedule_locked()
+            if future is None:
+                self._flush()
+
+    def _flush(self):
+        with self._flush_lock:
+            with self._lock:
+                # 安排的提交开始执行，此后加入的行需要重新安排
+                self._scheduled = None
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._lock:
+                    for model, row, _, _ in batch:
+                        self._pending_models[model] -= 1
+                        self._pending_chats[(model, row.get("chat_id"))] -= 1
+                    self._pending_models += Counter()
+                    self._pending_chats += Counter()
+
+    def _write_batch(self, batch: List[PendingRow]):
+        start = time.perf_counter()
+        # 列相同的行才能放进同一条 insert_many
+        groups: Dict[Tuple[Type[Model], Optional[str], Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for model, row, key_field, _ in batch:
+            groups.setdefault((model, key_field, tuple(row)), []).append(row)
+
+        results: List[bool]
+        try:
+            with db.atomic():
+                for (model, key_field, _), rows in groups.items():
+                    self._insert_rows(model, rows, key_field)
+            results = [True] * len(batch)
+        except Exception as e:
+            logger.error(f"批量写入 {len(batch)} 行失败，改为逐行写入: {e}")
+            results = []
+            for model, row, key_field, _ in batch:
+                try:
+                    with db.atomic():
+                        self._insert_rows(model, [row], key_field)
+                    results.append(True)
+                except Exception as row_error:
+                    logger.error(f"写入 {model.__name__} 记录失败: {row_error}")
+                    results.append(False)
+
+        for (_, _, _, on_written), ok in zip(batch, results, strict=True):
+            if on_written is None:
+                continue
+            try:
+                on_written(ok)
+            except Exception as e:
+                logger.error(f"组提交写入回调出错: {e}")
+
+        elapsed = time.perf_counter() - start
+        self.rows_written += len(batch)
+        self.batches += 1
+        self.total_flush_time += elapsed
+        self.max_batch_rows = max(self.max_batch_rows, len(batch))
+
+    @staticmethod
+    def _insert_rows(model: Type[Model], rows: List[Dict[str, Any]], key_field: Optional[str]):
+        if key_field:
+            # 同一批内相同主键只保留最后一次写入，已存在的记录改为更新
+            latest = {row[key_field]: row for row in rows}
+            field = getattr(model, key_field)
+            existing = set()
+            for keys in chunked(list(latest), SQLITE_MAX_VARIABLES):
+                existing.update(value for (value,) in model.select(field).where(field.in_(keys)).tuples())
+            for key in existing:
+                model.update(**latest[key]).where(field == key).execute()
+            rows = [row for key, row in latest.items() if key not in existing]
+
+        if not rows:
+            return
+        rows_per_statement = max(1, SQLITE_MAX_VARIABLES // len(rows[0]))
+        for chunk in chunked(rows, rows_per_statement):
+            model.insert_many(chunk).execute()
+
+
+def _in_event_loop() -> bool:
+    """当前线程是否正在运行事件循环，事件循环线程不能阻塞等待写线程"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+group_commit_writer = GroupCommitWriter()
@@ -1,14 +1,19 @@
 # 使用基于时间戳的文件处理器，简单的轮转份数限制
 
+import atexit
 import logging
 import json
+import queue
+import random
 import threading
 import time
 import structlog
 import tomlkit
 
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
 # 创建logs目录
@@ -19,6 +24,12 @@ PROJECT_ROOT = logger_file.parent.parent.parent.resolve()
 # 全局handler实例，避免重复创建
 _file_handler = None
 _console_handler = None
+# 异步日志模式下的队列handler与后台写入线程
+_queue_handler = None
+_queue_listener = None
+
+# 异步日志模式下后台线程每批最多处理的日志条数
+ASYNC_LOG_BATCH_SIZE = 512
 
 
 def get_file_handler():
@@ -70,23 +81,27 @@ class TimestampedFileHandler(logging.Handler):
         self.backup_count = backup_count
         self.encoding = encoding
         self._lock = threading.Lock()
+        # 是否每条日志都立即flush；异步模式下由后台线程在每批写完后统一flush
+        self.auto_flush = True
 
         # 当前活跃的日志文件
         self.current_file = None
         self.current_stream = None
+        # 当前文件已写入的字节数，用于判断轮转，避免每条日志都stat一次文件
+        self._bytes_written = 0
         self._init_current_file()
 
     def _init_current_file(self):
         """初始化当前日志文件"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.current_file = self.log_dir / f"app_{timestamp}.log.jsonl"
-        self.current_stream = open(self.current_file, "a", encoding=self.encoding)
+        self.current_stream = open(self.current_file, "ab")
+        # 同一秒内轮转时会追加到已有文件
+        self._bytes_written = self.current_stream.tell()
 
     def _should_rollover(self):
         """检查是否需要轮转"""
-        if self.current_file and self.current_file.exists():
-            return self.current_file.stat().st_size >= self.max_bytes
-        return False
+        return self._bytes_written >= self.max_bytes
 
     def _do_rollover(self):
         """执行轮转：关闭当前文件，创建新文件"""
@@ -129,13 +144,21 @@ class TimestampedFileHandler(logging.Handler):
 
                 # 写入日志
                 if self.current_stream:
-                    msg = self.format(record)
-                    self.current_stream.write(msg + "\n")
-                    self.current_stream.flush()
+                    data = (self.format(record) + "\n").encode(self.encoding)
+                    self.current_stream.write(data)
+                    self._bytes_written += len(data)
+                    if self.auto_flush:
+                        self.current_stream.flush()
 
         except Exception:
             self.handleError(record)
 
+    def flush(self):
+        """将缓冲区内容写入文件"""
+        with self._lock:
+            if self.current_stream:
+                self.current_stream.flush()
+
     def close(self):
         """关闭处理器"""
         with self._lock:
@@ -148,9 +171,72 @@ class TimestampedFileHandler(logging.Handler):
 # 旧的轮转文件处理器已移除，现在使用基于时间戳的处理器
 
 
+class StructlogQueueHandler(QueueHandler):
+    """异步日志模式下挂在根logger上的handler，只把日志记录放入队列，格式化与写入交给后台线程"""
+
+    def prepare(self, record):
+        # 记录不跨进程传递，无需像默认实现那样在调用线程上提前格式化
+        return record
+
+
+class BatchingQueueListener(QueueListener):
+    """从队列中批量取出日志记录并写入各handler，每批写完后统一flush一次"""
+
+    def _monitor(self):
+        q = self.queue
+        has_task_done = hasattr(q, "task_done")
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < ASYNC_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    # 停止前仍然写完同一批中剩余的记录
+                    stopping = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+            if has_task_done:
+                for _ in batch:
+                    q.task_done()
+
+
+def stop_async_logging():
+    """停止异步日志的后台线程，等待队列中已有的日志全部写入，之后的日志改回在调用线程直接写入"""
+    global _queue_listener
+    if _queue_listener is not None:
+        # 先把根logger换回真实的handler再停止后台线程，停止后不会再有日志留在无人消费的队列中
+        root_logger = logging.getLogger()
+        if _queue_handler is not None:
+            root_logger.removeHandler(_queue_handler)
+        for handler in _queue_listener.handlers:
+            if handler not in root_logger.handlers:
+                root_logger.addHandler(handler)
+        _queue_listener.stop()
+        _queue_listener = None
+    if _file_handler:
+        _file_handler.auto_flush = True
+
+
+atexit.register(stop_async_logging)
+
+
 def close_handlers():
     """安全关闭所有handler"""
-    global _file_handler, _console_handler
+    global _file_handler, _console_handler, _queue_handler
+
+    stop_async_logging()
+    if _queue_handler:
+        _queue_handler.close()
+        _queue_handler = None
 
     if _file_handler:
         _file_handler.close()
@@ -209,6 +295,9 @@ def load_log_config():  # sourcery skip: use-contextlib-suppress
             "jieba",
         ],
         "library_log_levels": {"aiohttp": "WARNING"},
+        "async_log": False,  # 是否由后台线程批量格式化并写入日志
+        "log_sample_rates": {},  # 各级别日志的采样率
+        "info_rate_limit": 0,  # 每个模块每秒最多输出的INFO日志条数，0为不限制
     }
 
     try:
@@ -459,6 +548,23 @@ MODULE_ALIASES = {
 RESET_COLOR = "\033[0m"
 
 
+@lru_cache(maxsize=1024)
+def _pathname_to_module(pathname: str) -> Optional[str]:
+    """将文件路径转换为模块风格的路径，转换失败时返回None；结果会被缓存，避免每条日志都访问文件系统"""
+    try:
+        # 使用绝对路径确保准确性
+        pathname_path = Path(pathname).resolve()
+        rel_path = pathname_path.relative_to(PROJECT_ROOT)
+    except Exception:
+        return None
+
+    # 转换为模块风格：移除 .py 扩展名，将路径分隔符替换为点
+    module_path = str(rel_path).replace("\\", ".").replace("/", ".")
+    if module_path.endswith(".py"):
+        module_path = module_path[:-3]
+    return module_path
+
+
 def convert_pathname_to_module(logger, method_name, event_dict):
     # sourcery skip: extract-method, use-string-remove-affix
     """将 pathname 转换为模块风格的路径"""
@@ -468,31 +574,72 @@ def convert_pathname_to_module(logger, method_name, event_dict):
             event_dict["module"] = "maim_message"
         return event_dict
     if "pathname" in event_dict:
-        pathname = event_dict["pathname"]
-        try:
-            # 使用绝对路径确保准确性
-            pathname_path = Path(pathname).resolve()
-            rel_path = pathname_path.relative_to(PROJECT_ROOT)
-
-            # 转换为模块风格：移除 .py 扩展名，将路径分隔符替换为点
-            module_path = str(rel_path).replace("\\", ".").replace("/", ".")
-            if module_path.endswith(".py"):
-                module_path = module_path[:-3]
-
+        pathname = event_dict.pop("pathname")
+        module_path = _pathname_to_module(pathname)
+        if module_path is not None:
             # 使用转换后的模块路径替换 module 字段
             event_dict["module"] = module_path
-            # 移除原始的 pathname 字段
-            del event_dict["pathname"]
-        except Exception:
-            # 如果转换失败，删除 pathname 但保留原始的 module（如果有的话）
-            del event_dict["pathname"]
-            # 如果没有 module 字段，使用文件名作为备选
-            if "module" not in event_dict:
-                event_dict["module"] = Path(pathname).stem
+        elif "module" not in event_dict:
+            # 如果转换失败且没有 module 字段，使用文件名作为备选
+            event_dict["module"] = Path(pathname).stem
 
     return event_dict
 
 
+class LogSampler:
+    """
+    日志采样与限流处理器
+
+    位于structlog处理链的前部，被丢弃的日志不会再进行调用位置检查、格式化与写入：
+    - log_sample_rates: 各级别的采样率（0~1），例如 { "DEBUG" = 0.1 } 表示只保留一成的DEBUG日志
+    - info_rate_limit: 每个模块每秒最多输出的INFO及以下级别日志条数，0为不限制；
+      被限流省略的条数会附在该模块下一秒的第一条日志后
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sample_rates: Dict[str, float] = {}
+        self.info_rate_limit = 0
+        # 模块名 -> (当前窗口开始时间, 窗口内已输出条数, 被省略条数)
+        self._windows: Dict[str, Tuple[float, int, int]] = {}
+
+    def reload(self, config):
+        """从日志配置中读取采样率与限流设置"""
+        rates = config.get("log_sample_rates", {}) or {}
+        self.sample_rates = {str(level).lower(): float(rate) for level, rate in rates.items()}
+        self.info_rate_limit = int(config.get("info_rate_limit", 0) or 0)
+        with self._lock:
+            self._windows.clear()
+
+    def __call__(self, logger, method_name, event_dict):
+        level = event_dict.get("level", method_name)
+        rate = self.sample_rates.get(level)
+        if rate is not None and rate < 1 and random.random() >= rate:
+            raise structlog.DropEvent
+        if self.info_rate_limit > 0 and level in ("debug", "info"):
+            self._apply_rate_limit(event_dict)
+        return event_dict
+
+    def _apply_rate_limit(self, event_dict):
+        name = event_dict.get("logger_name", "")
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._windows.get(name, (now, 0, 0))
+            if now - window_start >= 1:
+                # 进入新的一秒，报告上一秒被省略的条数
+                if suppressed:
+                    event_dict["event"] = f"{event_dict.get('event', '')}（此前因限流省略了 {suppressed} 条日志）"
+                window_start, count, suppressed = now, 0, 0
+            if count >= self.info_rate_limit:
+                self._windows[name] = (window_start, count, suppressed + 1)
+                raise structlog.DropEvent
+            self._windows[name] = (window_start, count + 1, suppressed)
+
+
+log_sampler = LogSampler()
+log_sampler.reload(LOG_CONFIG)
+
+
 class ModuleColoredConsoleRenderer:
     """自定义控制台渲染器，为不同模块提供不同颜色"""
 
@@ -656,6 +803,8 @@ def configure_structlog():
         processors=[
             structlog.contextvars.merge_contextvars,
             structlog.processors.add_log_level,
+            # 先采样限流，被丢弃的日志不再检查调用位置
+            log_sampler,
             structlog.processors.CallsiteParameterAdder(
                 parameters=[
                     structlog.processors.CallsiteParameter.PATHNAME,
@@ -750,6 +899,44 @@ def _immediate_setup():
     # 重新配置所有已存在的logger
     reconfigure_existing_loggers()
 
+    # 按配置切换同步/异步日志
+    apply_log_pipeline()
+
+
+def apply_log_pipeline():
+    """
+    按配置切换日志写入方式
+
+    async_log 为 true 时根logger只挂一个队列handler，调用线程（通常是事件循环）只负责入队，
+    由后台线程批量格式化并写入文件与控制台；为 false 时直接在调用线程写入。
+    """
+    global _queue_handler, _queue_listener
+    root_logger = logging.getLogger()
+    file_handler = get_file_handler()
+    console_handler = get_console_handler()
+
+    if LOG_CONFIG.get("async_log", False):
+        if _queue_handler is None:
+            _queue_handler = StructlogQueueHandler(queue.SimpleQueue())
+        if _queue_listener is None:
+            _queue_listener = BatchingQueueListener(
+                _queue_handler.queue, file_handler, console_handler, respect_handler_level=True
+            )
+            file_handler.auto_flush = False
+            _queue_listener.start()
+        for handler in root_logger.handlers[:]:
+            if handler is not _queue_handler:
+                root_logger.removeHandler(handler)
+        if _queue_handler not in root_logger.handlers:
+            root_logger.addHandler(_queue_handler)
+    else:
+        if _queue_handler is not None:
+            root_logger.removeHandler(_queue_handler)
+        stop_async_logging()
+        for handler in (file_handler, console_handler):
+            if handler not in root_logger.handlers:
+                root_logger.addHandler(handler)
+
 
 # 立即执行配置
 _immediate_setup()
@@ -778,8 +965,10 @@ def initialize_logging():
     global LOG_CONFIG
     LOG_CONFIG = load_log_config()
     # print(LOG_CONFIG)
+    log_sampler.reload(LOG_CONFIG)
     configure_third_party_loggers()
     reconfigure_existing_loggers()
+    apply_log_pipeline()
 
     # 启动日志清理任务
     start_log_cleanup_task()
@@ -792,6 +981,7 @@ def initialize_logging():
     logger.info("日志系统已初始化:")
     logger.info(f"  - 控制台级别: {console_level}")
     logger.info(f"  - 文件级别: {file_level}")
+    logger.info(f"  - 写入方式: {'异步批量' if LOG_CONFIG.get('async_log', False) else '同步'}")
     logger.info("  - 轮转份数: 30个文件|自动清理: 30天前的日志")
 
 
@@ -845,6 +1035,9 @@ def shutdown_logging():
     logger = get_logger("logger")
     logger.info("正在关闭日志系统...")
 
+    # 先等待异步队列中的日志全部写入
+    stop_async_logging()
+
     # 关闭所有handler
     root_logger = logging.getLogger()
     for handler in root_logger.handlers[:]:
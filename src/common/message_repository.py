@@ -1,21 +1,24 @@
 import traceback
 
 from typing import List, Any, Optional
-from peewee import Model  # 添加 Peewee Model 导入
 
 from src.config.config import global_config
 from src.common.data_models.database_data_model import DatabaseMessages
 from src.common.database.database_model import Messages
+from src.common.database.group_commit import group_commit_writer
 from src.common.logger import get_logger
 
 logger = get_logger(__name__)
 
 
-def _model_to_instance(model_instance: Model) -> DatabaseMessages:
-    """
-    将 Peewee 模型实例转换为字典。
-    """
-    return DatabaseMessages(**model_instance.__data__)
+# DatabaseMessages 需要的列，不含自增主键
+_MESSAGE_COLUMNS = [field for field in Messages._meta.sorted_fields if field.name != "id"]
+
+
+def _flush_pending_messages(message_filter: dict[str, Any]):
+    """等待组提交写入器提交与过滤条件相关的消息；chat_id 不是单个值时等待全部消息"""
+    chat_id = message_filter.get("chat_id") if message_filter else None
+    group_commit_writer.flush(Messages, chat_id if isinstance(chat_id, str) else None)
 
 
 def find_messages(
@@ -39,7 +42,10 @@ def find_messages(
         消息字典列表，如果出错则返回空列表。
     """
     try:
-        query = Messages.select()
+        # 先提交该聊天缓冲中的消息，保证能读到刚存储的消息
+        _flush_pending_messages(message_filter)
+        # 只取需要的列并以字典返回，跳过 Peewee 模型实例的构造
+        query = Messages.select(*_MESSAGE_COLUMNS)
 
         # 应用过滤器
         if message_filter:
@@ -81,19 +87,19 @@ def find_messages(
             query = query.where(Messages.user_id != global_config.bot.qq_account)
 
         if filter_command:
-            query = query.where(not Messages.is_command)
+            query = query.where(Messages.is_command == False)  # noqa: E712
 
         if limit > 0:
             if limit_mode == "earliest":
                 # 获取时间最早的 limit 条记录，已经是正序
                 query = query.order_by(Messages.time.asc()).limit(limit)
-                peewee_results = list(query)
+                rows = list(query.dicts())
             else:  # 默认为 'latest'
                 # 获取时间最晚的 limit 条记录
                 query = query.order_by(Messages.time.desc()).limit(limit)
-                latest_results_peewee = list(query)
+                latest_rows = list(query.dicts())
                 # 将结果按时间正序排列
-                peewee_results = sorted(latest_results_peewee, key=lambda msg: msg.time)
+                rows = sorted(latest_rows, key=lambda row: row["time"])
         else:
             # limit 为 0 时，应用传入的 sort 参数
             if sort:
@@ -111,9 +117,9 @@ def find_messages(
                         logger.warning(f"排序字段 '{field_name}' 在 Messages 模型中未找到。将跳过此排序条件。")
                 if peewee_sort_terms:
                     query = query.order_by(*peewee_sort_terms)
-            peewee_results = list(query)
+            rows = list(query.dicts())
 
-        return [_model_to_instance(msg) for msg in peewee_results]
+        return [DatabaseMessages(**row) for row in rows]
     except Exception as e:
         log_message = (
             f"使用 Peewee 查找消息失败 (filter={message_filter}, sort={sort}, limit={limit}, limit_mode={limit_mode}): {e}\n"
@@ -134,6 +140,7 @@ def count_messages(message_filter: dict[str, Any]) -> int:
         符合条件的消息数量，如果出错则返回 0。
     """
     try:
+        _flush_pending_messages(message_filter)
         query = Messages.select()
 
         # 应用过滤器
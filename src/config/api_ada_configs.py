@@ -28,6 +28,15 @@ class APIProvider(ConfigBase):
     retry_interval: int = 10
     """重试间隔（如果API调用失败，重试的间隔时间，单位：秒）"""
 
+    max_concurrency: int = 0
+    """最大并发请求数（该提供商同时进行中的请求上限，0为不限制）"""
+
+    rpm_limit: int = 0
+    """每分钟请求数上限（0为不限制）"""
+
+    tpm_limit: int = 0
+    """每分钟token数上限（按预估值排队，请求完成后以实际用量计算，0为不限制）"""
+
     def get_api_key(self) -> str:
         return self.api_key
 
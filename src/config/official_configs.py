@@ -263,6 +263,9 @@ class ToolConfig(ConfigBase):
     enable_tool: bool = False
     """是否在聊天中启用工具"""
 
+    call_timeout: float = 30.0
+    """工具单次调用的默认超时时间（秒），工具自己声明了超时时间时以工具为准，0表示不限制"""
+
 
 @dataclass
 class VoiceConfig(ConfigBase):
@@ -493,3 +496,6 @@ class LPMMKnowledgeConfig(ConfigBase):
 
     embedding_dimension: int = 1024
     """嵌入向量维度，应该与模型的输出维度一致"""
+
+    embedding_index_type: str = "auto"
+    """嵌入库Faiss索引类型，可选 auto/flat/ivf/hnsw，auto 时小库精确检索、大库使用IVF"""
@@ -1,14 +1,66 @@
 import asyncio
+import weakref
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import Callable, Any, Optional
+from typing import AsyncIterator, Awaitable, Callable, Any, Optional, TypeVar
 
 from src.config.api_ada_configs import ModelInfo, APIProvider
+from ..exceptions import ReqAbortException
 from ..payload_content.message import Message
 from ..payload_content.resp_format import RespFormat
 from ..payload_content.tool_option import ToolOption, ToolCall
 
 
+T = TypeVar("T")
+
+
+async def await_interruptible(awaitable: Awaitable[T], interrupt_flag: asyncio.Event | None) -> T:
+    """
+    等待请求完成，期间中断信号量被设置则立即取消请求并抛出ReqAbortException
+    同时等待请求与中断信号量，请求完成即返回，不再轮询；没有中断信号量时直接等待请求
+    :param awaitable: 请求协程
+    :param interrupt_flag: 中断信号量（可选）
+    :return: 请求结果
+    """
+    if interrupt_flag is None:
+        return await awaitable
+    req_task = asyncio.ensure_future(awaitable)
+    if interrupt_flag.is_set():
+        req_task.cancel()
+        raise ReqAbortException("请求被外部信号中断")
+    interrupt_task = asyncio.ensure_future(interrupt_flag.wait())
+    try:
+        await asyncio.wait((req_task, interrupt_task), return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        req_task.cancel()
+        raise
+    finally:
+        interrupt_task.cancel()
+    if not req_task.done():
+        req_task.cancel()
+        raise ReqAbortException("请求被外部信号中断")
+    return req_task.result()
+
+
+async def iterate_interruptible(stream: AsyncIterator[T], interrupt_flag: asyncio.Event | None) -> AsyncIterator[T]:
+    """
+    迭代流式响应，等待下一帧期间中断信号量被设置则立即抛出ReqAbortException
+    :param stream: 流式响应
+    :param interrupt_flag: 中断信号量（可选）
+    """
+    if interrupt_flag is None:
+        async for item in stream:
+            yield item
+        return
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            item = await await_interruptible(iterator.__anext__(), interrupt_flag)
+        except StopAsyncIteration:
+            return
+        yield item
+
+
 @dataclass
 class UsageRecord:
     """
@@ -49,6 +101,9 @@ class APIResponse:
     embedding: list[float] | None = None
     """嵌入向量"""
 
+    embeddings: list[list[float]] | None = None
+    """批量嵌入向量（与输入顺序一致）"""
+
     usage: UsageRecord | None = None
     """使用情况 (prompt_tokens, completion_tokens, total_tokens)"""
 
@@ -97,6 +152,39 @@ class BaseClient(ABC):
         """
         raise NotImplementedError("'get_response' method should be overridden in subclasses")
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[str | APIResponse]:
+        """
+        流式获取对话响应（默认等待完整响应后一次性输出，支持流式输出的客户端应重写此方法）
+        请求进行中逐个产出正式内容的增量文本，最后产出一个完整的APIResponse（含推理内容、工具调用与使用情况）
+        停止迭代（aclose）即中断请求
+        :param model_info: 模型信息
+        :param message_list: 对话体
+        :param tool_options: 工具选项（可选，默认为None）
+        :param max_tokens: 最大token数（可选，默认为1024）
+        :param temperature: 温度（可选，默认为0.7）
+        :param extra_params: 附加的请求参数
+        :return: 增量文本与最终响应的异步迭代器
+        """
+        response = await self.get_response(
+            model_info=model_info,
+            message_list=message_list,
+            tool_options=tool_options,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_params=extra_params,
+        )
+        if response.content:
+            yield response.content
+        yield response
+
     @abstractmethod
     async def get_embedding(
         self,
@@ -112,6 +200,35 @@ class BaseClient(ABC):
         """
         raise NotImplementedError("'get_embedding' method should be overridden in subclasses")
 
+    async def get_embeddings(
+        self,
+        model_info: ModelInfo,
+        embedding_inputs: list[str],
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        批量获取文本嵌入（默认逐条请求，支持批量输入的客户端应重写此方法）
+        :param model_info: 模型信息
+        :param embedding_inputs: 嵌入输入文本列表
+        :return: 嵌入响应，embeddings 与输入顺序一致
+        """
+        response = APIResponse(embeddings=[])
+        prompt_tokens = total_tokens = 0
+        for embedding_input in embedding_inputs:
+            single = await self.get_embedding(model_info, embedding_input, extra_params)
+            response.embeddings.append(single.embedding)  # type: ignore
+            if single.usage:
+                prompt_tokens += single.usage.prompt_tokens
+                total_tokens += single.usage.total_tokens
+        response.usage = UsageRecord(
+            model_name=model_info.name,
+            provider_name=model_info.api_provider,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=0,
+            total_tokens=total_tokens,
+        )
+        return response
+
     @abstractmethod
     async def get_audio_transcriptions(
         self,
@@ -142,7 +259,11 @@ class ClientRegistry:
         self.client_registry: dict[str, type[BaseClient]] = {}
         """APIProvider.type -> BaseClient的映射表"""
         self.client_instance_cache: dict[str, BaseClient] = {}
-        """APIProvider.name -> BaseClient的映射表"""
+        """APIProvider.name -> BaseClient的映射表（在事件循环外获取时使用）"""
+        self.loop_client_cache: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, BaseClient]] = (
+            weakref.WeakKeyDictionary()
+        )
+        """事件循环 -> (APIProvider.name -> BaseClient)的映射表，客户端的连接池绑定在创建它的事件循环上"""
 
     def register_client_class(self, client_type: str):
         """
@@ -175,13 +296,17 @@ class ClientRegistry:
             else:
                 raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
 
-        # 正常的缓存逻辑
-        if api_provider.name not in self.client_instance_cache:
+        # 正常的缓存逻辑：每个事件循环各自复用一个客户端，避免跨事件循环使用同一个连接池
+        try:
+            cache = self.loop_client_cache.setdefault(asyncio.get_running_loop(), {})
+        except RuntimeError:
+            cache = self.client_instance_cache
+        if api_provider.name not in cache:
             if client_class := self.client_registry.get(api_provider.client_type):
-                self.client_instance_cache[api_provider.name] = client_class(api_provider)
+                cache[api_provider.name] = client_class(api_provider)
             else:
                 raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
-        return self.client_instance_cache[api_provider.name]
+        return cache[api_provider.name]
 
 
 client_registry = ClientRegistry()
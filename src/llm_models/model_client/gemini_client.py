@@ -31,7 +31,14 @@ from google.genai.errors import (
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from src.common.logger import get_logger
 
-from .base_client import APIResponse, UsageRecord, BaseClient, client_registry
+from .base_client import (
+    APIResponse,
+    UsageRecord,
+    BaseClient,
+    client_registry,
+    await_interruptible,
+    iterate_interruptible,
+)
 from ..exceptions import (
     RespParseException,
     NetworkConnectionError,
@@ -250,12 +257,8 @@ async def _default_stream_response_handler(
         if _fc_delta_buffer and not _fc_delta_buffer.closed:
             _fc_delta_buffer.close()
 
-    async for chunk in resp_stream:
-        # 检查是否有中断量
-        if interrupt_flag and interrupt_flag.is_set():
-            # 如果中断量被设置，则抛出ReqAbortException
-            raise ReqAbortException("请求被外部信号中断")
-
+    # 等待下一帧期间中断量被设置时抛出ReqAbortException
+    async for chunk in iterate_interruptible(resp_stream, interrupt_flag):
         _process_delta(
             chunk,
             _fc_delta_buffer,
@@ -384,6 +387,54 @@ class GeminiClient(BaseClient):
         logger.warning(f"模型 {model_id} 未在 THINKING_BUDGET_LIMITS 中定义，将使用动态模式 tb=-1 兼容。")
         return THINKING_BUDGET_AUTO
 
+    def _build_generation_config(
+        self,
+        model_info: ModelInfo,
+        messages: tuple[ContentListUnion, list[str] | None],
+        tool_options: list[ToolOption] | None,
+        max_tokens: int,
+        temperature: float,
+        response_format: RespFormat | None,
+        extra_params: dict[str, Any] | None,
+    ) -> GenerateContentConfig:
+        """构建Gemini API的生成配置"""
+        # 将tool_options转换为Gemini API所需的格式
+        tools = _convert_tool_options(tool_options) if tool_options else None
+
+        tb = THINKING_BUDGET_AUTO
+        # 空处理
+        if extra_params and "thinking_budget" in extra_params:
+            try:
+                tb = int(extra_params["thinking_budget"])
+            except (ValueError, TypeError):
+                logger.warning(f"无效的 thinking_budget 值 {extra_params['thinking_budget']}，将使用默认动态模式 {tb}")
+        # 裁剪到模型支持的范围
+        tb = self.clamp_thinking_budget(tb, model_info.model_identifier)
+
+        # 将response_format转换为Gemini API所需的格式
+        generation_config_dict = {
+            "max_output_tokens": max_tokens,
+            "temperature": temperature,
+            "response_modalities": ["TEXT"],
+            "thinking_config": ThinkingConfig(
+                include_thoughts=True,
+                thinking_budget=tb,
+            ),
+            "safety_settings": gemini_safe_settings,  # 防止空回复问题
+        }
+        if tools:
+            generation_config_dict["tools"] = Tool(function_declarations=tools)
+        if messages[1]:
+            # 如果有system消息，则将其添加到配置中
+            generation_config_dict["system_instructions"] = messages[1]
+        if response_format and response_format.format_type == RespFormatType.TEXT:
+            generation_config_dict["response_mime_type"] = "text/plain"
+        elif response_format and response_format.format_type in (RespFormatType.JSON_OBJ, RespFormatType.JSON_SCHEMA):
+            generation_config_dict["response_mime_type"] = "application/json"
+            generation_config_dict["response_schema"] = response_format.to_dict()
+
+        return GenerateContentConfig(**generation_config_dict)
+
     async def get_response(
         self,
         model_info: ModelInfo,
@@ -427,75 +478,34 @@ class GeminiClient(BaseClient):
 
         # 将messages构造为Gemini API所需的格式
         messages = _convert_messages(message_list)
-        # 将tool_options转换为Gemini API所需的格式
-        tools = _convert_tool_options(tool_options) if tool_options else None
-
-        tb = THINKING_BUDGET_AUTO
-        # 空处理
-        if extra_params and "thinking_budget" in extra_params:
-            try:
-                tb = int(extra_params["thinking_budget"])
-            except (ValueError, TypeError):
-                logger.warning(f"无效的 thinking_budget 值 {extra_params['thinking_budget']}，将使用默认动态模式 {tb}")
-        # 裁剪到模型支持的范围
-        tb = self.clamp_thinking_budget(tb, model_info.model_identifier)
-
-        # 将response_format转换为Gemini API所需的格式
-        generation_config_dict = {
-            "max_output_tokens": max_tokens,
-            "temperature": temperature,
-            "response_modalities": ["TEXT"],
-            "thinking_config": ThinkingConfig(
-                include_thoughts=True,
-                thinking_budget=tb,
-            ),
-            "safety_settings": gemini_safe_settings,  # 防止空回复问题
-        }
-        if tools:
-            generation_config_dict["tools"] = Tool(function_declarations=tools)
-        if messages[1]:
-            # 如果有system消息，则将其添加到配置中
-            generation_config_dict["system_instructions"] = messages[1]
-        if response_format and response_format.format_type == RespFormatType.TEXT:
-            generation_config_dict["response_mime_type"] = "text/plain"
-        elif response_format and response_format.format_type in (RespFormatType.JSON_OBJ, RespFormatType.JSON_SCHEMA):
-            generation_config_dict["response_mime_type"] = "application/json"
-            generation_config_dict["response_schema"] = response_format.to_dict()
-
-        generation_config = GenerateContentConfig(**generation_config_dict)
+        generation_config = self._build_generation_config(
+            model_info, messages, tool_options, max_tokens, temperature, response_format, extra_params
+        )
 
         try:
             if model_info.force_stream_mode:
-                req_task = asyncio.create_task(
+                # 同时等待请求与中断信号量，中断时立即取消请求
+                req_result = await await_interruptible(
                     self.client.aio.models.generate_content_stream(
                         model=model_info.model_identifier,
                         contents=messages[0],
                         config=generation_config,
-                    )
+                    ),
+                    interrupt_flag,
                 )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.1秒后再次检查任务&中断信号量状态
-                resp, usage_record = await stream_response_handler(req_task.result(), interrupt_flag)
+                resp, usage_record = await stream_response_handler(req_result, interrupt_flag)
             else:
-                req_task = asyncio.create_task(
+                # 同时等待请求与中断信号量，中断时立即取消请求
+                req_result = await await_interruptible(
                     self.client.aio.models.generate_content(
                         model=model_info.model_identifier,
                         contents=messages[0],
                         config=generation_config,
-                    )
+                    ),
+                    interrupt_flag,
                 )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.5)  # 等待0.5秒后再次检查任务&中断信号量状态
-
-                resp, usage_record = async_response_parser(req_task.result())
+
+                resp, usage_record = async_response_parser(req_result)
         except (ClientError, ServerError) as e:
             # 重封装ClientError和ServerError为RespNotOkException
             raise RespNotOkException(e.code, e.message) from None
@@ -505,6 +515,9 @@ class GeminiClient(BaseClient):
             FunctionInvocationError,
         ) as e:
             raise ValueError(f"工具类型错误：请检查工具选项和参数：{str(e)}") from None
+        except ReqAbortException:
+            # 外部中断不是网络错误，不应触发重试
+            raise
         except Exception as e:
             raise NetworkConnectionError() from e
 
@@ -519,6 +532,79 @@ class GeminiClient(BaseClient):
 
         return resp
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.4,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[str | APIResponse]:
+        """
+        流式获取对话响应
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            tool_options: 工具选项（可选，默认为None）
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.4）
+        Returns:
+            请求进行中逐个产出正式内容的增量文本，最后产出完整的APIResponse
+        """
+        messages = _convert_messages(message_list)
+        generation_config = self._build_generation_config(
+            model_info, messages, tool_options, max_tokens, temperature, None, extra_params
+        )
+
+        _fc_delta_buffer = io.StringIO()  # 正式内容缓冲区
+        _tool_calls_buffer: list[tuple[str, str, dict]] = []  # 工具调用缓冲区
+        _usage_record = None  # 使用情况记录
+
+        try:
+            resp_stream = await self.client.aio.models.generate_content_stream(
+                model=model_info.model_identifier,
+                contents=messages[0],
+                config=generation_config,
+            )
+            async for chunk in resp_stream:
+                fc_position = _fc_delta_buffer.tell()
+                _process_delta(chunk, _fc_delta_buffer, _tool_calls_buffer)
+
+                if chunk.usage_metadata:
+                    _usage_record = (
+                        chunk.usage_metadata.prompt_token_count or 0,
+                        (chunk.usage_metadata.candidates_token_count or 0)
+                        + (chunk.usage_metadata.thoughts_token_count or 0),
+                        chunk.usage_metadata.total_token_count or 0,
+                    )
+
+                if _fc_delta_buffer.tell() > fc_position:
+                    yield chunk.text  # type: ignore
+        except (ClientError, ServerError) as e:
+            raise RespNotOkException(e.code, e.message) from None
+        except (
+            UnknownFunctionCallArgumentError,
+            UnsupportedFunctionError,
+            FunctionInvocationError,
+        ) as e:
+            raise ValueError(f"工具类型错误：请检查工具选项和参数：{str(e)}") from None
+        except (RespParseException, EmptyResponseException):
+            raise
+        except Exception as e:
+            raise NetworkConnectionError() from e
+
+        resp = _build_stream_api_resp(_fc_delta_buffer, _tool_calls_buffer)
+        if _usage_record:
+            resp.usage = UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=_usage_record[0],
+                completion_tokens=_usage_record[1],
+                total_tokens=_usage_record[2],
+            )
+        yield resp
+
     async def get_embedding(
         self,
         model_info: ModelInfo,
@@ -561,6 +647,45 @@ class GeminiClient(BaseClient):
 
         return response
 
+    async def get_embeddings(
+        self,
+        model_info: ModelInfo,
+        embedding_inputs: list[str],
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        批量获取文本嵌入，一次请求提交全部输入
+        :param model_info: 模型信息
+        :param embedding_inputs: 嵌入输入文本列表
+        :return: 嵌入响应，embeddings 与输入顺序一致
+        """
+        try:
+            raw_response: EmbedContentResponse = await self.client.aio.models.embed_content(
+                model=model_info.model_identifier,
+                contents=embedding_inputs,  # type: ignore
+                config=EmbedContentConfig(task_type="SEMANTIC_SIMILARITY"),
+            )
+        except (ClientError, ServerError) as e:
+            # 重封装ClientError和ServerError为RespNotOkException
+            raise RespNotOkException(e.code) from None
+        except Exception as e:
+            raise NetworkConnectionError() from e
+
+        if not raw_response.embeddings or len(raw_response.embeddings) != len(embedding_inputs):
+            raise RespParseException(raw_response, "响应解析失败，embeddings数量与输入不一致")
+
+        input_tokens = sum(len(embedding_input) for embedding_input in embedding_inputs)
+        return APIResponse(
+            embeddings=[embedding.values for embedding in raw_response.embeddings],  # type: ignore
+            usage=UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=input_tokens,
+                completion_tokens=0,
+                total_tokens=input_tokens,
+            ),
+        )
+
     def get_audio_transcriptions(
         self, model_info: ModelInfo, audio_base64: str, extra_params: dict[str, Any] | None = None
     ) -> APIResponse:
@@ -4,13 +4,14 @@ import json
 import re
 import base64
 from collections.abc import Iterable
-from typing import Callable, Any, Coroutine, Optional
+from typing import AsyncIterator, Callable, Any, Coroutine, Optional
 from json_repair import repair_json
 
 from openai import (
     AsyncOpenAI,
     APIConnectionError,
     APIStatusError,
+    BadRequestError,
     NOT_GIVEN,
     AsyncStream,
 )
@@ -24,12 +25,18 @@ from openai.types.chat.chat_completion_chunk import ChoiceDelta
 
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from src.common.logger import get_logger
-from .base_client import APIResponse, UsageRecord, BaseClient, client_registry
+from .base_client import (
+    APIResponse,
+    UsageRecord,
+    BaseClient,
+    client_registry,
+    await_interruptible,
+    iterate_interruptible,
+)
 from ..exceptions import (
     RespParseException,
     NetworkConnectionError,
     RespNotOkException,
-    ReqAbortException,
     EmptyResponseException,
 )
 from ..payload_content.message import Message, RoleType
@@ -38,6 +45,9 @@ from ..payload_content.tool_option import ToolOption, ToolParam, ToolCall
 
 logger = get_logger("OpenAI客户端")
 
+# 不支持 stream_options 的 (API提供商, 模型标识符)，流式请求时不再要求附带用量
+_stream_usage_unsupported: set[tuple[str, str]] = set()
+
 
 def _convert_messages(messages: list[Message]) -> list[ChatCompletionMessageParam]:
     """
@@ -269,11 +279,8 @@ async def _default_stream_response_handler(
             if buffer and not buffer.closed:
                 buffer.close()
 
-    async for event in resp_stream:
-        if interrupt_flag and interrupt_flag.is_set():
-            # 如果中断量被设置，则抛出ReqAbortException
-            _insure_buffer_closed()
-            raise ReqAbortException("请求被外部信号中断")
+    # 等待下一帧期间中断量被设置时抛出ReqAbortException
+    async for event in iterate_interruptible(resp_stream, interrupt_flag):
         # 空 choices / usage-only 帧的防御
         if not hasattr(event, "choices") or not event.choices:
             if hasattr(event, "usage") and event.usage:
@@ -446,7 +453,8 @@ class OpenaiClient(BaseClient):
 
         try:
             if model_info.force_stream_mode:
-                req_task = asyncio.create_task(
+                # 同时等待请求与中断信号量，中断时立即取消请求
+                req_result = await await_interruptible(
                     self.client.chat.completions.create(
                         model=model_info.model_identifier,
                         messages=messages,
@@ -456,20 +464,16 @@ class OpenaiClient(BaseClient):
                         stream=True,
                         response_format=NOT_GIVEN,
                         extra_body=extra_params,
-                    )
+                    ),
+                    interrupt_flag,
                 )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.1秒后再次检查任务&中断信号量状态
-
-                resp, usage_record = await stream_response_handler(req_task.result(), interrupt_flag)
+
+                resp, usage_record = await stream_response_handler(req_result, interrupt_flag)
             else:
                 # 发送请求并获取响应
                 # start_time = time.time()
-                req_task = asyncio.create_task(
+                # 同时等待请求与中断信号量，中断时立即取消请求
+                req_result = await await_interruptible(
                     self.client.chat.completions.create(
                         model=model_info.model_identifier,
                         messages=messages,
@@ -479,18 +483,13 @@ class OpenaiClient(BaseClient):
                         stream=False,
                         response_format=NOT_GIVEN,
                         extra_body=extra_params,
-                    )
+                    ),
+                    interrupt_flag,
                 )
-                while not req_task.done():
-                    if interrupt_flag and interrupt_flag.is_set():
-                        # 如果中断量存在且被设置，则取消任务并抛出异常
-                        req_task.cancel()
-                        raise ReqAbortException("请求被外部信号中断")
-                    await asyncio.sleep(0.1)  # 等待0.5秒后再次检查任务&中断信号量状态
 
                 # logger.info(f"OpenAI请求时间: {model_info.model_identifier}  {time.time() - start_time} \n{messages}")
 
-                resp, usage_record = async_response_parser(req_task.result())
+                resp, usage_record = async_response_parser(req_result)
         except APIConnectionError as e:
             # 重封装APIConnectionError为NetworkConnectionError
             raise NetworkConnectionError() from e
@@ -509,18 +508,122 @@ class OpenaiClient(BaseClient):
 
         return resp
 
-    async def get_embedding(
+    async def get_response_stream(
         self,
         model_info: ModelInfo,
-        embedding_input: str,
+        message_list: list[Message],
+        tool_options: list[ToolOption] | None = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
         extra_params: dict[str, Any] | None = None,
-    ) -> APIResponse:
+    ) -> AsyncIterator[str | APIResponse]:
         """
-        获取文本嵌入
-        :param model_info: 模型信息
-        :param embedding_input: 嵌入输入文本
-        :return: 嵌入响应
+        流式获取对话响应
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            tool_options: 工具选项（可选，默认为None）
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.7）
+        Returns:
+            请求进行中逐个产出正式内容的增量文本，最后产出完整的APIResponse
         """
+        messages: Iterable[ChatCompletionMessageParam] = _convert_messages(message_list)
+        tools: Iterable[ChatCompletionToolParam] = _convert_tool_options(tool_options) if tool_options else NOT_GIVEN  # type: ignore
+
+        _has_rc_attr_flag = False  # 标记是否有独立的推理内容块
+        _in_rc_flag = False  # 标记是否在推理内容块中
+        _rc_delta_buffer = io.StringIO()  # 推理内容缓冲区
+        _fc_delta_buffer = io.StringIO()  # 正式内容缓冲区
+        _tool_calls_buffer: list[tuple[str, str, io.StringIO]] = []  # 工具调用缓冲区
+        _usage_record = None  # 使用情况记录
+
+        async def create_stream(include_usage: bool) -> AsyncStream[ChatCompletionChunk]:
+            return await self.client.chat.completions.create(
+                model=model_info.model_identifier,
+                messages=messages,
+                tools=tools,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # 流式响应默认不返回用量，需要显式要求在最后一帧附带
+                stream_options={"include_usage": True} if include_usage else NOT_GIVEN,
+                response_format=NOT_GIVEN,
+                extra_body=extra_params,
+            )
+
+        usage_key = (model_info.api_provider, model_info.model_identifier)
+        try:
+            if usage_key in _stream_usage_unsupported:
+                resp_stream = await create_stream(include_usage=False)
+            else:
+                try:
+                    resp_stream = await create_stream(include_usage=True)
+                except BadRequestError as e:
+                    # 部分 OpenAI 兼容接口不认识 stream_options，去掉后重试；重试成功才记住该模型不支持
+                    logger.warning(f"模型 {model_info.name} 的流式请求被拒绝，尝试不附带用量参数重试: {e.message}")
+                    resp_stream = await create_stream(include_usage=False)
+                    _stream_usage_unsupported.add(usage_key)
+                    logger.info(f"模型 {model_info.name} 不支持 stream_options，之后的流式请求将不再统计用量")
+            try:
+                async for event in resp_stream:
+                    if not hasattr(event, "choices") or not event.choices:
+                        if hasattr(event, "usage") and event.usage:
+                            _usage_record = (
+                                event.usage.prompt_tokens or 0,
+                                event.usage.completion_tokens or 0,
+                                event.usage.total_tokens or 0,
+                            )
+                        continue
+                    delta = event.choices[0].delta
+
+                    if hasattr(delta, "reasoning_content") and delta.reasoning_content:  # type: ignore
+                        _has_rc_attr_flag = True
+
+                    fc_position = _fc_delta_buffer.tell()
+                    _in_rc_flag = _process_delta(
+                        delta,
+                        _has_rc_attr_flag,
+                        _in_rc_flag,
+                        _rc_delta_buffer,
+                        _fc_delta_buffer,
+                        _tool_calls_buffer,
+                    )
+
+                    if event.usage:
+                        _usage_record = (
+                            event.usage.prompt_tokens or 0,
+                            event.usage.completion_tokens or 0,
+                            event.usage.total_tokens or 0,
+                        )
+
+                    if _fc_delta_buffer.tell() > fc_position:
+                        # 正式内容缓冲区有新增内容，即本帧的content
+                        yield delta.content  # type: ignore
+            finally:
+                await resp_stream.close()
+        except APIConnectionError as e:
+            raise NetworkConnectionError() from e
+        except APIStatusError as e:
+            raise RespNotOkException(e.status_code, e.message) from e
+
+        resp = _build_stream_api_resp(_fc_delta_buffer, _rc_delta_buffer, _tool_calls_buffer)
+        if _usage_record:
+            resp.usage = UsageRecord(
+                model_name=model_info.name,
+                provider_name=model_info.api_provider,
+                prompt_tokens=_usage_record[0],
+                completion_tokens=_usage_record[1],
+                total_tokens=_usage_record[2],
+            )
+        yield resp
+
+    async def _create_embeddings(
+        self,
+        model_info: ModelInfo,
+        embedding_input: str | list[str],
+        extra_params: dict[str, Any] | None = None,
+    ):
         try:
             raw_response = await self.client.embeddings.create(
                 model=model_info.model_identifier,
@@ -537,6 +640,33 @@ class OpenaiClient(BaseClient):
         except APIStatusError as e:
             # 重封装APIError为RespNotOkException
             raise RespNotOkException(e.status_code) from e
+        return raw_response
+
+    @staticmethod
+    def _parse_embedding_usage(model_info: ModelInfo, raw_response) -> UsageRecord | None:
+        if not hasattr(raw_response, "usage"):
+            return None
+        return UsageRecord(
+            model_name=model_info.name,
+            provider_name=model_info.api_provider,
+            prompt_tokens=raw_response.usage.prompt_tokens or 0,
+            completion_tokens=getattr(raw_response.usage, "completion_tokens", 0),
+            total_tokens=raw_response.usage.total_tokens or 0,
+        )
+
+    async def get_embedding(
+        self,
+        model_info: ModelInfo,
+        embedding_input: str,
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        获取文本嵌入
+        :param model_info: 模型信息
+        :param embedding_input: 嵌入输入文本
+        :return: 嵌入响应
+        """
+        raw_response = await self._create_embeddings(model_info, embedding_input, extra_params)
 
         response = APIResponse()
 
@@ -550,15 +680,32 @@ class OpenaiClient(BaseClient):
             )
 
         # 解析使用情况
-        if hasattr(raw_response, "usage"):
-            response.usage = UsageRecord(
-                model_name=model_info.name,
-                provider_name=model_info.api_provider,
-                prompt_tokens=raw_response.usage.prompt_tokens or 0,
-                completion_tokens=getattr(raw_response.usage, "completion_tokens", 0),
-                total_tokens=raw_response.usage.total_tokens or 0,
-            )
+        response.usage = self._parse_embedding_usage(model_info, raw_response)
+
+        return response
+
+    async def get_embeddings(
+        self,
+        model_info: ModelInfo,
+        embedding_inputs: list[str],
+        extra_params: dict[str, Any] | None = None,
+    ) -> APIResponse:
+        """
+        批量获取文本嵌入，一次 /embeddings 请求提交全部输入
+        :param model_info: 模型信息
+        :param embedding_inputs: 嵌入输入文本列表
+        :return: 嵌入响应，embeddings 与输入顺序一致
+        """
+        raw_response = await self._create_embeddings(model_info, embedding_inputs, extra_params)
 
+        if len(raw_response.data) != len(embedding_inputs):
+            raise RespParseException(
+                raw_response,
+                f"响应解析失败，请求了 {len(embedding_inputs)} 条嵌入，返回了 {len(raw_response.data)} 条。",
+            )
+        response = APIResponse()
+        response.embeddings = [item.embedding for item in sorted(raw_response.data, key=lambda item: item.index)]
+        response.usage = self._parse_embedding_usage(model_info, raw_response)
         return response
 
     async def get_audio_transcriptions(
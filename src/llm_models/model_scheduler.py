@@ -0,0 +1,414 @@
+import asyncio
+import threading
+import time
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from src.common.logger import get_logger
+from src.config.api_ada_configs import APIProvider, ModelInfo
+from .payload_content.message import Message
+
+logger = get_logger("model_scheduler")
+
+# 每分钟请求数/token数的统计窗口（秒）
+RATE_WINDOW = 60.0
+# 模型错误惩罚的半衰期（秒），避免一次故障让模型永久被冷落
+PENALTY_HALF_LIFE = 300.0
+# 请求延迟滑动平均的平滑系数
+LATENCY_EWMA_ALPHA = 0.2
+# 预估请求token数时，每张图片按多少token计算
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# 选择模型时各项负载的权重
+PENALTY_WEIGHT = 300
+IN_FLIGHT_WEIGHT = 1000
+LATENCY_WEIGHT = 100
+
+# 请求优先级，数值越小越优先
+PRIORITY_CHAT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+# 聊天回复链路上的请求类型（按前缀匹配），排队时优先放行
+CHAT_REQUEST_TYPES = ("replyer", "s4u_replyer", "planner", "tool_executor", "action", "thinking", "motion")
+# 后台学习/整理类请求，排队时最后放行
+BACKGROUND_REQUEST_TYPES = ("memory.modify", "memory.build", "expression.learner", "lpmm", "relation", "mood")
+
+
+def get_request_priority(request_type: str) -> int:
+    """根据请求类型获取排队优先级"""
+    if request_type.startswith(CHAT_REQUEST_TYPES):
+        return PRIORITY_CHAT
+    if request_type.startswith(BACKGROUND_REQUEST_TYPES):
+        return PRIORITY_BACKGROUND
+    return PRIORITY_NORMAL
+
+
+def estimate_tokens(
+    message_list: Optional[List[Message]] = None,
+    embedding_input: Optional[str | List[str]] = None,
+    max_tokens: int = 0,
+) -> int:
+    """粗略预估一次请求消耗的token数（按字符数计，偏保守），用于TPM限流"""
+    tokens = max_tokens
+    if isinstance(embedding_input, list):
+        tokens += sum(len(text) for text in embedding_input)
+    elif embedding_input:
+        tokens += len(embedding_input)
+    for message in message_list or []:
+        if isinstance(message.content, str):
+            tokens += len(message.content)
+            continue
+        for part in message.content:
+            tokens += len(part) if isinstance(part, str) else IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+
+class _ModelState:
+    """单个模型的全局负载状态"""
+
+    def __init__(self):
+        self.in_flight = 0
+        # 已选中该模型、正在排队等待提供商配额的请求数
+        self.queued = 0
+        self.total_tokens = 0
+        self.total_requests = 0
+        self.failures = 0
+        # 最近一分钟的 (时间, token数)
+        self.token_window: Deque[Tuple[float, int]] = deque()
+        self.latency: Optional[float] = None
+        self.penalty = 0.0
+        self.penalty_time = 0.0
+
+    def tokens_per_minute(self, now: float) -> int:
+        while self.token_window and now - self.token_window[0][0] > RATE_WINDOW:
+            self.token_window.popleft()
+        return sum(tokens for _, tokens in self.token_window)
+
+    def current_penalty(self, now: float) -> float:
+        if not self.penalty:
+            return 0.0
+        return self.penalty * 0.5 ** ((now - self.penalty_time) / PENALTY_HALF_LIFE)
+
+
+class _Waiter:
+    """排队等待提供商配额的请求，future 属于发起请求的事件循环"""
+
+    __slots__ = ("future", "tokens", "request_type")
+
+    def __init__(self, future: asyncio.Future, tokens: int, request_type: str):
+        self.future = future
+        self.tokens = tokens
+        self.request_type = request_type
+
+
+class _ProviderState:
+    """单个API提供商的并发与限流状态"""
+
+    def __init__(self, provider: APIProvider):
+        self.provider = provider
+        self.in_flight = 0
+        # 最近一分钟的请求开始时间
+        self.request_times: Deque[float] = deque()
+        # 最近一分钟的 [时间, token数]，请求结束后用实际用量替换预估值
+        self.token_entries: Deque[List[Any]] = deque()
+        # 优先级 -> 请求类型 -> 等待队列；同一优先级内按请求类型轮转，避免某一类请求占满配额
+        self.waiters: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        # RPM/TPM 限流时的唤醒定时器；用线程定时器而不是某个事件循环的 call_later，不依赖该事件循环继续运行
+        self.wakeup_timer: Optional[threading.Timer] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queues in self.waiters.values() for queue in queues.values())
+
+    def prune(self, now: float):
+        while self.request_times and now - self.request_times[0] > RATE_WINDOW:
+            self.request_times.popleft()
+        while self.token_entries and now - self.token_entries[0][0] > RATE_WINDOW:
+            self.token_entries.popleft()
+
+    def capacity_delay(self, now: float, tokens: int) -> Optional[float]:
+        """
+        判断现在能否放行一个请求
+
+        Returns:
+            0 表示可以放行；正数表示需要等待的秒数（RPM/TPM限制）；None 表示需要等待其他请求结束（并发限制）
+        """
+        self.prune(now)
+        provider = self.provider
+        if provider.max_concurrency > 0 and self.in_flight >= provider.max_concurrency:
+            return None
+        if provider.rpm_limit > 0 and len(self.request_times) >= provider.rpm_limit:
+            return self.request_times[0] + RATE_WINDOW - now
+        if provider.tpm_limit > 0 and self.token_entries:
+            used = sum(entry[1] for entry in self.token_entries)
+            # 单个请求超过整个TPM时，等窗口清空后放行，避免永远等待
+            excess = used + min(tokens, provider.tpm_limit) - provider.tpm_limit
+            if excess > 0:
+                for entry_time, entry_tokens in self.token_entries:
+                    excess -= entry_tokens
+                    if excess <= 0:
+                        return entry_time + RATE_WINDOW - now
+        return 0
+
+    def next_waiter(self) -> Optional[_Waiter]:
+        """取出（不移除）下一个应被放行的等待者，顺带清理已取消的等待者"""
+        for priority in sorted(self.waiters):
+            queues = self.waiters[priority]
+            for request_type in list(queues):
+                queue = queues[request_type]
+                while queue and queue[0].future.done():
+                    queue.popleft()
+                if queue:
+                    return queue[0]
+                del queues[request_type]
+            if not queues:
+                del self.waiters[priority]
+        return None
+
+    def pop_waiter(self, waiter: _Waiter):
+        queues = self.waiters[get_request_priority(waiter.request_type)]
+        queues[waiter.request_type].popleft()
+        # 该类型已被服务一次，轮到同优先级的其他类型
+        queues.move_to_end(waiter.request_type)
+
+
+class ModelLease:
+    """一次已获准发出的请求，结束时归还配额并汇报用量"""
+
+    def __init__(self, model_name: str, provider_name: str, token_entry: List[Any]):
+        self.model_name = model_name
+        self.provider_name = provider_name
+        self.token_entry = token_entry
+        self.start_time = time.monotonic()
+        self.succeeded = False
+
+    def report_usage(self, total_tokens: int):
+        """汇报本次请求的实际token用量"""
+        self.token_entry[1] = total_tokens
+        self.succeeded = True
+
+
+class ModelScheduler:
+    """
+    全局模型调度器
+
+    所有 LLMRequest 实例共享同一个调度器，按模型与提供商维护全局负载：
+    - 进行中的请求数、每分钟token数、请求延迟与带衰减的错误惩罚，用于在任务的模型列表中选出负载最低的模型
+    - 提供商的并发数与 RPM/TPM 上限（在 model_config.toml 的 api_providers 中配置），超出时请求排队等待
+    - 排队时聊天回复链路优先于普通请求，普通请求优先于后台学习；同一优先级内按请求类型轮转放行
+
+    调度器会被多个事件循环使用（主循环与 embedding 服务的事件循环线程），共享状态都由 _lock 保护；
+    放行等待者时通过其 future 所属事件循环的 call_soon_threadsafe 唤醒，不在其他线程中直接操作 future
+    """
+
+    def __init__(self):
+        self._models: Dict[str, _ModelState] = {}
+        self._providers: Dict[str, _ProviderState] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, name: str) -> _ModelState:
+        state = self._models.get(name)
+        if state is None:
+            state = self._models[name] = _ModelState()
+        return state
+
+    def _provider(self, provider: APIProvider) -> _ProviderState:
+        state = self._providers.get(provider.name)
+        if state is None:
+            state = self._providers[provider.name] = _ProviderState(provider)
+        else:
+            # 配置可能被重新加载
+            state.provider = provider
+        return state
+
+    def select_model(self, candidates: List[ModelInfo]) -> ModelInfo:
+        """在候选模型中选择当前全局负载最低的模型"""
+        if not candidates:
+            raise RuntimeError("没有可用的模型可供选择。所有模型均已尝试失败。")
+
+        def load(model_info: ModelInfo) -> float:
+            state = self._model(model_info.name)
+            provider_state = self._providers.get(model_info.api_provider)
+            waiting = provider_state.waiting if provider_state else 0
+            return (
+                state.tokens_per_minute(now)
+                + state.current_penalty(now) * PENALTY_WEIGHT
+                + (state.in_flight + state.queued + waiting) * IN_FLIGHT_WEIGHT
+                + (state.latency or 0.0) * LATENCY_WEIGHT
+            )
+
+        with self._lock:
+            now = time.monotonic()
+            return min(candidates, key=load)
+
+    def report_failure(self, model_name: str):
+        """记录模型的一次失败，增加其惩罚值"""
+        with self._lock:
+            state = self._model(model_name)
+            now = time.monotonic()
+            state.penalty = state.current_penalty(now) + 1
+            state.penalty_time = now
+            state.failures += 1
+
+    @asynccontextmanager
+    async def slot(
+        self, model_info: ModelInfo, api_provider: APIProvider, request_type: str, estimated_tokens: int
+    ) -> AsyncIterator[ModelLease]:
+        """
+        获取向提供商发出一次请求的配额，超出并发或 RPM/TPM 限制时排队等待
+
+        Args:
+            model_info: 要请求的模型
+            api_provider: 模型所属的提供商
+            request_type: 请求类型，决定排队优先级
+            estimated_tokens: 预估token数，用于TPM限流，请求成功后以 lease.report_usage 汇报的实际值为准
+        """
+        lease = await self._acquire(model_info, api_provider, request_type, estimated_tokens)
+        try:
+            yield lease
+        finally:
+            self._release(lease)
+
+    async def _acquire(
+        self, model_info: ModelInfo, api_provider: APIProvider, request_type: str, estimated_tokens: int
+    ) -> ModelLease:
+        with self._lock:
+            provider_state = self._provider(api_provider)
+            model_state = self._model(model_info.name)
+            if not provider_state.waiters and provider_state.capacity_delay(time.monotonic(), estimated_tokens) == 0:
+                token_entry = self._grant(provider_state, estimated_tokens)
+                model_state.in_flight += 1
+                return ModelLease(model_info.name, api_provider.name, token_entry)
+
+            future = asyncio.get_running_loop().create_future()
+            waiter = _Waiter(future, estimated_tokens, request_type)
+            queues = provider_state.waiters.setdefault(get_request_priority(request_type), OrderedDict())
+            queues.setdefault(request_type, deque()).append(waiter)
+            logger.debug(
+                f"提供商 {api_provider.name} 已达到并发或速率上限，{request_type} 请求排队中（{provider_state.waiting} 个等待）"
+            )
+            model_state.queued += 1
+            self._dispatch(provider_state)
+
+        try:
+            token_entry = await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future.done() and not future.cancelled():
+                    # 已获准但调用方被取消，归还配额
+                    self._return_slot(provider_state)
+                elif provider_state.waiters:
+                    # 被取消的等待者可能正挡在队首，重新检查后面的请求能否放行
+                    self._dispatch(provider_state)
+            raise
+        finally:
+            with self._lock:
+                model_state.queued -= 1
+
+        with self._lock:
+            model_state.in_flight += 1
+        return ModelLease(model_info.name, api_provider.name, token_entry)
+
+    @staticmethod
+    def _grant(provider_state: _ProviderState, tokens: int) -> List[Any]:
+        now = time.monotonic()
+        provider_state.in_flight += 1
+        provider_state.request_times.append(now)
+        token_entry = [now, tokens]
+        provider_state.token_entries.append(token_entry)
+        return token_entry
+
+    def _dispatch(self, provider_state: _ProviderState):
+        """按优先级放行排队中的请求，直到配额用尽，调用方需持有 _lock"""
+        while (waiter := provider_state.next_waiter()) is not None:
+            delay = provider_state.capacity_delay(time.monotonic(), waiter.tokens)
+            if delay is None:
+                # 等待进行中的请求结束后再放行
+                return
+            if delay > 0:
+                if provider_state.wakeup_timer is None:
+                    timer = threading.Timer(delay, self._on_wakeup, args=(provider_state,))
+                    timer.daemon = True
+                    provider_state.wakeup_timer = timer
+                    timer.start()
+                return
+            provider_state.pop_waiter(waiter)
+            token_entry = self._grant(provider_state, waiter.tokens)
+            try:
+                waiter.future.get_loop().call_soon_threadsafe(self._deliver, provider_state, waiter.future, token_entry)
+            except RuntimeError:
+                # 等待者所在的事件循环已关闭，配额直接归还
+                provider_state.in_flight -= 1
+
+    def _deliver(self, provider_state: _ProviderState, future: asyncio.Future, token_entry: List[Any]):
+        """在等待者自己的事件循环中完成 future；等待者已被取消时归还配额"""
+        if not future.done():
+            future.set_result(token_entry)
+            return
+        with self._lock:
+            self._return_slot(provider_state)
+
+    def _on_wakeup(self, provider_state: _ProviderState):
+        with self._lock:
+            provider_state.wakeup_timer = None
+            self._dispatch(provider_state)
+
+    def _return_slot(self, provider_state: _ProviderState):
+        provider_state.in_flight -= 1
+        if provider_state.waiters:
+            self._dispatch(provider_state)
+
+    def _release(self, lease: ModelLease):
+        with self._lock:
+            model_state = self._model(lease.model_name)
+            model_state.in_flight = max(model_state.in_flight - 1, 0)
+            if lease.succeeded:
+                now = time.monotonic()
+                latency = now - lease.start_time
+                model_state.latency = (
+                    latency
+                    if model_state.latency is None
+                    else model_state.latency * (1 - LATENCY_EWMA_ALPHA) + latency * LATENCY_EWMA_ALPHA
+                )
+                model_state.total_tokens += lease.token_entry[1]
+                model_state.total_requests += 1
+                model_state.token_window.append((now, lease.token_entry[1]))
+
+            self._return_slot(self._providers[lease.provider_name])
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各模型与提供商的负载统计"""
+        with self._lock:
+            now = time.monotonic()
+            for state in self._providers.values():
+                state.prune(now)
+            return {
+                "models": {
+                    name: {
+                        "in_flight": state.in_flight,
+                        "queued": state.queued,
+                        "tokens_per_minute": state.tokens_per_minute(now),
+                        "total_tokens": state.total_tokens,
+                        "total_requests": state.total_requests,
+                        "failures": state.failures,
+                        "latency": state.latency,
+                        "penalty": state.current_penalty(now),
+                    }
+                    for name, state in self._models.items()
+                },
+                "providers": {
+                    name: {
+                        "in_flight": state.in_flight,
+                        "waiting": state.waiting,
+                        "requests_per_minute": len(state.request_times),
+                        "tokens_per_minute": sum(entry[1] for entry in state.token_entries),
+                    }
+                    for name, state in self._providers.items()
+                },
+            }
+
+
+model_scheduler = ModelScheduler()
@@ -7,6 +7,7 @@ from datetime import datetime
 from src.common.logger import get_logger
 from src.common.database.database import db  # 确保 db 被导入用于 create_tables
 from src.common.database.database_model import LLMUsage
+from src.common.database.group_commit import group_commit_writer
 from src.config.api_ada_configs import ModelInfo
 from .payload_content.message import Message, MessageBuilder
 from .model_client.base_client import UsageRecord
@@ -167,21 +168,24 @@ class LLMUsageRecorder:
         output_cost = (model_usage.completion_tokens / 1000000) * model_info.price_out
         total_cost = round(input_cost + output_cost, 6)
         try:
-            # 使用 Peewee 模型创建记录
-            LLMUsage.create(
-                model_name=model_info.model_identifier,
-                model_assign_name=model_info.name,
-                model_api_provider=model_info.api_provider,
-                user_id=user_id,
-                request_type=request_type,
-                endpoint=endpoint,
-                prompt_tokens=model_usage.prompt_tokens or 0,
-                completion_tokens=model_usage.completion_tokens or 0,
-                total_tokens=model_usage.total_tokens or 0,
-                cost=total_cost or 0.0,
-                time_cost=round(time_cost or 0.0, 3),
-                status="success",
-                timestamp=datetime.now(),  # Peewee 会处理 DateTimeField
+            # 交给组提交写入器批量落库
+            group_commit_writer.add(
+                LLMUsage,
+                dict(
+                    model_name=model_info.model_identifier,
+                    model_assign_name=model_info.name,
+                    model_api_provider=model_info.api_provider,
+                    user_id=user_id,
+                    request_type=request_type,
+                    endpoint=endpoint,
+                    prompt_tokens=model_usage.prompt_tokens or 0,
+                    completion_tokens=model_usage.completion_tokens or 0,
+                    total_tokens=model_usage.total_tokens or 0,
+                    cost=total_cost or 0.0,
+                    time_cost=round(time_cost or 0.0, 3),
+                    status="success",
+                    timestamp=datetime.now(),  # Peewee 会处理 DateTimeField
+                ),
             )
             logger.debug(
                 f"Token使用情况 - 模型: {model_usage.model_name}, "
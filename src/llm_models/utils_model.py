@@ -4,7 +4,7 @@ import time
 
 from enum import Enum
 from rich.traceback import install
-from typing import Tuple, List, Dict, Optional, Callable, Any, Set
+from typing import AsyncIterator, Tuple, List, Dict, Optional, Callable, Any, Set
 import traceback
 
 from src.common.logger import get_logger
@@ -14,6 +14,7 @@ from .payload_content.message import MessageBuilder, Message
 from .payload_content.resp_format import RespFormat
 from .payload_content.tool_option import ToolOption, ToolCall, ToolOptionBuilder, ToolParamType
 from .model_client.base_client import BaseClient, APIResponse, client_registry
+from .model_scheduler import model_scheduler, estimate_tokens
 from .utils import compress_messages, llm_usage_recorder
 from .exceptions import (
     NetworkConnectionError,
@@ -47,6 +48,74 @@ class RequestType(Enum):
     AUDIO = "audio"
 
 
+class LLMResponseStream:
+    """
+    流式响应
+    异步迭代得到正式内容的增量文本，迭代结束后可读取完整的响应内容、推理内容、模型名称与工具调用
+    """
+
+    def __init__(self) -> None:
+        self.content: str = ""
+        """已输出的正式内容"""
+        self.reasoning_content: str = ""
+        """推理内容（迭代结束后可用）"""
+        self.model_name: str = ""
+        """实际使用的模型名称（迭代结束后可用）"""
+        self.tool_calls: Optional[List[ToolCall]] = None
+        """工具调用列表（迭代结束后可用）"""
+        self._chunks: Optional[AsyncIterator[str]] = None
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        assert self._chunks is not None, "请通过 LLMRequest.generate_response_stream 创建流式响应"
+        return self._chunks
+
+    async def aclose(self) -> None:
+        """提前结束迭代并中断请求"""
+        if self._chunks is not None:
+            await self._chunks.aclose()  # type: ignore
+
+
+class _ThinkTagFilter:
+    """
+    过滤流式正式内容开头以 <think> 标签包裹的推理内容（与非流式的 _extract_reasoning 对应）
+    标签可能被拆分在多个增量中，因此在能够判断开头是否为 <think> 之前暂不输出
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._decided = False
+        self.reasoning = ""
+
+    def feed(self, delta: str) -> str:
+        if self._decided:
+            return delta
+        self._buffer += delta
+        stripped = self._buffer.lstrip()
+        if "<think>".startswith(stripped):
+            # 可能是 <think> 的前缀，继续等待
+            return ""
+        if not stripped.startswith("<think>"):
+            self._decided = True
+            output, self._buffer = self._buffer, ""
+            return output
+        end = stripped.find("</think>")
+        if end < 0:
+            return ""
+        self._decided = True
+        self.reasoning = stripped[len("<think>") : end].strip()
+        output = stripped[end + len("</think>") :].lstrip()
+        self._buffer = ""
+        return output
+
+    def flush(self) -> str:
+        """流结束时取出仍被暂存的内容（未闭合的 <think> 视为推理内容）"""
+        output, self._buffer = self._buffer, ""
+        if not self._decided and output.lstrip().startswith("<think>"):
+            self.reasoning = output.lstrip()[len("<think>") :].strip()
+            return ""
+        return output
+
+
 class LLMRequest:
     """LLM请求类"""
 
@@ -54,10 +123,7 @@ class LLMRequest:
         self.task_name = request_type
         self.model_for_task = model_set
         self.request_type = request_type
-        self.model_usage: Dict[str, Tuple[int, int, int]] = {
-            model: (0, 0, 0) for model in self.model_for_task.model_list
-        }
-        """模型使用量记录，用于进行负载均衡，对应为(total_tokens, penalty, usage_penalty)，惩罚值是为了能在某个模型请求不给力或正在被使用的时候进行调整"""
+        # 负载均衡与限流由全局的 model_scheduler 负责，所有实例共享模型的负载与惩罚状态
 
     async def generate_response_for_image(
         self,
@@ -177,6 +243,37 @@ class LLMRequest:
             )
         return content or "", (reasoning_content, model_info.name, tool_calls)
 
+    def generate_response_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> LLMResponseStream:
+        """
+        流式生成响应，请求进行中即可逐段取得正式内容
+        在输出第一段内容之前遇到错误时会按非流式请求的规则重试或切换模型；已经输出内容后的错误直接抛出
+        Args:
+            prompt (str): 提示词
+            temperature (float, optional): 温度参数
+            max_tokens (int, optional): 最大token数
+        Returns:
+            (LLMResponseStream): 异步迭代得到增量文本，迭代结束后可读取推理内容、模型名称与工具调用
+        """
+
+        def message_factory(client: BaseClient) -> List[Message]:
+            message_builder = MessageBuilder()
+            message_builder.add_text_content(prompt)
+            return [message_builder.build()]
+
+        stream = LLMResponseStream()
+        stream._chunks = self._execute_stream_request(
+            stream,
+            message_factory=message_factory,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return stream
+
     async def get_embedding(self, embedding_input: str) -> Tuple[List[float], str]:
         """
         获取嵌入向量
@@ -204,29 +301,47 @@ class LLMRequest:
             raise RuntimeError("获取embedding失败")
         return embedding, model_info.name
 
+    async def get_embeddings(self, embedding_inputs: List[str]) -> Tuple[List[List[float]], str]:
+        """
+        批量获取嵌入向量，一次请求提交全部输入
+        Args:
+            embedding_inputs (List[str]): 获取嵌入的目标列表
+        Returns:
+            (Tuple[List[List[float]], str]): (与输入顺序一致的嵌入向量列表，使用的模型名称)
+        """
+        start_time = time.time()
+        response, model_info = await self._execute_request(
+            request_type=RequestType.EMBEDDING,
+            embedding_input=embedding_inputs,
+        )
+        embeddings = response.embeddings
+        if usage := response.usage:
+            llm_usage_recorder.record_usage_to_database(
+                model_info=model_info,
+                model_usage=usage,
+                user_id="system",
+                request_type=self.request_type,
+                endpoint="/embeddings",
+                time_cost=time.time() - start_time,
+            )
+        if not embeddings or len(embeddings) != len(embedding_inputs) or not all(embeddings):
+            raise RuntimeError("批量获取embedding失败")
+        return embeddings, model_info.name
+
     def _select_model(self, exclude_models: Optional[Set[str]] = None) -> Tuple[ModelInfo, APIProvider, BaseClient]:
         """
-        根据总tokens和惩罚值选择的模型
+        根据全局负载（每分钟tokens、进行中的请求、延迟与惩罚值）选择模型
         """
-        available_models = {
-            model: scores
-            for model, scores in self.model_usage.items()
+        candidates = [
+            model_config.get_model_info(model)
+            for model in self.model_for_task.model_list
             if not exclude_models or model not in exclude_models
-        }
-        if not available_models:
-            raise RuntimeError("没有可用的模型可供选择。所有模型均已尝试失败。")
-
-        least_used_model_name = min(
-            available_models,
-            key=lambda k: available_models[k][0] + available_models[k][1] * 300 + available_models[k][2] * 1000,
-        )
-        model_info = model_config.get_model_info(least_used_model_name)
+        ]
+        model_info = model_scheduler.select_model(candidates)
         api_provider = model_config.get_provider(model_info.api_provider)
-        force_new_client = self.request_type == "embedding"
-        client = client_registry.get_client_class_instance(api_provider, force_new=force_new_client)
+        # 客户端按事件循环缓存复用，嵌入请求不再每次新建客户端与连接池
+        client = client_registry.get_client_class_instance(api_provider)
         logger.debug(f"选择请求模型: {model_info.name}")
-        total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-        self.model_usage[model_info.name] = (total_tokens, penalty, usage_penalty + 1)
         return model_info, api_provider, client
 
     async def _attempt_request_on_model(
@@ -242,7 +357,7 @@ class LLMRequest:
         async_response_parser: Optional[Callable],
         temperature: Optional[float],
         max_tokens: Optional[int],
-        embedding_input: str | None,
+        embedding_input: str | List[str] | None,
         audio_base64: str | None,
     ) -> APIResponse:
         """
@@ -251,76 +366,113 @@ class LLMRequest:
         """
         retry_remain = api_provider.max_retry
         compressed_messages: Optional[List[Message]] = None
+        if max_tokens is None:
+            max_tokens = self.model_for_task.max_tokens
 
         while retry_remain > 0:
+            estimated_tokens = estimate_tokens(
+                message_list=(compressed_messages or message_list),
+                embedding_input=embedding_input,
+                max_tokens=max_tokens if request_type == RequestType.RESPONSE else 0,
+            )
             try:
-                if request_type == RequestType.RESPONSE:
-                    return await client.get_response(
-                        model_info=model_info,
-                        message_list=(compressed_messages or message_list),
-                        tool_options=tool_options,
-                        max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
-                        temperature=self.model_for_task.temperature if temperature is None else temperature,
-                        response_format=response_format,
-                        stream_response_handler=stream_response_handler,
-                        async_response_parser=async_response_parser,
-                        extra_params=model_info.extra_params,
-                    )
-                elif request_type == RequestType.EMBEDDING:
-                    assert embedding_input is not None
-                    return await client.get_embedding(
-                        model_info=model_info,
-                        embedding_input=embedding_input,
-                        extra_params=model_info.extra_params,
-                    )
-                elif request_type == RequestType.AUDIO:
-                    assert audio_base64 is not None
-                    return await client.get_audio_transcriptions(
-                        model_info=model_info,
-                        audio_base64=audio_base64,
-                        extra_params=model_info.extra_params,
-                    )
-            except (EmptyResponseException, NetworkConnectionError) as e:
+                # 每次实际发出请求前向调度器申请配额，超出提供商的并发或速率上限时在此排队
+                async with model_scheduler.slot(model_info, api_provider, self.request_type, estimated_tokens) as lease:
+                    if request_type == RequestType.RESPONSE:
+                        response = await client.get_response(
+                            model_info=model_info,
+                            message_list=(compressed_messages or message_list),
+                            tool_options=tool_options,
+                            max_tokens=max_tokens,
+                            temperature=self.model_for_task.temperature if temperature is None else temperature,
+                            response_format=response_format,
+                            stream_response_handler=stream_response_handler,
+                            async_response_parser=async_response_parser,
+                            extra_params=model_info.extra_params,
+                        )
+                    elif request_type == RequestType.EMBEDDING and isinstance(embedding_input, list):
+                        response = await client.get_embeddings(
+                            model_info=model_info,
+                            embedding_inputs=embedding_input,
+                            extra_params=model_info.extra_params,
+                        )
+                    elif request_type == RequestType.EMBEDDING:
+                        assert embedding_input is not None
+                        response = await client.get_embedding(
+                            model_info=model_info,
+                            embedding_input=embedding_input,
+                            extra_params=model_info.extra_params,
+                        )
+                    else:
+                        assert audio_base64 is not None
+                        response = await client.get_audio_transcriptions(
+                            model_info=model_info,
+                            audio_base64=audio_base64,
+                            extra_params=model_info.extra_params,
+                        )
+                    lease.report_usage(response.usage.total_tokens if response.usage else estimated_tokens)
+                    return response
+            except Exception as e:
+                retry_remain, compress = await self._handle_attempt_error(
+                    e,
+                    model_info,
+                    api_provider,
+                    retry_remain,
+                    can_compress=bool(message_list) and not compressed_messages,
+                )
+                if compress:
+                    # 压缩消息本身不消耗重试次数
+                    compressed_messages = compress_messages(message_list)
+
+        raise ModelAttemptFailed(f"模型 '{model_info.name}' 未被尝试，因为重试次数已配置为0或更少。")
+
+    async def _handle_attempt_error(
+        self,
+        e: Exception,
+        model_info: ModelInfo,
+        api_provider: APIProvider,
+        retry_remain: int,
+        can_compress: bool,
+    ) -> Tuple[int, bool]:
+        """
+        处理在单个模型上请求时遇到的异常，决定是否在该模型上重试。
+        可重试时等待重试间隔后返回 (剩余重试次数, 是否需要压缩消息后重试)；不可重试时抛出ModelAttemptFailed异常。
+        """
+        if isinstance(e, (EmptyResponseException, NetworkConnectionError)):
+            retry_remain -= 1
+            if retry_remain <= 0:
+                logger.error(f"模型 '{model_info.name}' 在用尽对临时错误的重试次数后仍然失败。")
+                raise ModelAttemptFailed(f"模型 '{model_info.name}' 重试耗尽", original_exception=e) from e
+
+            logger.warning(f"模型 '{model_info.name}' 遇到可重试错误: {str(e)}。剩余重试次数: {retry_remain}")
+            await asyncio.sleep(api_provider.retry_interval)
+            return retry_remain, False
+
+        if isinstance(e, RespNotOkException):
+            # 可重试的HTTP错误
+            if e.status_code == 429 or e.status_code >= 500:
                 retry_remain -= 1
                 if retry_remain <= 0:
-                    logger.error(f"模型 '{model_info.name}' 在用尽对临时错误的重试次数后仍然失败。")
+                    logger.error(f"模型 '{model_info.name}' 在遇到 {e.status_code} 错误并用尽重试次数后仍然失败。")
                     raise ModelAttemptFailed(f"模型 '{model_info.name}' 重试耗尽", original_exception=e) from e
 
-                logger.warning(f"模型 '{model_info.name}' 遇到可重试错误: {str(e)}。剩余重试次数: {retry_remain}")
+                logger.warning(f"模型 '{model_info.name}' 遇到可重试的HTTP错误: {str(e)}。剩余重试次数: {retry_remain}")
                 await asyncio.sleep(api_provider.retry_interval)
+                return retry_remain, False
 
-            except RespNotOkException as e:
-                # 可重试的HTTP错误
-                if e.status_code == 429 or e.status_code >= 500:
-                    retry_remain -= 1
-                    if retry_remain <= 0:
-                        logger.error(f"模型 '{model_info.name}' 在遇到 {e.status_code} 错误并用尽重试次数后仍然失败。")
-                        raise ModelAttemptFailed(f"模型 '{model_info.name}' 重试耗尽", original_exception=e) from e
+            # 特殊处理413，尝试压缩
+            if e.status_code == 413 and can_compress:
+                logger.warning(f"模型 '{model_info.name}' 返回413请求体过大，尝试压缩后重试...")
+                return retry_remain, True
 
-                    logger.warning(
-                        f"模型 '{model_info.name}' 遇到可重试的HTTP错误: {str(e)}。剩余重试次数: {retry_remain}"
-                    )
-                    await asyncio.sleep(api_provider.retry_interval)
-                    continue
+            # 不可重试的HTTP错误
+            logger.warning(f"模型 '{model_info.name}' 遇到不可重试的HTTP错误: {str(e)}")
+            raise ModelAttemptFailed(f"模型 '{model_info.name}' 遇到硬错误", original_exception=e) from e
 
-                # 特殊处理413，尝试压缩
-                if e.status_code == 413 and message_list and not compressed_messages:
-                    logger.warning(f"模型 '{model_info.name}' 返回413请求体过大，尝试压缩后重试...")
-                    # 压缩消息本身不消耗重试次数
-                    compressed_messages = compress_messages(message_list)
-                    continue
-
-                # 不可重试的HTTP错误
-                logger.warning(f"模型 '{model_info.name}' 遇到不可重试的HTTP错误: {str(e)}")
-                raise ModelAttemptFailed(f"模型 '{model_info.name}' 遇到硬错误", original_exception=e) from e
-
-            except Exception as e:
-                logger.error(traceback.format_exc())
-
-                logger.warning(f"模型 '{model_info.name}' 遇到未知的不可重试错误: {str(e)}")
-                raise ModelAttemptFailed(f"模型 '{model_info.name}' 遇到硬错误", original_exception=e) from e
+        logger.error(traceback.format_exc())
 
-        raise ModelAttemptFailed(f"模型 '{model_info.name}' 未被尝试，因为重试次数已配置为0或更少。")
+        logger.warning(f"模型 '{model_info.name}' 遇到未知的不可重试错误: {str(e)}")
+        raise ModelAttemptFailed(f"模型 '{model_info.name}' 遇到硬错误", original_exception=e) from e
 
     async def _execute_request(
         self,
@@ -332,7 +484,7 @@ class LLMRequest:
         async_response_parser: Optional[Callable] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        embedding_input: str | None = None,
+        embedding_input: str | List[str] | None = None,
         audio_base64: str | None = None,
     ) -> Tuple[APIResponse, ModelInfo]:
         """
@@ -370,18 +522,113 @@ class LLMRequest:
             except ModelAttemptFailed as e:
                 last_exception = e.original_exception or e
                 logger.warning(f"模型 '{model_info.name}' 尝试失败，切换到下一个模型。原因: {e}")
-                total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-                self.model_usage[model_info.name] = (total_tokens, penalty + 1, usage_penalty)
+                model_scheduler.report_failure(model_info.name)
                 failed_models_this_request.add(model_info.name)
 
                 if isinstance(last_exception, RespNotOkException) and last_exception.status_code == 400:
                     logger.error("收到不可恢复的客户端错误 (400)，中止所有尝试。")
                     raise last_exception from e
 
-            finally:
-                total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-                if usage_penalty > 0:
-                    self.model_usage[model_info.name] = (total_tokens, penalty, usage_penalty - 1)
+        logger.error(f"所有 {max_attempts} 个模型均尝试失败。")
+        if last_exception:
+            raise last_exception
+        raise RuntimeError("请求失败，所有可用模型均已尝试失败。")
+
+    async def _execute_stream_request(
+        self,
+        stream: LLMResponseStream,
+        message_factory: Callable[[BaseClient], List[Message]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        流式请求的调度函数，负责模型选择、重试与故障切换（仅在输出第一段内容之前），并在结束时记录用量。
+        """
+        start_time = time.time()
+        if max_tokens is None:
+            max_tokens = self.model_for_task.max_tokens
+        failed_models_this_request: Set[str] = set()
+        max_attempts = len(self.model_for_task.model_list)
+        last_exception: Optional[Exception] = None
+
+        for _ in range(max_attempts):
+            model_info, api_provider, client = self._select_model(exclude_models=failed_models_this_request)
+            message_list = message_factory(client)
+            compressed_messages: Optional[List[Message]] = None
+            retry_remain = api_provider.max_retry
+
+            try:
+                while retry_remain > 0:
+                    estimated_tokens = estimate_tokens(
+                        message_list=(compressed_messages or message_list), max_tokens=max_tokens
+                    )
+                    think_filter = _ThinkTagFilter()
+                    response: Optional[APIResponse] = None
+                    try:
+                        # 配额在整个流式输出期间保持占用
+                        async with model_scheduler.slot(
+                            model_info, api_provider, self.request_type, estimated_tokens
+                        ) as lease:
+                            async for chunk in client.get_response_stream(
+                                model_info=model_info,
+                                message_list=(compressed_messages or message_list),
+                                max_tokens=max_tokens,
+                                temperature=self.model_for_task.temperature if temperature is None else temperature,
+                                extra_params=model_info.extra_params,
+                            ):
+                                if isinstance(chunk, APIResponse):
+                                    response = chunk
+                                elif text := think_filter.feed(chunk):
+                                    stream.content += text
+                                    yield text
+                            if text := think_filter.flush():
+                                stream.content += text
+                                yield text
+                            assert response is not None, "流式响应未返回最终结果"
+                            lease.report_usage(response.usage.total_tokens if response.usage else estimated_tokens)
+                    except Exception as e:
+                        if stream.content:
+                            # 已经输出了部分内容，无法再重试或切换模型
+                            logger.error(f"模型 '{model_info.name}' 流式输出中断: {str(e)}")
+                            model_scheduler.report_failure(model_info.name)
+                            raise
+                        retry_remain, compress = await self._handle_attempt_error(
+                            e,
+                            model_info,
+                            api_provider,
+                            retry_remain,
+                            can_compress=bool(message_list) and not compressed_messages,
+                        )
+                        if compress:
+                            compressed_messages = compress_messages(message_list)
+                        continue
+
+                    stream.model_name = model_info.name
+                    stream.reasoning_content = response.reasoning_content or think_filter.reasoning
+                    stream.tool_calls = response.tool_calls
+                    logger.debug(f"LLM流式请求总耗时: {time.time() - start_time}")
+                    if usage := response.usage:
+                        llm_usage_recorder.record_usage_to_database(
+                            model_info=model_info,
+                            model_usage=usage,
+                            user_id="system",
+                            request_type=self.request_type,
+                            endpoint="/chat/completions",
+                            time_cost=time.time() - start_time,
+                        )
+                    return
+
+                raise ModelAttemptFailed(f"模型 '{model_info.name}' 未被尝试，因为重试次数已配置为0或更少。")
+
+            except ModelAttemptFailed as e:
+                last_exception = e.original_exception or e
+                logger.warning(f"模型 '{model_info.name}' 尝试失败，切换到下一个模型。原因: {e}")
+                model_scheduler.report_failure(model_info.name)
+                failed_models_this_request.add(model_info.name)
+
+                if isinstance(last_exception, RespNotOkException) and last_exception.status_code == 400:
+                    logger.error("收到不可恢复的客户端错误 (400)，中止所有尝试。")
+                    raise last_exception from e
 
         logger.error(f"所有 {max_attempts} 个模型均尝试失败。")
         if last_exception:
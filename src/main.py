@@ -1,4 +1,5 @@
 import asyncio
+import gc
 import time
 from maim_message import MessageServer
 
@@ -114,6 +115,11 @@ class MainSystem:
 
         await events_manager.handle_mai_events(event_type=EventType.ON_START)
         # logger.info("已触发 ON_START 事件")
+
+        # 启动时加载的模块、配置和知识库等对象会一直存在，把它们移出分代垃圾回收，
+        # 否则之后每次完整回收都要遍历它们，回收期间事件循环会卡住上百毫秒
+        gc.collect()
+        gc.freeze()
         try:
             init_time = int(1000 * (time.time() - init_start_time))
             logger.info(f"初始化完成，神经元放电{init_time}次")
@@ -5,6 +5,7 @@ from json_repair import repair_json
 from src.chat.message_receive.message import MessageRecv
 from src.llm_models.utils_model import LLMRequest
 from src.common.logger import get_logger
+from src.common.database.group_commit import group_commit_writer
 from src.chat.utils.chat_message_builder import build_readable_messages, get_raw_msg_by_timestamp_with_chat_inclusive
 from src.config.config import global_config, model_config
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
@@ -156,6 +157,7 @@ class ChatAction:
         self.regression_count = 0
 
         message_time: float = message.message_info.time  # type: ignore
+        await group_commit_writer.aflush(chat_id=self.chat_id)
         message_list_before_now = get_raw_msg_by_timestamp_with_chat_inclusive(
             chat_id=self.chat_id,
             timestamp_start=self.last_change_time,
@@ -219,6 +221,7 @@ class ChatAction:
 
     async def regress_action(self):
         message_time = time.time()
+        await group_commit_writer.aflush(chat_id=self.chat_id)
         message_list_before_now = get_raw_msg_by_timestamp_with_chat_inclusive(
             chat_id=self.chat_id,
             timestamp_start=self.last_change_time,
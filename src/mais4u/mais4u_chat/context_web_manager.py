@@ -1,8 +1,9 @@
 import asyncio
+import itertools
 import json
 from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Optional
 from aiohttp import web, WSMsgType
 import aiohttp_cors
 
@@ -11,11 +12,17 @@ from src.common.logger import get_logger
 
 logger = get_logger("context_web")
 
+# 每个网页连接最多积压的待发送更新数，超出后丢弃积压的增量，改为发送一次完整快照
+CONTEXT_WS_QUEUE_SIZE = 32
+# 单次发送的超时时间（秒），超时的连接视为已断开
+CONTEXT_WS_SEND_TIMEOUT = 10.0
+
 
 class ContextMessage:
     """上下文消息类"""
 
-    def __init__(self, message: MessageRecv):
+    def __init__(self, message: MessageRecv, seq: int = 0):
+        self.seq = seq
         self.user_name = message.message_info.user_info.user_nickname
         self.user_id = message.message_info.user_info.user_id
         self.content = message.processed_plain_text
@@ -39,8 +46,12 @@ class ContextMessage:
             else:
                 self.content = f"[¥{self.superchat_price}] {self.content}"
 
+        # 消息内容不会再变化，只序列化一次，之后的增量与快照都直接拼接
+        self.json = json.dumps(self.to_dict(), ensure_ascii=False)
+
     def to_dict(self):
         return {
+            "id": self.seq,
             "user_name": self.user_name,
             "user_id": self.user_id,
             "content": self.content,
@@ -51,6 +62,49 @@ class ContextMessage:
         }
 
 
+class ContextViewer:
+    """
+    一个网页连接
+
+    每个连接有独立的有界发送队列与发送任务，广播只需入队，慢连接不会拖慢其他连接；
+    队列满时丢弃积压的增量，改为发送一次完整快照追上最新状态。
+    """
+
+    def __init__(self, ws: web.WebSocketResponse):
+        self.ws = ws
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=CONTEXT_WS_QUEUE_SIZE)
+        self.coalesced = 0
+        self.task = asyncio.create_task(self._send_loop())
+
+    def push(self, payload: str, snapshot: Callable[[], str]) -> None:
+        """加入一条待发送的更新，不等待发送完成"""
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(snapshot())
+            self.coalesced += 1
+
+    async def _send_loop(self):
+        try:
+            while True:
+                payload = await self.queue.get()
+                await asyncio.wait_for(self.ws.send_str(payload), CONTEXT_WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"发送WebSocket消息失败，关闭连接: {e}")
+            await self.ws.close()
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
 class ContextWebManager:
     """上下文网页管理器"""
 
@@ -58,7 +112,11 @@ class ContextWebManager:
         self.max_messages = max_messages
         self.port = port
         self.contexts: Dict[str, deque] = {}  # chat_id -> deque of ContextMessage
-        self.websockets: List[web.WebSocketResponse] = []
+        # 所有聊天合并后最新的消息；消息按添加顺序递增，无需每次重新排序
+        self.recent_messages: deque[ContextMessage] = deque(maxlen=max_messages)
+        self.viewers: Dict[web.WebSocketResponse, ContextViewer] = {}
+        self._seq = itertools.count(1)
+        self._snapshot_payload: Optional[str] = None
         self.app = None
         self.runner = None
         self.site = None
@@ -124,6 +182,9 @@ class ContextWebManager:
 
     async def stop_server(self):
         """停止web服务器"""
+        for viewer in list(self.viewers.values()):
+            await viewer.close()
+        self.viewers.clear()
         if self.site:
             await self.site.stop()
         if self.runner:
@@ -284,6 +345,9 @@ class ContextWebManager:
         let ws;
         let reconnectInterval;
         let currentMessages = []; // 存储当前显示的消息
+        const maxContextMessages = """
+            + str(self.max_messages)
+            + """;
         
                  function connectWebSocket() {
              console.log('正在连接WebSocket...');
@@ -303,7 +367,14 @@ class ContextWebManager:
                  console.log('收到WebSocket消息:', event.data);
                  try {
                      const data = JSON.parse(event.data);
-                     updateMessages(data.contexts);
+                     if (data.type === 'delta') {
+                         // 增量更新只包含新消息，拼接到当前消息之后
+                         const lastId = currentMessages.length > 0 ? currentMessages[currentMessages.length - 1].id : 0;
+                         const newMessages = data.messages.filter(msg => msg.id > lastId);
+                         updateMessages(currentMessages.concat(newMessages).slice(-maxContextMessages));
+                     } else {
+                         updateMessages(data.contexts);
+                     }
                  } catch (e) {
                      console.error('解析消息失败:', e, event.data);
                  }
@@ -412,9 +483,7 @@ class ContextWebManager:
              // 从后往前找，因为新消息通常在末尾
              for (let i = contexts.length - 1; i >= 0; i--) {
                  const msg = contexts[i];
-                 if (msg.user_id === lastCurrentMsg.user_id && 
-                     msg.content === lastCurrentMsg.content && 
-                     msg.timestamp === lastCurrentMsg.timestamp) {
+                 if (msg.id === lastCurrentMsg.id) {
                      lastIndex = i;
                      break;
                  }
@@ -482,44 +551,37 @@ class ContextWebManager:
         ws = web.WebSocketResponse()
         await ws.prepare(request)
 
-        self.websockets.append(ws)
-        logger.debug(f"WebSocket连接建立，当前连接数: {len(self.websockets)}")
+        viewer = ContextViewer(ws)
+        self.viewers[ws] = viewer
+        logger.debug(f"WebSocket连接建立，当前连接数: {len(self.viewers)}")
 
         # 发送初始数据
-        await self.send_contexts_to_websocket(ws)
+        viewer.push(self._get_snapshot_payload(), self._get_snapshot_payload)
 
-        async for msg in ws:
-            if msg.type == WSMsgType.ERROR:
-                logger.error(f"WebSocket错误: {ws.exception()}")
-                break
-
-        # 清理断开的连接
-        if ws in self.websockets:
-            self.websockets.remove(ws)
-        logger.debug(f"WebSocket连接断开，当前连接数: {len(self.websockets)}")
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    logger.error(f"WebSocket错误: {ws.exception()}")
+                    break
+        finally:
+            # 清理断开的连接
+            self.viewers.pop(ws, None)
+            await viewer.close()
+            logger.debug(f"WebSocket连接断开，当前连接数: {len(self.viewers)}")
 
         return ws
 
     async def get_contexts_handler(self, request):
         """获取上下文API"""
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
-
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages :]]
-
-        logger.debug(f"返回上下文数据，共 {len(contexts_data)} 条消息")
-        return web.json_response({"contexts": contexts_data})
+        logger.debug(f"返回上下文数据，共 {len(self.recent_messages)} 条消息")
+        return web.Response(text=self._get_snapshot_payload(), content_type="application/json")
 
     async def debug_handler(self, request):
         """调试信息处理器"""
         debug_info = {
             "server_status": "running",
-            "websocket_connections": len(self.websockets),
+            "websocket_connections": len(self.viewers),
+            "coalesced_updates": sum(viewer.coalesced for viewer in self.viewers.values()),
             "total_chats": len(self.contexts),
             "total_messages": sum(len(contexts) for contexts in self.contexts.values()),
         }
@@ -560,6 +622,7 @@ class ContextWebManager:
         <h2>服务器状态</h2>
         <p>状态: {debug_info["server_status"]}</p>
         <p>WebSocket连接数: {debug_info["websocket_connections"]}</p>
+        <p>因连接过慢合并为快照的更新数: {debug_info["coalesced_updates"]}</p>
         <p>聊天总数: {debug_info["total_chats"]}</p>
         <p>消息总数: {debug_info["total_messages"]}</p>
     </div>
@@ -592,8 +655,10 @@ class ContextWebManager:
             self.contexts[chat_id] = deque(maxlen=self.max_messages)
             logger.debug(f"为聊天 {chat_id} 创建新的上下文队列")
 
-        context_msg = ContextMessage(message)
+        context_msg = ContextMessage(message, next(self._seq))
         self.contexts[chat_id].append(context_msg)
+        self.recent_messages.append(context_msg)
+        self._snapshot_payload = None
 
         # 统计当前总消息数
         total_messages = sum(len(contexts) for contexts in self.contexts.values())
@@ -602,75 +667,32 @@ class ContextWebManager:
             f"✅ 添加消息到上下文 [总数: {total_messages}]: [{context_msg.group_name}] {context_msg.user_name}: {context_msg.content}"
         )
 
-        # 调试：打印当前所有消息
-        logger.info("📝 当前上下文中的所有消息：")
-        for cid, contexts in self.contexts.items():
-            logger.info(f"  聊天 {cid}: {len(contexts)} 条消息")
-            for i, msg in enumerate(contexts):
-                logger.info(
-                    f"    {i + 1}. [{msg.timestamp.strftime('%H:%M:%S')}] {msg.user_name}: {msg.content[:30]}..."
-                )
-
-        # 广播更新给所有WebSocket连接
-        await self.broadcast_contexts()
+        # 只向所有WebSocket连接广播新消息
+        self._broadcast(f'{{"type": "delta", "messages": [{context_msg.json}]}}')
 
-    async def send_contexts_to_websocket(self, ws: web.WebSocketResponse):
-        """向单个WebSocket发送上下文数据"""
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
+    def _get_snapshot_payload(self) -> str:
+        """所有聊天最新消息的完整快照，消息变化前只序列化一次"""
+        if self._snapshot_payload is None:
+            contexts = ", ".join(msg.json for msg in self.recent_messages)
+            self._snapshot_payload = f'{{"type": "snapshot", "contexts": [{contexts}]}}'
+        return self._snapshot_payload
 
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages :]]
-
-        data = {"contexts": contexts_data}
-        await ws.send_str(json.dumps(data, ensure_ascii=False))
-
-    async def broadcast_contexts(self):
-        """向所有WebSocket连接广播上下文更新"""
-        if not self.websockets:
+    def _broadcast(self, payload: str):
+        """把同一份已序列化的更新放入每个连接的发送队列"""
+        if not self.viewers:
             logger.debug("没有WebSocket连接，跳过广播")
             return
+        logger.debug(f"广播更新到 {len(self.viewers)} 个WebSocket连接")
+        for viewer in self.viewers.values():
+            viewer.push(payload, self._get_snapshot_payload)
 
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
-
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages :]]
-
-        data = {"contexts": contexts_data}
-        message = json.dumps(data, ensure_ascii=False)
-
-        logger.info(f"广播 {len(contexts_data)} 条消息到 {len(self.websockets)} 个WebSocket连接")
-
-        # 创建WebSocket列表的副本，避免在遍历时修改
-        websockets_copy = self.websockets.copy()
-        removed_count = 0
+    async def send_contexts_to_websocket(self, ws: web.WebSocketResponse):
+        """向单个WebSocket发送上下文数据"""
+        await ws.send_str(self._get_snapshot_payload())
 
-        for ws in websockets_copy:
-            if ws.closed:
-                if ws in self.websockets:
-                    self.websockets.remove(ws)
-                    removed_count += 1
-            else:
-                try:
-                    await ws.send_str(message)
-                    logger.debug("消息发送成功")
-                except Exception as e:
-                    logger.error(f"发送WebSocket消息失败: {e}")
-                    if ws in self.websockets:
-                        self.websockets.remove(ws)
-                        removed_count += 1
-
-        if removed_count > 0:
-            logger.debug(f"清理了 {removed_count} 个断开的WebSocket连接")
+    async def broadcast_contexts(self):
+        """向所有WebSocket连接广播完整的上下文快照"""
+        self._broadcast(self._get_snapshot_payload())
 
 
 # 全局实例
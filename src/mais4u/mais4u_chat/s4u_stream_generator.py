@@ -1,8 +1,8 @@
 from typing import AsyncGenerator
-from src.llm_models.utils_model import LLMRequest, RequestType
-from src.llm_models.payload_content.message import MessageBuilder
+from src.llm_models.utils_model import LLMRequest
 from src.config.config import model_config
 from src.chat.message_receive.message import MessageRecvS4U
+from src.chat.utils.utils import StreamingSentenceBuffer
 from src.mais4u.mais4u_chat.s4u_prompt import prompt_builder
 from src.common.logger import get_logger
 import re
@@ -85,64 +85,20 @@ class S4UStreamGenerator:
             yield chunk
 
     async def _generate_response_with_llm_request(self, prompt: str) -> AsyncGenerator[str, None]:
-        """使用LLMRequest进行流式响应生成"""
-
-        # 构建消息
-        message_builder = MessageBuilder()
-        message_builder.add_text_content(prompt)
-        messages = [message_builder.build()]
-
-        # 选择模型
-        model_info, api_provider, client = self.llm_request._select_model()
-        self.current_model_name = model_info.name
-
-        # 如果模型支持强制流式模式，使用真正的流式处理
-        if model_info.force_stream_mode:
-            # 简化流式处理：直接使用LLMRequest的流式功能
-            try:
-                # 直接调用LLMRequest的流式处理
-                response = await self.llm_request._execute_request(
-                    api_provider=api_provider,
-                    client=client,
-                    request_type=RequestType.RESPONSE,
-                    model_info=model_info,
-                    message_list=messages,
-                )
-
-                # 处理响应内容
-                content = response.content or ""
-                if content:
-                    # 将内容按句子分割并输出
-                    async for chunk in self._process_content_streaming(content):
+        """使用LLMRequest进行流式响应生成，每生成一段完整的句子就输出，不必等待整个回复生成完毕"""
+        stream = self.llm_request.generate_response_stream(prompt)
+        sentence_buffer = StreamingSentenceBuffer()
+        try:
+            async for delta in stream:
+                if sentences := sentence_buffer.feed(delta):
+                    async for chunk in self._process_content_streaming(sentences):
                         yield chunk
-
-            except Exception as e:
-                logger.error(f"流式请求执行失败: {e}")
-                # 如果流式请求失败，回退到普通模式
-                response = await self.llm_request._execute_request(
-                    api_provider=api_provider,
-                    client=client,
-                    request_type=RequestType.RESPONSE,
-                    model_info=model_info,
-                    message_list=messages,
-                )
-                content = response.content or ""
-                async for chunk in self._process_content_streaming(content):
-                    yield chunk
-
-        else:
-            # 如果不支持流式，使用普通方式然后模拟流式输出
-            response = await self.llm_request._execute_request(
-                api_provider=api_provider,
-                client=client,
-                request_type=RequestType.RESPONSE,
-                model_info=model_info,
-                message_list=messages,
-            )
-
-            content = response.content or ""
-            async for chunk in self._process_content_streaming(content):
+            async for chunk in self._process_content_streaming(sentence_buffer.flush()):
                 yield chunk
+        finally:
+            # 提前停止迭代（如被打断）时中断请求
+            await stream.aclose()
+        self.current_model_name = stream.model_name
 
     async def _process_buffer_streaming(self, buffer: str) -> AsyncGenerator[str, None]:
         """实时处理缓冲区内容，输出完整句子"""
@@ -3,6 +3,7 @@ import random
 import time
 
 from src.common.logger import get_logger
+from src.common.database.group_commit import group_commit_writer
 from src.config.config import global_config, model_config
 from src.chat.message_receive.message import MessageRecv
 from src.chat.message_receive.chat_stream import get_chat_manager
@@ -93,6 +94,7 @@ class ChatMood:
         )
 
         message_time: float = message.message_info.time  # type: ignore
+        await group_commit_writer.aflush(chat_id=self.chat_id)
         message_list_before_now = get_raw_msg_by_timestamp_with_chat_inclusive(
             chat_id=self.chat_id,
             timestamp_start=self.last_change_time,
@@ -142,6 +144,7 @@ class ChatMood:
 
     async def regress_mood(self):
         message_time = time.time()
+        await group_commit_writer.aflush(chat_id=self.chat_id)
         message_list_before_now = get_raw_msg_by_timestamp_with_chat_inclusive(
             chat_id=self.chat_id,
             timestamp_start=self.last_change_time,
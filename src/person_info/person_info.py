@@ -4,13 +4,17 @@ import json
 import time
 import random
 import math
+import threading
 
+from collections import OrderedDict
+from functools import lru_cache
 from json_repair import repair_json
-from typing import Union, Optional
+from typing import Any, Dict, Tuple, Union, Optional
 
 from src.common.logger import get_logger
 from src.common.database.database import db
 from src.common.database.database_model import PersonInfo
+from src.common.database.db_executor import db_executor
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import global_config, model_config
 
@@ -20,6 +24,7 @@ logger = get_logger("person_info")
 relation_selection_model = LLMRequest(model_set=model_config.model_task_config.utils_small, request_type="relation_selection")
 
 
+@lru_cache(maxsize=8192)
 def get_person_id(platform: str, user_id: Union[int, str]) -> str:
     """获取唯一id"""
     if "-" in platform:
@@ -41,16 +46,16 @@ def get_person_id_by_person_name(person_name: str) -> str:
 
 def is_person_known(person_id: str = None, user_id: str = None, platform: str = None, person_name: str = None) -> bool:  # type: ignore
     if person_id:
-        person = PersonInfo.get_or_none(PersonInfo.person_id == person_id)
-        return person.is_known if person else False
+        record = person_info_manager.get_person_record(person_id)
+        return bool(record["is_known"]) if record else False
     elif user_id and platform:
         person_id = get_person_id(platform, user_id)
-        person = PersonInfo.get_or_none(PersonInfo.person_id == person_id)
-        return person.is_known if person else False
+        record = person_info_manager.get_person_record(person_id)
+        return bool(record["is_known"]) if record else False
     elif person_name:
         person_id = get_person_id_by_person_name(person_name)
-        person = PersonInfo.get_or_none(PersonInfo.person_id == person_id)
-        return person.is_known if person else False
+        record = person_info_manager.get_person_record(person_id) if person_id else None
+        return bool(record["is_known"]) if record else False
     else:
         return False
 
@@ -155,6 +160,23 @@ def levenshtein_distance(s1: str, s2: str) -> int:
     return previous_row[-1]
 
 
+def _write_person_record(person_id: str, data: Dict[str, Any]):
+    """在写线程中写入一条用户信息，失败时让缓存失效，下次读取时以数据库为准"""
+    try:
+        updated = PersonInfo.update(**data).where(PersonInfo.person_id == person_id).execute()
+        if updated:
+            logger.debug(f"已同步用户 {person_id} 的信息到数据库")
+        else:
+            # 创建新记录
+            PersonInfo.create(**data)
+            logger.debug(f"已创建用户 {person_id} 的信息到数据库")
+        # 写入期间缓存可能被读取到的旧记录覆盖，写入后再更新一次
+        person_info_manager.update_person_record(person_id, data)
+    except Exception as e:
+        person_info_manager.invalidate_person_record(person_id)
+        logger.error(f"同步用户 {person_id} 信息到数据库时出错: {e}")
+
+
 class Person:
     @classmethod
     def register_person(cls, platform: str, user_id: str, nickname: str):
@@ -342,22 +364,22 @@ class Person:
     def load_from_database(self):
         """从数据库加载个人信息数据"""
         try:
-            # 查询数据库中的记录
-            record = PersonInfo.get_or_none(PersonInfo.person_id == self.person_id)
+            # 查询记录（优先命中身份缓存）
+            record = person_info_manager.get_person_record(self.person_id)
 
             if record:
-                self.user_id = record.user_id or ""
-                self.platform = record.platform or ""
-                self.is_known = record.is_known or False
-                self.nickname = record.nickname or ""
-                self.person_name = record.person_name or self.nickname
-                self.name_reason = record.name_reason or None
-                self.know_times = record.know_times or 0
+                self.user_id = record["user_id"] or ""
+                self.platform = record["platform"] or ""
+                self.is_known = record["is_known"] or False
+                self.nickname = record["nickname"] or ""
+                self.person_name = record["person_name"] or self.nickname
+                self.name_reason = record["name_reason"] or None
+                self.know_times = record["know_times"] or 0
 
                 # 处理points字段（JSON格式的列表）
-                if record.memory_points:
+                if record["memory_points"]:
                     try:
-                        loaded_points = json.loads(record.memory_points)
+                        loaded_points = json.loads(record["memory_points"])
                         # 过滤掉None值，确保数据质量
                         if isinstance(loaded_points, list):
                             self.memory_points = [point for point in loaded_points if point is not None]
@@ -379,7 +401,10 @@ class Person:
             # 出错时保持默认值
 
     def sync_to_database(self):
-        """将所有属性同步回数据库"""
+        """将所有属性同步回数据库
+
+        先更新身份缓存，之后的读取立即可见；数据库写入交给写线程，与其他写入串行执行
+        """
         if not self.is_known:
             return
         try:
@@ -402,20 +427,12 @@ class Person:
                 else json.dumps([], ensure_ascii=False),
             }
 
-            # 检查记录是否存在
-            record = PersonInfo.get_or_none(PersonInfo.person_id == self.person_id)
-
-            if record:
-                # 更新现有记录
-                for field, value in data.items():
-                    if hasattr(record, field):
-                        setattr(record, field, value)
-                record.save()
-                logger.debug(f"已同步用户 {self.person_id} 的信息到数据库")
-            else:
-                # 创建新记录
-                PersonInfo.create(**data)
-                logger.debug(f"已创建用户 {self.person_id} 的信息到数据库")
+            person_info_manager.update_person_record(self.person_id, data)
+            if db_executor.in_writer_thread():
+                _write_person_record(self.person_id, data)
+            elif db_executor.submit_write(_write_person_record, self.person_id, data) is None:
+                # 写线程已关闭，直接写入
+                _write_person_record(self.person_id, data)
 
         except Exception as e:
             logger.error(f"同步用户 {self.person_id} 信息到数据库时出错: {e}")
@@ -496,8 +513,21 @@ class Person:
 
 
 class PersonInfoManager:
+    # 身份缓存容量与过期时间（秒），过期后重新读取数据库，兜底其他途径对表的修改
+    PERSON_CACHE_MAX_SIZE = 10000
+    PERSON_CACHE_TTL = 600
+    # 可以直接作为缓存记录的字段集合（不含自增主键）
+    PERSON_RECORD_FIELDS = frozenset(name for name in PersonInfo._meta.fields if name != "id")
+
     def __init__(self):
         self.person_name_list = {}
+        # person_id -> (缓存时间, 记录字段字典)；记录为 None 表示数据库中不存在
+        self._person_cache: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._person_cache_lock = threading.Lock()
+        # 每次写入或失效时递增；读库前后代数不同说明期间有写入，读到的记录可能已过时，不放入缓存
+        self._person_cache_generation = 0
+        self.person_cache_hits = 0
+        self.person_cache_misses = 0
         self.qv_name_llm = LLMRequest(model_set=model_config.model_task_config.utils, request_type="relation.qv_name")
         try:
             db.connect(reuse_if_open=True)
@@ -522,6 +552,78 @@ class PersonInfoManager:
         except Exception as e:
             logger.error(f"从 Peewee 加载 person_name_list 失败: {e}")
 
+    def get_person_record(self, person_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取 PersonInfo 记录的字段字典，优先读取 LRU/TTL 身份缓存
+
+        Args:
+            person_id: 用户唯一id
+
+        Returns:
+            Optional[Dict[str, Any]]: 记录字段字典（副本），数据库中不存在时返回 None
+        """
+        now = time.time()
+        with self._person_cache_lock:
+            cached = self._person_cache.get(person_id)
+            if cached and now - cached[0] < self.PERSON_CACHE_TTL:
+                self._person_cache.move_to_end(person_id)
+                self.person_cache_hits += 1
+                return dict(cached[1]) if cached[1] is not None else None
+            self.person_cache_misses += 1
+            generation = self._person_cache_generation
+
+        record = PersonInfo.get_or_none(PersonInfo.person_id == person_id)
+        data = dict(record.__data__) if record else None
+        self._put_person_record(person_id, data, generation)
+        return dict(data) if data is not None else None
+
+    def update_person_record(self, person_id: str, data: Dict[str, Any]):
+        """写入数据库后更新缓存中的记录；缓存中没有该记录且 data 不完整时只让旧缓存失效"""
+        with self._person_cache_lock:
+            self._person_cache_generation += 1
+            cached = self._person_cache.get(person_id)
+            if cached and cached[1] is not None:
+                record = dict(cached[1])
+            elif self.PERSON_RECORD_FIELDS.issubset(data):
+                record = {}
+            else:
+                self._person_cache.pop(person_id, None)
+                return
+            record.update(data)
+            self._store_locked(person_id, record)
+
+    def invalidate_person_record(self, person_id: Optional[str] = None):
+        """使缓存失效，不传 person_id 时清空全部缓存"""
+        with self._person_cache_lock:
+            self._person_cache_generation += 1
+            if person_id is None:
+                self._person_cache.clear()
+            else:
+                self._person_cache.pop(person_id, None)
+
+    def get_person_cache_stats(self) -> Dict[str, Any]:
+        """获取身份缓存的命中统计"""
+        total = self.person_cache_hits + self.person_cache_misses
+        return {
+            "size": len(self._person_cache),
+            "hits": self.person_cache_hits,
+            "misses": self.person_cache_misses,
+            "hit_rate": self.person_cache_hits / total if total else 0.0,
+        }
+
+    def _put_person_record(self, person_id: str, data: Optional[Dict[str, Any]], generation: int):
+        """缓存从数据库读到的记录；读取期间发生过写入时放弃，避免用旧记录覆盖刚写入的数据"""
+        with self._person_cache_lock:
+            if generation != self._person_cache_generation:
+                return
+            self._store_locked(person_id, data)
+
+    def _store_locked(self, person_id: str, data: Optional[Dict[str, Any]]):
+        self._person_cache[person_id] = (time.time(), data)
+        self._person_cache.move_to_end(person_id)
+        while len(self._person_cache) > self.PERSON_CACHE_MAX_SIZE:
+            self._person_cache.popitem(last=False)
+
     @staticmethod
     def _extract_json_from_text(text: str) -> dict:
         """从文本中提取JSON数据的高容错方法"""
@@ -13,6 +13,7 @@ import json
 from typing import Dict, List, Any, Union, Type, Optional
 from src.common.logger import get_logger
 from peewee import Model, DoesNotExist
+from src.common.database.group_commit import group_commit_writer
 
 logger = get_logger("database_api")
 
@@ -94,6 +95,8 @@ async def db_query(
     try:
         if query_type not in ["get", "create", "update", "delete", "count"]:
             raise ValueError("query_type must be 'get' or 'create' or 'update' or 'delete' or 'count'")
+        # 先提交该表缓冲中的写入，保证能读到刚存储的数据
+        await group_commit_writer.aflush(model_class)
         # 构建基本查询
         if query_type in ["get", "update", "delete", "count"]:
             query = model_class.select()
@@ -201,6 +204,7 @@ async def db_save(
         )
     """
     try:
+        await group_commit_writer.aflush(model_class)
         # 如果提供了key_field和key_value，尝试更新现有记录
         if key_field and key_value is not None:
             if existing_records := list(
@@ -268,6 +272,7 @@ async def db_get(
         )
     """
     try:
+        await group_commit_writer.aflush(model_class)
         # 构建查询
         query = model_class.select()
 
@@ -324,7 +329,8 @@ async def store_action_info(
         action_name: 动作名称
 
     Returns:
-        Dict[str, Any]: 保存的记录数据
+        Dict[str, Any]: 保存后的记录数据（包含主键）；记录与同一批次的其他写入一起提交，
+            提交完成前等待期间不阻塞事件循环
         None: 如果保存失败
 
     示例:
@@ -371,17 +377,23 @@ async def store_action_info(
                 }
             )
 
-        # 使用已有的db_save函数保存记录
-        saved_record = await db_save(
-            ActionRecords, data=record_data, key_field="action_id", key_value=record_data["action_id"]
-        )
+        action_id = record_data["action_id"]
+        written: List[bool] = []
+
+        # 交给组提交写入器与其他写入合并提交，按 action_id 创建或更新；等待提交后读回带主键的记录
+        group_commit_writer.add(ActionRecords, record_data, key_field="action_id", on_written=written.append)
+        await group_commit_writer.aflush(ActionRecords, record_data["chat_id"])
 
+        if not all(written):
+            logger.error(f"[DatabaseAPI] 存储动作信息失败: {action_name}")
+            return None
+        saved_record = await db_get(ActionRecords, filters={"action_id": action_id}, single_result=True)
         if saved_record:
-            logger.debug(f"[DatabaseAPI] 成功存储动作信息: {action_name} (ID: {record_data['action_id']})")
+            logger.debug(f"[DatabaseAPI] 成功存储动作信息: {action_name} (ID: {action_id})")
         else:
             logger.error(f"[DatabaseAPI] 存储动作信息失败: {action_name}")
 
-        return saved_record
+        return saved_record  # type: ignore
 
     except Exception as e:
         logger.error(f"[DatabaseAPI] 存储动作信息时发生错误: {e}")
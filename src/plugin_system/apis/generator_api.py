@@ -13,6 +13,7 @@ from typing import Tuple, Any, Dict, List, Optional, TYPE_CHECKING
 from rich.traceback import install
 from src.common.logger import get_logger
 from src.common.data_models.message_data_model import ReplySetModel
+from src.config.config import global_config
 from src.chat.replyer.group_generator import DefaultReplyer
 from src.chat.replyer.private_generator import PrivateReplyer
 from src.chat.message_receive.chat_stream import ChatStream
@@ -23,7 +24,8 @@ from src.plugin_system.base.component_types import ActionInfo
 if TYPE_CHECKING:
     from src.common.data_models.info_data_model import ActionPlannerInfo
     from src.common.data_models.database_data_model import DatabaseMessages
-    from src.common.data_models.llm_data_model import LLMGenerationDataModel
+    from src.common.data_models.llm_data_model import LLMGenerationDataModel, ReplyStreamHandler
+    from src.chat.utils.cycle_context import CycleContext
 
 install(extra_lines=3)
 
@@ -90,6 +92,8 @@ async def generate_reply(
     enable_chinese_typo: bool = True,
     request_type: str = "generator_api",
     from_plugin: bool = True,
+    cycle_context: Optional["CycleContext"] = None,
+    reply_stream_handler: Optional["ReplyStreamHandler"] = None,
 ) -> Tuple[bool, Optional["LLMGenerationDataModel"]]:
     """生成回复
 
@@ -109,6 +113,9 @@ async def generate_reply(
         model_set_with_weight: 模型配置列表，每个元素为 (TaskConfig, weight) 元组
         request_type: 请求类型（可选，记录LLM使用）
         from_plugin: 是否来自插件
+        cycle_context: 思考循环的上下文快照，提供时复用其中已读取的聊天记录
+        reply_stream_handler: 流式发送回复的函数（可选），提供时回复边生成边处理成拟人化文本交给它，
+            实际是否流式见返回值的 streamed 字段（有会修改生成结果的插件时仍会等待完整回复）
     Returns:
         Tuple[bool, List[Tuple[str, Any]], Optional[str]]: (是否成功, 回复集合, 提示词)
     """
@@ -126,6 +133,13 @@ async def generate_reply(
         if not reply_reason and action_data:
             reply_reason = action_data.get("reason", "")
 
+        stream_handler: Optional["ReplyStreamHandler"] = None
+        streamed_reply_set = ReplySetModel()
+        if reply_stream_handler:
+            stream_handler = _build_stream_handler(
+                reply_stream_handler, streamed_reply_set, enable_splitter, enable_chinese_typo
+            )
+
         # 调用回复器生成回复
         success, llm_response = await replyer.generate_reply_with_context(
             extra_info=extra_info,
@@ -136,12 +150,16 @@ async def generate_reply(
             reply_reason=reply_reason,
             from_plugin=from_plugin,
             stream_id=chat_stream.stream_id if chat_stream else chat_id,
+            cycle_context=cycle_context,
+            reply_stream_handler=stream_handler,
         )
         if not success:
             logger.warning("[GeneratorAPI] 回复生成失败")
             return False, None
         reply_set: Optional[ReplySetModel] = None
-        if content := llm_response.content:
+        if llm_response.streamed:
+            reply_set = streamed_reply_set
+        elif content := llm_response.content:
             reply_set = process_human_text(content, enable_splitter, enable_chinese_typo)
         llm_response.reply_set = reply_set
         logger.debug(f"[GeneratorAPI] 回复生成成功，生成了 {len(reply_set) if reply_set else 0} 个回复项")
@@ -229,6 +247,39 @@ async def rewrite_reply(
         return False, None
 
 
+def _build_stream_handler(
+    reply_stream_handler: "ReplyStreamHandler",
+    reply_set: ReplySetModel,
+    enable_splitter: bool,
+    enable_chinese_typo: bool,
+) -> "ReplyStreamHandler":
+    """包装流式回复处理函数：逐段处理为拟人化文本后发送，发送成功的内容记录到 reply_set
+
+    整条回复无法在发送后撤回，因此超过长度或句数上限时截断后续内容并停止生成，
+    而不是像非流式那样替换为默认回复。
+    """
+    max_length = global_config.response_splitter.max_length * 2
+    max_sentence_num = global_config.response_splitter.max_sentence_num
+    sent_length = 0
+
+    async def handler(sentences: str, llm_response: "LLMGenerationDataModel") -> bool:
+        nonlocal sent_length
+        for text in process_llm_response(sentences, enable_splitter, enable_chinese_typo, is_stream_segment=True):
+            if not text.strip():
+                continue
+            if global_config.response_post_process.enable_response_post_process and (
+                len(reply_set.reply_data) >= max_sentence_num or sent_length + len(text) > max_length
+            ):
+                logger.warning(f"[GeneratorAPI] 流式回复超过长度或句数上限，截断后续内容并停止生成: {text}")
+                return False
+            await reply_stream_handler(text, llm_response)
+            sent_length += len(text)
+            reply_set.add_text_content(text)
+        return True
+
+    return handler
+
+
 def process_human_text(content: str, enable_splitter: bool, enable_chinese_typo: bool) -> Optional[ReplySetModel]:
     """将文本处理为更拟人化的文本
 
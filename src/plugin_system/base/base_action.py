@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from typing import Tuple, Optional, TYPE_CHECKING, Dict, List
 
 from src.common.logger import get_logger
+from src.common.database.db_executor import db_read
 from src.common.data_models.message_data_model import ReplyContentType, ReplyContent, ReplySetModel, ForwardNode
 from src.chat.message_receive.chat_stream import ChatStream
 from src.plugin_system.base.component_types import ActionActivationType, ActionInfo, ComponentType
@@ -475,8 +476,11 @@ class BaseAction(ABC):
 
                 # 检查新消息
                 current_time = time.time()
-                new_message_count = message_api.count_new_messages(
-                    chat_id=self.chat_id, start_time=loop_start_time, end_time=current_time
+                new_message_count = await db_read(
+                    message_api.count_new_messages,
+                    chat_id=self.chat_id,
+                    start_time=loop_start_time,
+                    end_time=current_time,
                 )
 
                 if new_message_count > 0:
@@ -28,6 +28,10 @@ class BaseTool(ABC):
     """
     available_for_llm: bool = False
     """是否可供LLM使用"""
+    result_cache_ttl: float = 0.0
+    """结果缓存时间(秒)，大于0时相同参数的调用结果在所有聊天间共享，只适用于结果与聊天无关的工具"""
+    call_timeout: Optional[float] = None
+    """单次调用的超时时间(秒)，超时只影响该工具，不影响同一轮的其他工具；None表示使用配置中的默认值(tool.call_timeout)，0表示不限制"""
 
     def __init__(self, plugin_config: Optional[dict] = None):
         self.plugin_config = plugin_config or {}  # 直接存储插件配置字典
@@ -55,6 +59,8 @@ class BaseTool(ABC):
             tool_description=cls.description,
             enabled=cls.available_for_llm,
             tool_parameters=cls.parameters,
+            result_cache_ttl=cls.result_cache_ttl,
+            call_timeout=cls.call_timeout,
             component_type=ComponentType.TOOL,
         )
 
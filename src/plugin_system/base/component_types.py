@@ -166,6 +166,8 @@ class ToolInfo(ComponentInfo):
         default_factory=list
     )  # 工具参数定义
     tool_description: str = ""  # 工具描述
+    result_cache_ttl: float = 0.0  # 相同参数的结果在所有聊天间共享缓存的秒数，0表示不缓存
+    call_timeout: Optional[float] = None  # 单次调用的超时时间（秒），None表示使用配置中的默认值，0表示不限制
 
     def __post_init__(self):
         super().__post_init__()
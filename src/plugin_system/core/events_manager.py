@@ -23,6 +23,10 @@ class EventsManager:
         self._handler_tasks: Dict[str, List[asyncio.Task]] = {}  # 事件处理器正在处理的任务
         self._events_result_history: Dict[EventType | str, List[CustomEventHandlerResult]] = {}  # 事件的结果历史记录
         self._history_enable_map: Dict[EventType | str, bool] = {}  # 是否启用历史记录的映射表，同时作为events注册表
+        # (事件类型, 聊天流ID) -> 该聊天流启用的处理器，订阅或禁用状态变化时整体失效
+        self._stream_handlers_cache: Dict[Tuple[EventType | str, Optional[str]], List[BaseEventHandler]] = {}
+        self._subscribers_version = 0
+        self._stream_handlers_version: Tuple[int, int] = (-1, -1)
 
         # 事件注册（同时作为注册样例）
         for event in EventType:
@@ -74,39 +78,28 @@ class EventsManager:
     ) -> Tuple[bool, Optional[MaiMessages]]:
         """
         处理所有事件，根据事件类型分发给订阅的处理器。
+
+        没有启用的处理器时直接返回，不构建也不复制消息。
         """
-        from src.plugin_system.core import component_registry
+        # 1. 获取该聊天流启用的处理器
+        if not self._events_subscribers.get(event_type):
+            return True, None
+        handlers = self._get_stream_handlers(event_type, self._resolve_stream_id(message, stream_id))
+        if not handlers:
+            return True, None
 
         continue_flag = True
 
-        # 1. 准备消息
+        # 2. 准备消息，所有处理器共享同一份副本，避免修改原消息
         transformed_message = self._prepare_message(
             event_type, message, llm_prompt, llm_response, stream_id, action_usage
         )
         if transformed_message:
             transformed_message = transformed_message.deepcopy()
 
-        # 2. 获取并遍历处理器
-        handlers = self._events_subscribers.get(event_type, [])
-        if not handlers:
-            return True, None
-
-        current_stream_id = transformed_message.stream_id if transformed_message else None
         modified_message: Optional[MaiMessages] = None
         for handler in handlers:
-            # 3. 前置检查和配置加载
-            if (
-                current_stream_id
-                and handler.handler_name
-                in global_announcement_manager.get_disabled_chat_event_handlers(current_stream_id)
-            ):
-                continue
-
-            # 统一加载插件配置
-            plugin_config = component_registry.get_plugin_config(handler.plugin_name) or {}
-            handler.set_plugin_config(plugin_config)
-
-            # 4. 根据类型分发任务
+            # 3. 根据类型分发任务
             if (
                 handler.intercept_message or event_type == EventType.ON_STOP
             ):  # 让ON_STOP的所有事件处理器都发挥作用，防止还没执行即被取消
@@ -121,6 +114,56 @@ class EventsManager:
 
         return continue_flag, modified_message
 
+    def has_intercepting_handlers(self, event_type: EventType | str, stream_id: Optional[str] = None) -> bool:
+        """聊天流中是否有启用的、会阻塞并可能修改事件内容的处理器"""
+        if not self._events_subscribers.get(event_type):
+            return False
+        return any(handler.intercept_message for handler in self._get_stream_handlers(event_type, stream_id))
+
+    def _get_stream_handlers(self, event_type: EventType | str, stream_id: Optional[str]) -> List[BaseEventHandler]:
+        """获取聊天流中启用的处理器（按权重排序，已加载插件配置）
+
+        结果按 (事件类型, 聊天流ID) 缓存，处理器注册/注销或聊天流的禁用列表变化时失效。
+        """
+        from src.plugin_system.core import component_registry
+
+        version = (self._subscribers_version, global_announcement_manager.event_handler_version)
+        if version != self._stream_handlers_version:
+            self._stream_handlers_cache.clear()
+            self._stream_handlers_version = version
+
+        cache_key = (event_type, stream_id)
+        if (cached := self._stream_handlers_cache.get(cache_key)) is not None:
+            return cached
+
+        disabled_handlers = (
+            set(global_announcement_manager.get_disabled_chat_event_handlers(stream_id)) if stream_id else set()
+        )
+        handlers: List[BaseEventHandler] = []
+        cacheable = True
+        for handler in self._events_subscribers.get(event_type, []):
+            if handler.handler_name in disabled_handlers:
+                continue
+            # 统一加载插件配置
+            plugin_config = component_registry.get_plugin_config(handler.plugin_name)
+            if plugin_config is None:
+                # 插件实例还未加载完成，暂不缓存，下次分发时重新获取配置
+                cacheable = False
+            handler.set_plugin_config(plugin_config or {})
+            handlers.append(handler)
+
+        if cacheable:
+            self._stream_handlers_cache[cache_key] = handlers
+        return handlers
+
+    @staticmethod
+    def _resolve_stream_id(message: Optional[MessageRecv | MessageSending], stream_id: Optional[str]) -> Optional[str]:
+        """在不构建事件消息的情况下得到事件所属的聊天流ID"""
+        if message:
+            chat_stream = getattr(message, "chat_stream", None)
+            return chat_stream.stream_id if chat_stream else None
+        return stream_id
+
     async def cancel_handler_tasks(self, handler_name: str) -> None:
         tasks_to_be_cancelled = self._handler_tasks.get(handler_name, [])
         if remaining_tasks := [task for task in tasks_to_be_cancelled if not task.done()]:
@@ -184,6 +227,7 @@ class EventsManager:
         handler_instance.set_plugin_name(handler_info.plugin_name or "unknown")
         self._events_subscribers[handler_class.event_type].append(handler_instance)
         self._events_subscribers[handler_class.event_type].sort(key=lambda x: x.weight, reverse=True)
+        self._subscribers_version += 1
 
         return True
 
@@ -198,6 +242,7 @@ class EventsManager:
         for i, handler in enumerate(handlers):
             if isinstance(handler, handler_class):
                 del handlers[i]
+                self._subscribers_version += 1
                 logger.debug(f"事件处理器 {display_handler_name} 已移除")
                 return True
 
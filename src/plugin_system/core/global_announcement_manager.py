@@ -15,6 +15,8 @@ class GlobalAnnouncementManager:
         self._user_disabled_event_handlers: Dict[str, List[str]] = {}
         # 用户禁用的工具，chat_id -> [tool_name]
         self._user_disabled_tools: Dict[str, List[str]] = {}
+        # 事件处理器禁用状态的版本号，每次变更加一，供事件管理器判断缓存是否失效
+        self.event_handler_version = 0
 
     def disable_specific_chat_action(self, chat_id: str, action_name: str) -> bool:
         """禁用特定聊天的某个动作"""
@@ -66,6 +68,7 @@ class GlobalAnnouncementManager:
             logger.warning(f"事件处理器 {handler_name} 已经被禁用")
             return False
         self._user_disabled_event_handlers[chat_id].append(handler_name)
+        self.event_handler_version += 1
         return True
 
     def enable_specific_chat_event_handler(self, chat_id: str, handler_name: str) -> bool:
@@ -73,6 +76,7 @@ class GlobalAnnouncementManager:
         if chat_id in self._user_disabled_event_handlers:
             try:
                 self._user_disabled_event_handlers[chat_id].remove(handler_name)
+                self.event_handler_version += 1
                 return True
             except ValueError:
                 logger.warning(f"事件处理器 {handler_name} 不在禁用列表中")
@@ -1,7 +1,11 @@
+import asyncio
+import json
 import time
-from typing import List, Dict, Tuple, Optional, Any
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from src.plugin_system.apis.tool_api import get_llm_available_tool_definitions, get_tool_instance
 from src.plugin_system.base.base_tool import BaseTool
+from src.plugin_system.base.component_types import ComponentType
 from src.plugin_system.core.global_announcement_manager import global_announcement_manager
 from src.llm_models.utils_model import LLMRequest
 from src.llm_models.payload_content import ToolCall
@@ -12,6 +16,84 @@ from src.common.logger import get_logger
 
 logger = get_logger("tool_use")
 
+# 跨聊天共享的工具结果缓存最多保存的条目数
+TOOL_RESULT_CACHE_SIZE = 256
+
+ToolCacheKey = Tuple[str, str]
+
+
+class ToolResultCache:
+    """
+    跨聊天共享的工具结果缓存
+
+    按工具名与规范化后的参数缓存结果，过期时间按真实时间计算；
+    相同参数的调用正在执行时，后来的调用直接等待同一个结果，不会重复执行。
+    只有在组件信息中声明了 result_cache_ttl 的工具才会使用。
+    """
+
+    def __init__(self, max_size: int = TOOL_RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._results: "OrderedDict[ToolCacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[ToolCacheKey, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tool_name: str, function_args: Dict[str, Any]) -> ToolCacheKey:
+        """规范化参数：忽略调用来源标记，字符串去掉首尾空白，键排序后序列化"""
+        normalized = {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in function_args.items()
+            if key != "llm_called"
+        }
+        return tool_name, json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+    async def get_or_execute(
+        self, key: ToolCacheKey, ttl: float, execute: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.hits += 1
+                self._results.move_to_end(key)
+                return cached[1]
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(execute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, ttl, t))
+        else:
+            self.hits += 1
+
+        # 某个调用方超时或被取消时，不影响等待同一结果的其他调用方
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: ToolCacheKey, ttl: float, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        self._results[key] = (time.monotonic() + ttl, task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "cache_count": len(self._results),
+            "inflight": len(self._inflight),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+tool_result_cache = ToolResultCache()
+
 
 def init_tool_executor_prompt():
     """初始化工具执行器的提示词"""
@@ -157,46 +239,64 @@ class ToolExecutor:
 
         logger.info(f"{self.log_prefix}开始执行工具调用: {func_names}")
 
-        # 执行每个工具调用
-        for tool_call in tool_calls:
-            try:
-                tool_name = tool_call.func_name
-                logger.debug(f"{self.log_prefix}执行工具: {tool_name}")
-
-                # 执行工具
-                result = await self.execute_tool_call(tool_call)
-
-                if result:
-                    tool_info = {
-                        "type": result.get("type", "unknown_type"),
-                        "id": result.get("id", f"tool_exec_{time.time()}"),
-                        "content": result.get("content", ""),
-                        "tool_name": tool_name,
-                        "timestamp": time.time(),
-                    }
-                    content = tool_info["content"]
-                    if not isinstance(content, (str, list, tuple)):
-                        tool_info["content"] = str(content)
-
-                    tool_results.append(tool_info)
-                    used_tools.append(tool_name)
-                    logger.info(f"{self.log_prefix}工具{tool_name}执行成功，类型: {tool_info['type']}")
-                    preview = content[:200]
-                    logger.debug(f"{self.log_prefix}工具{tool_name}结果内容: {preview}...")
-            except Exception as e:
-                logger.error(f"{self.log_prefix}工具{tool_name}执行失败: {e}")
-                # 添加错误信息到结果中
-                error_info = {
-                    "type": "tool_error",
-                    "id": f"tool_error_{time.time()}",
-                    "content": f"工具{tool_name}执行失败: {str(e)}",
-                    "tool_name": tool_name,
-                    "timestamp": time.time(),
-                }
-                tool_results.append(error_info)
+        # 各工具调用相互独立，并发执行，结果按调用顺序返回
+        outcomes = await asyncio.gather(*(self._execute_tool_call_isolated(tool_call) for tool_call in tool_calls))
+        for tool_call, tool_info in zip(tool_calls, outcomes, strict=True):
+            if tool_info is None:
+                continue
+            tool_results.append(tool_info)
+            if tool_info["type"] != "tool_error":
+                used_tools.append(tool_call.func_name)
 
         return tool_results, used_tools
 
+    async def _execute_tool_call_isolated(self, tool_call: ToolCall) -> Optional[Dict[str, Any]]:
+        """执行一个工具调用，超时和异常都转换为错误结果，不影响其他工具
+
+        Returns:
+            Optional[Dict]: 工具结果信息，工具没有返回结果时为None
+        """
+        tool_name = tool_call.func_name
+        # 超时只影响该工具，不影响同一轮的其他工具
+        call_timeout = self._get_call_timeout(tool_name)
+        try:
+            logger.debug(f"{self.log_prefix}执行工具: {tool_name}")
+
+            # 执行工具
+            result = await asyncio.wait_for(self.execute_tool_call(tool_call), call_timeout)
+            if not result:
+                return None
+
+            tool_info = {
+                "type": result.get("type", "unknown_type"),
+                "id": result.get("id", f"tool_exec_{time.time()}"),
+                "content": result.get("content", ""),
+                "tool_name": tool_name,
+                "timestamp": time.time(),
+            }
+            content = tool_info["content"]
+            if not isinstance(content, (str, list, tuple)):
+                tool_info["content"] = str(content)
+
+            logger.info(f"{self.log_prefix}工具{tool_name}执行成功，类型: {tool_info['type']}")
+            preview = content[:200]
+            logger.debug(f"{self.log_prefix}工具{tool_name}结果内容: {preview}...")
+            return tool_info
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and call_timeout is not None:
+                error = f"执行超时（{call_timeout:g}秒）"
+            else:
+                error = f"执行失败: {str(e)}"
+            logger.error(f"{self.log_prefix}工具{tool_name}{error}")
+            # 添加错误信息到结果中
+            return {
+                "type": "tool_error",
+                "id": f"tool_error_{time.time()}",
+                "content": f"工具{tool_name}{error}",
+                "tool_name": tool_name,
+                "timestamp": time.time(),
+            }
+
     async def execute_tool_call(
         self, tool_call: ToolCall, tool_instance: Optional[BaseTool] = None
     ) -> Optional[Dict[str, Any]]:
@@ -220,8 +320,15 @@ class ToolExecutor:
                 logger.warning(f"未知工具名称: {function_name}")
                 return None
 
-            # 执行工具
-            result = await tool_instance.execute(function_args)
+            # 执行工具，声明了结果缓存的工具在所有聊天间共享相同参数的结果
+            cache_ttl = self._get_result_cache_ttl(function_name, tool_instance)
+            if cache_ttl > 0:
+                cache_key = tool_result_cache.make_key(function_name, function_args)
+                result = await tool_result_cache.get_or_execute(
+                    cache_key, cache_ttl, lambda: tool_instance.execute(function_args)
+                )
+            else:
+                result = await tool_instance.execute(function_args)
             if result:
                 return {
                     "tool_call_id": tool_call.call_id,
@@ -235,6 +342,25 @@ class ToolExecutor:
             logger.error(f"执行工具调用时发生错误: {str(e)}")
             raise e
 
+    def _get_result_cache_ttl(self, tool_name: str, tool_instance: BaseTool) -> float:
+        """工具声明的跨聊天结果缓存时间，未注册的工具实例使用类属性"""
+        from src.plugin_system.core import component_registry
+
+        tool_info = component_registry.get_component_info(tool_name, ComponentType.TOOL)
+        if tool_info is not None:
+            return getattr(tool_info, "result_cache_ttl", 0.0)
+        return tool_instance.result_cache_ttl
+
+    def _get_call_timeout(self, tool_name: str) -> Optional[float]:
+        """工具单次调用的超时时间，工具未声明时使用配置中的默认值；返回None表示不限制"""
+        from src.plugin_system.core import component_registry
+
+        tool_info = component_registry.get_component_info(tool_name, ComponentType.TOOL)
+        call_timeout = getattr(tool_info, "call_timeout", None)
+        if call_timeout is None:
+            call_timeout = global_config.tool.call_timeout
+        return call_timeout if call_timeout > 0 else None
+
     def _generate_cache_key(self, target_message: str, chat_history: str, sender: str) -> str:
         """生成缓存键
 
@@ -371,6 +497,7 @@ class ToolExecutor:
             "cache_count": total_count,
             "cache_ttl": self.cache_ttl,
             "ttl_distribution": ttl_distribution,
+            "shared_result_cache": tool_result_cache.get_stats(),
         }
 
     def set_cache_config(self, enable_cache: Optional[bool] = None, cache_ttl: int = -1):
@@ -17,6 +17,9 @@ class SearchKnowledgeFromLPMMTool(BaseTool):
         ("query", ToolParamType.STRING, "搜索查询关键词", True, None),
     ]
     available_for_llm = global_config.lpmm_knowledge.enable
+    result_cache_ttl = 300.0
+    # 需要请求嵌入模型并检索知识图谱
+    call_timeout = 20.0
 
     async def execute(self, function_args: Dict[str, Any]) -> Dict[str, Any]:
         """执行知识库搜索
@@ -26,6 +26,8 @@ class GetPersonInfoTool(BaseTool):
     ]
     
     available_for_llm = True
+    # 构建关系描述需要请求 LLM
+    call_timeout = 60.0
 
     async def execute(self, function_args: dict[str, Any]) -> dict[str, Any]:
         """执行比较两个数的大小
@@ -0,0 +1,142 @@
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, List
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# MAIBOT_BENCH=full 时基准测试使用需求中的完整数据规模，默认使用能在几秒内跑完的规模
+BENCH_FULL = os.getenv("MAIBOT_BENCH", "").lower() == "full"
+
+_test_root = None
+_old_cwd = None
+_bench_results: List[str] = []
+
+
+def pytest_configure(config):
+    """
+    在临时目录中搭建一个项目根目录，测试期间产生的配置、数据库、日志等文件都写在这里
+
+    配置、数据库与嵌入库目录按 src 所在目录计算，日志与 depends-data 按工作目录计算：
+    临时根目录下按仓库 src 的目录结构新建目录、其中的文件链接到仓库（模块按自身目录生成的配置，
+    如 S4U 配置，也会写在临时目录中），并把该目录放在 sys.path 最前面、作为工作目录；
+    模板与 depends-data 复制一份，首次运行时需要的配置文件从模板生成（否则配置加载会直接退出）
+    """
+    global _test_root, _old_cwd
+    _test_root = tempfile.mkdtemp(prefix="maibot-test-")
+    shutil.copytree(
+        os.path.join(PROJECT_ROOT, "src"),
+        os.path.join(_test_root, "src"),
+        copy_function=os.symlink,
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    for directory in ("template", "depends-data"):
+        shutil.copytree(os.path.join(PROJECT_ROOT, directory), os.path.join(_test_root, directory))
+
+    config_dir = os.path.join(_test_root, "config")
+    os.makedirs(config_dir)
+    for config_name in ("bot_config", "model_config"):
+        shutil.copy2(
+            os.path.join(_test_root, "template", f"{config_name}_template.toml"),
+            os.path.join(config_dir, f"{config_name}.toml"),
+        )
+
+    sys.path.insert(0, _test_root)
+    _old_cwd = os.getcwd()
+    os.chdir(_test_root)
+
+
+def pytest_unconfigure(config):
+    if _test_root is None:
+        return
+    os.chdir(_old_cwd)
+    shutil.rmtree(_test_root, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """在临时项目根目录下创建数据库表，返回数据库实例"""
+    from src.common.database.database import db
+    from src.common.database.database_model import initialize_database
+
+    initialize_database()
+    return db
+
+
+@pytest.fixture
+def insert_messages(database) -> Callable[..., None]:
+    """
+    向消息表批量写入测试消息：insert_messages(chat_id, count, start_time=0.0, interval=1.0, user_count=10, first=0)
+
+    第 i 条消息（i 从 first 开始编号）的时间为 start_time + (i - first) * interval，发送者在 user_count 个用户中轮换
+    """
+    from peewee import chunked
+
+    from src.common.database.database_model import Messages
+
+    def insert(
+        chat_id: str,
+        count: int,
+        start_time: float = 0.0,
+        interval: float = 1.0,
+        user_count: int = 10,
+        first: int = 0,
+    ):
+        rows = (
+            {
+                "message_id": f"{chat_id}-{i}",
+                "time": start_time + (i - first) * interval,
+                "chat_id": chat_id,
+                "chat_info_stream_id": chat_id,
+                "chat_info_platform": "test",
+                "chat_info_user_platform": "test",
+                "chat_info_user_id": "0",
+                "chat_info_user_nickname": "用户0",
+                "chat_info_group_platform": "test",
+                "chat_info_group_id": chat_id,
+                "chat_info_group_name": "测试群",
+                "chat_info_create_time": start_time,
+                "chat_info_last_active_time": start_time,
+                "user_platform": "test",
+                "user_id": str(i % user_count),
+                "user_nickname": f"用户{i % user_count}",
+                "processed_plain_text": f"第{i}条消息，今天天气不错",
+                "display_message": "",
+            }
+            for i in range(first, first + count)
+        )
+        with database.atomic():
+            for batch in chunked(rows, 1000):
+                Messages.insert_many(batch).execute()
+
+    return insert
+
+
+@pytest.fixture
+def bench_size() -> Callable[[int, int], int]:
+    """基准测试的数据规模：bench_size(默认规模, 完整规模)"""
+
+    def size(default: int, full: int) -> int:
+        return full if BENCH_FULL else default
+
+    return size
+
+
+@pytest.fixture
+def bench_report(request) -> Callable[[str], None]:
+    """记录一行基准测试结果，测试结束后统一输出"""
+
+    def report(line: str):
+        _bench_results.append(f"{request.node.name}: {line}")
+
+    return report
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _bench_results:
+        return
+    terminalreporter.section("benchmark")
+    for line in _bench_results:
+        terminalreporter.write_line(line)
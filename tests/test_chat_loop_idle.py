@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+import pytest
+
+from src.chat.heart_flow.heartFC_chat import HeartFChatting
+from src.chat.heart_flow.hfc_utils import NEW_MESSAGE_FALLBACK_INTERVAL
+from src.common.database.db_executor import db_read
+from src.plugin_system.apis import message_api
+
+# 旧实现在没有新消息时每隔多久查询一次数据库（秒）
+LEGACY_POLL_INTERVAL = 0.2
+
+
+def _idle_chat(chat_id: str) -> HeartFChatting:
+    """只带有空闲循环所需属性的 HeartFChatting，不加载规划器等组件"""
+    chat = object.__new__(HeartFChatting)
+    chat.stream_id = chat_id
+    chat.last_read_time = time.time()
+    chat.new_message_event = asyncio.Event()
+    chat.no_reply_until_call = False
+    return chat
+
+
+@pytest.fixture
+def query_counter(monkeypatch: pytest.MonkeyPatch) -> Dict[str, int]:
+    """统计每个聊天流查询新消息的次数"""
+    counts: Dict[str, int] = {}
+    original = message_api.get_messages_by_time_in_chat
+
+    def counted(chat_id: str, *args, **kwargs):
+        counts[chat_id] = counts.get(chat_id, 0) + 1
+        return original(chat_id, *args, **kwargs)
+
+    monkeypatch.setattr(message_api, "get_messages_by_time_in_chat", counted)
+    return counts
+
+
+async def _legacy_loopbody(chat: HeartFChatting):
+    """旧实现的空闲循环：查询一次，没有消息就休眠后再查"""
+    await db_read(
+        message_api.get_messages_by_time_in_chat,
+        chat_id=chat.stream_id,
+        start_time=chat.last_read_time,
+        end_time=time.time(),
+        limit=20,
+        limit_mode="latest",
+        filter_mai=True,
+        filter_command=True,
+    )
+    await asyncio.sleep(LEGACY_POLL_INTERVAL)
+
+
+def _run_idle(stream_count: int, duration: float, legacy: bool, counts: Dict[str, int]) -> Tuple[float, float]:
+    """让 stream_count 个聊天循环空转 duration 秒（不计启动时的首次查询），返回 (每秒查询数, CPU占用率)"""
+
+    async def scenario() -> float:
+        chats = [_idle_chat(f"idle-{legacy}-{stream_count}-{i}") for i in range(stream_count)]
+
+        async def loop(chat: HeartFChatting):
+            while True:
+                if legacy:
+                    await _legacy_loopbody(chat)
+                else:
+                    await chat._loopbody()
+
+        tasks = [asyncio.create_task(loop(chat)) for chat in chats]
+        # 等所有循环完成启动时的首次查询后再开始统计
+        while len(counts) < stream_count:
+            await asyncio.sleep(0.05)
+        counts.clear()
+        cpu_start = time.process_time()
+        await asyncio.sleep(duration)
+        cpu = time.process_time() - cpu_start
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return cpu
+
+    counts.clear()
+    cpu = asyncio.run(scenario())
+    return sum(counts.values()) / duration, cpu / duration
+
+
+@pytest.mark.benchmark
+def test_idle_streams_do_not_poll_database(database, query_counter, bench_size, bench_report):
+    duration = bench_size(1, 10)
+    results: List[str] = []
+    max_streams = bench_size(300, 3000)
+    for stream_count in (max_streams // 30, max_streams // 3, max_streams):
+        legacy_qps, legacy_cpu = _run_idle(stream_count, duration, legacy=True, counts=query_counter)
+        event_qps, event_cpu = _run_idle(stream_count, duration, legacy=False, counts=query_counter)
+        results.append(
+            f"{stream_count} 流：轮询 {legacy_qps:.0f} 次/秒、CPU {legacy_cpu:.0%}；"
+            f"事件唤醒 {event_qps:.0f} 次/秒、CPU {event_cpu:.0%}"
+        )
+        # 空闲时每个流只在每个兜底间隔查询一次
+        assert event_qps <= stream_count / NEW_MESSAGE_FALLBACK_INTERVAL
+        assert event_qps < legacy_qps / 3
+    bench_report("；".join(results))
+
+
+def test_new_message_event_wakes_idle_loop(database, query_counter):
+    async def scenario():
+        chat = _idle_chat("idle-wake")
+        task = asyncio.create_task(chat._loopbody())
+        await asyncio.sleep(0.05)
+        # 查询一次后在事件上等待，不再轮询数据库
+        assert query_counter["idle-wake"] == 1
+        assert not task.done()
+
+        chat.new_message_event.set()
+        return await asyncio.wait_for(task, timeout=0.5)
+
+    assert asyncio.run(scenario()) is True
@@ -0,0 +1,27 @@
+import time
+
+from src.chat.utils.cycle_context import CycleContext
+
+
+def test_refreshed_returns_new_snapshot(insert_messages):
+    chat_id = "cycle-context-chat"
+    now = time.time()
+    insert_messages(chat_id, 5, start_time=now - 10)
+
+    context = CycleContext(chat_id, timestamp=now, limit=20)
+    rendered = context.build_readable(timestamp_mode="normal_no_YMD")
+
+    # 没有新消息时直接复用当前快照
+    assert context.refreshed() is context
+
+    # 快照之后到达的消息只出现在新快照中，旧快照保持不变
+    insert_messages(chat_id, 2, start_time=context.timestamp + 0.001, interval=0.001, first=5)
+    time.sleep(0.01)
+    refreshed = context.refreshed()
+
+    assert refreshed is not context
+    assert [msg.message_id for msg in context.messages] == [f"{chat_id}-{i}" for i in range(5)]
+    assert context.build_readable(timestamp_mode="normal_no_YMD") == rendered
+    assert [msg.message_id for msg in refreshed.messages] == [f"{chat_id}-{i}" for i in range(7)]
+    assert refreshed.timestamp > context.timestamp
+    assert refreshed.db_queries == context.db_queries + 1
@@ -0,0 +1,106 @@
+import asyncio
+import gc
+import time
+from typing import List
+
+import pytest
+
+from src.chat.message_receive.chat_stream import ChatStream
+from src.chat.message_receive.message import MessageRecv
+from src.chat.message_receive.storage import MessageStorage
+from src.common.database.database_model import Messages
+from src.common.database.db_executor import db_executor, db_read
+from src.common.database.group_commit import group_commit_writer
+from src.common.message_repository import find_messages
+from maim_message import GroupInfo, UserInfo
+
+# 事件循环卡顿的检测间隔（秒）
+LAG_PROBE_INTERVAL = 0.002
+# 事件循环延迟的上限（秒）：写线程和读线程持有 GIL 时，事件循环每次要等一个线程切换间隔（默认 5ms）
+MAX_LOOP_LAG_P99 = 0.01
+MAX_LOOP_LAG = 0.05
+
+
+def _make_message(chat_id: str, i: int) -> MessageRecv:
+    message = MessageRecv(
+        {
+            "message_info": {
+                "platform": "test",
+                "message_id": f"{chat_id}-{i}",
+                "time": time.time(),
+                "user_info": {"platform": "test", "user_id": str(i % 50), "user_nickname": f"用户{i % 50}"},
+                "group_info": {"platform": "test", "group_id": chat_id, "group_name": "压测群"},
+            },
+            "message_segment": {"type": "text", "data": f"第{i}条消息"},
+        }
+    )
+    message.processed_plain_text = f"第{i}条消息，随便聊聊今天的天气"
+    message.interest_value = 0.5
+    return message
+
+
+@pytest.mark.benchmark
+def test_event_loop_lag_while_storing_messages(database, bench_size, bench_report):
+    rate = 1000
+    duration = bench_size(2, 30)
+    chat_id = "stress-chat"
+    chat_stream = ChatStream(
+        stream_id=chat_id,
+        platform="test",
+        user_info=UserInfo(platform="test", user_id="0", user_nickname="用户0"),
+        group_info=GroupInfo(platform="test", group_id=chat_id, group_name="压测群"),
+    )
+    total = rate * duration
+
+    async def scenario():
+        lags: List[float] = []
+        stop = asyncio.Event()
+
+        async def probe():
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(LAG_PROBE_INTERVAL)
+                lags.append(time.perf_counter() - start - LAG_PROBE_INTERVAL)
+
+        async def ingest():
+            # 每毫秒到达一条消息；同时像聊天循环一样不时读取最近的消息
+            start = time.perf_counter()
+            tasks = []
+            for i in range(total):
+                delay = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(MessageStorage.store_message(_make_message(chat_id, i), chat_stream)))
+                if i % 50 == 0:
+                    tasks.append(
+                        asyncio.create_task(db_read(find_messages, {"chat_id": chat_id}, sort=[("time", -1)], limit=30))
+                    )
+            await asyncio.gather(*tasks)
+            await group_commit_writer.aflush(Messages, chat_id)
+            return time.perf_counter() - start
+
+        probe_task = asyncio.create_task(probe())
+        elapsed = await ingest()
+        stop.set()
+        await probe_task
+        return elapsed, lags
+
+    # 与 MainSystem 初始化完成后一样冻结已加载的对象，否则一次完整垃圾回收就会卡住事件循环上百毫秒
+    gc.collect()
+    gc.freeze()
+    try:
+        elapsed, lags = asyncio.run(scenario())
+    finally:
+        gc.unfreeze()
+
+    assert Messages.select().where(Messages.chat_id == chat_id).count() == total
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)]
+    max_lag = lags[-1]
+    write_stats = db_executor.get_stats()["write"]
+    bench_report(
+        f"{total} 条消息 / {elapsed:.2f}s（{total / elapsed:.0f} 条/秒）：事件循环延迟 "
+        f"p99 {p99 * 1000:.2f}ms，最大 {max_lag * 1000:.2f}ms；写线程平均 {write_stats['avg_ms']:.2f}ms"
+    )
+    assert p99 < MAX_LOOP_LAG_P99
+    assert max_lag < MAX_LOOP_LAG
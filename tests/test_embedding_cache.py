@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.chat.utils.embedding_service import EmbeddingService
+from src.common.database.database_model import EmbeddingCache
+
+
+def test_prune_disk_cache_keeps_newest_rows(database):
+    EmbeddingCache.delete().execute()
+    vector = np.zeros(4, dtype=np.float32).tobytes()
+    EmbeddingCache.insert_many(
+        [
+            {"cache_key": f"model:{i}", "model_name": "model", "embedding": vector, "timestamp": float(i)}
+            for i in range(30)
+        ]
+    ).execute()
+
+    assert EmbeddingService._prune_disk_cache(max_rows=10) == 20
+    assert EmbeddingService._prune_disk_cache(max_rows=10) == 0
+
+    remaining = [row.cache_key for row in EmbeddingCache.select().order_by(EmbeddingCache.timestamp)]
+    assert remaining == [f"model:{i}" for i in range(20, 30)]
@@ -0,0 +1,86 @@
+import time
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from src.chat.knowledge.embedding_store import (
+    INDEX_TYPE_FLAT,
+    INDEX_TYPE_HNSW,
+    INDEX_TYPE_IVF,
+    EmbeddingStore,
+    EmbeddingTable,
+)
+from src.config.config import global_config
+
+DIMENSION = 64
+TOP_K = 10
+# 近似索引相对精确检索的最低召回率
+MIN_RECALL = 0.9
+
+
+def _synthetic_matrix(size: int, seed: int) -> np.ndarray:
+    """围绕若干聚类中心生成向量，比均匀随机向量更接近真实嵌入的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, size // 100), DIMENSION), dtype=np.float32)
+    matrix = centers[rng.integers(len(centers), size=size)]
+    matrix += 0.3 * rng.standard_normal((size, DIMENSION), dtype=np.float32)
+    return matrix
+
+
+def _build_store(tmp_path, matrix: np.ndarray, index_type: str, monkeypatch: pytest.MonkeyPatch) -> EmbeddingStore:
+    monkeypatch.setattr(global_config.lpmm_knowledge, "embedding_index_type", index_type)
+    store = EmbeddingStore(f"bench-{index_type}", str(tmp_path))
+    hashes = [f"hash-{i}" for i in range(len(matrix))]
+    store.store = EmbeddingTable(hashes, hashes, matrix)
+    store.build_faiss_index()
+    return store
+
+
+def _recall(results: List[List[Tuple[str, float]]], expected: List[List[Tuple[str, float]]]) -> float:
+    hits = sum(len({h for h, _ in row} & {h for h, _ in truth}) for row, truth in zip(results, expected, strict=True))
+    return hits / sum(len(truth) for truth in expected)
+
+
+@pytest.mark.benchmark
+def test_search_recall_and_latency(tmp_path, monkeypatch: pytest.MonkeyPatch, bench_size, bench_report):
+    monkeypatch.setattr(global_config.lpmm_knowledge, "embedding_dimension", DIMENSION)
+    size = bench_size(20000, 1000000)
+    query_count = bench_size(200, 1000)
+    matrix = _synthetic_matrix(size, seed=0)
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.integers(size, size=query_count)] + 0.1 * rng.standard_normal(
+        (query_count, DIMENSION), dtype=np.float32
+    )
+    query_list = queries.tolist()
+
+    flat = _build_store(tmp_path, matrix, INDEX_TYPE_FLAT, monkeypatch)
+    start = time.perf_counter()
+    expected = [flat.search_top_k(query, TOP_K) for query in query_list]
+    single_latency = (time.perf_counter() - start) / query_count
+    start = time.perf_counter()
+    batched = flat.search_top_k_many(query_list, TOP_K)
+    batched_latency = (time.perf_counter() - start) / query_count
+    assert _recall(batched, expected) == 1.0
+    report = [
+        f"{size} 条 × {DIMENSION} 维，flat：逐条 {single_latency * 1000:.2f}ms/条，批量 {batched_latency * 1000:.2f}ms/条"
+    ]
+
+    for index_type in (INDEX_TYPE_IVF, INDEX_TYPE_HNSW):
+        start = time.perf_counter()
+        store = _build_store(tmp_path, matrix, index_type, monkeypatch)
+        build_time = time.perf_counter() - start
+        assert store._get_index_type(store.faiss_index) == index_type
+
+        start = time.perf_counter()
+        results = store.search_top_k_many(query_list, TOP_K)
+        latency = (time.perf_counter() - start) / query_count
+        recall = _recall(results, expected)
+        report.append(
+            f"{index_type}：构建 {build_time:.2f}s，批量 {latency * 1000:.2f}ms/条，recall@{TOP_K} {recall:.3f}"
+        )
+        assert recall >= MIN_RECALL
+
+    bench_report("；".join(report))
+    # 批量检索一次提交全部查询，不应比逐条检索慢
+    assert batched_latency <= single_latency * 1.5
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+from src.chat.message_receive.message import MessageRecv
+from src.plugin_system.base.base_events_handler import BaseEventHandler
+from src.plugin_system.base.component_types import EventType, MaiMessages
+from src.plugin_system.core import component_registry
+from src.plugin_system.core.events_manager import EventsManager
+from src.plugin_system.core.global_announcement_manager import global_announcement_manager
+
+STREAM_ID = "bench-events-stream"
+HANDLER_COUNTS = (0, 1, 4, 16)
+
+
+def _message(segment_count: int) -> MessageRecv:
+    """构造一条含多个消息段的群消息，聊天流只需提供 stream_id"""
+    message = MessageRecv(
+        {
+            "message_info": {
+                "platform": "bench",
+                "message_id": "1",
+                "time": time.time(),
+                "group_info": {"platform": "bench", "group_id": "10001", "group_name": "测试群"},
+                "user_info": {"platform": "bench", "user_id": "20001", "user_nickname": "测试用户"},
+                "additional_config": {},
+            },
+            "message_segment": {
+                "type": "seglist",
+                "data": [{"type": "text", "data": f"第 {i} 段消息内容" * 5} for i in range(segment_count)],
+            },
+            "raw_message": "原始消息",
+            "processed_plain_text": "处理后的消息",
+        }
+    )
+    message.update_chat_stream(SimpleNamespace(stream_id=STREAM_ID))  # type: ignore
+    return message
+
+
+def _make_handler(index: int, config_calls: Dict[str, int]) -> type:
+    class BenchHandler(BaseEventHandler):
+        event_type = EventType.ON_MESSAGE
+        handler_name = f"bench_handler_{index}"
+
+        async def execute(self, message):
+            return True, True, None, None, None
+
+        def set_plugin_config(self, plugin_config: Dict) -> None:
+            config_calls[self.handler_name] = config_calls.get(self.handler_name, 0) + 1
+            super().set_plugin_config(plugin_config)
+
+    return BenchHandler
+
+
+def _time_dispatch(manager: EventsManager, message: MessageRecv, repeat: int) -> float:
+    """平均每次分发 ON_MESSAGE 的耗时（含等待非拦截处理器任务完成）"""
+
+    async def run() -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await manager.handle_mai_events(EventType.ON_MESSAGE, message)
+        tasks: List[asyncio.Task] = [task for tasks in manager._handler_tasks.values() for task in tasks]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        manager._handler_tasks.clear()
+        return elapsed / repeat
+
+    return asyncio.run(run())
+
+
+@pytest.mark.benchmark
+def test_dispatch_overhead_by_handler_count(monkeypatch, bench_size, bench_report):
+    repeat = bench_size(500, 100000)
+    monkeypatch.setattr(component_registry, "get_plugin_config", lambda plugin_name: {})
+    manager = EventsManager()
+    message = _message(segment_count=9)
+    config_calls: Dict[str, int] = {}
+
+    # 基线：无论是否有订阅者，每条消息都构建并深拷贝事件消息
+    start = time.perf_counter()
+    for _ in range(repeat):
+        manager._prepare_message(EventType.ON_MESSAGE, message).deepcopy()
+    payload = (time.perf_counter() - start) / repeat
+
+    copies = {"count": 0}
+    original_deepcopy = MaiMessages.deepcopy
+
+    def counting_deepcopy(self):
+        copies["count"] += 1
+        return original_deepcopy(self)
+
+    monkeypatch.setattr(MaiMessages, "deepcopy", counting_deepcopy)
+
+    per_dispatch: Dict[int, float] = {}
+    copies_per_dispatch: Dict[int, float] = {}
+    registered = 0
+    for count in HANDLER_COUNTS:
+        while registered < count:
+            handler_class = _make_handler(registered, config_calls)
+            info = handler_class.get_handler_info()
+            info.plugin_name = "bench_plugin"
+            assert manager.register_event_subscriber(info, handler_class)
+            registered += 1
+        copies["count"] = 0
+        per_dispatch[count] = _time_dispatch(manager, message, repeat)
+        copies_per_dispatch[count] = copies["count"] / repeat
+
+    # 插件配置只在注册新处理器后重新生成处理器列表时设置，不随分发次数增加
+    assert max(config_calls.values()) <= len(HANDLER_COUNTS)
+
+    # 在该聊天流禁用全部处理器后重新回到零开销路径
+    for index in range(registered):
+        global_announcement_manager.disable_specific_chat_event_handler(STREAM_ID, f"bench_handler_{index}")
+    try:
+        disabled = _time_dispatch(manager, message, repeat)
+    finally:
+        for index in range(registered):
+            global_announcement_manager.enable_specific_chat_event_handler(STREAM_ID, f"bench_handler_{index}")
+
+    bench_report(
+        f"9 段消息分发 ON_MESSAGE {repeat} 次：构建并深拷贝事件消息 {payload * 1e6:.1f}us；每次分发 "
+        + "，".join(f"{count} 个处理器 {per_dispatch[count] * 1e6:.1f}us" for count in HANDLER_COUNTS)
+        + f"，处理器全部在该聊天禁用 {disabled * 1e6:.1f}us"
+    )
+
+    # 没有启用的处理器时不构建消息，分发开销远小于一次构建与深拷贝
+    assert per_dispatch[0] < payload / 10
+    assert disabled < payload / 10
+    # 有处理器时每次分发只复制一次消息，多个处理器共享同一份副本
+    assert copies_per_dispatch == {0: 0, 1: 1, 4: 1, 16: 1}
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+import pytest
+
+from src.common.database.database_model import ActionRecords
+from src.common.database.db_executor import db_write
+from src.common.database.group_commit import GroupCommitWriter
+
+
+def _make_row(chat_id: str, i: int) -> Dict[str, Any]:
+    return {
+        "action_id": f"{chat_id}-{i}",
+        "time": time.time(),
+        "action_name": "reply",
+        "action_data": json.dumps({"content": f"第{i}条回复"}, ensure_ascii=False),
+        "action_done": True,
+        "action_build_into_prompt": False,
+        "action_prompt_display": f"回复了第{i}条消息",
+        "chat_id": chat_id,
+        "chat_info_stream_id": chat_id,
+        "chat_info_platform": "test",
+    }
+
+
+@pytest.mark.benchmark
+def test_group_commit_throughput(database, bench_size, bench_report):
+    row_count = bench_size(2000, 50000)
+    producers = 10
+
+    async def per_row(chat_id: str) -> float:
+        # 原来的写法：每行在写线程上单独提交一次
+        async def produce(worker: int):
+            for i in range(worker, row_count, producers):
+                await db_write(ActionRecords.create, **_make_row(chat_id, i))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[produce(worker) for worker in range(producers)])
+        return time.perf_counter() - start
+
+    async def batched(writer: GroupCommitWriter, chat_id: str) -> float:
+        async def produce(worker: int):
+            for i in range(worker, row_count, producers):
+                writer.add(ActionRecords, _make_row(chat_id, i))
+                await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[produce(worker) for worker in range(producers)])
+        await writer.aflush(ActionRecords, chat_id)
+        return time.perf_counter() - start
+
+    writer = GroupCommitWriter()
+    per_row_elapsed = asyncio.run(per_row("bench-per-row"))
+    batched_elapsed = asyncio.run(batched(writer, "bench-batched"))
+
+    assert ActionRecords.select().where(ActionRecords.chat_id == "bench-per-row").count() == row_count
+    assert ActionRecords.select().where(ActionRecords.chat_id == "bench-batched").count() == row_count
+    assert not writer.has_pending()
+
+    bench_report(
+        f"{row_count} 行动作记录：逐行提交 {row_count / per_row_elapsed:.0f} 行/秒，"
+        f"组提交 {row_count / batched_elapsed:.0f} 行/秒（{writer.batches} 批）"
+    )
+    assert batched_elapsed < per_row_elapsed
+
+
+def test_store_action_info_returns_saved_record(database):
+    from types import SimpleNamespace
+
+    from src.plugin_system.apis import database_api
+
+    chat_stream = SimpleNamespace(stream_id="store-action-chat", platform="test")
+
+    async def scenario():
+        record = await database_api.store_action_info(
+            chat_stream=chat_stream, action_name="reply", thinking_id="store-action-1", action_data={"a": 1}
+        )
+        return record
+
+    record = asyncio.run(scenario())
+
+    assert record is not None
+    assert record["id"] == ActionRecords.get(ActionRecords.action_id == "store-action-1").id
+    assert record["chat_id"] == "store-action-chat"
+
+
+def test_aflush_by_chat_id_waits_for_all_models(database):
+    writer = GroupCommitWriter(max_delay=10)
+
+    async def scenario():
+        writer.add(ActionRecords, _make_row("aflush-chat", 0))
+        writer.add(ActionRecords, _make_row("other-chat", 0))
+        assert writer.has_pending(chat_id="aflush-chat")
+        await writer.aflush(chat_id="aflush-chat")
+
+    asyncio.run(scenario())
+
+    assert not writer.has_pending(chat_id="aflush-chat")
+    assert ActionRecords.select().where(ActionRecords.chat_id == "aflush-chat").count() == 1
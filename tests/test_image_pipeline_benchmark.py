@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import io
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import src.chat.utils.utils_image as utils_image
+from src.chat.utils.utils_image import get_image_manager
+from src.common.database.database_model import Images
+
+# 模拟的 VLM 请求耗时（秒）
+VLM_DELAY = 0.2
+# 同一张图片同时出现在多少个群里
+GROUPS = 10
+# 循环延迟探针的间隔（秒）
+LAG_PROBE_INTERVAL = 0.005
+# 允许的最大事件循环延迟（秒）
+MAX_LOOP_LAG = 0.1
+
+
+def _png_base64(seed: int, size: int) -> str:
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _gif_base64(seed: int, size: int, frames: int) -> str:
+    rng = np.random.default_rng(seed)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).convert("P") for _ in range(frames)
+    ]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=50, loop=0)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def fake_models(monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """
+    用假请求代替 VLM 与情感标签模型，统计调用次数
+
+    VLM 请求要等到 calls["release"] 被置位后才开始计时返回，用来验证图片消息不等待识别结果
+    """
+    calls: Dict[str, Any] = {"vlm": 0, "llm": 0, "release": None}
+    manager = get_image_manager()
+
+    async def fake_vlm(prompt, image_base64, image_format, **kwargs):
+        calls["vlm"] += 1
+        await calls["release"].wait()
+        await asyncio.sleep(VLM_DELAY)
+        return f"描述{calls['vlm']}", None
+
+    async def fake_llm(self, prompt, **kwargs):
+        calls["llm"] += 1
+        return "开心", None
+
+    monkeypatch.setattr(manager.vlm, "generate_response_for_image", fake_vlm)
+    monkeypatch.setattr(utils_image.LLMRequest, "generate_response_async", fake_llm)
+    return calls
+
+
+@pytest.mark.benchmark
+def test_mixed_gif_and_png_traffic(database, fake_models, bench_size, bench_report):
+    png_count = bench_size(6, 60)
+    gif_count = bench_size(4, 40)
+    pngs = [_png_base64(seed, 256) for seed in range(png_count)]
+    gifs = [_gif_base64(1000 + seed, 200, frames=20) for seed in range(gif_count)]
+    manager = get_image_manager()
+
+    async def scenario():
+        lags: List[float] = []
+        done = False
+
+        async def probe():
+            while not done:
+                start = time.monotonic()
+                await asyncio.sleep(LAG_PROBE_INTERVAL)
+                lags.append(time.monotonic() - start - LAG_PROBE_INTERVAL)
+
+        fake_models["release"] = asyncio.Event()
+        probe_task = asyncio.create_task(probe())
+        start = time.monotonic()
+
+        async def timed(coro):
+            result = await coro
+            return result, time.monotonic() - start
+
+        # 每张图片同时出现在 GROUPS 个群里：表情包直接等待描述，图片走占位符流程
+        emoji_tasks = [
+            asyncio.create_task(timed(manager.get_emoji_description(gif))) for gif in gifs for _ in range(GROUPS)
+        ]
+        # VLM 请求全部卡住时，图片消息也应拿到占位符
+        image_results = await asyncio.wait_for(
+            asyncio.gather(*(timed(manager.process_image(png)) for png in pngs for _ in range(GROUPS))), timeout=30
+        )
+        fake_models["release"].set()
+        emoji_results = await asyncio.gather(*emoji_tasks)
+        while manager._background_tasks:
+            await asyncio.gather(*list(manager._background_tasks))
+        total = time.monotonic() - start
+        done = True
+        await probe_task
+        return image_results, emoji_results, total, lags
+
+    image_results, emoji_results, total, lags = asyncio.run(scenario())
+
+    placeholder_time = max(elapsed for _, elapsed in image_results)
+    emoji_time = max(elapsed for _, elapsed in emoji_results)
+    bench_report(
+        f"{png_count} 张 PNG、{gif_count} 张 GIF 表情包各在 {GROUPS} 个群同时出现：VLM 调用 {fake_models['vlm']} 次，"
+        f"图片占位符全部返回 {placeholder_time * 1000:.0f}ms，表情包描述全部返回 {emoji_time * 1000:.0f}ms，"
+        f"全部识别完成 {total:.2f}s；事件循环延迟最大 {max(lags) * 1000:.1f}ms"
+    )
+
+    # 同一张图片在多个群同时出现时只识别一次
+    assert fake_models["vlm"] == png_count + gif_count
+    image_ids = {image_id for (image_id, _), _ in image_results}
+    assert len(image_ids) == png_count
+    assert all(placeholder.startswith("[picid:") for (_, placeholder), _ in image_results)
+    assert all(description == "[表情包：开心]" for description, _ in emoji_results)
+    for image_id in image_ids:
+        image = Images.get(Images.image_id == image_id)
+        assert image.vlm_processed and image.description
+    # 解码与 GIF 拼帧在线程池中进行，不长时间阻塞事件循环
+    assert max(lags) < MAX_LOOP_LAG
@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import random
+import time
+import zlib
+from typing import List
+
+import numpy as np
+import pytest
+
+import src.chat.knowledge.embedding_store as embedding_store
+from src.chat.knowledge.embedding_store import EmbeddingManager
+from src.chat.knowledge.kg_manager import KGManager
+from src.chat.knowledge.open_ie import OpenIE
+from src.config.config import global_config
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "scripts", "import_openie.py")
+
+
+def _load_import_script():
+    spec = importlib.util.spec_from_file_location("import_openie", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+def _fake_embed_many_sync(texts: List[str], **kwargs) -> List[List[float]]:
+    """按文本哈希生成固定的随机向量，代替嵌入模型请求"""
+    dim = global_config.lpmm_knowledge.embedding_dimension
+    return [
+        np.random.default_rng(zlib.crc32(text.encode())).standard_normal(dim, dtype=np.float32).tolist()
+        for text in texts
+    ]
+
+
+def _make_openie(start: int, count: int, entity_count: int, seed: int) -> OpenIE:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(start, start + count):
+        entities = [f"实体{rng.randrange(entity_count)}" for _ in range(3)]
+        docs.append(
+            {
+                "idx": f"doc-{i}",
+                "passage": f"第{i}段：{entities[0]}与{entities[1]}在{entities[2]}见面",
+                "extracted_entities": entities,
+                "extracted_triples": [
+                    [entities[0], "认识", entities[1]],
+                    [entities[1], "位于", entities[2]],
+                ],
+            }
+        )
+    return OpenIE._from_dict([{"docs": docs}])
+
+
+@pytest.mark.benchmark
+def test_import_openie_throughput(monkeypatch: pytest.MonkeyPatch, bench_size, bench_report):
+    monkeypatch.setattr(embedding_store.embedding_service, "embed_many_sync", _fake_embed_many_sync)
+    import_openie = _load_import_script()
+
+    paragraph_count = bench_size(1000, 50000)
+    increment = 200
+    embed_manager = EmbeddingManager()
+    kg_manager = KGManager()
+
+    update_times: List[float] = []
+    original_update_graph = kg_manager._update_graph
+
+    def timed_update_graph(*args, **kwargs):
+        start = time.perf_counter()
+        original_update_graph(*args, **kwargs)
+        update_times.append(time.perf_counter() - start)
+
+    monkeypatch.setattr(kg_manager, "_update_graph", timed_update_graph)
+
+    def run_import(start: int, count: int, seed: int) -> float:
+        openie = _make_openie(start, count, entity_count=paragraph_count, seed=seed)
+        begin = time.perf_counter()
+        assert import_openie.handle_import_openie(openie, embed_manager, kg_manager)
+        return time.perf_counter() - begin
+
+    # 先导入较小的图，再导入一批增量，记录增量的建图耗时
+    small_base = paragraph_count // 4
+    run_import(0, small_base, seed=1)
+    run_import(small_base, increment, seed=2)
+    small_update = update_times[-1]
+
+    # 把图扩大到完整规模后导入同样大小的增量
+    full_import = run_import(small_base + increment, paragraph_count - small_base, seed=3)
+    run_import(paragraph_count + increment, increment, seed=4)
+    large_update = update_times[-1]
+
+    node_count = len(kg_manager.graph.get_node_list())
+    edge_count = len(kg_manager.graph.get_edge_list())
+    bench_report(
+        f"{paragraph_count - small_base} 段导入 {full_import:.2f}s（{node_count} 节点 / {edge_count} 边）；"
+        f"{increment} 段增量建图：小图 {small_update * 1000:.1f}ms，大图 {large_update * 1000:.1f}ms"
+    )
+
+    # 图扩大 4 倍后，同样大小增量的建图耗时应基本不变（按列表查重时会随图大小线性增长）
+    assert large_update < max(small_update * 2.5, 0.05)
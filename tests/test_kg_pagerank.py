@@ -0,0 +1,49 @@
+import random
+
+import pytest
+from quick_algo import di_graph, pagerank
+
+from src.chat.knowledge.kg_manager import SparsePageRank
+
+
+def _build_random_graph(node_count: int, edge_count: int, seed: int) -> di_graph.DiGraph:
+    """构建带权随机有向图，节点命名与知识图谱一致，包含一部分没有出边的悬挂节点"""
+    rng = random.Random(seed)
+    nodes = [f"entity-{i}" for i in range(node_count // 2)] + [f"paragraph-{i}" for i in range(node_count // 2)]
+    graph = di_graph.DiGraph()
+    edges = set()
+    while len(edges) < edge_count:
+        src, dst = rng.sample(nodes, 2)
+        if src.startswith("paragraph") and rng.random() < 0.5:
+            # 让部分文段节点没有出边
+            continue
+        edges.add((src, dst))
+    for src, dst in edges:
+        graph.add_edge(di_graph.DiEdge(src, dst, {"weight": rng.uniform(0.1, 5.0)}))
+    return graph
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sparse_pagerank_matches_quick_algo(seed: int):
+    graph = _build_random_graph(node_count=400, edge_count=2000, seed=seed)
+    rng = random.Random(seed)
+    nodes = graph.get_node_list()
+    personalization = {node: rng.uniform(0.0, 1.0) for node in rng.sample(nodes, 30)}
+
+    expected = pagerank.run_pagerank(graph, personalization=personalization, max_iter=100, alpha=0.85)
+    actual = SparsePageRank(graph).run(personalization, max_iter=100, alpha=0.85)
+
+    assert actual.keys() == expected.keys()
+    for node, score in expected.items():
+        assert actual[node] == pytest.approx(score, abs=1e-9)
+
+
+def test_sparse_pagerank_reuses_transition_matrix():
+    graph = _build_random_graph(node_count=200, edge_count=800, seed=3)
+    nodes = graph.get_node_list()
+    ppr = SparsePageRank(graph)
+
+    for personalization in ({nodes[0]: 1.0}, {nodes[1]: 0.3, nodes[2]: 0.7}):
+        expected = pagerank.run_pagerank(graph, personalization=personalization, max_iter=100, alpha=0.6)
+        actual = ppr.run(personalization, max_iter=100, alpha=0.6)
+        assert max(abs(actual[node] - expected[node]) for node in expected) < 1e-9
@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# 在新进程中以指定速率输出日志，同时测量事件循环的调度延迟；日志写在该进程工作目录下的 logs 中
+LOG_LOAD_SCRIPT = """
+import asyncio, glob, json, statistics, sys, time
+import src.common.logger as log
+
+mode, rate, duration = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+log.LOG_CONFIG["async_log"] = mode == "async"
+log.apply_log_pipeline()
+logger = log.get_logger("bench")
+TICK = 0.01
+PROBE = 0.002
+
+async def main():
+    lags = []
+    stop = time.monotonic() + duration
+
+    async def probe():
+        while time.monotonic() < stop:
+            start = time.monotonic()
+            await asyncio.sleep(PROBE)
+            lags.append(time.monotonic() - start - PROBE)
+
+    async def produce():
+        sent = 0
+        begin = time.monotonic()
+        while time.monotonic() < stop:
+            due = int((time.monotonic() - begin) * rate)
+            for i in range(sent, due):
+                logger.info(f"bench-line {i}: 收到消息，开始处理")
+            sent = max(sent, due)
+            await asyncio.sleep(TICK)
+        return sent
+
+    sent, _ = await asyncio.gather(produce(), probe())
+    return sent, sorted(lags)
+
+sent, lags = asyncio.run(main())
+begin = time.monotonic()
+log.shutdown_logging()
+drain = time.monotonic() - begin
+written = 0
+for path in glob.glob("logs/app_*.log.jsonl"):
+    with open(path, encoding="utf-8") as f:
+        written += sum("bench-line" in line for line in f)
+print("RESULT " + json.dumps({
+    "sent": sent,
+    "written": written,
+    "p50": statistics.median(lags),
+    "p99": lags[int(len(lags) * 0.99)],
+    "drain": drain,
+}))
+"""
+
+
+def _run(tmp_path, mode: str, rate: int, duration: float) -> dict:
+    workdir = tmp_path / mode
+    workdir.mkdir()
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([os.getcwd(), os.environ.get("PYTHONPATH", "")])}
+    result = subprocess.run(
+        [sys.executable, "-c", LOG_LOAD_SCRIPT, mode, str(rate), str(duration)],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        check=True,
+        timeout=300,
+    )
+    line = next(line for line in result.stdout.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT ") :])
+
+
+@pytest.mark.benchmark
+def test_loop_lag_at_10k_log_lines_per_second(tmp_path, bench_size, bench_report):
+    rate = 10000
+    duration = bench_size(2, 20)
+    sync = _run(tmp_path, "sync", rate, duration)
+    asynchronous = _run(tmp_path, "async", rate, duration)
+
+    bench_report(
+        f"{rate} 行/秒 × {duration}s：同步写入循环延迟 p50 {sync['p50'] * 1000:.2f}ms / p99 {sync['p99'] * 1000:.2f}ms；"
+        f"异步批量写入 p50 {asynchronous['p50'] * 1000:.2f}ms / p99 {asynchronous['p99'] * 1000:.2f}ms，"
+        f"关闭时排空 {asynchronous['drain'] * 1000:.0f}ms"
+    )
+
+    # 两种模式下关闭日志系统后所有日志都已写入文件
+    for result in (sync, asynchronous):
+        assert result["sent"] >= rate * duration * 0.9
+        assert result["written"] == result["sent"]
+    # 同步模式下每批日志都在事件循环线程上格式化并写入，尾部延迟明显更高
+    assert asynchronous["p99"] < sync["p99"]
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from src.chat.knowledge.embedding_store import EmbeddingStore, EmbeddingTable
+from src.config.config import global_config
+
+NAMESPACES = ("paragraph", "entity", "relation")
+
+# 在新进程中启动 LPMM，统计耗时与常驻内存增量（KG 目录为空，只加载嵌入库）
+STARTUP_SCRIPT = """
+import json, sys, time
+import src.chat.knowledge as knowledge
+import src.chat.knowledge.embedding_store as embedding_store
+import src.chat.knowledge.kg_manager as kg_manager
+
+def rss():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS"))
+
+embedding_store.EMBEDDING_DATA_DIR_STR = sys.argv[1]
+kg_manager.get_kg_dir_str = lambda: sys.argv[2]
+knowledge.global_config.lpmm_knowledge.enable = True
+before = rss()
+start = time.perf_counter()
+knowledge.lpmm_start_up()
+elapsed = time.perf_counter() - start
+assert knowledge.qa_manager is not None
+print(json.dumps({"seconds": elapsed, "rss_delta": rss() - before}))
+"""
+
+
+def _write_stores(data_dir: str, rows: int) -> int:
+    """写入三个随机嵌入库（含 Faiss 索引），返回全部 embedding 矩阵的字节数"""
+    dim = global_config.lpmm_knowledge.embedding_dimension
+    rng = np.random.default_rng(0)
+    total_bytes = 0
+    for namespace in NAMESPACES:
+        store = EmbeddingStore(namespace, data_dir)
+        hashes = [f"{namespace}-{i}" for i in range(rows)]
+        matrix = rng.standard_normal((rows, dim), dtype=np.float32)
+        store.store = EmbeddingTable(hashes, hashes, matrix)
+        store.build_faiss_index()
+        store.save_to_file()
+        total_bytes += matrix.nbytes
+    return total_bytes
+
+
+def _start_up(data_dir: str, kg_dir: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, data_dir, kg_dir],
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=600,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="需要 /proc 统计常驻内存")
+def test_lpmm_start_up_time_and_rss(tmp_path, bench_size, bench_report):
+    rows = bench_size(5000, 500000)
+    data_dir = str(tmp_path / "embedding")
+    kg_dir = str(tmp_path / "rag")
+    os.makedirs(kg_dir)
+    start = time.perf_counter()
+    matrix_bytes = _write_stores(data_dir, rows)
+    write_time = time.perf_counter() - start
+
+    # 首次启动没有矩阵文件，需要从 parquet 转换；之后的启动直接内存映射
+    for namespace in NAMESPACES:
+        os.remove(os.path.join(data_dir, f"{namespace}_emb.npy"))
+    cold = _start_up(data_dir, kg_dir)
+    warm = _start_up(data_dir, kg_dir)
+
+    mib = 1024 * 1024
+    bench_report(
+        f"3 个嵌入库各 {rows} 条（矩阵共 {matrix_bytes / mib:.0f}MiB，写入 {write_time:.1f}s）："
+        f"从 parquet 转换启动 {cold['seconds']:.2f}s / +{cold['rss_delta'] / mib:.0f}MiB，"
+        f"内存映射启动 {warm['seconds']:.2f}s / +{warm['rss_delta'] / mib:.0f}MiB"
+    )
+
+    for namespace in NAMESPACES:
+        assert os.path.exists(os.path.join(data_dir, f"{namespace}_emb.npy"))
+    # 矩阵只做内存映射，常驻内存主要是 Faiss 索引自身的一份向量，不再有逐条的 Python 浮点数列表
+    assert warm["rss_delta"] < matrix_bytes * 1.5 + 64 * mib
+    assert warm["seconds"] <= cold["seconds"] * 1.2
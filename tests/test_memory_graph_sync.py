@@ -0,0 +1,87 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from src.chat.memory_system.Hippocampus import EntorhinalCortex, Hippocampus
+from src.common.database.database_model import GraphEdges, GraphNodes
+
+
+def _build_hippocampus(node_count: int, edge_count: int, seed: int) -> Hippocampus:
+    """直接在图上构建随机记忆图，不记录变更（相当于刚从数据库加载完）"""
+    rng = random.Random(seed)
+    hippocampus = Hippocampus()
+    hippocampus.entorhinal_cortex = EntorhinalCortex(hippocampus)
+    graph = hippocampus.memory_graph.G
+    now = time.time()
+    concepts = [f"概念{i}" for i in range(node_count)]
+    for concept in concepts:
+        graph.add_node(concept, memory_items=f"{concept}的记忆", weight=1.0, created_time=now, last_modified=now)
+    edges = set()
+    while len(edges) < edge_count:
+        edges.add(hippocampus.memory_graph.edge_key(*rng.sample(concepts, 2)))
+    for source, target in edges:
+        graph.add_edge(source, target, strength=rng.randint(1, 10), created_time=now, last_modified=now)
+    hippocampus.memory_graph.topic_index.rebuild(graph.nodes())
+    return hippocampus
+
+
+def _full_diff(hippocampus: Hippocampus) -> None:
+    """旧实现每次同步都要做的工作：读出全部节点和边，逐个计算哈希与内存中的图比对"""
+    db_nodes = {
+        concept: node_hash for concept, node_hash in GraphNodes.select(GraphNodes.concept, GraphNodes.hash).tuples()
+    }
+    db_edges = {
+        (source, target): edge_hash
+        for source, target, edge_hash in GraphEdges.select(
+            GraphEdges.source, GraphEdges.target, GraphEdges.hash
+        ).tuples()
+    }
+    graph = hippocampus.memory_graph.G
+    for concept, data in graph.nodes(data=True):
+        assert db_nodes.get(concept) == str(hippocampus.calculate_node_hash(concept, data["memory_items"]))
+    for source, target in graph.edges():
+        edge_hash = str(hippocampus.calculate_edge_hash(source, target))
+        assert edge_hash in (db_edges.get((source, target)), db_edges.get((target, source)))
+
+
+@pytest.mark.benchmark
+def test_sync_one_changed_node(database, bench_size, bench_report):
+    node_count = bench_size(5000, 100000)
+    edge_count = node_count * 5
+    hippocampus = _build_hippocampus(node_count, edge_count, seed=0)
+    cortex = hippocampus.entorhinal_cortex
+    memory_graph = hippocampus.memory_graph
+
+    start = time.perf_counter()
+    asyncio.run(cortex.resync_memory_to_db())
+    full_rewrite = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _full_diff(hippocampus)
+    full_diff = time.perf_counter() - start
+
+    # 修改一个节点并加强它的一条边，只应写入这两行
+    neighbor = next(iter(memory_graph.G.neighbors("概念0")))
+    memory_graph.add_node("概念0", **{**memory_graph.G.nodes["概念0"], "memory_items": "新的记忆"})
+    memory_graph.add_edge("概念0", neighbor, **{**memory_graph.G["概念0"][neighbor], "strength": 99})
+    start = time.perf_counter()
+    asyncio.run(cortex.sync_memory_to_db())
+    delta_sync = time.perf_counter() - start
+
+    bench_report(
+        f"{node_count} 节点 / {edge_count} 边：全量重写 {full_rewrite:.2f}s，全量读取比对 {full_diff:.2f}s，"
+        f"只同步 1 个变更节点 {delta_sync * 1000:.1f}ms"
+    )
+
+    assert not memory_graph.has_pending_changes()
+    assert GraphNodes.select().count() == node_count
+    assert GraphEdges.select().count() == edge_count
+    assert GraphNodes.get(GraphNodes.concept == "概念0").memory_items == "新的记忆"
+    edge = GraphEdges.get(
+        ((GraphEdges.source == "概念0") & (GraphEdges.target == neighbor))
+        | ((GraphEdges.source == neighbor) & (GraphEdges.target == "概念0"))
+    )
+    assert edge.strength == 99
+    assert delta_sync < min(full_rewrite, full_diff) / 10
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from src.chat.utils.chat_message_builder import get_raw_msg_before_timestamp_with_chat
+from src.common.database.database_model import Messages, _sync_indexes
+
+HOT_CHAT = "bench-latest-hot"
+OTHER_CHATS = 50
+LIMIT = 30
+# 本次需求新增的索引；基线只保留原有的 chat_id 单列索引
+NEW_INDEXES = ("messages_chat_id_time", "messages_time")
+
+
+def _index_names(database) -> set:
+    return {row[1] for row in database.execute_sql("PRAGMA index_list('messages')").fetchall()}
+
+
+def _time_latest(database, repeat: int) -> float:
+    """查询热门聊天最新 LIMIT 条消息的平均耗时"""
+    now = time.time()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        messages = get_raw_msg_before_timestamp_with_chat(HOT_CHAT, now, limit=LIMIT)
+    elapsed = (time.perf_counter() - start) / repeat
+    assert len(messages) == LIMIT
+    assert [m.time for m in messages] == sorted(m.time for m in messages)
+    return elapsed
+
+
+@pytest.mark.benchmark
+def test_latest_messages_of_one_chat(database, insert_messages, bench_size, bench_report):
+    total = bench_size(50000, 5000000)
+    # 热门聊天占五分之一，其余消息分散在其他聊天中，各聊天的消息时间相互交错
+    hot_count = total // 5
+    insert_messages(HOT_CHAT, hot_count, start_time=0.0, interval=1.0)
+    per_chat = (total - hot_count) // OTHER_CHATS
+    for i in range(OTHER_CHATS):
+        insert_messages(f"bench-latest-{i}", per_chat, start_time=i / OTHER_CHATS, interval=hot_count / per_chat)
+
+    try:
+        assert set(NEW_INDEXES) <= _index_names(database)
+        plan = " ".join(
+            str(row)
+            for row in database.execute_sql(
+                "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE chat_id = ? AND time < ? ORDER BY time DESC LIMIT 30",
+                (HOT_CHAT, time.time()),
+            ).fetchall()
+        )
+        assert "messages_chat_id_time" in plan
+        indexed = _time_latest(database, repeat=50)
+
+        for index_name in NEW_INDEXES:
+            database.execute_sql(f'DROP INDEX "{index_name}"')
+        baseline = _time_latest(database, repeat=5)
+    finally:
+        _sync_indexes(Messages)
+        Messages.delete().where(Messages.chat_id.startswith("bench-latest-")).execute()
+
+    assert set(NEW_INDEXES) <= _index_names(database)
+    bench_report(
+        f"{total} 行中取单个聊天（{hot_count} 行）最新 {LIMIT} 条："
+        f"仅 chat_id 索引 {baseline * 1000:.1f}ms，(chat_id, time) 索引 {indexed * 1000:.2f}ms"
+    )
+    assert indexed < baseline / 5
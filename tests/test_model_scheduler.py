@@ -0,0 +1,165 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import pytest
+from aiohttp import web
+
+import src.llm_models.model_scheduler as scheduler_module
+import src.llm_models.utils_model as utils_model
+from src.config.api_ada_configs import APIProvider, ModelInfo, TaskConfig
+from src.config.config import model_config
+from src.llm_models.model_scheduler import ModelScheduler
+from src.llm_models.utils_model import LLMRequest
+
+
+class FakeOpenAIServer:
+    """记录并发数与请求顺序的 OpenAI 兼容接口"""
+
+    def __init__(self, delay: float, total_tokens: int):
+        self.delay = delay
+        self.total_tokens = total_tokens
+        self.current = 0
+        self.max_concurrency = 0
+        self.prompts: List[str] = []
+        self.start_times: List[float] = []
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        body: Dict[str, Any] = await request.json()
+        self.current += 1
+        self.max_concurrency = max(self.max_concurrency, self.current)
+        self.prompts.append(body["messages"][0]["content"])
+        self.start_times.append(time.monotonic())
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.current -= 1
+        return web.json_response(
+            {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": self.total_tokens},
+            }
+        )
+
+
+@asynccontextmanager
+async def fake_openai_server(delay: float = 0.1, total_tokens: int = 10):
+    server = FakeOpenAIServer(delay, total_tokens)
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", server.chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        yield server, f"http://127.0.0.1:{port}/v1"
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+def scheduler(monkeypatch: pytest.MonkeyPatch) -> ModelScheduler:
+    """每个测试使用独立的调度器，不记录模型用量"""
+    fresh = ModelScheduler()
+    monkeypatch.setattr(utils_model, "model_scheduler", fresh)
+    monkeypatch.setattr(utils_model.llm_usage_recorder, "record_usage_to_database", lambda **kwargs: None)
+    return fresh
+
+
+def make_task(monkeypatch: pytest.MonkeyPatch, base_url: str, provider_name: str, **limits: int) -> TaskConfig:
+    provider = APIProvider(name=provider_name, base_url=base_url, api_key="test", timeout=10, **limits)
+    monkeypatch.setitem(model_config.api_providers_dict, provider_name, provider)
+    model_name = f"{provider_name}-model"
+    model_info = ModelInfo(model_identifier=model_name, name=model_name, api_provider=provider_name)
+    monkeypatch.setitem(model_config.models_dict, model_name, model_info)
+    return TaskConfig(model_list=[model_name], max_tokens=20)
+
+
+def test_concurrency_cap(monkeypatch: pytest.MonkeyPatch, scheduler: ModelScheduler):
+    async def scenario():
+        async with fake_openai_server(delay=0.1) as (server, base_url):
+            task = make_task(monkeypatch, base_url, "fake-concurrency", max_concurrency=2)
+            results = await asyncio.gather(
+                *[LLMRequest(task, "utils").generate_response_async(f"req{i}") for i in range(8)]
+            )
+        return server, results
+
+    server, results = asyncio.run(scenario())
+
+    assert [content for content, _ in results] == ["ok"] * 8
+    assert server.max_concurrency == 2
+    stats = scheduler.get_stats()["providers"]["fake-concurrency"]
+    assert stats["in_flight"] == 0
+    assert stats["waiting"] == 0
+
+
+def test_priority_ordering(monkeypatch: pytest.MonkeyPatch, scheduler: ModelScheduler):
+    async def scenario():
+        async with fake_openai_server(delay=0.05) as (server, base_url):
+            task = make_task(monkeypatch, base_url, "fake-priority", max_concurrency=1)
+            first = asyncio.create_task(LLMRequest(task, "memory.build").generate_response_async("bg-first"))
+            while server.current == 0:
+                await asyncio.sleep(0.005)
+
+            # 占满并发后再入队：先入队的后台学习请求应排在聊天回复请求之后
+            background = [
+                asyncio.create_task(LLMRequest(task, "memory.build").generate_response_async(f"bg-{i}"))
+                for i in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            chat = [
+                asyncio.create_task(LLMRequest(task, "replyer").generate_response_async(f"chat-{i}")) for i in range(2)
+            ]
+            await asyncio.gather(first, *background, *chat)
+        return server
+
+    server = asyncio.run(scenario())
+
+    assert server.max_concurrency == 1
+    assert server.prompts == ["bg-first", "chat-0", "chat-1", "bg-0", "bg-1", "bg-2"]
+
+
+def test_rpm_limit_waits_for_window(monkeypatch: pytest.MonkeyPatch, scheduler: ModelScheduler):
+    window = 0.5
+    monkeypatch.setattr(scheduler_module, "RATE_WINDOW", window)
+
+    async def scenario():
+        async with fake_openai_server(delay=0) as (server, base_url):
+            task = make_task(monkeypatch, base_url, "fake-rpm", rpm_limit=2)
+            start = time.monotonic()
+            await asyncio.gather(*[LLMRequest(task, "utils").generate_response_async(f"req{i}") for i in range(5)])
+        return server, time.monotonic() - start
+
+    server, elapsed = asyncio.run(scenario())
+
+    assert len(server.start_times) == 5
+    # 5 个请求、每个窗口最多 2 个，至少要等两个窗口
+    assert elapsed >= 2 * window * 0.9
+    for earlier, later in zip(server.start_times, server.start_times[2:], strict=False):
+        assert later - earlier >= window * 0.9
+
+
+def test_tpm_limit_waits_for_window(monkeypatch: pytest.MonkeyPatch, scheduler: ModelScheduler):
+    window = 0.5
+    monkeypatch.setattr(scheduler_module, "RATE_WINDOW", window)
+
+    async def scenario():
+        # 每个请求预估约 25 token、实际用量 25 token，TPM 上限 60 时每个窗口最多放行 2 个
+        async with fake_openai_server(delay=0, total_tokens=25) as (server, base_url):
+            task = make_task(monkeypatch, base_url, "fake-tpm", tpm_limit=60)
+            start = time.monotonic()
+            await asyncio.gather(*[LLMRequest(task, "utils").generate_response_async(f"req{i}") for i in range(4)])
+        return server, time.monotonic() - start
+
+    server, elapsed = asyncio.run(scenario())
+
+    assert len(server.start_times) == 4
+    assert elapsed >= window * 0.9
+    for earlier, later in zip(server.start_times, server.start_times[2:], strict=False):
+        assert later - earlier >= window * 0.9
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.chat.utils.chat_message_builder import build_readable_messages, get_raw_msg_before_timestamp_with_chat
+from src.common.database.database_model import PersonInfo
+from src.person_info.person_info import PersonInfoManager, get_person_id, person_info_manager
+
+
+def _insert_persons(user_count: int):
+    rows = []
+    for i in range(user_count):
+        rows.append(
+            {
+                "person_id": get_person_id("test", str(i)),
+                "is_known": True,
+                "person_name": f"用户{i}的名字",
+                "name_reason": "测试",
+                "platform": "test",
+                "user_id": str(i),
+                "nickname": f"用户{i}",
+                "memory_points": json.dumps([f"性格:喜欢第{i}种东西:1.0:{time.time()}"], ensure_ascii=False),
+                "know_times": 1,
+                "know_since": time.time(),
+                "last_know": time.time(),
+            }
+        )
+    PersonInfo.insert_many(rows).on_conflict_ignore().execute()
+
+
+@pytest.mark.benchmark
+def test_build_readable_messages_person_cache(
+    monkeypatch: pytest.MonkeyPatch, insert_messages, bench_size, bench_report
+):
+    chat_id = "person-cache-chat"
+    user_count = 20
+    _insert_persons(user_count)
+    insert_messages(chat_id, 200, start_time=time.time() - 1000, user_count=user_count)
+    messages = get_raw_msg_before_timestamp_with_chat(chat_id=chat_id, timestamp=time.time(), limit=200)
+    assert len(messages) == 200
+    rounds = bench_size(5, 50)
+
+    def render_rounds() -> float:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            build_readable_messages(messages, replace_bot_name=True, timestamp_mode="relative")
+        return (time.perf_counter() - start) / rounds
+
+    # 缓存立即过期时，每次解析发送者都要查询数据库，相当于没有身份缓存
+    person_info_manager.invalidate_person_record()
+    monkeypatch.setattr(PersonInfoManager, "PERSON_CACHE_TTL", 0)
+    uncached = render_rounds()
+    monkeypatch.undo()
+
+    person_info_manager.invalidate_person_record()
+    hits_before = person_info_manager.person_cache_hits
+    misses_before = person_info_manager.person_cache_misses
+    cached = render_rounds()
+    hits = person_info_manager.person_cache_hits - hits_before
+    misses = person_info_manager.person_cache_misses - misses_before
+
+    bench_report(
+        f"200 条消息渲染：无缓存 {uncached * 1000:.1f}ms，有缓存 {cached * 1000:.1f}ms；"
+        f"缓存命中率 {hits / (hits + misses):.1%}"
+    )
+    # 每个发送者只在第一次解析时查询数据库
+    assert misses <= user_count
+    assert cached < uncached
+
+
+def test_read_racing_write_does_not_cache_stale_record(monkeypatch: pytest.MonkeyPatch, database):
+    person_id = get_person_id("test", "race")
+    PersonInfo.insert(
+        person_id=person_id, platform="test", user_id="race", nickname="旧昵称"
+    ).on_conflict_ignore().execute()
+    person_info_manager.invalidate_person_record(person_id)
+
+    original_get_or_none = PersonInfo.get_or_none
+    read_started = threading.Event()
+    write_done = threading.Event()
+
+    def slow_get_or_none(*args, **kwargs):
+        # 读到旧记录后等待另一个线程写入，模拟读库期间发生的写入
+        record = original_get_or_none(*args, **kwargs)
+        read_started.set()
+        write_done.wait(5)
+        return record
+
+    def writer():
+        read_started.wait(5)
+        PersonInfo.update(nickname="新昵称").where(PersonInfo.person_id == person_id).execute()
+        person_info_manager.update_person_record(person_id, {"nickname": "新昵称"})
+        write_done.set()
+
+    monkeypatch.setattr(PersonInfo, "get_or_none", slow_get_or_none)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    stale = person_info_manager.get_person_record(person_id)
+    thread.join()
+    monkeypatch.undo()
+
+    assert stale is not None and stale["nickname"] == "旧昵称"
+    assert person_info_manager.get_person_record(person_id)["nickname"] == "新昵称"  # type: ignore
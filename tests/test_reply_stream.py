@@ -0,0 +1,117 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import pytest
+from aiohttp import web
+
+import src.llm_models.utils_model as utils_model
+from src.chat.utils.utils import generate_reply_stream
+from src.common.data_models.llm_data_model import LLMGenerationDataModel
+from src.config.api_ada_configs import APIProvider, ModelInfo, TaskConfig
+from src.config.config import model_config
+from src.llm_models.model_scheduler import ModelScheduler
+from src.llm_models.utils_model import LLMRequest
+
+
+class FakeStreamServer:
+    """逐帧返回给定文本的 OpenAI 兼容流式接口，可模拟不支持 stream_options 的服务"""
+
+    def __init__(self, chunks: List[str], reject_stream_options: bool = False):
+        self.chunks = chunks
+        self.reject_stream_options = reject_stream_options
+        self.requests: List[Dict[str, Any]] = []
+        self.chunks_sent = 0
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body: Dict[str, Any] = await request.json()
+        self.requests.append(body)
+        if self.reject_stream_options and "stream_options" in body:
+            return web.json_response(
+                {"error": {"message": "Unrecognized request argument: stream_options", "type": "invalid_request"}},
+                status=400,
+            )
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for chunk in self.chunks:
+            frame = {
+                "id": "chatcmpl-test",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(frame, ensure_ascii=False)}\n\n".encode())
+            self.chunks_sent += 1
+            await asyncio.sleep(0.01)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+
+@asynccontextmanager
+async def fake_stream_server(chunks: List[str], reject_stream_options: bool = False):
+    server = FakeStreamServer(chunks, reject_stream_options)
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", server.chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        yield server, f"http://127.0.0.1:{port}/v1"
+    finally:
+        await runner.cleanup()
+
+
+def make_request(monkeypatch: pytest.MonkeyPatch, base_url: str, provider_name: str) -> LLMRequest:
+    monkeypatch.setattr(utils_model, "model_scheduler", ModelScheduler())
+    monkeypatch.setattr(utils_model.llm_usage_recorder, "record_usage_to_database", lambda **kwargs: None)
+    provider = APIProvider(name=provider_name, base_url=base_url, api_key="test", timeout=10, max_retry=1)
+    monkeypatch.setitem(model_config.api_providers_dict, provider_name, provider)
+    model_name = f"{provider_name}-model"
+    model_info = ModelInfo(model_identifier=model_name, name=model_name, api_provider=provider_name)
+    monkeypatch.setitem(model_config.models_dict, model_name, model_info)
+    return LLMRequest(TaskConfig(model_list=[model_name], max_tokens=50), "replyer")
+
+
+def test_stream_retries_without_stream_options(monkeypatch: pytest.MonkeyPatch):
+    async def collect(request: LLMRequest) -> str:
+        return "".join([delta async for delta in request.generate_response_stream("hi")])
+
+    async def scenario():
+        async with fake_stream_server(["你好", "呀。"], reject_stream_options=True) as (server, base_url):
+            request = make_request(monkeypatch, base_url, "fake-no-stream-options")
+            first = await collect(request)
+            second = await collect(request)
+        return server, first, second
+
+    server, first, second = asyncio.run(scenario())
+
+    assert first == second == "你好呀。"
+    # 第一次请求被拒绝后去掉 stream_options 重试，之后的请求不再附带
+    assert ["stream_options" in body for body in server.requests] == [True, False, False]
+
+
+def test_generate_reply_stream_stops_when_handler_declines(monkeypatch: pytest.MonkeyPatch):
+    chunks = ["第一句。", "第二句。", "第三句。"] + [f"后面的第{i}句。" for i in range(20)]
+    handled: List[str] = []
+
+    async def handler(sentences: str, llm_response: LLMGenerationDataModel) -> bool:
+        handled.append(sentences)
+        return len(handled) < 2
+
+    async def scenario():
+        async with fake_stream_server(chunks) as (server, base_url):
+            request = make_request(monkeypatch, base_url, "fake-stream-stop")
+            llm_response = LLMGenerationDataModel()
+            await generate_reply_stream(request, "hi", llm_response, handler)
+        return server, llm_response
+
+    server, llm_response = asyncio.run(scenario())
+
+    assert handled == ["第一句。", "第二句。"]
+    assert llm_response.streamed
+    # 处理函数拒绝后立即中断请求，不再读完整个回复
+    assert server.chunks_sent < len(chunks)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Awaitable, List, Optional, TypeVar
+
+import pytest
+
+import src.llm_models.model_client.openai_client as openai_client
+from src.config.api_ada_configs import APIProvider, ModelInfo
+from src.llm_models.exceptions import ReqAbortException
+from src.llm_models.model_client.openai_client import OpenaiClient
+from src.llm_models.payload_content.message import MessageBuilder
+from test_model_scheduler import fake_openai_server
+
+T = TypeVar("T")
+
+# 中断信号量在请求发出后多久被设置（秒）
+INTERRUPT_AFTER = 0.05
+
+
+async def _await_polling(awaitable: Awaitable[T], interrupt_flag: Optional[asyncio.Event]) -> T:
+    """旧实现：每 100ms 轮询一次请求任务与中断信号量"""
+    req_task = asyncio.ensure_future(awaitable)
+    while not req_task.done():
+        if interrupt_flag and interrupt_flag.is_set():
+            req_task.cancel()
+            raise ReqAbortException("请求被外部信号中断")
+        await asyncio.sleep(0.1)
+    return req_task.result()
+
+
+def _client(base_url: str) -> tuple:
+    provider = APIProvider(name="fake-interrupt", base_url=base_url, api_key="test", timeout=10)
+    model_info = ModelInfo(model_identifier="fake-model", name="fake-model", api_provider="fake-interrupt")
+    return OpenaiClient(provider), model_info
+
+
+def _measure(calls: int) -> dict:
+    """依次发出 calls 个带中断信号量的请求，再测一次请求进行中被中断的耗时"""
+    message_list = [MessageBuilder().add_text_content("ping").build()]
+
+    async def scenario() -> dict:
+        async with fake_openai_server(delay=0) as (_, base_url):
+            client, model_info = _client(base_url)
+            latencies: List[float] = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                response = await client.get_response(model_info, message_list, interrupt_flag=asyncio.Event())
+                latencies.append(time.perf_counter() - start)
+                assert response.content == "ok"
+
+        async with fake_openai_server(delay=0.5) as (_, base_url):
+            client, model_info = _client(base_url)
+            interrupt_flag = asyncio.Event()
+            asyncio.get_running_loop().call_later(INTERRUPT_AFTER, interrupt_flag.set)
+            start = time.perf_counter()
+            with pytest.raises(ReqAbortException):
+                await client.get_response(model_info, message_list, interrupt_flag=interrupt_flag)
+            abort = time.perf_counter() - start
+        return {"mean": sum(latencies) / calls, "abort": abort}
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.benchmark
+def test_request_latency_without_polling(monkeypatch, bench_size, bench_report):
+    calls = bench_size(20, 300)
+    waiting = _measure(calls)
+    with monkeypatch.context() as patch:
+        patch.setattr(openai_client, "await_interruptible", _await_polling)
+        polling = _measure(calls)
+
+    bench_report(
+        f"本地假服务器依次请求 {calls} 次：轮询中断量平均 {polling['mean'] * 1000:.1f}ms，"
+        f"同时等待请求与中断量 {waiting['mean'] * 1000:.1f}ms；"
+        f"{INTERRUPT_AFTER * 1000:.0f}ms 时中断，轮询 {polling['abort'] * 1000:.1f}ms 后放弃，"
+        f"事件等待 {waiting['abort'] * 1000:.1f}ms 后放弃"
+    )
+
+    # 轮询每次请求至少多等一个 100ms 的间隔，同时等待时请求完成即返回
+    assert polling["mean"] >= 0.1
+    assert waiting["mean"] < polling["mean"] / 3
+    # 中断信号量被设置后立即取消请求
+    assert INTERRUPT_AFTER <= waiting["abort"] < INTERRUPT_AFTER + 0.04
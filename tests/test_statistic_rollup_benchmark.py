@@ -0,0 +1,115 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from peewee import chunked
+
+from src.chat.utils.statistic_rollup import statistic_rollup
+from src.common.database.database_model import (
+    LLMUsage,
+    LLMUsageHourRollup,
+    LLMUsageMinuteRollup,
+    MessageHourRollup,
+    MessageMinuteRollup,
+    Messages,
+    StatisticRollupCursor,
+)
+
+PERIOD = timedelta(days=7)
+MODELS = ["model-a", "model-b", "model-c"]
+REQUEST_TYPES = ["replyer", "planner", "memory.build", "emoji"]
+
+
+def _insert_llm_usage(count: int, start: datetime, seed: int):
+    rng = random.Random(seed)
+    step = PERIOD / count
+    rows = (
+        {
+            "model_name": rng.choice(MODELS),
+            "model_api_provider": "bench",
+            "user_id": "system",
+            "request_type": rng.choice(REQUEST_TYPES),
+            "endpoint": "/chat/completions",
+            "prompt_tokens": 100,
+            "completion_tokens": 20,
+            "total_tokens": 120,
+            "cost": 0.001,
+            "time_cost": rng.uniform(0.5, 3.0),
+            "status": "success",
+            "timestamp": start + step * i,
+        }
+        for i in range(count)
+    )
+    with LLMUsage._meta.database.atomic():
+        for batch in chunked(rows, 2000):
+            LLMUsage.insert_many(batch).execute()
+
+
+def _reset_rollups():
+    for model in (LLMUsageMinuteRollup, LLMUsageHourRollup, MessageMinuteRollup, MessageHourRollup):
+        model.delete().execute()
+    StatisticRollupCursor.delete().execute()
+
+
+def _scan_raw(start: datetime) -> int:
+    """旧实现：逐条读取时间段内的原始记录（ORM 对象）并累加"""
+    requests = 0
+    for record in LLMUsage.select().where(LLMUsage.timestamp >= start):
+        requests += 1 if record.model_name else 0
+    for message in Messages.select().where(Messages.time >= start.timestamp()):
+        requests += 0 if message.chat_id else 1
+    return requests
+
+
+@pytest.mark.benchmark
+def test_rollup_backfill_and_query(database, insert_messages, bench_size, bench_report):
+    usage_count = bench_size(100000, 10000000)
+    message_count = bench_size(20000, 1000000)
+    now = datetime.now()
+    start = now - PERIOD
+    LLMUsage.delete().execute()
+    _reset_rollups()
+    try:
+        _insert_llm_usage(usage_count, start, seed=0)
+        insert_messages(
+            "bench-rollup", message_count, start_time=start.timestamp(), interval=PERIOD.total_seconds() / message_count
+        )
+
+        # 游标为 0 时的首次汇总即为对已有数据的回填
+        begin = time.perf_counter()
+        statistic_rollup.catch_up()
+        backfill = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        usage_rows = statistic_rollup.query_llm_usage(start)
+        message_rows = statistic_rollup.query_messages(start)
+        chart_rows = statistic_rollup.query_llm_cost_by_minute(start.replace(second=0, microsecond=0))
+        rollup_query = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        _scan_raw(start)
+        raw_scan = time.perf_counter() - begin
+
+        # 之后每次统计只汇总新增的记录
+        _insert_llm_usage(1000, now, seed=1)
+        begin = time.perf_counter()
+        statistic_rollup.catch_up()
+        incremental = time.perf_counter() - begin
+        after_rows = statistic_rollup.query_llm_usage(start)
+    finally:
+        LLMUsage.delete().execute()
+        Messages.delete().where(Messages.chat_id == "bench-rollup").execute()
+        _reset_rollups()
+
+    bench_report(
+        f"{usage_count} 条 LLM 记录 + {message_count} 条消息：回填 {backfill:.2f}s，增量汇总 1000 条 "
+        f"{incremental * 1000:.0f}ms；7 天统计与图表读汇总表 {rollup_query * 1000:.0f}ms，"
+        f"逐条扫描原始记录 {raw_scan:.2f}s"
+    )
+
+    assert sum(row[3] for row in usage_rows) == usage_count
+    assert sum(row[3] for row in after_rows) == usage_count + 1000
+    assert sum(row[2] for row in message_rows if row[0] == "gbench-rollup") == message_count
+    assert chart_rows
+    assert rollup_query < raw_scan / 5
@@ -0,0 +1,50 @@
+import random
+import time
+
+import pytest
+
+from src.chat.utils.typo_generator import ChineseTypoGenerator, TypoIndex, get_typo_generator
+
+SENTENCES = [
+    "今天天气不错，我们一起去公园散步吧",
+    "这个问题我之前也遇到过，重启一下就好了",
+    "你说的那家餐厅我上周刚去过，味道还可以",
+    "晚上要不要一起打游戏，我已经在线了",
+    "明天记得带伞，天气预报说下午有雨",
+]
+
+
+@pytest.mark.benchmark
+def test_create_typo_sentence_throughput(monkeypatch: pytest.MonkeyPatch, bench_size, bench_report):
+    # 首次构建索引并写入缓存文件，再模拟新进程从缓存文件加载
+    monkeypatch.setattr(TypoIndex, "_instance", None)
+    start = time.perf_counter()
+    TypoIndex.get_instance()
+    build_time = time.perf_counter() - start
+
+    monkeypatch.setattr(TypoIndex, "_instance", None)
+    start = time.perf_counter()
+    TypoIndex.get_instance()
+    load_time = time.perf_counter() - start
+
+    # 索引已加载后，新建生成器不应再重新计算拼音表
+    start = time.perf_counter()
+    ChineseTypoGenerator()
+    construct_time = time.perf_counter() - start
+
+    random.seed(0)
+    generator = get_typo_generator(error_rate=0.3, min_freq=5, tone_error_rate=0.2, word_replace_rate=0.3)
+    count = bench_size(200, 5000)
+    start = time.perf_counter()
+    for i in range(count):
+        typo_sentence, _ = generator.create_typo_sentence(SENTENCES[i % len(SENTENCES)])
+        assert typo_sentence
+    per_sentence = (time.perf_counter() - start) / count
+
+    bench_report(
+        f"索引构建 {build_time:.2f}s，从缓存加载 {load_time:.2f}s，新建生成器 {construct_time * 1000:.1f}ms；"
+        f"{count} 句 create_typo_sentence 平均 {per_sentence * 1000:.2f}ms（{1 / per_sentence:.0f} 句/秒）"
+    )
+
+    assert construct_time < 0.05
+    assert per_sentence < 0.02